@@ -0,0 +1,225 @@
+"""
+Генератор синтетических данных для бенчмарков
+
+Заполняет БД бота правдоподобной историей: сотрудники, подключения
+разных типов с одним-тремя исполнителями, фотографии, начисления и
+списания материалов и роутеров в журнале движений, итоговые остатки.
+При одинаковых seed, размере и конце истории данные совпадают: даты
+отсчитываются назад от --now, по умолчанию - от фиксированной даты
+DEFAULT_NOW, а не от дня запуска.
+
+Запуск из корня проекта:
+    python -m benchmarks.dataset --db bench.db --connections 100000 [--seed 42] [--now 2025-01-01T12:00]
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from database import Database
+from database.base_repository import db_timestamp
+from database.connection_pool import close_pool
+
+CONNECTION_TYPES = (('mkd', 6), ('chs', 3), ('legal', 1))
+EXECUTOR_COUNTS = ((1, 6), (2, 3), (3, 1))
+ROUTER_MODELS = ("Keenetic Start", "Keenetic Air", "TP-Link Archer C6", "TP-Link Archer C80", "Xiaomi AX3000")
+
+# Пополнение остатков сотрудника, когда материала не хватает на подключение
+FIBER_REFILL = 1000.0
+TWISTED_PAIR_REFILL = 500.0
+ROUTER_REFILL = 10
+
+# Размер пачки executemany
+CHUNK_SIZE = 10000
+
+# Конец истории по умолчанию: данные и базовые результаты бенчмарков не зависят от дня запуска
+DEFAULT_NOW = datetime(2025, 1, 1, 12, 0)
+
+
+def employees_for(connections: int) -> int:
+    """Количество сотрудников для истории из connections подключений"""
+    return max(5, min(500, connections // 200))
+
+
+class _Writer:
+    """Буфер строк по таблицам, сохраняемый пачками executemany"""
+    
+    SQL = {
+        'connections': """
+            INSERT INTO connections
+                (id, connection_type, address, router_model, port, fiber_meters, twisted_pair_meters,
+                 created_at, created_by, router_quantity, contract_signed, router_access)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?)
+        """,
+        'connection_employees': """
+            INSERT INTO connection_employees (connection_id, employee_id, created_at) VALUES (?, ?, ?)
+        """,
+        'connection_photos': """
+            INSERT INTO connection_photos (connection_id, photo_file_id, photo_category, photo_order)
+            VALUES (?, ?, 'general', 0)
+        """,
+        'material_movement_log': """
+            INSERT INTO material_movement_log
+                (employee_id, operation_type, item_type, item_name, quantity,
+                 balance_after, connection_id, created_at, created_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)
+        """,
+    }
+    
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows: Dict[str, List[Tuple]] = defaultdict(list)
+        self.counts: Dict[str, int] = defaultdict(int)
+    
+    def add(self, table: str, row: Tuple) -> None:
+        self.rows[table].append(row)
+        if len(self.rows[table]) >= CHUNK_SIZE:
+            self.flush(table)
+    
+    def flush(self, table: Optional[str] = None) -> None:
+        # Подключения сохраняются раньше ссылающихся на них строк
+        names = list(self.SQL) if table is None else ['connections', table]
+        for name in dict.fromkeys(names):
+            rows = self.rows.pop(name, None)
+            if rows:
+                self.conn.executemany(self.SQL[name], rows)
+                self.counts[name] += len(rows)
+
+
+def generate(
+    db_path: str,
+    connections: int,
+    seed: int = 42,
+    employees: Optional[int] = None,
+    days: int = 365,
+    now: Optional[datetime] = None
+) -> Dict:
+    """
+    Заполнить БД синтетической историей
+    
+    Args:
+        db_path: Путь к файлу БД (схема создается миграциями)
+        connections: Количество подключений
+        seed: Зерно генератора случайных чисел
+        employees: Количество сотрудников (по умолчанию - от размера истории)
+        days: Глубина истории в днях
+        now: Конец истории (по умолчанию - DEFAULT_NOW)
+    
+    Returns:
+        Dict: ID сотрудников и количество строк по таблицам
+    """
+    rng = random.Random(seed)
+    db = Database(db_path)
+    employee_count = employees or employees_for(connections)
+    end = now or DEFAULT_NOW
+    start = end - timedelta(days=days)
+    step = (end - start) / max(connections, 1)
+    
+    employee_ids = [db.add_employee(f"Монтажник {i:04d}") for i in range(employee_count)]
+    types, type_weights = zip(*CONNECTION_TYPES)
+    executor_counts, executor_weights = zip(*EXECUTOR_COUNTS)
+    
+    fiber = dict.fromkeys(employee_ids, 0.0)
+    twisted_pair = dict.fromkeys(employee_ids, 0.0)
+    routers: Dict[Tuple[int, str], int] = defaultdict(int)
+    
+    started = time.perf_counter()
+    with db.pool.transaction() as conn:
+        first_id = (conn.execute("SELECT COALESCE(MAX(id), 0) FROM connections").fetchone()[0]) + 1
+        writer = _Writer(conn)
+        for i in range(connections):
+            connection_id = first_id + i
+            created_at = db_timestamp(start + step * i)
+            executors = rng.sample(employee_ids, min(rng.choices(executor_counts, executor_weights)[0], employee_count))
+            payer = executors[0]
+            fiber_meters = float(rng.randrange(20, 300, 5))
+            twisted_pair_meters = float(rng.randrange(0, 60, 5))
+            router_model = rng.choice(ROUTER_MODELS) if rng.random() < 0.8 else '-'
+            
+            writer.add('connections', (
+                connection_id, rng.choices(types, type_weights)[0], f"ул. Синтетическая, д. {i % 500}, кв. {i}",
+                router_model, str(rng.randint(1, 48)), fiber_meters, twisted_pair_meters, created_at,
+                1, rng.random() < 0.9, rng.random() < 0.7
+            ))
+            for employee_id in executors:
+                writer.add('connection_employees', (connection_id, employee_id, created_at))
+            writer.add('connection_photos', (connection_id, f"photo_{connection_id}"))
+            
+            # Пополнение остатков плательщика перед списанием
+            if fiber[payer] < fiber_meters or twisted_pair[payer] < twisted_pair_meters:
+                fiber[payer] += FIBER_REFILL
+                twisted_pair[payer] += TWISTED_PAIR_REFILL
+                writer.add('material_movement_log',
+                           (payer, 'add', 'fiber', 'ВОЛС', FIBER_REFILL, fiber[payer], None, created_at))
+                writer.add('material_movement_log',
+                           (payer, 'add', 'twisted_pair', 'Витая пара', TWISTED_PAIR_REFILL,
+                            twisted_pair[payer], None, created_at))
+            if router_model != '-' and routers[payer, router_model] < 1:
+                routers[payer, router_model] += ROUTER_REFILL
+                writer.add('material_movement_log',
+                           (payer, 'add', 'router', router_model, ROUTER_REFILL,
+                            routers[payer, router_model], None, created_at))
+            
+            fiber[payer] -= fiber_meters
+            twisted_pair[payer] -= twisted_pair_meters
+            writer.add('material_movement_log',
+                       (payer, 'deduct', 'fiber', 'ВОЛС', fiber_meters, fiber[payer], connection_id, created_at))
+            if twisted_pair_meters:
+                writer.add('material_movement_log',
+                           (payer, 'deduct', 'twisted_pair', 'Витая пара', twisted_pair_meters,
+                            twisted_pair[payer], connection_id, created_at))
+            if router_model != '-':
+                routers[payer, router_model] -= 1
+                writer.add('material_movement_log',
+                           (payer, 'deduct', 'router', router_model, 1,
+                            routers[payer, router_model], connection_id, created_at))
+        writer.flush()
+        
+        # Итоговые остатки (сводка остатков обновляется триггерами)
+        conn.executemany(
+            "UPDATE employees SET fiber_balance = ?, twisted_pair_balance = ? WHERE id = ?",
+            [(round(fiber[emp], 2), round(twisted_pair[emp], 2), emp) for emp in employee_ids]
+        )
+        conn.executemany(
+            "INSERT INTO employee_routers (employee_id, router_name, quantity) VALUES (?, ?, ?)",
+            [(emp, name, quantity) for (emp, name), quantity in sorted(routers.items()) if quantity > 0]
+        )
+    
+    # Подключения вставлены напрямую, поэтому дневные сводки пересчитываются целиком
+    db.rebuild_daily_stats()
+    db.employee_directory.invalidate()
+    db.router_catalog.invalidate()
+    
+    return {
+        'employee_ids': employee_ids,
+        'connections': writer.counts['connections'],
+        'connection_employees': writer.counts['connection_employees'],
+        'connection_photos': writer.counts['connection_photos'],
+        'movements': writer.counts['material_movement_log'],
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def main() -> None:
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Генератор синтетических данных бота")
+    parser.add_argument('--db', required=True, help="Путь к файлу БД")
+    parser.add_argument('--connections', type=int, default=10000, help="Количество подключений")
+    parser.add_argument('--employees', type=int, help="Количество сотрудников (по умолчанию - от размера истории)")
+    parser.add_argument('--days', type=int, default=365, help="Глубина истории в днях")
+    parser.add_argument('--seed', type=int, default=42, help="Зерно генератора")
+    parser.add_argument('--now', type=datetime.fromisoformat, default=DEFAULT_NOW,
+                        help="Конец истории ГГГГ-ММ-ДД[TЧЧ:ММ] (по умолчанию - фиксированная дата)")
+    args = parser.parse_args()
+    
+    result = generate(args.db, args.connections, args.seed, args.employees, args.days, args.now)
+    close_pool(args.db)
+    print(f"Сотрудников: {len(result['employee_ids'])}, подключений: {result['connections']}, "
+          f"исполнителей: {result['connection_employees']}, движений: {result['movements']} "
+          f"({result['seconds']} с)")
+
+
+if __name__ == '__main__':
+    main()
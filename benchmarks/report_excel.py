@@ -0,0 +1,143 @@
+"""
+Бенчмарк генерации Excel-отчета: прежний генератор (книга в памяти, стили на каждую ячейку)
+против потокового (write-only, именованные стили, строки из курсора БД)
+
+Запуск из корня проекта:
+    python -m benchmarks.report_excel [--sizes 1000 100000 1000000] [--legacy-max 100000]
+
+Каждый прогон выполняется в отдельном процессе, чтобы пиковый RSS
+(ru_maxrss) относился только к нему. Прежний генератор на больших
+историях требует гигабайты памяти, поэтому выше --legacy-max не запускается.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from openpyxl import Workbook
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+
+from benchmarks.report_queries import _seed
+from database import Database
+from database.connection_pool import close_pool
+from report_generator import ReportGenerator
+
+
+def _legacy_generate(connections: List[Dict], stats: Dict, filename: str) -> None:
+    """Лист подключений так, как его строил прежний ReportGenerator"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Отчет"
+    
+    for idx, conn in enumerate(connections, 1):
+        row_data = [idx, conn['connection_type'], ', '.join(conn['all_employees']), conn['address'],
+                    conn['router_model'], str(conn['port']), conn['employee_fiber_meters'],
+                    conn['employee_twisted_pair_meters'], conn['created_at']]
+        for col_num, value in enumerate(row_data, 1):
+            cell = ws.cell(row=idx + 6, column=col_num)
+            cell.value = value
+            cell.border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                                 top=Side(style='thin'), bottom=Side(style='thin'))
+            if col_num in [7, 8]:
+                cell.alignment = Alignment(horizontal='right', vertical='center')
+                cell.number_format = '0.00'
+            else:
+                cell.alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
+    
+    cell = ws.cell(row=len(connections) + 8, column=7)
+    cell.value = stats['total_fiber_meters']
+    cell.font = Font(name='Arial', size=11, bold=True)
+    cell.fill = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")
+    wb.save(filename)
+
+
+def _max_rss_mb() -> float:
+    """Пиковый RSS текущего процесса, МБ (ru_maxrss в Linux - в КБ)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_case(mode: str, db_path: str, employee_id: int, out_dir: str, result: Dict) -> None:
+    """Сформировать отчет в отдельном процессе и сохранить замеры в result"""
+    db = Database(db_path)
+    baseline = _max_rss_mb()
+    filename = os.path.join(out_dir, f"{mode}.xlsx")
+    
+    started = time.perf_counter()
+    if mode == 'legacy':
+        connections, stats = db.get_employee_report(employee_id)
+        _legacy_generate(connections, stats, filename)
+    else:
+        stats = db.get_employee_report_totals(employee_id)
+        wb = ReportGenerator.create_workbook()
+        ReportGenerator.write_employee_sheets(wb, "Монтажник", db.iter_employee_report(employee_id),
+                                              stats, "Все время")
+        wb.save(filename)
+    elapsed = time.perf_counter() - started
+    
+    result.update({
+        'seconds': elapsed,
+        'rows_per_sec': stats['total_connections'] / elapsed,
+        'peak_rss_mb': _max_rss_mb(),
+        'rss_growth_mb': _max_rss_mb() - baseline,
+        'file_mb': os.path.getsize(filename) / 1024 / 1024,
+    })
+    os.remove(filename)
+    close_pool(db_path)
+
+
+def _measure(mode: str, db_path: str, employee_id: int, out_dir: str) -> Optional[Dict]:
+    """Запустить прогон в новом процессе (spawn) и вернуть замеры"""
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Manager() as manager:
+        result = manager.dict()
+        process = ctx.Process(target=_run_case, args=(mode, db_path, employee_id, out_dir, result))
+        process.start()
+        process.join()
+        return dict(result) if process.exitcode == 0 else None
+
+
+def run(sizes: List[int], legacy_max: int) -> None:
+    """Прогнать бенчмарк для каждого размера истории"""
+    print(f"{'строк':>9} {'генератор':>10} {'строк/с':>10} {'пик RSS, МБ':>12} {'рост RSS, МБ':>13} {'файл, МБ':>9}")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        db = Database(db_path)
+        employee_id = db.add_employee("Монтажник")
+        partner_id = db.add_employee("Напарник")
+        
+        seeded = 0
+        for size in sorted(sizes):
+            _seed(db, employee_id, partner_id, size - seeded)
+            seeded = size
+            
+            for mode in ('legacy', 'streaming'):
+                if mode == 'legacy' and size > legacy_max:
+                    print(f"{size:>9} {mode:>10} {'пропущен (--legacy-max)':>47}")
+                    continue
+                result = _measure(mode, db_path, employee_id, tmp)
+                if result is None:
+                    print(f"{size:>9} {mode:>10} {'ошибка':>47}")
+                    continue
+                print(f"{size:>9} {mode:>10} {result['rows_per_sec']:>10.0f} {result['peak_rss_mb']:>12.1f} "
+                      f"{result['rss_growth_mb']:>13.1f} {result['file_mb']:>9.1f}")
+        
+        close_pool(db_path)
+
+
+def main() -> None:
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Бенчмарк генерации Excel-отчета")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000],
+                        help="Количество строк (подключений) в отчете")
+    parser.add_argument('--legacy-max', type=int, default=100000,
+                        help="Максимальный размер для прежнего генератора")
+    args = parser.parse_args()
+    run(args.sizes, args.legacy_max)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Бенчмарк отчета по сотруднику: количество SQL-запросов и время при растущей истории
+
+Запуск из корня проекта:
+    python -m benchmarks.report_queries [--sizes 10 100 1000 10000] [--repeat 5]
+
+Завершается с кодом 1, если количество запросов зависит от размера истории.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+from database import Database
+from database.connection_pool import close_pool
+
+
+def _seed(db: Database, employee_id: int, partner_id: int, count: int) -> None:
+    """Добавить count подключений, выполненных двумя сотрудниками"""
+    with db.pool.transaction() as conn:
+        for i in range(count):
+            cursor = conn.execute("""
+                INSERT INTO connections
+                    (connection_type, address, router_model, port, fiber_meters, twisted_pair_meters, created_by)
+                VALUES ('mkd', ?, 'Router', ?, 100.0, 20.0, 1)
+            """, (f"ул. Бенчмарка, д. {i}", str(i % 24)))
+            conn.executemany(
+                "INSERT INTO connection_employees (connection_id, employee_id) VALUES (?, ?)",
+                [(cursor.lastrowid, employee_id), (cursor.lastrowid, partner_id)]
+            )
+    
+    # Подключения вставлены напрямую, мимо create_connection - пересчитываем дневные сводки
+    db.rebuild_daily_stats()
+
+
+def run(sizes: List[int], repeat: int) -> bool:
+    """Прогнать бенчмарк, вернуть True, если число запросов постоянно"""
+    print(f"{'подключений':>12} {'запросов':>9} {'мин, мс':>9} {'медиана, мс':>12}")
+    query_counts = set()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        db = Database(db_path)
+        employee_id = db.add_employee("Старший монтажник")
+        partner_id = db.add_employee("Напарник")
+        
+        seeded = 0
+        for size in sorted(sizes):
+            _seed(db, employee_id, partner_id, size - seeded)
+            seeded = size
+            
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                with db.pool.trace_statements() as statements:
+                    connections, _ = db.get_employee_report(employee_id)
+                timings.append((time.perf_counter() - started) * 1000)
+            
+            assert len(connections) == size
+            query_counts.add(len(statements))
+            print(f"{size:>12} {len(statements):>9} {min(timings):>9.2f} {statistics.median(timings):>12.2f}")
+        
+        close_pool(db_path)
+    
+    return len(query_counts) == 1
+
+
+def main() -> None:
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Бенчмарк запросов отчета по сотруднику")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help="Размеры истории подключений")
+    parser.add_argument('--repeat', type=int, default=5, help="Повторов на каждый размер")
+    args = parser.parse_args()
+    
+    if not run(args.sizes, args.repeat):
+        print("❌ Количество запросов растет вместе с историей")
+        sys.exit(1)
+    print("✅ Количество запросов не зависит от размера истории")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+"""
+Бенчмарк репозиториев и генератора отчетов на синтетических данных
+
+Для каждого размера истории создается БД генератором benchmarks.dataset
+(одинаковые данные при одинаковых seed и --now) и замеряются основные операции
+EmployeeRepository, MaterialRepository, RouterRepository,
+ConnectionRepository и ReportGenerator: операций в секунду, задержка
+p50/p99, количество SQL-запросов на операцию и пик памяти Python.
+
+Запуск из корня проекта:
+    python -m benchmarks.repositories [--sizes 1000 10000 100000 1000000] [--only connections.]
+    python -m benchmarks.repositories --save benchmarks/baselines/repositories.json
+    python -m benchmarks.repositories --baseline benchmarks/baselines/repositories.json
+
+С --baseline сравнивает результат с сохраненным и завершается с кодом 1
+при регрессии: запросов на операцию стало больше, p50 или пик памяти
+выросли больше допуска (--tolerance).
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from benchmarks.dataset import DEFAULT_NOW, ROUTER_MODELS, generate
+from database import Database
+from database.connection_pool import close_pool
+from report_generator import ReportGenerator
+
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "repositories.json")
+
+# Шум замеров: меньшие абсолютные изменения регрессией не считаются
+MIN_LATENCY_DELTA_MS = 0.5
+MIN_MEMORY_DELTA_KIB = 256
+
+
+class Case(NamedTuple):
+    """Замеряемая операция: имя 'компонент.операция' и функция от контекста"""
+    name: str
+    run: Callable[['Context'], object]
+
+
+class Context:
+    """Данные прогона: БД, ID из сгенерированной истории и генератор аргументов"""
+    
+    def __init__(self, db: Database, dataset: Dict, seed: int, now: datetime = DEFAULT_NOW):
+        self.db = db
+        self.dataset = dataset
+        self.rng = random.Random(seed)
+        self.employee_ids = dataset['employee_ids']
+        self.connection_count = dataset['connections']
+        
+        # Последние 30 дней истории (now - ее конец): целые дни (дневные сводки) и от
+        # момента now (исходные таблицы). Верхняя граница отсекает подключения,
+        # которые создает сам бенчмарк
+        self.month_end = datetime.combine(now.date(), datetime.min.time()) + timedelta(days=1)
+        self.month_start = self.month_end - timedelta(days=30)
+        self.window_start = now - timedelta(days=30)
+        self.window_end = now
+        
+        # Операции записи выполняются отдельными сотрудниками, чтобы не менять
+        # историю сотрудников, на которых замеряются чтения и отчеты
+        self.writer_id = db.add_employee("Бенчмарк Запись")
+        self.partner_id = db.add_employee("Бенчмарк Напарник")
+        db.add_material_to_employee(self.writer_id, 10 ** 9, 10 ** 9)
+        db.add_router_to_employee(self.writer_id, ROUTER_MODELS[0], 10 ** 6)
+    
+    def employee(self) -> int:
+        return self.rng.choice(self.employee_ids)
+    
+    def connection(self) -> int:
+        return self.rng.randint(1, self.connection_count)
+
+
+def _employee_report(ctx: Context) -> int:
+    """Excel-отчет сотрудника за последние 30 дней (в буфер)"""
+    db, employee_id = ctx.db, ctx.employee()
+    stats = db.get_employee_report_totals(employee_id, start=ctx.month_start, end=ctx.month_end)
+    output = ReportGenerator.generate_employee_report(
+        "Монтажник", db.iter_employee_report(employee_id, start=ctx.month_start, end=ctx.month_end), stats,
+        "Последние 30 дней", movements=db.iter_employee_movements(employee_id, ctx.month_start, ctx.month_end),
+        output=io.BytesIO()
+    )
+    return output.getbuffer().nbytes
+
+
+def _team_report(ctx: Context) -> int:
+    """Сводный Excel-отчет по всем сотрудникам за последние 30 дней (в буфер)"""
+    db = ctx.db
+    summary = db.get_team_summary(start=ctx.month_start, end=ctx.month_end)
+    output = ReportGenerator.generate_team_report(
+        summary, db.iter_team_report(start=ctx.month_start, end=ctx.month_end), "Последние 30 дней",
+        output=io.BytesIO()
+    )
+    return output.getbuffer().nbytes
+
+
+def _create_connection(ctx: Context) -> Optional[int]:
+    """Подключение с двумя исполнителями: списания, журнал, сводки и фото в одной транзакции"""
+    return ctx.db.create_connection(
+        connection_type='mkd', address="ул. Бенчмарка, д. 1", router_model=ROUTER_MODELS[0], port="1",
+        fiber_meters=100.0, twisted_pair_meters=20.0, employee_ids=[ctx.writer_id, ctx.partner_id],
+        photo_file_ids=["photo"], created_by=1, material_payer_id=ctx.writer_id, router_payer_id=ctx.writer_id
+    )
+
+
+CASES: List[Case] = [
+    Case('employees.get_inventory', lambda ctx: ctx.db.employees_repo.get_inventory()),
+    Case('employees.get_by_id', lambda ctx: ctx.db.employees_repo.get_by_id(ctx.employee())),
+    Case('employees.get_balance', lambda ctx: ctx.db.employees_repo.get_balance(ctx.employee())),
+    
+    Case('materials.add_material', lambda ctx: ctx.db.materials_repo.add_material(ctx.writer_id, 1.0, 1.0)),
+    Case('materials.deduct_material', lambda ctx: ctx.db.materials_repo.deduct_material(ctx.writer_id, 1.0, 1.0)),
+    Case('materials.get_movements_30d',
+         lambda ctx: ctx.db.materials_repo.get_movements(ctx.employee(), ctx.month_start, ctx.month_end)),
+    Case('materials.count_movements_all', lambda ctx: ctx.db.materials_repo.count_movements(ctx.employee())),
+    Case('materials.count_movements_window',
+         lambda ctx: ctx.db.materials_repo.count_movements(ctx.employee(), ctx.window_start, ctx.window_end)),
+    
+    Case('routers.add_router', lambda ctx: ctx.db.routers_repo.add_router(ctx.writer_id, ROUTER_MODELS[1], 1)),
+    Case('routers.deduct_router', lambda ctx: ctx.db.routers_repo.deduct_router(ctx.writer_id, ROUTER_MODELS[1], 1)),
+    Case('routers.get_routers', lambda ctx: ctx.db.routers_repo.get_routers(ctx.employee())),
+    Case('routers.get_quantity',
+         lambda ctx: ctx.db.routers_repo.get_quantity(ctx.employee(), ctx.rng.choice(ROUTER_MODELS))),
+    
+    Case('connections.get_by_id', lambda ctx: ctx.db.connections_repo.get_by_id(ctx.connection())),
+    Case('connections.create', _create_connection),
+    Case('connections.employee_report_30d',
+         lambda ctx: ctx.db.connections_repo.get_employee_report(
+             ctx.employee(), start=ctx.month_start, end=ctx.month_end)),
+    Case('connections.employee_totals_all',
+         lambda ctx: ctx.db.connections_repo.get_employee_report_totals(ctx.employee())),
+    Case('connections.employee_totals_window',
+         lambda ctx: ctx.db.connections_repo.get_employee_report_totals(
+             ctx.employee(), start=ctx.window_start, end=ctx.window_end)),
+    Case('connections.team_summary_30d',
+         lambda ctx: ctx.db.connections_repo.get_team_summary(start=ctx.month_start, end=ctx.month_end)),
+    Case('connections.team_summary_window',
+         lambda ctx: ctx.db.connections_repo.get_team_summary(start=ctx.window_start, end=ctx.window_end)),
+    Case('connections.get_all_count', lambda ctx: ctx.db.connections_repo.get_all_count()),
+    
+    Case('report.employee_30d', _employee_report),
+    Case('report.team_30d', _team_report),
+]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def measure(case: Case, ctx: Context, time_budget: float, max_iterations: int, min_iterations: int = 5) -> Dict:
+    """
+    Замерить операцию
+    
+    Операция повторяется, пока не исчерпан бюджет времени или
+    max_iterations (но не меньше min_iterations раз). Затем один дополнительный прогон выполняется с
+    подсчетом SQL-запросов и tracemalloc - чтобы они не влияли на задержки.
+    """
+    timings = []
+    budget_end = time.perf_counter() + time_budget
+    while len(timings) < min_iterations or (len(timings) < max_iterations and time.perf_counter() < budget_end):
+        started = time.perf_counter()
+        case.run(ctx)
+        timings.append(time.perf_counter() - started)
+    
+    with ExitStack() as stack:
+        statements = [stack.enter_context(pool.trace_statements()) for pool in (ctx.db.pool, ctx.db.read_pool)]
+        tracemalloc.start()
+        try:
+            case.run(ctx)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    queries = sum(1 for traced in statements for sql in traced if not sql.lstrip().upper().startswith(
+        ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+    ))
+    
+    timings.sort()
+    return {
+        'iterations': len(timings),
+        'ops_per_sec': round(len(timings) / sum(timings), 1),
+        'p50_ms': round(_percentile(timings, 0.50) * 1000, 3),
+        'p99_ms': round(_percentile(timings, 0.99) * 1000, 3),
+        'queries': queries,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run(
+    sizes: List[int],
+    seed: int = 42,
+    time_budget: float = 1.0,
+    max_iterations: int = 1000,
+    only: Optional[str] = None,
+    now: datetime = DEFAULT_NOW
+) -> Dict:
+    """Прогнать бенчмарк для каждого размера истории (now - конец истории) и вернуть результаты"""
+    cases = [case for case in CASES if not only or case.name.startswith(only)]
+    results = {
+        'meta': {
+            'seed': seed,
+            'now': now.isoformat(timespec='minutes'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+        },
+        'sizes': {},
+    }
+    
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "bench.db")
+            dataset = generate(db_path, size, seed=seed, now=now)
+            print(f"\n{size} подключений: {len(dataset['employee_ids'])} сотрудников, "
+                  f"{dataset['connection_employees']} исполнителей, {dataset['movements']} движений "
+                  f"(генерация {dataset['seconds']} с)")
+            print(f"{'операция':<38} {'оп/с':>10} {'p50, мс':>9} {'p99, мс':>9} {'запросов':>9} {'пик, КиБ':>10}")
+            
+            ctx = Context(Database(db_path), dataset, seed, now)
+            size_results = {}
+            for case in cases:
+                result = size_results[case.name] = measure(case, ctx, time_budget, max_iterations)
+                print(f"{case.name:<38} {result['ops_per_sec']:>10.1f} {result['p50_ms']:>9.3f} "
+                      f"{result['p99_ms']:>9.3f} {result['queries']:>9} {result['peak_kib']:>10.1f}")
+            
+            results['sizes'][str(size)] = {
+                'dataset': {key: value for key, value in dataset.items() if key != 'employee_ids'},
+                'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                'cases': size_results,
+            }
+            close_pool(db_path)
+    
+    return results
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Сравнить результаты с сохраненными
+    
+    Returns:
+        Список регрессий (пустой - регрессий нет)
+    """
+    regressions = []
+    for size, size_results in results['sizes'].items():
+        base_cases = baseline.get('sizes', {}).get(size, {}).get('cases', {})
+        for name, result in size_results['cases'].items():
+            base = base_cases.get(name)
+            if base is None:
+                continue
+            label = f"{size} / {name}"
+            if result['queries'] > base['queries']:
+                regressions.append(f"{label}: запросов {base['queries']} → {result['queries']}")
+            if (result['p50_ms'] > base['p50_ms'] * (1 + tolerance)
+                    and result['p50_ms'] - base['p50_ms'] > MIN_LATENCY_DELTA_MS):
+                regressions.append(f"{label}: p50 {base['p50_ms']} → {result['p50_ms']} мс")
+            if (result['peak_kib'] > base['peak_kib'] * (1 + tolerance)
+                    and result['peak_kib'] - base['peak_kib'] > MIN_MEMORY_DELTA_KIB):
+                regressions.append(f"{label}: пик памяти {base['peak_kib']} → {result['peak_kib']} КиБ")
+    return regressions
+
+
+def main() -> None:
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Бенчмарк репозиториев и генератора отчетов")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Размеры истории (подключений), от 1000 до 1000000")
+    parser.add_argument('--seed', type=int, default=42, help="Зерно генератора данных")
+    parser.add_argument('--now', type=datetime.fromisoformat, default=DEFAULT_NOW,
+                        help="Конец истории ГГГГ-ММ-ДД[TЧЧ:ММ] (по умолчанию - фиксированная дата генератора)")
+    parser.add_argument('--time-budget', type=float, default=1.0, help="Секунд на замер операции")
+    parser.add_argument('--max-iterations', type=int, default=1000, help="Максимум повторов операции")
+    parser.add_argument('--only', help="Замерять только операции с этим префиксом (например, connections.)")
+    parser.add_argument('--save', metavar='PATH', help="Сохранить результаты как базовые")
+    parser.add_argument('--baseline', metavar='PATH', help="Сравнить с базовыми результатами")
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="Допустимый рост p50 и пика памяти относительно базовых (0.5 = +50%%)")
+    args = parser.parse_args()
+    
+    # Журнал операций на уровне INFO искажает замеры и вывод
+    logging.getLogger().setLevel(logging.WARNING)
+    results = run(args.sizes, args.seed, args.time_budget, args.max_iterations, args.only, args.now)
+    
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты сохранены: {args.save}")
+    
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n❌ Регрессии относительно базовых результатов:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\n✅ Регрессий относительно базовых результатов нет")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""
+Задержка от обновления до ответа бота: long polling против вебхука
+
+Бот (все обработчики из bot.build_application) работает против
+локального фейкового Bot API. Записанные обновления по одному
+доставляются боту: в режиме polling - ответом на getUpdates, в режиме
+webhook - POST на встроенный сервер PTB с секретным заголовком. Задержка -
+от отправки обновления до первого вызова API с chat_id этого обновления
+(обычно sendMessage с ответом).
+
+Запуск из корня проекта:
+    python -m benchmarks.webhook_latency [--modes polling webhook] [--rounds 20] [--rtt 60]
+    python -m benchmarks.webhook_latency --updates updates.json --save latency.json
+
+--updates - JSON-список объектов Update (например, из ответа getUpdates);
+chat.id, from.id и update_id заменяются, чтобы ответы на разные
+обновления не путались. --rtt моделирует сеть до Telegram: каждый
+вызов API отвечает через rtt мс, обновление доходит до бота за rtt/2.
+БД создается во временном каталоге.
+"""
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import os
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.web import Application as WebApplication, RequestHandler
+
+from bot import build_application
+
+TOKEN = "123456:BENCHMARK"
+SECRET_TOKEN = "benchmark-secret"
+WEBHOOK_PATH = "telegram"
+DEFAULT_UPDATES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recorded_updates.json')
+
+# Long polling как в bot.py (run_polling): запрос getUpdates висит до 10 с
+POLL_TIMEOUT = 10
+REPLY_TIMEOUT = 15.0
+
+# ID чатов, которые получают обновления при замере
+CHAT_ID_BASE = 10_000_000
+
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': "ISP Bot", 'username': "isp_benchmark_bot",
+            'can_join_groups': False, 'can_read_all_group_messages': False, 'supports_inline_queries': False}
+
+
+class _ApiHandler(RequestHandler):
+    """POST /bot<token>/<method>"""
+    
+    def initialize(self, api: 'FakeBotApi'):
+        self.api = api
+    
+    async def post(self, method: str):
+        params = {key: values[-1].decode() for key, values in self.request.body_arguments.items()}
+        result = await self.api.call(method, params)
+        self.set_header('Content-Type', 'application/json')
+        self.write(json.dumps({'ok': True, 'result': result}, ensure_ascii=False))
+
+
+class FakeBotApi:
+    """Локальный Bot API: отдает обновления через getUpdates и отмечает ответы бота"""
+    
+    def __init__(self, rtt: float = 0.0):
+        self.rtt = rtt
+        self.calls: Dict[str, int] = {}
+        self._updates: List[Dict] = []
+        self._arrived = asyncio.Event()
+        self._waiting: Dict[int, asyncio.Future] = {}
+        self._next_message_id = 1
+        self._server: Optional[HTTPServer] = None
+        self._closing = False
+        self.url = ''
+    
+    async def start(self) -> None:
+        sockets = bind_sockets(0, '127.0.0.1', family=socket.AF_INET)
+        app = WebApplication([(rf"/bot{TOKEN}/(\w+)", _ApiHandler, {'api': self})])
+        self._server = HTTPServer(app)
+        self._server.add_sockets(sockets)
+        self.url = f"http://127.0.0.1:{sockets[0].getsockname()[1]}"
+    
+    async def stop(self) -> None:
+        # Висящий getUpdates завершается пустым ответом, а не отменой
+        self._closing = True
+        self._arrived.set()
+        await asyncio.sleep(0)
+        self._server.stop()
+        await self._server.close_all_connections()
+    
+    def push(self, update: Dict) -> None:
+        """Обновление для следующего ответа на getUpdates"""
+        self._updates.append(update)
+        self._arrived.set()
+    
+    def expect_reply(self, chat_id: int) -> asyncio.Future:
+        """Future со временем первого вызова API для chat_id"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[chat_id] = future
+        return future
+    
+    async def call(self, method: str, params: Dict):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if method == 'getUpdates':
+            return await self._get_updates(int(params.get('offset', 0)), float(params.get('timeout', 0)))
+        
+        chat_id = params.get('chat_id')
+        if chat_id and chat_id.lstrip('-').isdigit():
+            future = self._waiting.pop(int(chat_id), None)
+            if future is not None and not future.done():
+                future.set_result(time.perf_counter())
+        
+        await asyncio.sleep(self.rtt)
+        if method == 'getMe':
+            return BOT_USER
+        if method in ('sendMessage', 'sendPhoto', 'editMessageText'):
+            self._next_message_id += 1
+            return {'message_id': self._next_message_id, 'date': int(time.time()),
+                    'chat': {'id': int(chat_id), 'type': 'private'}, 'text': params.get('text', '')}
+        return True
+    
+    async def _get_updates(self, offset: int, timeout: float) -> List[Dict]:
+        """Long polling: ответ, как только появится обновление, или через timeout"""
+        self._updates = [update for update in self._updates if update['update_id'] >= offset]
+        if not self._updates:
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+            if self._closing:
+                return []
+        # Обновление идет от Telegram к боту в ответе на висящий запрос
+        await asyncio.sleep(self.rtt / 2)
+        return list(self._updates)
+
+
+def _personalize(template: Dict, update_id: int, chat_id: int) -> Dict:
+    """Копия записанного обновления с новыми update_id, чатом и отправителем"""
+    update = copy.deepcopy(template)
+    update['update_id'] = update_id
+    for key, value in update.items():
+        if not isinstance(value, dict):
+            continue
+        if isinstance(value.get('from'), dict):
+            value['from']['id'] = chat_id
+        message = value.get('message', value) if key == 'callback_query' else value
+        if isinstance(message.get('chat'), dict):
+            message['chat']['id'] = chat_id
+            message['date'] = int(time.time())
+    return update
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+async def measure(mode: str, updates: List[Dict], rounds: int, rtt: float) -> Dict:
+    """
+    Замерить задержку ответа в одном режиме
+    
+    Args:
+        mode: 'polling' или 'webhook'
+        updates: Записанные обновления (отправляются по одному)
+        rounds: Сколько раз отправить весь список
+        rtt: Время ответа Bot API, секунд
+    
+    Returns:
+        Dict: Задержки (мс), число обновлений и вызовы API по методам
+    """
+    api = FakeBotApi(rtt)
+    await api.start()
+    application = build_application(TOKEN, base_url=f"{api.url}/bot")
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    
+    webhook_url = None
+    if mode == 'webhook':
+        port = _free_port()
+        webhook_url = f"http://127.0.0.1:{port}/{WEBHOOK_PATH}"
+        await application.updater.start_webhook(
+            listen='127.0.0.1', port=port, url_path=WEBHOOK_PATH,
+            webhook_url=webhook_url, secret_token=SECRET_TOKEN
+        )
+    else:
+        await application.updater.start_polling(poll_interval=0.0, timeout=POLL_TIMEOUT)
+    
+    latencies = []
+    rejected = None
+    started = time.perf_counter()
+    try:
+        async with httpx.AsyncClient() as client:
+            if webhook_url:
+                # Запрос без секрета сервер должен отклонить
+                rejected = (await client.post(webhook_url, json=_personalize(updates[0], 1, CHAT_ID_BASE))
+                            ).status_code
+            
+            update_id = 1
+            for _ in range(rounds):
+                for template in updates:
+                    update_id += 1
+                    chat_id = CHAT_ID_BASE + update_id
+                    update = _personalize(template, update_id, chat_id)
+                    reply = api.expect_reply(chat_id)
+                    sent = time.perf_counter()
+                    if webhook_url:
+                        await asyncio.sleep(rtt / 2)
+                        response = await client.post(
+                            webhook_url, json=update,
+                            headers={'X-Telegram-Bot-Api-Secret-Token': SECRET_TOKEN}
+                        )
+                        response.raise_for_status()
+                    else:
+                        api.push(update)
+                    latencies.append(await asyncio.wait_for(reply, REPLY_TIMEOUT) - sent)
+    finally:
+        elapsed = time.perf_counter() - started
+        await application.updater.stop()
+        await application.stop()
+        await application.post_shutdown(application)
+        await application.shutdown()
+        await api.stop()
+    
+    latencies.sort()
+    return {
+        'updates': len(latencies),
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+        'elapsed_s': round(elapsed, 3),
+        'api_calls': dict(sorted(api.calls.items())),
+        'rejected_without_secret': rejected,
+    }
+
+
+def run(modes: List[str], updates_path: str = DEFAULT_UPDATES, rounds: int = 20, rtt: float = 0.0) -> Dict:
+    """Замерить все режимы; БД бота создается во временном каталоге"""
+    with open(updates_path, encoding='utf-8') as file:
+        updates = json.load(file)
+    
+    results = {'rounds': rounds, 'rtt_ms': round(rtt * 1000, 1), 'updates_file': updates_path, 'modes': {}}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="isp_bot_latency_") as tmp:
+        # post_init открывает isp_bot.db в текущем каталоге
+        os.chdir(tmp)
+        try:
+            for mode in modes:
+                result = asyncio.run(measure(mode, updates, rounds, rtt))
+                results['modes'][mode] = result
+                print(f"{mode:<8} {result['updates']:>5} обн.  p50 {result['p50_ms']:>8.2f} мс  "
+                      f"p95 {result['p95_ms']:>8.2f} мс  max {result['max_ms']:>8.2f} мс  "
+                      f"вызовы API: {result['api_calls']}")
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def main() -> None:
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Задержка ответа бота: long polling против вебхука")
+    parser.add_argument('--modes', nargs='+', choices=('polling', 'webhook'), default=['polling', 'webhook'])
+    parser.add_argument('--updates', default=DEFAULT_UPDATES, help="JSON-список записанных обновлений")
+    parser.add_argument('--rounds', type=int, default=20, help="Сколько раз отправить все обновления")
+    parser.add_argument('--rtt', type=float, default=0.0, help="Время ответа Bot API, мс")
+    parser.add_argument('--save', metavar='PATH', help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+    
+    # Журнал обработчиков на уровне INFO искажает замеры и вывод
+    logging.getLogger().setLevel(logging.WARNING)
+    results = run(args.modes, args.updates, args.rounds, args.rtt / 1000)
+    
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты сохранены: {args.save}")
+    
+    if any(result['rejected_without_secret'] not in (None, 403) for result in results['modes'].values()):
+        print("\n❌ Вебхук принял запрос без секретного заголовка")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
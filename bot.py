@@ -2,6 +2,8 @@
 Telegram-бот для интернет-провайдера
 Автоматизация отчетности по подключению новых абонентов
 """
+from typing import Optional
+
 from telegram import Update
 from telegram.ext import (
     Application,
@@ -21,12 +23,18 @@ from config import (
     ENTER_FIBER_AMOUNT, ENTER_TWISTED_AMOUNT, CONFIRM_MATERIAL_OPERATION,
     SELECT_EMPLOYEE_FOR_ROUTER, SELECT_ROUTER_ACTION,
     ENTER_ROUTER_NAME, ENTER_ROUTER_QUANTITY, CONFIRM_ROUTER_OPERATION,
-    SELECT_REPORT_EMPLOYEE, SELECT_REPORT_PERIOD,
+    SELECT_REPORT_EMPLOYEE, SELECT_REPORT_PERIOD, ENTER_REPORT_PERIOD,
+    REPORT_WORKERS, REPORT_MAX_QUEUED,
+    OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE_PER_MINUTE, OUTBOX_MAX_ATTEMPTS,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_CERT, WEBHOOK_KEY,
+    WEBHOOK_SECRET_TOKEN,
     logger
 )
 
 # Импорт базы данных
 from database import Database
+from database.async_db import AsyncDatabase
+from database.connection_pool import close_all_pools
 
 # Импорт обработчиков команд
 from handlers.commands import (
@@ -37,7 +45,12 @@ from handlers.commands import (
 )
 
 # Импорт клавиатуры
-from utils.keyboards import get_main_keyboard
+from utils.keyboards import get_main_keyboard, get_keyboard_cache
+from utils.helpers import DB_KEY, OUTBOX_KEY, REPORT_JOBS_KEY
+from utils.outbox import Outbox
+from utils.report_cache import get_report_cache
+from utils.report_delivery import get_delivery_stats
+from utils.report_jobs import ReportJobRunner
 
 # Импорт ConversationHandler для подключений
 from handlers.connection import connection_conv
@@ -46,7 +59,9 @@ from handlers.connection import connection_conv
 from handlers.reports import (
     report_start,
     report_select_period,
-    report_generate
+    report_generate,
+    report_custom_period,
+    report_job_cancel
 )
 
 # Импорт обработчиков сотрудников
@@ -66,18 +81,49 @@ from handlers.employees import (
     show_employees_list
 )
 
-# Инициализация БД
-db = Database()
 
+async def post_init(application: Application) -> None:
+    """Создание общих для всех обработчиков объектов после инициализации приложения"""
+    db = AsyncDatabase(Database())
+    application.bot_data[DB_KEY] = db
+    logger.info("База данных инициализирована")
+    outbox = Outbox(db, application.bot, OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE_PER_MINUTE, OUTBOX_MAX_ATTEMPTS)
+    application.bot_data[OUTBOX_KEY] = outbox
+    outbox.start()
+    application.bot_data[REPORT_JOBS_KEY] = ReportJobRunner(REPORT_WORKERS, REPORT_MAX_QUEUED)
 
-def main():
-    """Запуск бота"""
-    if not TELEGRAM_BOT_TOKEN:
-        logger.error("TELEGRAM_BOT_TOKEN не найден в .env файле!")
-        return
-    
-    # Создаем приложение
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+
+async def post_shutdown(application: Application) -> None:
+    """Освобождение ресурсов при остановке бота"""
+    jobs = application.bot_data.pop(REPORT_JOBS_KEY, None)
+    if jobs:
+        await jobs.shutdown()
+    outbox = application.bot_data.pop(OUTBOX_KEY, None)
+    if outbox:
+        await outbox.stop()
+    db = application.bot_data.pop(DB_KEY, None)
+    if db:
+        await db.shutdown()
+        logger.info(f"Статистика пулов подключений к БД: {db.get_pool_stats()}")
+        logger.info(f"Статистика кэшей БД: {db.get_cache_stats()}")
+    logger.info(f"Статистика кэша клавиатур: {get_keyboard_cache().stats()}")
+    logger.info(f"Статистика кэша отчетов: {get_report_cache().stats()}")
+    logger.info(f"Статистика доставки отчетов: {get_delivery_stats().stats()}")
+    close_all_pools()
+    logger.info("Подключения к БД закрыты")
+
+
+def build_application(token: str, base_url: Optional[str] = None) -> Application:
+    """Создать приложение со всеми обработчиками (base_url - другой адрес Bot API, например стенд)"""
+    builder = (
+        Application.builder()
+        .token(token)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    application = builder.build()
     
     # Фильтр для ввода данных (исключает кнопки главного меню)
     text_input_filter = (
@@ -89,58 +135,19 @@ def main():
     # Фильтр для кнопок главного меню
     menu_buttons_filter = filters.Regex('^(📝 Новое подключение|📊 Сводный отчет|👥 Управление сотрудниками|ℹ️ Помощь)$')
     
-    # Обертки для передачи db в обработчики отчетов и сотрудников
-    async def report_start_wrapper(update, context):
-        return await report_start(update, context, db)
-    
-    async def report_select_period_wrapper(update, context):
-        return await report_select_period(update, context, db)
-    
-    async def report_generate_wrapper(update, context):
-        return await report_generate(update, context, db)
-    
-    async def manage_action_wrapper(update, context):
-        return await manage_action(update, context, db)
-    
-    async def add_employee_name_wrapper(update, context):
-        return await add_employee_name(update, context, db)
-    
-    async def delete_employee_confirm_wrapper(update, context):
-        return await delete_employee_confirm(update, context, db)
-    
-    async def select_employee_for_material_wrapper(update, context):
-        return await select_employee_for_material(update, context, db)
-    
-    async def select_material_action_wrapper(update, context):
-        return await select_material_action(update, context, db)
-    
-    async def enter_fiber_amount_wrapper(update, context):
-        return await enter_fiber_amount(update, context, db)
-    
-    async def enter_twisted_amount_wrapper(update, context):
-        return await enter_twisted_amount(update, context, db)
-    
-    async def select_employee_for_router_wrapper(update, context):
-        return await select_employee_for_router(update, context, db)
-    
-    async def select_router_action_wrapper(update, context):
-        return await select_router_action(update, context, db)
-    
-    async def enter_router_name_wrapper(update, context):
-        return await enter_router_name(update, context, db)
-    
-    async def enter_router_quantity_wrapper(update, context):
-        return await enter_router_quantity(update, context, db)
-    
     # Обработчик отчетов
     report_conv = ConversationHandler(
         entry_points=[
-            CommandHandler('report', report_start_wrapper),
-            MessageHandler(filters.Regex('^📊 Сводный отчет$'), report_start_wrapper)
+            CommandHandler('report', report_start),
+            MessageHandler(filters.Regex('^📊 Сводный отчет$'), report_start)
         ],
         states={
-            SELECT_REPORT_EMPLOYEE: [CallbackQueryHandler(report_select_period_wrapper, pattern='^(rep_emp_|report_cancel)')],
-            SELECT_REPORT_PERIOD: [CallbackQueryHandler(report_generate_wrapper, pattern='^(period_|period_cancel)')]
+            SELECT_REPORT_EMPLOYEE: [CallbackQueryHandler(report_select_period, pattern='^(rep_emp_|report_cancel)')],
+            SELECT_REPORT_PERIOD: [CallbackQueryHandler(report_generate, pattern='^(period_|period_cancel)')],
+            ENTER_REPORT_PERIOD: [
+                MessageHandler(text_input_filter, report_custom_period),
+                CallbackQueryHandler(report_generate, pattern='^period_cancel$')
+            ]
         },
         fallbacks=[
             CommandHandler('cancel', cancel_command),
@@ -155,23 +162,23 @@ def main():
             MessageHandler(filters.Regex('^👥 Управление сотрудниками$'), manage_employees_start)
         ],
         states={
-            MANAGE_ACTION: [CallbackQueryHandler(manage_action_wrapper, pattern='^(manage_|back_to_manage)')],
-            ADD_EMPLOYEE_NAME: [MessageHandler(text_input_filter, add_employee_name_wrapper)],
-            DELETE_EMPLOYEE_SELECT: [CallbackQueryHandler(delete_employee_confirm_wrapper, pattern='^(del_emp_|delete_cancel)')],
-            SELECT_EMPLOYEE_FOR_MATERIAL: [CallbackQueryHandler(select_employee_for_material_wrapper, pattern='^(mat_emp_|back_to_manage)')],
-            SELECT_MATERIAL_ACTION: [CallbackQueryHandler(select_material_action_wrapper, pattern='^(mat_action_|mat_back_to_list)')],
-            ENTER_FIBER_AMOUNT: [MessageHandler(text_input_filter, enter_fiber_amount_wrapper)],
-            ENTER_TWISTED_AMOUNT: [MessageHandler(text_input_filter, enter_twisted_amount_wrapper)],
-            SELECT_EMPLOYEE_FOR_ROUTER: [CallbackQueryHandler(select_employee_for_router_wrapper, pattern='^(rtr_emp_|back_to_manage)')],
+            MANAGE_ACTION: [CallbackQueryHandler(manage_action, pattern='^(manage_|back_to_manage)')],
+            ADD_EMPLOYEE_NAME: [MessageHandler(text_input_filter, add_employee_name)],
+            DELETE_EMPLOYEE_SELECT: [CallbackQueryHandler(delete_employee_confirm, pattern='^(del_emp_|delete_cancel)')],
+            SELECT_EMPLOYEE_FOR_MATERIAL: [CallbackQueryHandler(select_employee_for_material, pattern='^(mat_emp_|back_to_manage)')],
+            SELECT_MATERIAL_ACTION: [CallbackQueryHandler(select_material_action, pattern='^(mat_action_|mat_back_to_list)')],
+            ENTER_FIBER_AMOUNT: [MessageHandler(text_input_filter, enter_fiber_amount)],
+            ENTER_TWISTED_AMOUNT: [MessageHandler(text_input_filter, enter_twisted_amount)],
+            SELECT_EMPLOYEE_FOR_ROUTER: [CallbackQueryHandler(select_employee_for_router, pattern='^(rtr_emp_|back_to_manage)')],
             SELECT_ROUTER_ACTION: [
-                CallbackQueryHandler(select_router_action_wrapper, pattern='^(rtr_action_|rtr_back_to_list)'),
-                CallbackQueryHandler(enter_router_name_wrapper, pattern='^(deduct_router_|router_model_)')
+                CallbackQueryHandler(select_router_action, pattern='^(rtr_action_|rtr_back_to_list)'),
+                CallbackQueryHandler(enter_router_name, pattern='^(deduct_router_|router_model_)')
             ],
             ENTER_ROUTER_NAME: [
-                CallbackQueryHandler(enter_router_name_wrapper, pattern='^router_model_'),
-                MessageHandler(text_input_filter, enter_router_name_wrapper)
+                CallbackQueryHandler(enter_router_name, pattern='^router_model_'),
+                MessageHandler(text_input_filter, enter_router_name)
             ],
-            ENTER_ROUTER_QUANTITY: [MessageHandler(text_input_filter, enter_router_quantity_wrapper)]
+            ENTER_ROUTER_QUANTITY: [MessageHandler(text_input_filter, enter_router_quantity)]
         },
         fallbacks=[
             CommandHandler('cancel', cancel_command),
@@ -179,17 +186,14 @@ def main():
         ]
     )
     
-    # Wrapper для show_employees_list
-    async def show_employees_list_wrapper(update, context):
-        return await show_employees_list(update, context, db)
-    
     # Добавляем обработчики
     application.add_handler(CommandHandler('start', start_command))
     application.add_handler(CommandHandler('help', help_command))
     application.add_handler(connection_conv)
     application.add_handler(report_conv)
+    application.add_handler(CallbackQueryHandler(report_job_cancel, pattern='^rjob_cancel_'))
     application.add_handler(manage_conv)
-    application.add_handler(MessageHandler(filters.Regex('^👤 Список сотрудников$'), show_employees_list_wrapper))
+    application.add_handler(MessageHandler(filters.Regex('^👤 Список сотрудников$'), show_employees_list))
     application.add_handler(MessageHandler(filters.Regex('^ℹ️ Помощь$'), help_command))
     
     # Fallback для неизвестных команд
@@ -204,9 +208,35 @@ def main():
         unknown_command
     ))
     
+    return application
+
+
+def main():
+    """Запуск бота"""
+    if not TELEGRAM_BOT_TOKEN:
+        logger.error("TELEGRAM_BOT_TOKEN не найден в .env файле!")
+        return
+    
+    application = build_application(TELEGRAM_BOT_TOKEN)
+    
     # Запускаем бота
-    logger.info("🚀 Бот запущен!")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if BOT_MODE == 'webhook':
+        # Вебхук регистрируется в Telegram при запуске; при возврате к polling он снимается
+        logger.info(f"🚀 Бот запущен! Вебхук: {WEBHOOK_URL}/{WEBHOOK_PATH}, "
+                    f"сервер: {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{' (TLS)' if WEBHOOK_CERT else ''}")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            cert=WEBHOOK_CERT,
+            key=WEBHOOK_KEY,
+            allowed_updates=Update.ALL_TYPES
+        )
+    else:
+        logger.info("🚀 Бот запущен!")
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
 if __name__ == '__main__':
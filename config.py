@@ -2,6 +2,8 @@
 Конфигурация бота и константы
 """
 import os
+import re
+import secrets
 import logging
 from dotenv import load_dotenv
 
@@ -57,6 +59,7 @@ CONFIRM_ROUTER_OPERATION = 29
 # Отчеты
 SELECT_REPORT_EMPLOYEE = 30
 SELECT_REPORT_PERIOD = 31
+ENTER_REPORT_PERIOD = 32
 
 # Типы подключений
 CONNECTION_TYPES = {
@@ -84,6 +87,71 @@ if REPORTS_CHANNEL_ID:
 else:
     REPORTS_CHANNEL_ID = None
 
+# Дополнительные каналы отчетов по типам подключений (опционально):
+# REPORTS_CHANNELS_BY_TYPE=mkd:-1001111111111,chs:-1002222222222,legal:-1003333333333
+# Тип можно указать несколько раз, тогда отчет уходит во все его каналы
+REPORTS_CHANNELS_BY_TYPE = {}
+for item in os.getenv('REPORTS_CHANNELS_BY_TYPE', '').split(','):
+    if not item.strip():
+        continue
+    conn_type, _, channel_id = item.partition(':')
+    conn_type = conn_type.strip()
+    try:
+        if conn_type not in CONNECTION_TYPES:
+            raise ValueError(conn_type)
+        REPORTS_CHANNELS_BY_TYPE.setdefault(conn_type, []).append(int(channel_id.strip()))
+    except ValueError:
+        logger.warning(f"REPORTS_CHANNELS_BY_TYPE: неверный элемент '{item.strip()}' (ожидается тип:ID канала)")
+if REPORTS_CHANNELS_BY_TYPE:
+    logger.info(f"Каналы отчетов по типам подключений: {REPORTS_CHANNELS_BY_TYPE}")
+
+# Доставка отчета в каналы: 'copy' - копия сообщения пользователя (copy_messages),
+# 'send' - отправка медиа-группы в каждый канал заново
+REPORT_DELIVERY_MODE = os.getenv('REPORT_DELIVERY_MODE', 'copy').strip().lower()
+if REPORT_DELIVERY_MODE not in ('copy', 'send'):
+    logger.warning(f"REPORT_DELIVERY_MODE имеет неверное значение '{REPORT_DELIVERY_MODE}', используется 'copy'")
+    REPORT_DELIVERY_MODE = 'copy'
+
+# Фоновое формирование отчетов: количество процессов и длина очереди
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '2'))
+REPORT_MAX_QUEUED = int(os.getenv('REPORT_MAX_QUEUED', '8'))
+
+# Очередь исходящих сообщений: сообщений в секунду на бота, в минуту на группу или канал,
+# попыток отправки одного сообщения
+OUTBOX_GLOBAL_RATE = float(os.getenv('OUTBOX_GLOBAL_RATE', '25'))
+OUTBOX_CHAT_RATE_PER_MINUTE = float(os.getenv('OUTBOX_CHAT_RATE_PER_MINUTE', '20'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '8'))
+
+# Получение обновлений: 'polling' (getUpdates) или 'webhook' (встроенный сервер PTB).
+# WEBHOOK_URL - публичный https-адрес бота или TLS-прокси перед ним (без пути);
+# Telegram присылает обновления на WEBHOOK_URL/WEBHOOK_PATH, сервер слушает
+# WEBHOOK_LISTEN:WEBHOOK_PORT. WEBHOOK_CERT/WEBHOOK_KEY нужны, только если TLS
+# завершается в самом боте, а не на прокси
+BOT_MODE = os.getenv('BOT_MODE', 'polling').strip().lower()
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').strip().rstrip('/')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram').strip().strip('/')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1').strip()
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_CERT = os.getenv('WEBHOOK_CERT', '').strip() or None
+WEBHOOK_KEY = os.getenv('WEBHOOK_KEY', '').strip() or None
+# Секрет в заголовке X-Telegram-Bot-Api-Secret-Token: запросы без него сервер отклоняет
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN', '').strip()
+
+if BOT_MODE not in ('polling', 'webhook'):
+    logger.warning(f"BOT_MODE имеет неверное значение '{BOT_MODE}', используется 'polling'")
+    BOT_MODE = 'polling'
+if BOT_MODE == 'webhook':
+    if not WEBHOOK_URL:
+        logger.warning("BOT_MODE=webhook, но WEBHOOK_URL не задан, используется 'polling'")
+        BOT_MODE = 'polling'
+    elif not re.fullmatch(r'[A-Za-z0-9_-]{1,256}', WEBHOOK_SECRET_TOKEN):
+        # Telegram допускает только такие символы; без секрета вебхук примет запрос от кого угодно
+        if WEBHOOK_SECRET_TOKEN:
+            logger.warning("WEBHOOK_SECRET_TOKEN содержит недопустимые символы, сгенерирован новый")
+        else:
+            logger.info("WEBHOOK_SECRET_TOKEN не задан, сгенерирован на время работы бота")
+        WEBHOOK_SECRET_TOKEN = secrets.token_urlsafe(32)
+
 
 def is_admin(user_id: int) -> bool:
     """Проверка, является ли пользователь администратором"""
@@ -0,0 +1,55 @@
+"""
+CLI миграций схемы БД
+
+Использование:
+    python -m database status [--db isp_bot.db]
+    python -m database migrate [--db isp_bot.db]
+    python -m database rebuild-stats [--db isp_bot.db] [--since ГГГГ-ММ-ДД]
+"""
+import argparse
+import logging
+from datetime import date
+
+from database import Database
+from database.migrations import (
+    LATEST_VERSION, apply_migrations, get_pending_migrations, get_schema_version
+)
+
+
+def main() -> None:
+    """Точка входа CLI"""
+    parser = argparse.ArgumentParser(description="Миграции схемы БД бота")
+    parser.add_argument('command', choices=['status', 'migrate', 'rebuild-stats'],
+                        help="status - показать версию схемы, migrate - применить миграции, "
+                             "rebuild-stats - пересчитать дневные сводки")
+    parser.add_argument('--db', default="isp_bot.db", help="Путь к файлу БД")
+    parser.add_argument('--since', type=date.fromisoformat,
+                        help="Пересчитать сводки начиная с дня ГГГГ-ММ-ДД (по умолчанию - всю историю)")
+    args = parser.parse_args()
+    
+    if args.command == 'status':
+        current = get_schema_version(args.db)
+        pending = get_pending_migrations(args.db)
+        print(f"БД: {args.db}")
+        print(f"Версия схемы: {current} (последняя: {LATEST_VERSION})")
+        if pending:
+            print("Ожидают применения:")
+            for version, description in pending:
+                print(f"  {version}: {description}")
+        else:
+            print("Схема актуальна")
+    elif args.command == 'rebuild-stats':
+        connection_rows, material_rows = Database(args.db).rebuild_daily_stats(args.since)
+        print(f"Сводки пересчитаны: {connection_rows} строк подключений, {material_rows} строк движений")
+    else:
+        before = get_schema_version(args.db)
+        after = apply_migrations(args.db)
+        if after == before:
+            print(f"Схема актуальна (версия {after})")
+        else:
+            print(f"Схема обновлена: {before} → {after}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,181 @@
+"""
+Асинхронный фасад над Database
+Синхронные вызовы sqlite3 выполняются в отдельных потоках и не блокируют цикл событий бота
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+import logging
+
+from database.db_manager import Database
+
+logger = logging.getLogger(__name__)
+
+# Количество потоков для чтения (запись всегда выполняется одним потоком)
+DEFAULT_READ_WORKERS = 3
+
+# Максимальное количество запросов, ожидающих выполнения в одной очереди
+DEFAULT_MAX_PENDING = 64
+
+# Префиксы методов Database, которые только читают данные
+READ_PREFIXES = ('get_', 'count_')
+
+# Методы Database, которые можно вызывать синхронно: они не обращаются к
+# SQLite (счетчики, версия данных) и не блокируют цикл событий
+SYNC_METHODS = frozenset({'get_data_version', 'get_pool_stats', 'get_cache_stats'})
+
+
+class _Lane:
+    """Очередь выполнения запросов одного типа (чтение или запись) со счетчиками"""
+    
+    def __init__(self, name: str, workers: int, max_pending: int):
+        self.name = name
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"db-{name}")
+        self.max_pending = max_pending
+        self._slots = None
+        self._lock = threading.Lock()
+        
+        # Счетчики
+        self.submitted = 0
+        self.completed = 0
+        self.errors = 0
+        self.pending = 0
+        self.max_pending_seen = 0
+        self.queue_full_waits = 0
+        self.queue_time = 0.0
+        self.max_queue_time = 0.0
+        self.exec_time = 0.0
+        self.max_exec_time = 0.0
+    
+    def _get_slots(self) -> asyncio.Semaphore:
+        """Семафор ограничения очереди (создается в работающем цикле событий)"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        return self._slots
+    
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполнить функцию в потоке этой очереди"""
+        slots = self._get_slots()
+        # Время в очереди включает ожидание места в ней
+        queued_at = time.perf_counter()
+        if slots.locked():
+            # Очередь заполнена - ждем освобождения места вместо неограниченного роста
+            with self._lock:
+                self.queue_full_waits += 1
+        
+        async with slots:
+            with self._lock:
+                self.submitted += 1
+                self.pending += 1
+                self.max_pending_seen = max(self.max_pending_seen, self.pending)
+            
+            def call():
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    finished = time.perf_counter()
+                    with self._lock:
+                        waited = started - queued_at
+                        self.queue_time += waited
+                        self.max_queue_time = max(self.max_queue_time, waited)
+                        self.exec_time += finished - started
+                        self.max_exec_time = max(self.max_exec_time, finished - started)
+            
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self.executor, call)
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                raise
+            finally:
+                with self._lock:
+                    self.pending -= 1
+                    self.completed += 1
+    
+    def stats(self) -> Dict:
+        """Получить статистику очереди"""
+        with self._lock:
+            completed = self.completed
+            return {
+                'submitted': self.submitted,
+                'completed': completed,
+                'errors': self.errors,
+                'pending': self.pending,
+                'max_pending': self.max_pending_seen,
+                'queue_full_waits': self.queue_full_waits,
+                'queue_time_avg': round(self.queue_time / completed, 6) if completed else 0.0,
+                'queue_time_max': round(self.max_queue_time, 6),
+                'exec_time_avg': round(self.exec_time / completed, 6) if completed else 0.0,
+                'exec_time_max': round(self.max_exec_time, 6),
+            }
+
+
+class AsyncDatabase:
+    """
+    Асинхронный фасад над Database
+    
+    Любой метод Database доступен в асинхронном виде с префиксом "a":
+    await db.aget_all_employees(), await db.acreate_connection(...).
+    Методы get_* и count_* выполняются в пуле потоков чтения, остальные -
+    в единственном потоке записи, поэтому записи не конкурируют между
+    собой за блокировку SQLite. Потоковые iter_* возвращают итераторы,
+    привязанные к подключению потока, поэтому их потребляют целиком
+    внутри run_read().
+    
+    Синхронно доступны только атрибуты-данные (db_path, pool и т.д.) и
+    методы из SYNC_METHODS; остальные методы Database без префикса "a"
+    вызывают AttributeError, чтобы запрос к SQLite случайно не выполнился
+    в потоке цикла событий.
+    """
+    
+    def __init__(self, db: Database, read_workers: int = DEFAULT_READ_WORKERS,
+                 max_pending: int = DEFAULT_MAX_PENDING):
+        self.db = db
+        self._read = _Lane('read', read_workers, max_pending)
+        self._write = _Lane('write', 1, max_pending)
+    
+    async def run_read(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполнить произвольную читающую функцию в потоке чтения"""
+        return await self._read.run(func, *args, **kwargs)
+    
+    async def run_write(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполнить произвольную пишущую функцию в потоке записи"""
+        return await self._write.run(func, *args, **kwargs)
+    
+    def __getattr__(self, name: str) -> Any:
+        if name == 'db':
+            raise AttributeError(name)
+        if name.startswith('a') and callable(getattr(self.db, name[1:], None)):
+            method = getattr(self.db, name[1:])
+            lane = self._read if name[1:].startswith(READ_PREFIXES) else self._write
+            
+            async def call(*args, **kwargs):
+                return await lane.run(method, *args, **kwargs)
+            
+            call.__name__ = name
+            call.__doc__ = method.__doc__
+            return call
+        
+        value = getattr(self.db, name)
+        if callable(value) and name not in SYNC_METHODS:
+            raise AttributeError(
+                f"Метод Database.{name} блокирует цикл событий - используйте await a{name}(...)"
+            )
+        return value
+    
+    def stats(self) -> Dict:
+        """Получить статистику очередей чтения и записи"""
+        return {
+            'read': self._read.stats(),
+            'write': self._write.stats(),
+        }
+    
+    async def shutdown(self) -> None:
+        """Дождаться выполнения запросов и остановить потоки (ожидание - вне цикла событий)"""
+        await asyncio.to_thread(self._write.executor.shutdown, wait=True)
+        await asyncio.to_thread(self._read.executor.shutdown, wait=True)
+        logger.info(f"Статистика асинхронного доступа к БД: {self.stats()}")
@@ -2,32 +2,68 @@
 Базовый репозиторий с общими методами для работы с БД
 """
 import sqlite3
-from typing import Optional, List, Dict, Any, Tuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Tuple, Iterator
 import logging
 
+from database.connection_pool import get_pool, get_read_pool
+
 logger = logging.getLogger(__name__)
 
 
+def db_timestamp(value: datetime) -> str:
+    """
+    Граница периода в формате колонок created_at
+    
+    created_at заполняется CURRENT_TIMESTAMP, то есть хранится в UTC
+    текстом 'ГГГГ-ММ-ДД ЧЧ:ММ:СС'; локальное (наивное) время переводится
+    в UTC, чтобы сравнение строк давало правильный диапазон.
+    """
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
 class BaseRepository:
     """Базовый класс для всех репозиториев"""
     
     def __init__(self, db_path: str = "isp_bot.db"):
         """Инициализация репозитория"""
         self.db_path = db_path
+        self.pool = get_pool(db_path)
+        self.read_pool = get_read_pool(db_path)
     
-    def get_connection(self) -> sqlite3.Connection:
-        """Получить подключение к БД с row_factory"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Получить подключение из общего пула"""
+        with self.pool.connection() as conn:
+            yield conn
+    
+    @contextmanager
+    def read_connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Получить подключение только для чтения (отчеты и выгрузки)
+        
+        Внутри уже открытого подключения на запись используется оно,
+        чтобы чтение видело еще не зафиксированные изменения.
+        """
+        pool = self.pool if self.pool.in_use() else self.read_pool
+        with pool.connection() as conn:
+            yield conn
+    
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Получить подключение из общего пула в рамках транзакции"""
+        with self.pool.transaction() as conn:
+            yield conn
     
     def execute_query(
-        self, 
-        query: str, 
-        params: Tuple = (), 
-        fetch_one: bool = False, 
+        self,
+        query: str,
+        params: Tuple = (),
+        fetch_one: bool = False,
         fetch_all: bool = False,
-        commit: bool = True
+        commit: bool = True,
+        read_only: bool = False
     ) -> Any:
         """
         Выполнить SQL запрос
@@ -38,35 +74,35 @@ class BaseRepository:
             fetch_one: Вернуть одну запись
             fetch_all: Вернуть все записи
             commit: Выполнить commit
-            
+            read_only: Выполнить на подключении только для чтения
+        
         Returns:
             Результат запроса, ID последней вставки, или None
         """
-        conn = None
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(query, params)
+            if read_only:
+                with self.read_connection() as conn:
+                    cursor = conn.execute(query, params)
+                    if fetch_one:
+                        result = cursor.fetchone()
+                        return dict(result) if result else None
+                    return [dict(row) for row in cursor.fetchall()]
+            
+            if fetch_one or fetch_all or not commit:
+                with self.connection() as conn:
+                    cursor = conn.execute(query, params)
+                    if fetch_one:
+                        result = cursor.fetchone()
+                        return dict(result) if result else None
+                    if fetch_all:
+                        return [dict(row) for row in cursor.fetchall()]
+                    return cursor.lastrowid
             
-            if fetch_one:
-                result = cursor.fetchone()
-                return dict(result) if result else None
-            elif fetch_all:
-                result = cursor.fetchall()
-                return [dict(row) for row in result]
-            else:
-                last_id = cursor.lastrowid
-                if commit:
-                    conn.commit()
-                return last_id
+            with self.transaction() as conn:
+                return conn.execute(query, params).lastrowid
         except Exception as e:
             logger.error(f"Ошибка выполнения запроса: {e}")
-            if conn:
-                conn.rollback()
             return None
-        finally:
-            if conn:
-                conn.close()
     
     def execute_many(self, query: str, params_list: List[Tuple]) -> bool:
         """
@@ -75,23 +111,14 @@ class BaseRepository:
         Args:
             query: SQL запрос
             params_list: Список параметров
-            
+        
         Returns:
             Успех операции
         """
-        conn = None
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.executemany(query, params_list)
-            conn.commit()
+            with self.transaction() as conn:
+                conn.executemany(query, params_list)
             return True
         except Exception as e:
             logger.error(f"Ошибка множественного запроса: {e}")
-            if conn:
-                conn.rollback()
             return False
-        finally:
-            if conn:
-                conn.close()
-
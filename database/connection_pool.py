@@ -0,0 +1,363 @@
+"""
+Пул подключений к SQLite
+Долгоживущие подключения настраиваются один раз и переиспользуются всеми репозиториями
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from queue import Queue, Empty
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+from urllib.parse import quote
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Максимальное количество подключений к одному файлу БД
+DEFAULT_POOL_SIZE = 5
+
+# Сколько ждать освобождения подключения, если пул исчерпан (секунды)
+ACQUIRE_TIMEOUT = 30.0
+
+# Сколько SQLite ждет снятия блокировки другим подключением (миллисекунды)
+BUSY_TIMEOUT_MS = 5000
+
+# Размер страничного кэша на подключение (отрицательное значение - в КиБ)
+CACHE_SIZE_KIB = 16384
+
+
+class ConnectionPool:
+    """
+    Пул подключений к одному файлу БД
+    
+    Подключения создаются лениво (не больше max_size), настраиваются
+    один раз (WAL, synchronous=NORMAL, busy_timeout, foreign_keys, cache_size)
+    и возвращаются в пул после использования.
+    
+    Вложенные вызовы connection()/transaction() в одном потоке получают
+    то же самое подключение, поэтому репозитории могут вызывать друг друга
+    внутри одной транзакции.
+    
+    Пул с read_only=True открывает файл в режиме mode=ro: в WAL такие
+    подключения читают снимок БД и не блокируют запись.
+    """
+    
+    def __init__(self, db_path: str, max_size: int = DEFAULT_POOL_SIZE,
+                 acquire_timeout: float = ACQUIRE_TIMEOUT, read_only: bool = False):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.read_only = read_only
+        
+        self._idle: Queue = Queue()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._created = 0
+        self._closed = False
+        
+        # Версия схемы, проверенная миграциями в этом процессе (None - еще не проверялась)
+        self.schema_version = None
+        
+        # Кэши данных этой БД (живут, пока жив пул)
+        self._caches: Dict[str, Any] = {}
+        
+        # Счетчики
+        self._acquisitions = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._hold_time = 0.0
+        self._max_hold_time = 0.0
+        self._lock_waits = 0
+        self._lock_wait_time = 0.0
+        self._max_lock_wait_time = 0.0
+        self._busy_errors = 0
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Открыть и настроить новое подключение"""
+        if self.read_only:
+            conn = sqlite3.connect(
+                f"file:{quote(os.path.abspath(self.db_path))}?mode=ro",
+                uri=True,
+                timeout=BUSY_TIMEOUT_MS / 1000,
+                check_same_thread=False
+            )
+        else:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=BUSY_TIMEOUT_MS / 1000,
+                check_same_thread=False
+            )
+        conn.row_factory = sqlite3.Row
+        if self.read_only:
+            # Режим журнала задается пишущими подключениями и хранится в файле
+            conn.execute("PRAGMA query_only=ON")
+        else:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        logger.debug(f"Открыто подключение к {self.db_path}{' (только чтение)' if self.read_only else ''}")
+        return conn
+    
+    def _acquire(self) -> sqlite3.Connection:
+        """Взять подключение из пула (или создать новое)"""
+        if self._closed:
+            raise sqlite3.ProgrammingError(f"Пул подключений {self.db_path} закрыт")
+        
+        started = time.perf_counter()
+        waited = False
+        try:
+            conn = self._idle.get_nowait()
+        except Empty:
+            with self._lock:
+                can_create = self._created < self.max_size
+                if can_create:
+                    self._created += 1
+            
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                waited = True
+                try:
+                    conn = self._idle.get(timeout=self.acquire_timeout)
+                except Empty:
+                    raise sqlite3.OperationalError(
+                        f"Не дождались свободного подключения к {self.db_path} "
+                        f"за {self.acquire_timeout} с"
+                    )
+        
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._acquisitions += 1
+            self._wait_time += elapsed
+            self._max_wait_time = max(self._max_wait_time, elapsed)
+            if waited:
+                self._waits += 1
+        return conn
+    
+    def _release(self, conn: sqlite3.Connection) -> None:
+        """Вернуть подключение в пул"""
+        try:
+            if conn.in_transaction:
+                # Незафиксированные изменения отбрасываем, как при закрытии подключения
+                conn.rollback()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при возврате подключения в пул: {e}")
+            self._discard(conn)
+            return
+        
+        if self._closed:
+            self._discard(conn)
+        else:
+            self._idle.put(conn)
+    
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        """Закрыть подключение и освободить место в пуле"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+    
+    def in_use(self) -> bool:
+        """Держит ли текущий поток подключение этого пула"""
+        return getattr(self._local, 'conn', None) is not None
+    
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Получить подключение на время блока with
+        
+        Если поток уже держит подключение этого пула, возвращается оно же.
+        Незафиксированные изменения при возврате в пул откатываются.
+        """
+        current = getattr(self._local, 'conn', None)
+        if current is not None:
+            yield current
+            return
+        
+        conn = self._acquire()
+        self._local.conn = conn
+        self._local.after_commit = []
+        acquired_at = time.perf_counter()
+        try:
+            yield conn
+        except sqlite3.OperationalError as e:
+            if 'locked' in str(e) or 'busy' in str(e):
+                with self._lock:
+                    self._busy_errors += 1
+            raise
+        finally:
+            held = time.perf_counter() - acquired_at
+            with self._lock:
+                self._hold_time += held
+                self._max_hold_time = max(self._max_hold_time, held)
+            self._local.conn = None
+            self._local.after_commit = []
+            self._release(conn)
+    
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Выполнить блок with в транзакции
+        
+        Commit при успешном выходе, rollback при исключении.
+        Вложенная транзакция присоединяется к внешней.
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            
+            # Время ожидания блокировки записи - показатель конкуренции писателей
+            started = time.perf_counter()
+            conn.execute("BEGIN IMMEDIATE")
+            waited = time.perf_counter() - started
+            with self._lock:
+                self._lock_waits += 1
+                self._lock_wait_time += waited
+                self._max_lock_wait_time = max(self._max_lock_wait_time, waited)
+            
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                self._local.after_commit = []
+                raise
+            else:
+                conn.commit()
+                self._run_after_commit()
+    
+    def call_after_commit(self, callback: Callable[[], None]) -> None:
+        """
+        Выполнить callback после фиксации текущей транзакции потока
+        
+        Если транзакции нет, callback выполняется сразу. При откате
+        транзакции отложенные callback'и отбрасываются.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and conn.in_transaction:
+            self._local.after_commit.append(callback)
+        else:
+            callback()
+    
+    def _run_after_commit(self) -> None:
+        """Выполнить callback'и, отложенные до фиксации транзакции"""
+        callbacks, self._local.after_commit = self._local.after_commit, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Ошибка в обработчике после фиксации транзакции: {e}")
+    
+    def get_cache(self, name: str, factory: Callable[[], Any]) -> Any:
+        """Получить кэш этой БД по имени (создается при первом обращении)"""
+        with self._lock:
+            cache = self._caches.get(name)
+            if cache is None:
+                cache = self._caches[name] = factory()
+            return cache
+    
+    @contextmanager
+    def trace_statements(self) -> Iterator[List[str]]:
+        """
+        Собрать SQL-запросы, выполненные текущим потоком в блоке with
+        
+        Используется тестами и бенчмарками для подсчета запросов.
+        """
+        statements: List[str] = []
+        with self.connection() as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                yield statements
+            finally:
+                conn.set_trace_callback(None)
+    
+    def stats(self) -> Dict:
+        """Получить статистику пула"""
+        with self._lock:
+            acquisitions = self._acquisitions
+            transactions = self._lock_waits
+            return {
+                'db_path': self.db_path,
+                'read_only': self.read_only,
+                'max_size': self.max_size,
+                'connections': self._created,
+                'idle': self._idle.qsize(),
+                'acquisitions': acquisitions,
+                'waits': self._waits,
+                'wait_time_total': round(self._wait_time, 6),
+                'wait_time_avg': round(self._wait_time / acquisitions, 6) if acquisitions else 0.0,
+                'wait_time_max': round(self._max_wait_time, 6),
+                'hold_time_avg': round(self._hold_time / acquisitions, 6) if acquisitions else 0.0,
+                'hold_time_max': round(self._max_hold_time, 6),
+                'transactions': transactions,
+                'lock_wait_avg': round(self._lock_wait_time / transactions, 6) if transactions else 0.0,
+                'lock_wait_max': round(self._max_lock_wait_time, 6),
+                'busy_errors': self._busy_errors,
+            }
+    
+    def close(self) -> None:
+        """Закрыть все свободные подключения (занятые закроются при возврате)"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
+                break
+            self._discard(conn)
+
+
+# ==================== РЕЕСТР ПУЛОВ ====================
+
+_pools: Dict[Tuple[str, bool], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_key(db_path: str, read_only: bool) -> Tuple[str, bool]:
+    return os.path.abspath(db_path), read_only
+
+
+def get_pool(db_path: str, read_only: bool = False) -> ConnectionPool:
+    """Получить общий для процесса пул подключений к файлу БД"""
+    key = _pool_key(db_path, read_only)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(db_path, read_only=read_only)
+            _pools[key] = pool
+            logger.info(f"Создан пул подключений к БД: {db_path}{' (только чтение)' if read_only else ''}")
+        return pool
+
+
+def get_read_pool(db_path: str) -> ConnectionPool:
+    """Получить общий для процесса пул подключений только для чтения"""
+    return get_pool(db_path, read_only=True)
+
+
+def close_pool(db_path: str) -> None:
+    """Закрыть пулы подключений к файлу БД (на запись и только для чтения)"""
+    with _pools_lock:
+        pools = [_pools.pop(_pool_key(db_path, read_only), None) for read_only in (False, True)]
+    for pool in pools:
+        if pool:
+            pool.close()
+
+
+def close_all_pools() -> None:
+    """Закрыть все пулы подключений процесса"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,207 @@
+"""
+Дневные сводки (rollup) для статистики и итогов отчетов
+
+Сводки хранят по каждому сотруднику и дню (локальная дата) количество
+подключений по типам, долю сотрудника в метраже, начисления и списания
+материалов и роутеров. Итоги за период суммируют строки дней периода,
+а не проходят по всем подключениям и движениям.
+
+Подключения учитываются в сводке вызовом record_connection() в
+транзакции create_connection, движения - триггером на журнале движений.
+Сводки за прошлые дни можно пересчитать из исходных таблиц (rebuild).
+"""
+import sqlite3
+from datetime import datetime, time
+from typing import List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Дата сводки - локальный день, в котором создана запись (created_at хранится в UTC)
+_DAY = "date({column}, 'localtime')"
+
+# Границы локального дня в формате created_at (UTC)
+_DAY_START_UTC = "datetime(?, 'utc')"
+
+# Доля исполнителя в метраже - одна формула для строк отчетов и сводок
+SHARE = "ROUND({meters} / {executors}, 2)"
+
+RECORD_CONNECTION_SQL = (
+    # Доля каждого исполнителя - как в строке отчета (SHARE)
+    f"""
+    INSERT INTO employee_daily_connections
+        (employee_id, day, connection_type, connections, fiber_meters, twisted_pair_meters)
+    SELECT
+        ce.employee_id,
+        {_DAY.format(column='c.created_at')},
+        c.connection_type,
+        1,
+        {SHARE.format(meters='c.fiber_meters', executors='n.executors')},
+        {SHARE.format(meters='c.twisted_pair_meters', executors='n.executors')}
+    FROM connections c
+    JOIN connection_employees ce ON ce.connection_id = c.id
+    JOIN (SELECT COUNT(*) AS executors FROM connection_employees WHERE connection_id = ?) n
+    WHERE c.id = ?
+    ON CONFLICT (employee_id, day, connection_type) DO UPDATE SET
+        connections = connections + excluded.connections,
+        fiber_meters = fiber_meters + excluded.fiber_meters,
+        twisted_pair_meters = twisted_pair_meters + excluded.twisted_pair_meters
+    """,
+    # Бригада: подключение учитывается один раз, с полным метражом
+    f"""
+    INSERT INTO team_daily_connections (day, connection_type, connections, fiber_meters, twisted_pair_meters)
+    SELECT {_DAY.format(column='created_at')}, connection_type, 1, fiber_meters, twisted_pair_meters
+    FROM connections
+    WHERE id = ?
+    ON CONFLICT (day, connection_type) DO UPDATE SET
+        connections = connections + excluded.connections,
+        fiber_meters = fiber_meters + excluded.fiber_meters,
+        twisted_pair_meters = twisted_pair_meters + excluded.twisted_pair_meters
+    """,
+)
+
+# Колонки сводки движений: (колонка, item_type, operation_type, только списания на подключения)
+MATERIAL_COLUMNS = (
+    ('fiber_added', 'fiber', 'add', False),
+    ('fiber_deducted', 'fiber', 'deduct', False),
+    ('twisted_pair_added', 'twisted_pair', 'add', False),
+    ('twisted_pair_deducted', 'twisted_pair', 'deduct', False),
+    ('routers_added', 'router', 'add', False),
+    ('routers_deducted', 'router', 'deduct', False),
+    ('routers_used', 'router', 'deduct', True),
+)
+
+
+def _material_values(prefix: str) -> List[str]:
+    """Выражения колонок сводки движений для строки журнала (prefix - 'NEW.' или '')"""
+    values = []
+    for _, item_type, operation_type, for_connection in MATERIAL_COLUMNS:
+        condition = f"{prefix}item_type = '{item_type}' AND {prefix}operation_type = '{operation_type}'"
+        if for_connection:
+            condition += f" AND {prefix}connection_id IS NOT NULL"
+        values.append(f"CASE WHEN {condition} THEN {prefix}quantity ELSE 0 END")
+    return values
+
+
+def material_trigger_sql() -> str:
+    """Триггер, учитывающий движение в сводке в той же транзакции, что и запись журнала"""
+    columns = ", ".join(column for column, *_ in MATERIAL_COLUMNS)
+    updates = ",\n                ".join(f"{column} = {column} + excluded.{column}" for column, *_ in MATERIAL_COLUMNS)
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS trg_movement_log_daily_stats
+        AFTER INSERT ON material_movement_log
+        BEGIN
+            INSERT INTO employee_daily_materials (employee_id, day, {columns}, movements)
+            VALUES (NEW.employee_id, {_DAY.format(column='NEW.created_at')}, {", ".join(_material_values("NEW."))}, 1)
+            ON CONFLICT (employee_id, day) DO UPDATE SET
+                {updates},
+                movements = movements + 1;
+        END
+    """
+
+
+def record_connection(conn: sqlite3.Connection, connection_id: int) -> None:
+    """
+    Учесть новое подключение в дневных сводках
+    
+    Args:
+        conn: Подключение с открытой транзакцией, создавшей подключение и исполнителей
+        connection_id: ID подключения
+    """
+    employees_sql, team_sql = RECORD_CONNECTION_SQL
+    conn.execute(employees_sql, (connection_id, connection_id))
+    conn.execute(team_sql, (connection_id,))
+
+
+def rebuild(conn: sqlite3.Connection, since: Optional[str] = None) -> Tuple[int, int]:
+    """
+    Пересчитать дневные сводки из подключений и журнала движений
+    
+    Args:
+        conn: Подключение с открытой транзакцией
+        since: Первый пересчитываемый день 'ГГГГ-ММ-ДД' (None - вся история)
+    
+    Returns:
+        Tuple: (строк сводки подключений, строк сводки движений)
+    """
+    day_filter = "WHERE day >= ?" if since else ""
+    params = (since,) if since else ()
+    range_filter = f"WHERE {{column}} >= {_DAY_START_UTC}" if since else ""
+    for table in ('employee_daily_connections', 'team_daily_connections', 'employee_daily_materials'):
+        conn.execute(f"DELETE FROM {table} {day_filter}", params)
+    
+    connection_rows = conn.execute(f"""
+        INSERT INTO employee_daily_connections
+            (employee_id, day, connection_type, connections, fiber_meters, twisted_pair_meters)
+        SELECT own.employee_id, {_DAY.format(column='c.created_at')}, c.connection_type, COUNT(*),
+               SUM({SHARE.format(meters='c.fiber_meters', executors='n.executors')}),
+               SUM({SHARE.format(meters='c.twisted_pair_meters', executors='n.executors')})
+        FROM connections c
+        JOIN (
+            SELECT connection_id, COUNT(*) AS executors FROM connection_employees GROUP BY connection_id
+        ) n ON n.connection_id = c.id
+        JOIN connection_employees own ON own.connection_id = c.id
+        {range_filter.format(column='c.created_at')}
+        GROUP BY own.employee_id, 2, c.connection_type
+    """, params).rowcount
+    
+    conn.execute(f"""
+        INSERT INTO team_daily_connections (day, connection_type, connections, fiber_meters, twisted_pair_meters)
+        SELECT {_DAY.format(column='created_at')}, connection_type, COUNT(*), SUM(fiber_meters), SUM(twisted_pair_meters)
+        FROM connections
+        {range_filter.format(column='created_at')}
+        GROUP BY 1, connection_type
+    """, params)
+    
+    columns = ", ".join(column for column, *_ in MATERIAL_COLUMNS)
+    sums = ", ".join(f"SUM({value})" for value in _material_values(""))
+    material_rows = conn.execute(f"""
+        INSERT INTO employee_daily_materials (employee_id, day, {columns}, movements)
+        SELECT employee_id, {_DAY.format(column='created_at')}, {sums}, COUNT(*)
+        FROM material_movement_log
+        {range_filter.format(column='created_at')}
+        GROUP BY employee_id, 2
+    """, params).rowcount
+    
+    logger.info(f"Дневные сводки пересчитаны с {since or 'начала истории'}: "
+                f"{connection_rows} строк подключений, {material_rows} строк движений")
+    return connection_rows, material_rows
+
+
+def day_conditions(
+    first_day: Optional[str],
+    end_day: Optional[str],
+    column: str = 'day'
+) -> Tuple[List[str], List[str]]:
+    """Условия по дню сводки для периода [first_day, end_day)"""
+    conditions, params = [], []
+    if first_day is not None:
+        conditions.append(f"{column} >= ?")
+        params.append(first_day)
+    if end_day is not None:
+        conditions.append(f"{column} < ?")
+        params.append(end_day)
+    return conditions, params
+
+
+def day_range(
+    start: Optional[datetime],
+    end: Optional[datetime]
+) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    """
+    Период [start, end) в днях сводки
+    
+    Returns:
+        Tuple: (первый день, день после последнего) в формате 'ГГГГ-ММ-ДД',
+        None вместо дня - без ограничения; None, если границы не совпадают
+        с началом суток и период нельзя собрать из дневных сводок
+    """
+    bounds = []
+    for value in (start, end):
+        if value is None:
+            bounds.append(None)
+        elif value.time() == time(0):
+            bounds.append(value.strftime("%Y-%m-%d"))
+        else:
+            return None
+    return bounds[0], bounds[1]
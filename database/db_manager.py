@@ -2,19 +2,30 @@
 Модуль для работы с базой данных SQLite
 Использует паттерн Repository для разделения ответственности
 """
-import sqlite3
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
+from datetime import date, datetime
+from typing import Iterator, List, Dict, Optional, Tuple, Union
 import logging
+import time
 
 from database.repositories.employee_repository import EmployeeRepository
 from database.repositories.material_repository import MaterialRepository
 from database.repositories.router_repository import RouterRepository
 from database.repositories.connection_repository import ConnectionRepository
+from database.repositories.outbox_repository import OutboxRepository
+from database.connection_pool import get_pool, get_read_pool
+from database.migrations import ensure_schema
+from database.ledger import MovementLedger
+from database import daily_stats
+from database.employee_directory import get_employee_directory
+from database.router_catalog import get_router_catalog
 
 logger = logging.getLogger(__name__)
 
 
+class _ConnectionRollback(Exception):
+    """Отмена создания подключения с откатом всей транзакции"""
+
+
 class Database:
     """
     Класс для работы с базой данных
@@ -24,170 +35,24 @@ class Database:
     def __init__(self, db_path: str = "isp_bot.db"):
         """Инициализация подключения к БД и репозиториев"""
         self.db_path = db_path
+        self.pool = get_pool(db_path)
+        self.read_pool = get_read_pool(db_path)
         
         # Инициализация репозиториев
         self.employees_repo = EmployeeRepository(db_path)
         self.materials_repo = MaterialRepository(db_path)
         self.routers_repo = RouterRepository(db_path)
         self.connections_repo = ConnectionRepository(db_path)
+        self.outbox_repo = OutboxRepository(db_path)
         
-        # Создаем таблицы
-        self.create_tables()
-    
-    def get_connection(self) -> sqlite3.Connection:
-        """Получить подключение к БД"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
-    
-    def create_tables(self):
-        """Создать таблицы БД"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Таблица сотрудников
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS employees (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                full_name TEXT NOT NULL UNIQUE,
-                fiber_balance REAL DEFAULT 0,
-                twisted_pair_balance REAL DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Добавляем поля балансов в существующую таблицу (если их нет)
-        try:
-            cursor.execute("ALTER TABLE employees ADD COLUMN fiber_balance REAL DEFAULT 0")
-            logger.info("Добавлено поле fiber_balance в таблицу employees")
-        except sqlite3.OperationalError:
-            pass
-        
-        try:
-            cursor.execute("ALTER TABLE employees ADD COLUMN twisted_pair_balance REAL DEFAULT 0")
-            logger.info("Добавлено поле twisted_pair_balance в таблицу employees")
-        except sqlite3.OperationalError:
-            pass
-        
-        # Таблица подключений
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS connections (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                connection_type TEXT NOT NULL DEFAULT 'mkd',
-                address TEXT NOT NULL,
-                router_model TEXT NOT NULL,
-                port TEXT NOT NULL,
-                fiber_meters REAL NOT NULL,
-                twisted_pair_meters REAL NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                created_by INTEGER NOT NULL
-            )
-        """)
-        
-        # Добавляем поле connection_type в существующую таблицу (если его нет)
-        try:
-            cursor.execute("ALTER TABLE connections ADD COLUMN connection_type TEXT NOT NULL DEFAULT 'mkd'")
-            logger.info("Добавлено поле connection_type в таблицу connections")
-        except sqlite3.OperationalError:
-            # Поле уже существует
-            pass
-        
-        # Добавляем поле router_quantity в существующую таблицу (если его нет)
-        try:
-            cursor.execute("ALTER TABLE connections ADD COLUMN router_quantity INTEGER DEFAULT 1")
-            logger.info("Добавлено поле router_quantity в таблицу connections")
-        except sqlite3.OperationalError:
-            # Поле уже существует
-            pass
-        
-        # Добавляем поле contract_signed в существующую таблицу (если его нет)
-        try:
-            cursor.execute("ALTER TABLE connections ADD COLUMN contract_signed INTEGER DEFAULT 0")
-            logger.info("Добавлено поле contract_signed в таблицу connections")
-        except sqlite3.OperationalError:
-            # Поле уже существует
-            pass
-        
-        # Добавляем поле router_access в существующую таблицу (если его нет)
-        try:
-            cursor.execute("ALTER TABLE connections ADD COLUMN router_access INTEGER DEFAULT 0")
-            logger.info("Добавлено поле router_access в таблицу connections")
-        except sqlite3.OperationalError:
-            # Поле уже существует
-            pass
+        # Схема БД проверяется миграциями один раз на процесс
+        ensure_schema(db_path)
         
-        # Добавляем поле telegram_bot_connected в существующую таблицу (если его нет)
-        try:
-            cursor.execute("ALTER TABLE connections ADD COLUMN telegram_bot_connected INTEGER DEFAULT 0")
-            logger.info("Добавлено поле telegram_bot_connected в таблицу connections")
-        except sqlite3.OperationalError:
-            # Поле уже существует
-            pass
+        # Справочник сотрудников в памяти (общий для процесса)
+        self.employee_directory = get_employee_directory(db_path)
         
-        # Таблица связи подключений и сотрудников (многие ко многим)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS connection_employees (
-                connection_id INTEGER NOT NULL,
-                employee_id INTEGER NOT NULL,
-                PRIMARY KEY (connection_id, employee_id),
-                FOREIGN KEY (connection_id) REFERENCES connections(id) ON DELETE CASCADE,
-                FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Таблица фотографий подключений
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS connection_photos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                connection_id INTEGER NOT NULL,
-                photo_file_id TEXT NOT NULL,
-                photo_category TEXT NOT NULL DEFAULT 'other',
-                photo_order INTEGER NOT NULL,
-                FOREIGN KEY (connection_id) REFERENCES connections(id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Добавляем поле photo_category в существующую таблицу (если его нет)
-        try:
-            cursor.execute("ALTER TABLE connection_photos ADD COLUMN photo_category TEXT NOT NULL DEFAULT 'other'")
-            logger.info("Добавлено поле photo_category в таблицу connection_photos")
-        except sqlite3.OperationalError:
-            # Поле уже существует
-            pass
-        
-        # Таблица роутеров сотрудников
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS employee_routers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                employee_id INTEGER NOT NULL,
-                router_name TEXT NOT NULL,
-                quantity INTEGER NOT NULL DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Таблица логов движения материалов и роутеров
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS material_movement_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                employee_id INTEGER NOT NULL,
-                operation_type TEXT NOT NULL,
-                item_type TEXT NOT NULL,
-                item_name TEXT,
-                quantity REAL NOT NULL,
-                balance_after REAL,
-                connection_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                created_by INTEGER,
-                FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE,
-                FOREIGN KEY (connection_id) REFERENCES connections(id) ON DELETE SET NULL
-            )
-        """)
-        
-        conn.commit()
-        conn.close()
-        logger.info("Таблицы БД созданы успешно")
+        # Каталог роутеров в памяти (общий для процесса)
+        self.router_catalog = get_router_catalog(db_path)
     
     # ==================== ЛОГИРОВАНИЕ ДВИЖЕНИЙ ====================
     
@@ -206,23 +71,8 @@ class Database:
             connection_id: ID подключения (если списание при подключении)
             created_by: ID пользователя, выполнившего операцию
         """
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO material_movement_log 
-                (employee_id, operation_type, item_type, item_name, quantity, 
-                 balance_after, connection_id, created_by)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (employee_id, operation_type, item_type, item_name, quantity,
-                  balance_after, connection_id, created_by))
-            conn.commit()
-            conn.close()
-            logger.info(f"Logged movement: {operation_type} {quantity} {item_type} for employee {employee_id}")
-            return True
-        except Exception as e:
-            logger.error(f"Ошибка при логировании движения: {e}")
-            return False
+        return self.materials_repo.log_movement(employee_id, operation_type, item_type, item_name,
+                                                quantity, balance_after, connection_id, created_by)
     
     # ==================== СОТРУДНИКИ ====================
     
@@ -236,12 +86,20 @@ class Database:
         return employee_id
     
     def get_all_employees(self) -> List[Dict]:
-        """Получить список всех сотрудников"""
-        return self.employees_repo.get_all()
+        """Получить список всех сотрудников (из справочника в памяти)"""
+        return self.employee_directory.get_all()
     
     def get_employee_by_id(self, employee_id: int) -> Optional[Dict]:
-        """Получить сотрудника по ID"""
-        return self.employees_repo.get_by_id(employee_id)
+        """Получить сотрудника по ID (из справочника в памяти)"""
+        return self.employee_directory.get(employee_id)
+    
+    def get_employee_names(self, employee_ids: List[int]) -> List[str]:
+        """Получить ФИО сотрудников по списку ID (из справочника в памяти)"""
+        return self.employee_directory.get_names(employee_ids)
+    
+    def get_employee_inventory(self) -> List[Dict]:
+        """Получить сотрудников с материалами и роутерами (одним запросом)"""
+        return self.employees_repo.get_inventory()
     
     def delete_employee(self, employee_id: int) -> bool:
         """Удалить сотрудника"""
@@ -280,21 +138,31 @@ class Database:
     
     def get_employee_routers(self, employee_id: int) -> List[Dict]:
         """Получить список роутеров сотрудника"""
-        return self.routers_repo.get_routers(employee_id)
+        return self.router_catalog.get_routers(employee_id)
     
     def get_router_quantity(self, employee_id: int, router_name: str) -> int:
         """Получить количество конкретного роутера у сотрудника"""
-        return self.routers_repo.get_quantity(employee_id, router_name)
+        return self.router_catalog.get_quantity(employee_id, router_name)
     
     def get_all_router_names(self) -> List[str]:
-        """Получить список всех уникальных названий роутеров"""
-        return self.routers_repo.get_all_names()
+        """Получить список моделей роутеров, которые есть в наличии"""
+        return self.router_catalog.get_names()
     
-    def get_employee_movements(self, employee_id: int, start_date: datetime, 
-                              end_date: datetime) -> List[Dict]:
-        """Получить все движения материалов и роутеров сотрудника за период"""
+    def get_employee_movements(self, employee_id: int, start_date: Optional[datetime] = None,
+                              end_date: Optional[datetime] = None) -> List[Dict]:
+        """Получить все движения материалов и роутеров сотрудника за период [start_date, end_date)"""
         return self.materials_repo.get_movements(employee_id, start_date, end_date)
     
+    def iter_employee_movements(self, employee_id: int, start_date: Optional[datetime] = None,
+                                end_date: Optional[datetime] = None) -> Iterator[Dict]:
+        """Потоково получить движения сотрудника за период (для выгрузок)"""
+        return self.materials_repo.iter_movements(employee_id, start_date, end_date)
+    
+    def count_employee_movements(self, employee_id: int, start_date: Optional[datetime] = None,
+                                 end_date: Optional[datetime] = None) -> int:
+        """Получить количество движений сотрудника за период"""
+        return self.materials_repo.count_movements(employee_id, start_date, end_date)
+    
     # ==================== ПОДКЛЮЧЕНИЯ ====================
     
     def create_connection(
@@ -312,123 +180,112 @@ class Database:
         router_quantity: int = 1,
         contract_signed: bool = False,
         router_access: bool = False,
-        telegram_bot_connected: bool = False
+        telegram_bot_connected: bool = False,
+        router_payer_id: Optional[int] = None
     ) -> Optional[int]:
-        """Создать новое подключение и списать материалы с указанного сотрудника
+        """Создать новое подключение и списать материалы и роутер
+        
+        Подключение, исполнители, списания, записи журнала движений и
+        фотографии сохраняются в одной транзакции: либо все, либо ничего.
         
         Args:
             material_payer_id: ID сотрудника, с которого списывать материалы.
                               Если None, материалы списываются поровну со всех.
+            router_payer_id: ID сотрудника, с которого списывать роутер.
+                            Если None или роутер пропущен ('-'), роутер не списывается.
+        
+        Returns:
+            ID подключения или None, если не удалось списать материалы
+            (хотя бы одну долю) или роутер - тогда ничего не сохраняется
         """
+        ledger = MovementLedger()
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Создаем запись подключения
-            cursor.execute("""
-                INSERT INTO connections 
-                (connection_type, address, router_model, port, fiber_meters, twisted_pair_meters, created_by, router_quantity, contract_signed, router_access, telegram_bot_connected)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (connection_type, address, router_model, port, fiber_meters, twisted_pair_meters, created_by, router_quantity, 1 if contract_signed else 0, 1 if router_access else 0, 1 if telegram_bot_connected else 0))
-            
-            connection_id = cursor.lastrowid
-            
-            # Связываем всех сотрудников с подключением
-            for emp_id in employee_ids:
-                cursor.execute("""
-                    INSERT INTO connection_employees (connection_id, employee_id)
-                    VALUES (?, ?)
-                """, (connection_id, emp_id))
-            
-            # Списываем материалы
-            if material_payer_id:
-                # Списываем весь материал с одного сотрудника
-                cursor.execute("""
-                    SELECT fiber_balance, twisted_pair_balance 
-                    FROM employees 
-                    WHERE id = ?
-                """, (material_payer_id,))
-                row = cursor.fetchone()
-                
-                if not row:
-                    logger.error(f"Сотрудник ID {material_payer_id} не найден")
-                    conn.close()
-                    return None
-                
-                current_fiber = row[0] or 0
-                current_twisted = row[1] or 0
-                
-                # Проверяем достаточность материалов
-                if current_fiber < fiber_meters:
-                    logger.warning(f"Недостаточно ВОЛС у сотрудника ID {material_payer_id}: "
-                                 f"есть {current_fiber}м, требуется {fiber_meters}м")
-                    conn.close()
-                    return None
-                
-                if current_twisted < twisted_pair_meters:
-                    logger.warning(f"Недостаточно витой пары у сотрудника ID {material_payer_id}: "
-                                 f"есть {current_twisted}м, требуется {twisted_pair_meters}м")
-                    conn.close()
-                    return None
-                
-                # Сохраняем в БД перед логированием
-                conn.commit()
-                conn.close()
-                
-                # Списываем весь материал с одного сотрудника (с логированием)
-                success = self.deduct_material_from_employee(
-                    material_payer_id, fiber_meters, twisted_pair_meters,
-                    connection_id, created_by
-                )
+            with self.pool.transaction() as conn:
+                cursor = conn.cursor()
                 
-                if not success:
-                    logger.error(f"Не удалось списать материалы с сотрудника ID {material_payer_id}")
-                    return None
+                # Создаем запись подключения
+                cursor.execute("""
+                    INSERT INTO connections 
+                    (connection_type, address, router_model, port, fiber_meters, twisted_pair_meters, created_by, router_quantity, contract_signed, router_access, telegram_bot_connected)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (connection_type, address, router_model, port, fiber_meters, twisted_pair_meters, created_by, router_quantity, 1 if contract_signed else 0, 1 if router_access else 0, 1 if telegram_bot_connected else 0))
                 
-                logger.info(f"Списано у сотрудника ID {material_payer_id}: "
-                          f"ВОЛС -{fiber_meters}м, Витая пара -{twisted_pair_meters}м (полная сумма)")
+                connection_id = cursor.lastrowid
                 
-                # Переоткрываем соединение для фото
-                conn = self.get_connection()
-                cursor = conn.cursor()
-            else:
-                # Старая логика: делим поровну между всеми
-                emp_count = len(employee_ids)
-                fiber_per_emp = fiber_meters / emp_count if emp_count > 0 else 0
-                twisted_per_emp = twisted_pair_meters / emp_count if emp_count > 0 else 0
+                # Связываем всех сотрудников с подключением
+                cursor.executemany("""
+                    INSERT INTO connection_employees (connection_id, employee_id)
+                    VALUES (?, ?)
+                """, [(connection_id, emp_id) for emp_id in employee_ids])
                 
-                # Сохраняем в БД перед логированием
-                conn.commit()
-                conn.close()
+                # Дневные сводки обновляются в той же транзакции
+                daily_stats.record_connection(conn, connection_id)
                 
-                for emp_id in employee_ids:
-                    # Списываем с логированием
-                    success = self.deduct_material_from_employee(
-                        emp_id, fiber_per_emp, twisted_per_emp,
-                        connection_id, created_by
+                # Списываем материалы (репозитории присоединяются к этой транзакции и пишут в общий журнал)
+                if material_payer_id:
+                    # Списываем весь материал с одного сотрудника (с логированием)
+                    success = self.materials_repo.deduct_material(
+                        material_payer_id, fiber_meters, twisted_pair_meters,
+                        connection_id, created_by, ledger
                     )
                     
                     if not success:
-                        logger.error(f"Не удалось списать материалы с сотрудника ID {emp_id}")
-                    else:
+                        raise _ConnectionRollback(
+                            f"Не удалось списать материалы с сотрудника ID {material_payer_id}: "
+                            f"требуется ВОЛС {fiber_meters}м, витая пара {twisted_pair_meters}м"
+                        )
+                    
+                    logger.info(f"Списано у сотрудника ID {material_payer_id}: "
+                              f"ВОЛС -{fiber_meters}м, Витая пара -{twisted_pair_meters}м (полная сумма)")
+                else:
+                    # Старая логика: делим поровну между всеми
+                    emp_count = len(employee_ids)
+                    fiber_per_emp = fiber_meters / emp_count if emp_count > 0 else 0
+                    twisted_per_emp = twisted_pair_meters / emp_count if emp_count > 0 else 0
+                    
+                    for emp_id in employee_ids:
+                        # Списываем с логированием
+                        success = self.materials_repo.deduct_material(
+                            emp_id, fiber_per_emp, twisted_per_emp,
+                            connection_id, created_by, ledger
+                        )
+                        
+                        if not success:
+                            raise _ConnectionRollback(
+                                f"Не удалось списать материалы с сотрудника ID {emp_id}: "
+                                f"требуется ВОЛС {fiber_per_emp}м, витая пара {twisted_per_emp}м"
+                            )
+                        
                         logger.info(f"Списано у сотрудника ID {emp_id}: "
                                   f"ВОЛС -{fiber_per_emp}м, Витая пара -{twisted_per_emp}м")
                 
-                # Переоткрываем соединение для фото
-                conn = self.get_connection()
-                cursor = conn.cursor()
-            
-            # Сохраняем фотографии
-            for idx, photo_id in enumerate(photo_file_ids):
-                cursor.execute("""
+                # Списываем роутер, если указан плательщик и роутер не пропущен
+                if router_payer_id and router_model and router_model != '-':
+                    success = self.routers_repo.deduct_router(
+                        router_payer_id, router_model, router_quantity,
+                        connection_id, created_by, ledger
+                    )
+                    if not success:
+                        raise _ConnectionRollback(
+                            f"Не удалось списать роутер '{router_model}' x{router_quantity} "
+                            f"с сотрудника ID {router_payer_id}"
+                        )
+                    logger.info(f"Роутер '{router_model}' x{router_quantity} списан с сотрудника ID {router_payer_id}")
+                
+                # Все движения (материалы и роутер) сохраняются одним executemany
+                ledger.flush(conn)
+                
+                # Сохраняем фотографии
+                cursor.executemany("""
                     INSERT INTO connection_photos (connection_id, photo_file_id, photo_category, photo_order)
                     VALUES (?, ?, ?, ?)
-                """, (connection_id, photo_id, 'general', idx))
+                """, [(connection_id, photo_id, 'general', idx) for idx, photo_id in enumerate(photo_file_ids)])
             
-            conn.commit()
-            conn.close()
             logger.info(f"Создано подключение ID: {connection_id}, материалы списаны")
             return connection_id
+        except _ConnectionRollback as e:
+            logger.warning(f"Подключение не создано: {e}")
+            return None
         except Exception as e:
             logger.error(f"Ошибка при создании подключения: {e}")
             return None
@@ -442,7 +299,9 @@ class Database:
     def get_employee_report(
         self,
         employee_id: int,
-        days: Optional[int] = None
+        days: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
     ) -> Tuple[List[Dict], Dict]:
         """
         Получить отчет по сотруднику за период
@@ -450,83 +309,114 @@ class Database:
         Args:
             employee_id: ID сотрудника
             days: Количество дней (None = все время)
+            start: Начало периода включительно (вместо days)
+            end: Конец периода, не включая (None = по текущий момент)
         
         Returns:
             Tuple: (список подключений, итоговая статистика)
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Формируем условие по дате
-        date_condition = ""
-        params = [employee_id]
-        if days is not None:
-            date_limit = datetime.now() - timedelta(days=days)
-            date_condition = "AND c.created_at >= ?"
-            params.append(date_limit.strftime("%Y-%m-%d %H:%M:%S"))
-        
-        # Получаем подключения с участием сотрудника
-        query = f"""
-            SELECT 
-                c.id,
-                c.connection_type,
-                c.address,
-                c.router_model,
-                c.port,
-                c.fiber_meters,
-                c.twisted_pair_meters,
-                c.created_at,
-                COUNT(DISTINCT ce.employee_id) as employee_count
-            FROM connections c
-            JOIN connection_employees ce ON c.id = ce.connection_id
-            WHERE ce.connection_id IN (
-                SELECT connection_id 
-                FROM connection_employees 
-                WHERE employee_id = ?
-            )
-            {date_condition}
-            GROUP BY c.id
-            ORDER BY c.created_at DESC
+        return self.connections_repo.get_employee_report(employee_id, days, start, end)
+    
+    def iter_employee_report(self, employee_id: int, days: Optional[int] = None,
+                             start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[Dict]:
+        """Потоково получить подключения отчета по сотруднику (для выгрузок)"""
+        return self.connections_repo.iter_employee_report(employee_id, days, start, end)
+    
+    def get_employee_report_totals(self, employee_id: int, days: Optional[int] = None,
+                                   start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict:
+        """Получить итоги отчета по сотруднику без выборки подключений"""
+        return self.connections_repo.get_employee_report_totals(employee_id, days, start, end)
+    
+    def iter_team_report(self, days: Optional[int] = None, start: Optional[datetime] = None,
+                         end: Optional[datetime] = None) -> Iterator[Dict]:
+        """Потоково получить подключения всех сотрудников (по сотрудникам в порядке ФИО)"""
+        return self.connections_repo.iter_team_report(days, start, end)
+    
+    def get_team_summary(self, days: Optional[int] = None, start: Optional[datetime] = None,
+                         end: Optional[datetime] = None) -> Dict:
+        """Получить сводку по всем сотрудникам за период (доли метража, типы подключений, роутеры)"""
+        return self.connections_repo.get_team_summary(days, start, end)
+    
+    def get_report_watermark(self) -> Tuple[int, int, int]:
         """
+        Отметка актуальности отчетов: последние ID подключения и движения
+        и версия справочника сотрудников (ФИО исполнителей в отчете)
+        """
+        connection_id, movement_id = self.connections_repo.get_report_watermark()
+        return (connection_id, movement_id, self.employee_directory.version)
+    
+    def get_all_connections_count(self) -> int:
+        """Получить общее количество подключений"""
+        return self.connections_repo.get_all_count()
+    
+    def rebuild_daily_stats(self, since: Optional[date] = None) -> Tuple[int, int]:
+        """
+        Пересчитать дневные сводки из подключений и журнала движений
         
-        cursor.execute(query, params)
-        connections = []
-        
-        total_fiber = 0.0
-        total_twisted = 0.0
-        
-        for row in cursor.fetchall():
-            conn_dict = dict(row)
-            emp_count = conn_dict['employee_count']
-            
-            # Рассчитываем долю для сотрудника
-            conn_dict['employee_fiber_meters'] = round(conn_dict['fiber_meters'] / emp_count, 2)
-            conn_dict['employee_twisted_pair_meters'] = round(conn_dict['twisted_pair_meters'] / emp_count, 2)
-            
-            # Получаем список всех исполнителей для этого подключения
-            cursor.execute("""
-                SELECT e.full_name
-                FROM employees e
-                JOIN connection_employees ce ON e.id = ce.employee_id
-                WHERE ce.connection_id = ?
-                ORDER BY e.full_name
-            """, (conn_dict['id'],))
-            conn_dict['all_employees'] = [row['full_name'] for row in cursor.fetchall()]
-            
-            connections.append(conn_dict)
-            total_fiber += conn_dict['employee_fiber_meters']
-            total_twisted += conn_dict['employee_twisted_pair_meters']
+        Args:
+            since: Первый пересчитываемый день (None - вся история)
         
-        conn.close()
+        Returns:
+            Tuple: (строк сводки подключений, строк сводки движений)
+        """
+        with self.pool.transaction() as conn:
+            return daily_stats.rebuild(conn, since.isoformat() if since else None)
+    
+    # ==================== ОЧЕРЕДЬ СООБЩЕНИЙ (делегирование OutboxRepository) ====================
+    
+    def enqueue_outbox(self, chat_id: Union[int, str], method: str, payload: Dict, cost: int = 1,
+                       title: Optional[str] = None, now: Optional[float] = None) -> Optional[int]:
+        """Поставить вызов Bot API в очередь исходящих сообщений"""
+        return self.outbox_repo.enqueue(chat_id, method, payload, cost, title, time.time() if now is None else now)
+    
+    def get_outbox_heads(self, limit: int = 50) -> List[Dict]:
+        """Получить первые неотправленные сообщения каждого чата"""
+        return self.outbox_repo.get_heads(limit)
+    
+    def get_outbox_backlog(self) -> Dict:
+        """Получить глубину очереди сообщений и время создания самого старого"""
+        return self.outbox_repo.get_backlog()
+    
+    def mark_outbox_sent(self, message_id: int, now: Optional[float] = None) -> bool:
+        """Отметить сообщение очереди отправленным"""
+        return self.outbox_repo.mark_sent(message_id, time.time() if now is None else now)
+    
+    def reschedule_outbox(self, message_id: int, next_attempt_at: float, error: str, attempts: int) -> bool:
+        """Отложить сообщение очереди до следующей попытки"""
+        return self.outbox_repo.reschedule(message_id, next_attempt_at, error, attempts)
+    
+    def replace_outbox_request(self, message_id: int, method: str, payload: Dict, cost: int) -> bool:
+        """Заменить вызов Bot API сообщения очереди"""
+        return self.outbox_repo.replace_request(message_id, method, payload, cost, time.time())
+    
+    def fail_outbox(self, message_id: int, error: str, attempts: int) -> bool:
+        """Отметить сообщение очереди неотправляемым"""
+        return self.outbox_repo.mark_failed(message_id, error, attempts)
+    
+    def prune_outbox(self, sent_before: float) -> int:
+        """Удалить отправленные сообщения очереди старше sent_before"""
+        return self.outbox_repo.prune(sent_before)
+    
+    def get_data_version(self) -> Tuple[int, int]:
+        """
+        Версия справочников сотрудников и роутеров
         
-        stats = {
-            'total_connections': len(connections),
-            'total_fiber_meters': round(total_fiber, 2),
-            'total_twisted_pair_meters': round(total_twisted, 2)
+        Меняется после фиксации любого изменения сотрудников, их
+        остатков или роутеров; по ней кэшируются производные данные
+        (например, клавиатуры со списками сотрудников).
+        """
+        return (self.employee_directory.version, self.router_catalog.version)
+    
+    def get_cache_stats(self) -> Dict:
+        """Получить статистику кэшей"""
+        return {
+            'employees': self.employee_directory.stats(),
+            'routers': self.router_catalog.stats(),
         }
-        
-        return connections, stats
     
-    def get_all_connections_count(self) -> int:
-        """Получить общее количество подключений"""
-        return self.connections_repo.get_all_count()
+    def get_pool_stats(self) -> Dict:
+        """Получить статистику пулов подключений: на запись и только для чтения"""
+        return {
+            'write': self.pool.stats(),
+            'read': self.read_pool.stats(),
+        }
@@ -0,0 +1,74 @@
+"""
+Кэш справочника сотрудников
+Список сотрудников читается из БД один раз и сбрасывается после фиксации изменений
+"""
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from database.connection_pool import get_pool
+from database.versioned_cache import VersionedCache
+
+
+def _public(employee: Dict) -> Dict:
+    """Копия записи сотрудника без служебного признака active"""
+    return {key: value for key, value in employee.items() if key != 'active'}
+
+
+class EmployeeDirectory(VersionedCache):
+    """
+    Справочник сотрудников в памяти процесса
+    
+    Хранит два представления: словарь id -> запись и список,
+    отсортированный по ФИО (как в EmployeeRepository.get_all).
+    Удаленные сотрудники (active = 0) не попадают в списки и get(),
+    но их ФИО доступны get_names() - для отчетов о прошлых подключениях.
+    Репозитории вызывают invalidate() при добавлении/удалении
+    сотрудников и изменении остатков материалов.
+    
+    Возвращаются копии записей, изменять их можно без вреда для кэша.
+    """
+    
+    title = "справочника сотрудников"
+    
+    def _load(self, conn: sqlite3.Connection) -> Tuple[List[Dict], Dict[int, Dict]]:
+        """Прочитать всех сотрудников (включая удаленных): список по ФИО и словарь по id"""
+        rows = conn.execute("""
+            SELECT id, full_name, fiber_balance, twisted_pair_balance, created_at, active
+            FROM employees
+            ORDER BY full_name
+        """).fetchall()
+        employees = [dict(row) for row in rows]
+        return employees, {emp['id']: emp for emp in employees}
+    
+    def _sizes(self, snapshot: Optional[Tuple[List[Dict], Dict[int, Dict]]]) -> Dict:
+        return {'size': len(snapshot[1]) if snapshot is not None else 0}
+    
+    def get_all(self) -> List[Dict]:
+        """Получить список всех сотрудников (по ФИО)"""
+        snapshot = self._current()
+        if snapshot is None:
+            return []
+        employees, _ = snapshot
+        return [_public(emp) for emp in employees if emp['active']]
+    
+    def get(self, employee_id: int) -> Optional[Dict]:
+        """Получить сотрудника по ID"""
+        snapshot = self._current()
+        if snapshot is None:
+            return None
+        employee = snapshot[1].get(employee_id)
+        return _public(employee) if employee and employee['active'] else None
+    
+    def get_names(self, employee_ids: Iterable[int]) -> List[str]:
+        """Получить ФИО сотрудников с указанными ID, включая удаленных (по ФИО, без копирования записей)"""
+        wanted = set(employee_ids)
+        snapshot = self._current()
+        if snapshot is None:
+            return []
+        employees, _ = snapshot
+        return [emp['full_name'] for emp in employees if emp['id'] in wanted]
+
+
+def get_employee_directory(db_path: str) -> EmployeeDirectory:
+    """Получить общий для процесса справочник сотрудников БД"""
+    return get_pool(db_path).get_cache('employee_directory', lambda: EmployeeDirectory(db_path))
@@ -0,0 +1,70 @@
+"""
+Журнал движения материалов и роутеров
+Записи накапливаются в памяти и сохраняются одним executemany в транзакции, изменившей балансы
+"""
+import sqlite3
+from typing import List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+INSERT_MOVEMENT_SQL = """
+    INSERT INTO material_movement_log
+    (employee_id, operation_type, item_type, item_name, quantity,
+     balance_after, connection_id, created_by)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+class MovementLedger:
+    """
+    Буфер записей журнала движений
+    
+    Одна операция может затрагивать несколько позиций (ВОЛС, витая пара,
+    роутер): все они записываются в буфер и сохраняются вызовом flush()
+    на подключении той же транзакции, где менялись остатки.
+    
+    Методы репозиториев, меняющие остатки, принимают необязательный
+    ledger: если он передан, записи попадают в журнал вызывающей стороны
+    (и сохраняются ее flush()), иначе метод сохраняет их сам.
+    """
+    
+    def __init__(self):
+        self._rows: List[Tuple] = []
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    def record(
+        self,
+        employee_id: int,
+        operation_type: str,
+        item_type: str,
+        item_name: str,
+        quantity: float,
+        balance_after: float,
+        connection_id: Optional[int] = None,
+        created_by: Optional[int] = None
+    ) -> None:
+        """Добавить движение в буфер"""
+        self._rows.append((employee_id, operation_type, item_type, item_name, quantity,
+                           balance_after, connection_id, created_by))
+    
+    def flush(self, conn: sqlite3.Connection) -> int:
+        """
+        Сохранить накопленные движения одним executemany
+        
+        Args:
+            conn: Подключение с открытой транзакцией, изменившей остатки
+        
+        Returns:
+            Количество сохраненных записей
+        """
+        if not self._rows:
+            return 0
+        
+        rows, self._rows = self._rows, []
+        conn.executemany(INSERT_MOVEMENT_SQL, rows)
+        for employee_id, operation_type, item_type, _, quantity, *_ in rows:
+            logger.info(f"Logged movement: {operation_type} {quantity} {item_type} for employee {employee_id}")
+        return len(rows)
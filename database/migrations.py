@@ -0,0 +1,512 @@
+"""
+Версионные миграции схемы БД
+Текущая версия хранится в PRAGMA user_version, каждая миграция применяется один раз
+Ручной запуск: python -m database status|migrate
+"""
+import sqlite3
+import threading
+from typing import Callable, List, Tuple
+import logging
+
+from database import daily_stats
+from database.connection_pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+
+
+def _column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    """Проверить наличие колонки в таблице"""
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def _add_column(conn: sqlite3.Connection, table: str, column: str, definition: str) -> None:
+    """Добавить колонку, если ее еще нет (для БД, созданных старыми версиями бота)"""
+    if not _column_exists(conn, table, column):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logger.info(f"Добавлено поле {column} в таблицу {table}")
+
+
+# ==================== МИГРАЦИИ ====================
+
+def _initial_schema(conn: sqlite3.Connection) -> None:
+    """Базовая схема (бывший Database.create_tables)"""
+    # Таблица сотрудников
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS employees (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            full_name TEXT NOT NULL UNIQUE,
+            fiber_balance REAL DEFAULT 0,
+            twisted_pair_balance REAL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    _add_column(conn, 'employees', 'fiber_balance', "REAL DEFAULT 0")
+    _add_column(conn, 'employees', 'twisted_pair_balance', "REAL DEFAULT 0")
+    
+    # Таблица подключений
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS connections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            connection_type TEXT NOT NULL DEFAULT 'mkd',
+            address TEXT NOT NULL,
+            router_model TEXT NOT NULL,
+            port TEXT NOT NULL,
+            fiber_meters REAL NOT NULL,
+            twisted_pair_meters REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_by INTEGER NOT NULL,
+            router_quantity INTEGER DEFAULT 1,
+            contract_signed INTEGER DEFAULT 0,
+            router_access INTEGER DEFAULT 0,
+            telegram_bot_connected INTEGER DEFAULT 0
+        )
+    """)
+    _add_column(conn, 'connections', 'connection_type', "TEXT NOT NULL DEFAULT 'mkd'")
+    _add_column(conn, 'connections', 'router_quantity', "INTEGER DEFAULT 1")
+    _add_column(conn, 'connections', 'contract_signed', "INTEGER DEFAULT 0")
+    _add_column(conn, 'connections', 'router_access', "INTEGER DEFAULT 0")
+    _add_column(conn, 'connections', 'telegram_bot_connected', "INTEGER DEFAULT 0")
+    
+    # Таблица связи подключений и сотрудников (многие ко многим)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS connection_employees (
+            connection_id INTEGER NOT NULL,
+            employee_id INTEGER NOT NULL,
+            PRIMARY KEY (connection_id, employee_id),
+            FOREIGN KEY (connection_id) REFERENCES connections(id) ON DELETE CASCADE,
+            FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Таблица фотографий подключений
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS connection_photos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            connection_id INTEGER NOT NULL,
+            photo_file_id TEXT NOT NULL,
+            photo_category TEXT NOT NULL DEFAULT 'other',
+            photo_order INTEGER NOT NULL,
+            FOREIGN KEY (connection_id) REFERENCES connections(id) ON DELETE CASCADE
+        )
+    """)
+    _add_column(conn, 'connection_photos', 'photo_category', "TEXT NOT NULL DEFAULT 'other'")
+    
+    # Таблица роутеров сотрудников
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS employee_routers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER NOT NULL,
+            router_name TEXT NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Таблица логов движения материалов и роутеров
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS material_movement_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER NOT NULL,
+            operation_type TEXT NOT NULL,
+            item_type TEXT NOT NULL,
+            item_name TEXT,
+            quantity REAL NOT NULL,
+            balance_after REAL,
+            connection_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_by INTEGER,
+            FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE,
+            FOREIGN KEY (connection_id) REFERENCES connections(id) ON DELETE SET NULL
+        )
+    """)
+
+
+def _hot_query_indexes(conn: sqlite3.Connection) -> None:
+    """Индексы для отчетов, журнала движений и поиска роутеров"""
+    # Отчет по сотруднику: connection_id берется прямо из индекса
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_connection_employees_employee
+        ON connection_employees (employee_id, connection_id)
+    """)
+    
+    # Движения сотрудника за период
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movement_log_employee_created
+        ON material_movement_log (employee_id, created_at)
+    """)
+    
+    # Фотографии подключения в порядке загрузки
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_connection_photos_connection
+        ON connection_photos (connection_id, photo_order)
+    """)
+    
+    # Перед созданием уникального индекса сливаем дубли роутеров в одну запись
+    duplicates = conn.execute("""
+        SELECT employee_id, router_name, MIN(id) AS keep_id, SUM(quantity) AS total
+        FROM employee_routers
+        GROUP BY employee_id, router_name
+        HAVING COUNT(*) > 1
+    """).fetchall()
+    for employee_id, router_name, keep_id, total in duplicates:
+        conn.execute("UPDATE employee_routers SET quantity = ? WHERE id = ?", (total, keep_id))
+        conn.execute("""
+            DELETE FROM employee_routers
+            WHERE employee_id = ? AND router_name = ? AND id != ?
+        """, (employee_id, router_name, keep_id))
+        logger.warning(f"Объединены дубли роутера '{router_name}' у сотрудника ID {employee_id}")
+    
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_employee_routers_employee_name
+        ON employee_routers (employee_id, router_name)
+    """)
+    
+    # Список моделей в наличии (SELECT DISTINCT router_name ... WHERE quantity > 0)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_employee_routers_name_quantity
+        ON employee_routers (router_name, quantity)
+    """)
+
+
+# Пересчет роутеров сотрудника в сводке остатков (подставляется в триггеры employee_routers)
+_REFRESH_INVENTORY_ROUTERS = """
+    UPDATE employee_inventory SET
+        router_total = (
+            SELECT COALESCE(SUM(quantity), 0) FROM employee_routers WHERE employee_id = {ref}.employee_id
+        ),
+        routers = (
+            SELECT json_group_array(json_object('router_name', router_name, 'quantity', quantity))
+            FROM (
+                SELECT router_name, quantity FROM employee_routers
+                WHERE employee_id = {ref}.employee_id
+                ORDER BY router_name
+            )
+        )
+    WHERE employee_id = {ref}.employee_id;
+"""
+
+
+def _employee_inventory(conn: sqlite3.Connection) -> None:
+    """Сводка остатков сотрудников, поддерживаемая триггерами"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS employee_inventory (
+            employee_id INTEGER PRIMARY KEY,
+            full_name TEXT NOT NULL,
+            fiber_balance REAL NOT NULL DEFAULT 0,
+            twisted_pair_balance REAL NOT NULL DEFAULT 0,
+            router_total INTEGER NOT NULL DEFAULT 0,
+            routers TEXT NOT NULL DEFAULT '[]',
+            FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Списки сотрудников выводятся по ФИО
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_employee_inventory_name
+        ON employee_inventory (full_name)
+    """)
+    
+    # Сотрудники: ФИО и балансы материалов
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_employees_inventory_insert
+        AFTER INSERT ON employees
+        BEGIN
+            INSERT OR REPLACE INTO employee_inventory (employee_id, full_name, fiber_balance, twisted_pair_balance)
+            VALUES (NEW.id, NEW.full_name, COALESCE(NEW.fiber_balance, 0), COALESCE(NEW.twisted_pair_balance, 0));
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_employees_inventory_update
+        AFTER UPDATE OF full_name, fiber_balance, twisted_pair_balance ON employees
+        BEGIN
+            UPDATE employee_inventory SET
+                full_name = NEW.full_name,
+                fiber_balance = COALESCE(NEW.fiber_balance, 0),
+                twisted_pair_balance = COALESCE(NEW.twisted_pair_balance, 0)
+            WHERE employee_id = NEW.id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_employees_inventory_delete
+        AFTER DELETE ON employees
+        BEGIN
+            DELETE FROM employee_inventory WHERE employee_id = OLD.id;
+        END
+    """)
+    
+    # Роутеры: итог и разбивка по моделям
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_employee_routers_inventory_insert
+        AFTER INSERT ON employee_routers
+        BEGIN
+            {_REFRESH_INVENTORY_ROUTERS.format(ref='NEW')}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_employee_routers_inventory_update
+        AFTER UPDATE ON employee_routers
+        BEGIN
+            {_REFRESH_INVENTORY_ROUTERS.format(ref='OLD')}
+            {_REFRESH_INVENTORY_ROUTERS.format(ref='NEW')}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_employee_routers_inventory_delete
+        AFTER DELETE ON employee_routers
+        BEGIN
+            {_REFRESH_INVENTORY_ROUTERS.format(ref='OLD')}
+        END
+    """)
+    
+    # Заполняем сводку для уже существующих сотрудников
+    conn.execute("""
+        INSERT OR REPLACE INTO employee_inventory
+            (employee_id, full_name, fiber_balance, twisted_pair_balance)
+        SELECT id, full_name, COALESCE(fiber_balance, 0), COALESCE(twisted_pair_balance, 0)
+        FROM employees
+    """)
+    conn.execute("""
+        UPDATE employee_inventory SET
+            router_total = (
+                SELECT COALESCE(SUM(quantity), 0) FROM employee_routers
+                WHERE employee_routers.employee_id = employee_inventory.employee_id
+            ),
+            routers = (
+                SELECT json_group_array(json_object('router_name', router_name, 'quantity', quantity))
+                FROM (
+                    SELECT router_name, quantity FROM employee_routers
+                    WHERE employee_routers.employee_id = employee_inventory.employee_id
+                    ORDER BY router_name
+                )
+            )
+    """)
+
+
+def _report_date_ranges(conn: sqlite3.Connection) -> None:
+    """Индексы для отчетов за произвольный период (диапазоны по created_at)"""
+    # Дата подключения дублируется в связке с исполнителем: отчет сотрудника
+    # за период читает только его подключения из этого периода
+    _add_column(conn, 'connection_employees', 'created_at', "TIMESTAMP")
+    conn.execute("""
+        UPDATE connection_employees SET created_at = (
+            SELECT created_at FROM connections WHERE connections.id = connection_employees.connection_id
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_connection_employees_created_at
+        AFTER INSERT ON connection_employees
+        WHEN NEW.created_at IS NULL
+        BEGIN
+            UPDATE connection_employees
+            SET created_at = (SELECT created_at FROM connections WHERE id = NEW.connection_id)
+            WHERE connection_id = NEW.connection_id AND employee_id = NEW.employee_id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_connections_created_at
+        AFTER UPDATE OF created_at ON connections
+        BEGIN
+            UPDATE connection_employees SET created_at = NEW.created_at WHERE connection_id = NEW.id;
+        END
+    """)
+    
+    # Новый индекс начинается с employee_id, поэтому прежний (employee_id, connection_id) не нужен
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_connection_employees_employee_created
+        ON connection_employees (employee_id, created_at, connection_id)
+    """)
+    conn.execute("DROP INDEX IF EXISTS idx_connection_employees_employee")
+    
+    # Подключения всех сотрудников за период (сводный отчет)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_connections_created
+        ON connections (created_at)
+    """)
+    
+    # Роутеры, списанные за период (сводный отчет)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movement_log_router_deduct
+        ON material_movement_log (created_at)
+        WHERE item_type = 'router' AND operation_type = 'deduct'
+    """)
+
+
+def _daily_stats(conn: sqlite3.Connection) -> None:
+    """Дневные сводки по сотрудникам для статистики и итогов отчетов"""
+    # Подключения сотрудника за день по типам и его доля в метраже
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS employee_daily_connections (
+            employee_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            connection_type TEXT NOT NULL,
+            connections INTEGER NOT NULL DEFAULT 0,
+            fiber_meters REAL NOT NULL DEFAULT 0,
+            twisted_pair_meters REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (employee_id, day, connection_type)
+        ) WITHOUT ROWID
+    """)
+    
+    # Подключения бригады за день: каждое учитывается один раз
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS team_daily_connections (
+            day TEXT NOT NULL,
+            connection_type TEXT NOT NULL,
+            connections INTEGER NOT NULL DEFAULT 0,
+            fiber_meters REAL NOT NULL DEFAULT 0,
+            twisted_pair_meters REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, connection_type)
+        ) WITHOUT ROWID
+    """)
+    
+    # Начисления и списания материалов и роутеров сотрудника за день
+    columns = ",\n".join(
+        f"            {column} REAL NOT NULL DEFAULT 0" for column, *_ in daily_stats.MATERIAL_COLUMNS
+    )
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS employee_daily_materials (
+            employee_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+{columns},
+            movements INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (employee_id, day)
+        ) WITHOUT ROWID
+    """)
+    
+    # Сводка по всем сотрудникам за период - диапазон по дню
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_employee_daily_connections_day
+        ON employee_daily_connections (day)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_employee_daily_materials_day
+        ON employee_daily_materials (day)
+    """)
+    
+    conn.execute(daily_stats.material_trigger_sql())
+    daily_stats.rebuild(conn)
+
+
+def _outbox(conn: sqlite3.Connection) -> None:
+    """Очередь исходящих сообщений Telegram (отправки в каналы отчетов)"""
+    # Время - unix-секунды (REAL): по нему планируются повторы и считается задержка
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id TEXT NOT NULL,
+            method TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            cost INTEGER NOT NULL DEFAULT 1,
+            title TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            next_attempt_at REAL NOT NULL,
+            sent_at REAL
+        )
+    """)
+    
+    # Очередь чата - его неотправленные сообщения по порядку (частичный индекс)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_outbox_pending_chat
+        ON outbox (chat_id, id) WHERE status = 'pending'
+    """)
+
+
+def _employee_soft_delete(conn: sqlite3.Connection) -> None:
+    """Мягкое удаление сотрудников: история подключений и движений материалов сохраняется"""
+    # Удаленный сотрудник остается в employees (active = 0), поэтому ON DELETE CASCADE
+    # связей с подключениями и журнала движений не срабатывает
+    _add_column(conn, 'employees', 'active', "INTEGER NOT NULL DEFAULT 1")
+    
+    # В сводке остатков - только работающие сотрудники
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_employees_inventory_deactivate
+        AFTER UPDATE OF active ON employees
+        WHEN NEW.active = 0
+        BEGIN
+            DELETE FROM employee_inventory WHERE employee_id = NEW.id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_employees_inventory_reactivate
+        AFTER UPDATE OF active ON employees
+        WHEN NEW.active = 1 AND OLD.active = 0
+        BEGIN
+            INSERT OR REPLACE INTO employee_inventory (employee_id, full_name, fiber_balance, twisted_pair_balance)
+            VALUES (NEW.id, NEW.full_name, COALESCE(NEW.fiber_balance, 0), COALESCE(NEW.twisted_pair_balance, 0));
+        END
+    """)
+
+
+# Упорядоченный список миграций: (версия, описание, функция)
+# Новые миграции добавляются только в конец, номера не переиспользуются
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "Базовая схема", _initial_schema),
+    (2, "Индексы для отчетов, журнала движений и роутеров", _hot_query_indexes),
+    (3, "Сводка остатков сотрудников на триггерах", _employee_inventory),
+    (4, "Индексы для отчетов за произвольный период", _report_date_ranges),
+    (5, "Дневные сводки для статистики и итогов отчетов", _daily_stats),
+    (6, "Очередь исходящих сообщений Telegram", _outbox),
+    (7, "Мягкое удаление сотрудников", _employee_soft_delete),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ==================== ПРИМЕНЕНИЕ ====================
+
+def get_schema_version(db_path: str) -> int:
+    """Получить текущую версию схемы БД"""
+    with get_pool(db_path).connection() as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def get_pending_migrations(db_path: str) -> List[Tuple[int, str]]:
+    """Получить список непримененных миграций"""
+    current = get_schema_version(db_path)
+    return [(version, description) for version, description, _ in MIGRATIONS if version > current]
+
+
+def apply_migrations(db_path: str) -> int:
+    """
+    Применить все непримененные миграции
+    
+    Каждая миграция выполняется в своей транзакции вместе с
+    обновлением user_version, поэтому прерванная миграция не
+    оставляет схему в промежуточном состоянии.
+    
+    Returns:
+        Версия схемы после применения
+    """
+    pool = get_pool(db_path)
+    with _lock:
+        for version, description, migrate in MIGRATIONS:
+            with pool.transaction() as conn:
+                current = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version <= current:
+                    continue
+                migrate(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+            logger.info(f"Применена миграция БД {version}: {description}")
+        
+        version = get_schema_version(db_path)
+        pool.schema_version = version
+        return version
+
+
+def ensure_schema(db_path: str) -> None:
+    """
+    Убедиться, что схема БД актуальна
+    
+    Проверка выполняется один раз на процесс (на время жизни пула),
+    повторные вызовы ничего не стоят.
+    """
+    pool = get_pool(db_path)
+    if pool.schema_version is not None:
+        return
+    version = apply_migrations(db_path)
+    logger.info(f"Схема БД {db_path}: версия {version}")
@@ -6,11 +6,13 @@ from database.repositories.employee_repository import EmployeeRepository
 from database.repositories.material_repository import MaterialRepository
 from database.repositories.router_repository import RouterRepository
 from database.repositories.connection_repository import ConnectionRepository
+from database.repositories.outbox_repository import OutboxRepository
 
 __all__ = [
     'EmployeeRepository',
     'MaterialRepository',
     'RouterRepository',
-    'ConnectionRepository'
+    'ConnectionRepository',
+    'OutboxRepository'
 ]
 
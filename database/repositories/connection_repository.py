@@ -1,11 +1,12 @@
 """
 Репозиторий для работы с подключениями
 """
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 import logging
 
-from database.base_repository import BaseRepository
+from database.base_repository import BaseRepository, db_timestamp
+from database.daily_stats import SHARE, day_conditions, day_range
 
 logger = logging.getLogger(__name__)
 
@@ -13,213 +14,434 @@ logger = logging.getLogger(__name__)
 class ConnectionRepository(BaseRepository):
     """Репозиторий для управления подключениями"""
     
-    def create(
-        self,
-        connection_type: str,
-        address: str,
-        router_model: str,
-        port: str,
-        fiber_meters: float,
-        twisted_pair_meters: float,
-        created_by: int,
-        router_quantity: int = 1,
-        contract_signed: bool = False,
-        router_access: bool = False,
-        telegram_bot_connected: bool = False
-    ) -> Optional[int]:
-        """Создать новое подключение"""
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Создаем запись подключения
-            cursor.execute("""
-                INSERT INTO connections 
-                (connection_type, address, router_model, port, fiber_meters, 
-                 twisted_pair_meters, created_by, router_quantity, contract_signed, 
-                 router_access, telegram_bot_connected)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                connection_type, address, router_model, port, fiber_meters,
-                twisted_pair_meters, created_by, router_quantity,
-                1 if contract_signed else 0,
-                1 if router_access else 0,
-                1 if telegram_bot_connected else 0
-            ))
-            
-            connection_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            
-            logger.info(f"Создано подключение ID: {connection_id}")
-            return connection_id
-        except Exception as e:
-            logger.error(f"Ошибка при создании подключения: {e}")
-            return None
-    
-    def link_employees(self, connection_id: int, employee_ids: List[int]) -> bool:
-        """Связать сотрудников с подключением"""
-        try:
-            params_list = [(connection_id, emp_id) for emp_id in employee_ids]
-            return self.execute_many("""
-                INSERT INTO connection_employees (connection_id, employee_id)
-                VALUES (?, ?)
-            """, params_list)
-        except Exception as e:
-            logger.error(f"Ошибка при связывании сотрудников: {e}")
-            return False
-    
-    def save_photos(self, connection_id: int, photo_file_ids: List[str]) -> bool:
-        """Сохранить фотографии подключения"""
-        try:
-            params_list = [
-                (connection_id, photo_id, 'general', idx)
-                for idx, photo_id in enumerate(photo_file_ids)
-            ]
-            return self.execute_many("""
-                INSERT INTO connection_photos (connection_id, photo_file_id, photo_category, photo_order)
-                VALUES (?, ?, ?, ?)
-            """, params_list)
-        except Exception as e:
-            logger.error(f"Ошибка при сохранении фотографий: {e}")
-            return False
-    
     def get_by_id(self, connection_id: int) -> Optional[Dict]:
         """Получить подключение по ID"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Получаем основную информацию
-            cursor.execute("""
-                SELECT id, connection_type, address, router_model, port, fiber_meters, 
-                       twisted_pair_meters, created_at, created_by, router_quantity, 
-                       contract_signed, router_access, telegram_bot_connected
-                FROM connections
-                WHERE id = ?
-            """, (connection_id,))
-            
-            row = cursor.fetchone()
-            if not row:
-                conn.close()
-                return None
-            
-            connection = dict(row)
-            
-            # Получаем сотрудников
-            cursor.execute("""
-                SELECT e.id, e.full_name
-                FROM employees e
-                JOIN connection_employees ce ON e.id = ce.employee_id
-                WHERE ce.connection_id = ?
-                ORDER BY e.full_name
-            """, (connection_id,))
-            connection['employees'] = [dict(row) for row in cursor.fetchall()]
-            
-            # Получаем фотографии
-            cursor.execute("""
-                SELECT photo_file_id
-                FROM connection_photos
-                WHERE connection_id = ?
-                ORDER BY photo_order
-            """, (connection_id,))
-            connection['photos'] = [row['photo_file_id'] for row in cursor.fetchall()]
-            
-            conn.close()
-            return connection
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                
+                # Получаем основную информацию
+                cursor.execute("""
+                    SELECT id, connection_type, address, router_model, port, fiber_meters, 
+                           twisted_pair_meters, created_at, created_by, router_quantity, 
+                           contract_signed, router_access, telegram_bot_connected
+                    FROM connections
+                    WHERE id = ?
+                """, (connection_id,))
+                
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                
+                connection = dict(row)
+                
+                # Получаем сотрудников
+                cursor.execute("""
+                    SELECT e.id, e.full_name
+                    FROM employees e
+                    JOIN connection_employees ce ON e.id = ce.employee_id
+                    WHERE ce.connection_id = ?
+                    ORDER BY e.full_name
+                """, (connection_id,))
+                connection['employees'] = [dict(row) for row in cursor.fetchall()]
+                
+                # Получаем фотографии
+                cursor.execute("""
+                    SELECT photo_file_id
+                    FROM connection_photos
+                    WHERE connection_id = ?
+                    ORDER BY photo_order
+                """, (connection_id,))
+                connection['photos'] = [row['photo_file_id'] for row in cursor.fetchall()]
+                
+                return connection
         except Exception as e:
             logger.error(f"Ошибка при получении подключения: {e}")
             return None
     
+    @staticmethod
+    def _date_range(
+        column: str,
+        days: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Условия полуоткрытого диапазона [start, end) по колонке created_at
+        
+        days - сокращение для start = сейчас - days. Границы сравниваются
+        с индексированной колонкой напрямую, поэтому выборка за период
+        читает только строки этого периода.
+        
+        Returns:
+            Tuple: (условия, параметры)
+        """
+        if days is not None:
+            start = datetime.now() - timedelta(days=days)
+        conditions, params = [], []
+        if start is not None:
+            conditions.append(f"{column} >= ?")
+            params.append(db_timestamp(start))
+        if end is not None:
+            conditions.append(f"{column} < ?")
+            params.append(db_timestamp(end))
+        return conditions, params
+    
+    @staticmethod
+    def _report_query(
+        employee_id: Optional[int],
+        days: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        for_totals: bool = False
+    ) -> Tuple[str, Tuple]:
+        """
+        Запрос подключений сотрудника за период (общий для списка, потока и итогов)
+        
+        Подключения, количество исполнителей, их имена и доля сотрудника
+        в метраже выбираются одним запросом, независимо от длины истории.
+        Для итогов имена и сортировка не нужны (for_totals=True).
+        employee_id=None - подключения всех сотрудников (строка на пару
+        сотрудник-подключение), по ФИО сотрудника.
+        """
+        conditions = []
+        params = []
+        if employee_id is not None:
+            # Период сотрудника - диапазон по индексу (employee_id, created_at) связки
+            conditions.append("own.employee_id = ?")
+            params.append(employee_id)
+            range_conditions, range_params = ConnectionRepository._date_range('own.created_at', days, start, end)
+        else:
+            range_conditions, range_params = ConnectionRepository._date_range('c.created_at', days, start, end)
+        conditions += range_conditions
+        params += range_params
+        
+        # Имена исполнителей склеиваются через символ-разделитель (0x1F), которого не бывает в ФИО
+        names = "NULL" if for_totals else "group_concat(e.full_name, char(31))"
+        if for_totals:
+            order = ""
+        elif employee_id is None:
+            order = "ORDER BY oe.full_name, own.employee_id, c.created_at DESC"
+        else:
+            order = "ORDER BY c.created_at DESC"
+        owner_join = "JOIN employees oe ON oe.id = own.employee_id" if employee_id is None else ""
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+            SELECT 
+                own.employee_id,
+                c.id,
+                c.connection_type,
+                c.address,
+                c.router_model,
+                c.port,
+                c.fiber_meters,
+                c.twisted_pair_meters,
+                c.created_at,
+                COUNT(ce.employee_id) as employee_count,
+                {SHARE.format(meters='c.fiber_meters', executors='COUNT(ce.employee_id)')} as employee_fiber_meters,
+                {SHARE.format(meters='c.twisted_pair_meters', executors='COUNT(ce.employee_id)')} as employee_twisted_pair_meters,
+                {names} as employee_names
+            FROM connection_employees own
+            {owner_join}
+            JOIN connections c ON c.id = own.connection_id
+            JOIN connection_employees ce ON ce.connection_id = c.id
+            LEFT JOIN employees e ON e.id = ce.employee_id
+            {where}
+            GROUP BY own.employee_id, c.id
+            {order}
+        """
+        return query, tuple(params)
+    
+    @staticmethod
+    def _report_row(row: Dict) -> Dict:
+        """Преобразовать строку отчета: имена исполнителей - в отсортированный список"""
+        names = row.pop('employee_names')
+        # Порядок group_concat не гарантирован, поэтому сортируем здесь
+        row['all_employees'] = sorted(names.split('\x1f')) if names else []
+        return row
+    
     def get_employee_report(
         self,
         employee_id: int,
-        days: Optional[int] = None
+        days: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
     ) -> tuple[List[Dict], Dict]:
-        """Получить отчет по сотруднику за период"""
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Формируем условие по дате
-            date_condition = ""
-            params = [employee_id]
-            if days is not None:
-                date_limit = datetime.now() - timedelta(days=days)
-                date_condition = "AND c.created_at >= ?"
-                params.append(date_limit.strftime("%Y-%m-%d %H:%M:%S"))
-            
-            # Получаем подключения с участием сотрудника
-            query = f"""
-                SELECT 
+        """
+        Получить отчет по сотруднику за период
+        
+        Args:
+            employee_id: ID сотрудника
+            days: Количество дней (None = все время)
+            start: Начало периода включительно (вместо days)
+            end: Конец периода, не включая (None = по текущий момент)
+        
+        Returns:
+            Tuple: (список подключений, итоговая статистика)
+        """
+        query, params = self._report_query(employee_id, days, start, end)
+        rows = self.execute_query(query, params, fetch_all=True, read_only=True) or []
+        connections = [self._report_row(row) for row in rows]
+        
+        stats = {
+            'total_connections': len(connections),
+            'total_fiber_meters': round(sum(c['employee_fiber_meters'] for c in connections), 2),
+            'total_twisted_pair_meters': round(sum(c['employee_twisted_pair_meters'] for c in connections), 2)
+        }
+        
+        return connections, stats
+    
+    def iter_employee_report(
+        self,
+        employee_id: int,
+        days: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Iterator[Dict]:
+        """
+        Потоково получить подключения отчета по сотруднику
+        
+        Строки читаются из курсора по мере потребления, поэтому память
+        не зависит от длины истории. Подключение для чтения занято,
+        пока итератор не исчерпан или не закрыт.
+        """
+        query, params = self._report_query(employee_id, days, start, end)
+        return self._iter_report(query, params)
+    
+    def iter_team_report(
+        self,
+        days: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Iterator[Dict]:
+        """
+        Потоково получить подключения всех сотрудников за период
+        
+        Строка на каждую пару сотрудник-подключение (с долей сотрудника
+        в метраже), сгруппированные по сотрудникам в порядке ФИО.
+        """
+        query, params = self._report_query(None, days, start, end)
+        return self._iter_report(query, params)
+    
+    def _iter_report(self, query: str, params: Tuple) -> Iterator[Dict]:
+        """Читать строки отчета из курсора"""
+        with self.read_connection() as conn:
+            cursor = conn.execute(query, params)
+            try:
+                for row in cursor:
+                    yield self._report_row(dict(row))
+            finally:
+                cursor.close()
+    
+    def get_employee_report_totals(
+        self,
+        employee_id: int,
+        days: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Dict:
+        """
+        Получить итоги отчета по сотруднику без выборки строк
+        
+        Период из целых дней суммируется по дневным сводкам, иначе -
+        агрегирующим запросом по подключениям.
+        """
+        days_range = day_range(start, end) if days is None else None
+        if days_range:
+            conditions, params = day_conditions(*days_range)
+            result = self.execute_query(f"""
+                SELECT
+                    COALESCE(SUM(connections), 0) as total_connections,
+                    ROUND(COALESCE(SUM(fiber_meters), 0), 2) as total_fiber_meters,
+                    ROUND(COALESCE(SUM(twisted_pair_meters), 0), 2) as total_twisted_pair_meters
+                FROM employee_daily_connections
+                WHERE employee_id = ?{''.join(f" AND {condition}" for condition in conditions)}
+            """, (employee_id, *params), fetch_one=True, read_only=True)
+            return result or {'total_connections': 0, 'total_fiber_meters': 0.0, 'total_twisted_pair_meters': 0.0}
+        
+        query, params = self._report_query(employee_id, days, start, end, for_totals=True)
+        result = self.execute_query(f"""
+            SELECT
+                COUNT(*) as total_connections,
+                ROUND(COALESCE(SUM(employee_fiber_meters), 0), 2) as total_fiber_meters,
+                ROUND(COALESCE(SUM(employee_twisted_pair_meters), 0), 2) as total_twisted_pair_meters
+            FROM ({query})
+        """, params, fetch_one=True, read_only=True)
+        return result or {'total_connections': 0, 'total_fiber_meters': 0.0, 'total_twisted_pair_meters': 0.0}
+    
+    def get_team_summary(
+        self,
+        days: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Dict:
+        """
+        Получить сводку по всем сотрудникам за период одним запросом
+        
+        За один проход по подключениям периода считаются доли сотрудников
+        в метраже ВОЛС и витой пары, количество подключений по типам и
+        роутеры, списанные под подключения. Отдельной строкой запроса
+        идут итоги по бригаде: подключение с несколькими исполнителями
+        учитывается в них один раз.
+        
+        Returns:
+            {'employees': [...], 'total': {...}}; у сотрудника и итога ключи
+            total_connections, by_type, total_fiber_meters,
+            total_twisted_pair_meters, routers_used
+        """
+        days_range = day_range(start, end) if days is None else None
+        if days_range:
+            rows = self._team_summary_rollup_rows(*days_range)
+        else:
+            rows = self._team_summary_rows(days, start, end)
+        
+        def empty() -> Dict:
+            return {'total_connections': 0, 'by_type': {}, 'total_fiber_meters': 0.0,
+                    'total_twisted_pair_meters': 0.0, 'routers_used': 0}
+        
+        employees: Dict[int, Dict] = {}
+        total = empty()
+        for row in rows:
+            if row['employee_id'] is None:
+                target = total
+            else:
+                target = employees.get(row['employee_id'])
+                if target is None:
+                    target = employees[row['employee_id']] = dict(
+                        empty(), employee_id=row['employee_id'], full_name=row['full_name']
+                    )
+            if row['connection_type'] is not None:
+                target['by_type'][row['connection_type']] = row['connections']
+                target['total_connections'] += row['connections']
+            target['total_fiber_meters'] += row['fiber_meters']
+            target['total_twisted_pair_meters'] += row['twisted_pair_meters']
+            target['routers_used'] += row['routers_used']
+        
+        for summary in [total, *employees.values()]:
+            summary['total_fiber_meters'] = round(summary['total_fiber_meters'], 2)
+            summary['total_twisted_pair_meters'] = round(summary['total_twisted_pair_meters'], 2)
+        total['routers_used'] = sum(emp['routers_used'] for emp in employees.values())
+        
+        return {
+            'employees': sorted(employees.values(), key=lambda emp: (emp['full_name'], emp['employee_id'])),
+            'total': total,
+        }
+    
+    def _team_summary_rows(
+        self,
+        days: Optional[int],
+        start: Optional[datetime],
+        end: Optional[datetime]
+    ) -> List[Dict]:
+        """Строки сводки по всем сотрудникам из подключений и журнала движений"""
+        connection_conditions, range_params = self._date_range('c.created_at', days, start, end)
+        movement_conditions, _ = self._date_range('created_at', days, start, end)
+        connection_filter = f"WHERE {' AND '.join(connection_conditions)}" if connection_conditions else ""
+        movement_filter = ''.join(f" AND {condition}" for condition in movement_conditions)
+        params = range_params * 2
+        
+        return self.execute_query(f"""
+            WITH executors AS (
+                SELECT
                     c.id,
                     c.connection_type,
-                    c.address,
-                    c.router_model,
-                    c.port,
                     c.fiber_meters,
                     c.twisted_pair_meters,
-                    c.created_at,
-                    COUNT(DISTINCT ce.employee_id) as employee_count
+                    (SELECT COUNT(*) FROM connection_employees ce WHERE ce.connection_id = c.id) AS executors
                 FROM connections c
-                JOIN connection_employees ce ON c.id = ce.connection_id
-                WHERE ce.connection_id IN (
-                    SELECT connection_id 
-                    FROM connection_employees 
-                    WHERE employee_id = ?
-                )
-                {date_condition}
-                GROUP BY c.id
-                ORDER BY c.created_at DESC
-            """
-            
-            cursor.execute(query, params)
-            connections = []
-            
-            total_fiber = 0.0
-            total_twisted = 0.0
-            
-            for row in cursor.fetchall():
-                conn_dict = dict(row)
-                emp_count = conn_dict['employee_count']
-                
-                # Рассчитываем долю для сотрудника
-                conn_dict['employee_fiber_meters'] = round(conn_dict['fiber_meters'] / emp_count, 2)
-                conn_dict['employee_twisted_pair_meters'] = round(conn_dict['twisted_pair_meters'] / emp_count, 2)
-                
-                # Получаем список всех исполнителей для этого подключения
-                cursor.execute("""
-                    SELECT e.full_name
-                    FROM employees e
-                    JOIN connection_employees ce ON e.id = ce.employee_id
-                    WHERE ce.connection_id = ?
-                    ORDER BY e.full_name
-                """, (conn_dict['id'],))
-                conn_dict['all_employees'] = [row['full_name'] for row in cursor.fetchall()]
-                
-                connections.append(conn_dict)
-                total_fiber += conn_dict['employee_fiber_meters']
-                total_twisted += conn_dict['employee_twisted_pair_meters']
-            
-            conn.close()
-            
-            stats = {
-                'total_connections': len(connections),
-                'total_fiber_meters': round(total_fiber, 2),
-                'total_twisted_pair_meters': round(total_twisted, 2)
-            }
-            
-            return connections, stats
+                {connection_filter}
+            ),
+            shares AS (
+                SELECT
+                    id,
+                    connection_type,
+                    fiber_meters,
+                    twisted_pair_meters,
+                    {SHARE.format(meters='fiber_meters', executors='executors')} AS employee_fiber_meters,
+                    {SHARE.format(meters='twisted_pair_meters', executors='executors')} AS employee_twisted_pair_meters
+                FROM executors
+                WHERE executors > 0
+            ),
+            routers AS (
+                SELECT employee_id, SUM(quantity) AS routers_used
+                FROM material_movement_log
+                WHERE item_type = 'router' AND operation_type = 'deduct'
+                  AND connection_id IS NOT NULL{movement_filter}
+                GROUP BY employee_id
+            )
+            SELECT own.employee_id, e.full_name, s.connection_type,
+                   COUNT(*) AS connections,
+                   SUM(s.employee_fiber_meters) AS fiber_meters,
+                   SUM(s.employee_twisted_pair_meters) AS twisted_pair_meters,
+                   0 AS routers_used
+            FROM shares s
+            JOIN connection_employees own ON own.connection_id = s.id
+            JOIN employees e ON e.id = own.employee_id
+            GROUP BY own.employee_id, s.connection_type
+            UNION ALL
+            SELECT r.employee_id, e.full_name, NULL, 0, 0, 0, r.routers_used
+            FROM routers r
+            JOIN employees e ON e.id = r.employee_id
+            UNION ALL
+            SELECT NULL, NULL, connection_type, COUNT(*), SUM(fiber_meters), SUM(twisted_pair_meters), 0
+            FROM shares
+            GROUP BY connection_type
+        """, tuple(params), fetch_all=True, read_only=True) or []
+    
+    def _team_summary_rollup_rows(self, first_day: Optional[str], end_day: Optional[str]) -> List[Dict]:
+        """Строки сводки по всем сотрудникам из дневных сводок (те же колонки, что у _team_summary_rows)"""
+        conditions, params = day_conditions(first_day, end_day, 'd.day')
+        day_filter = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        router_filter = ' AND '.join(['d.routers_used > 0', *conditions])
+        return self.execute_query(f"""
+            SELECT d.employee_id, e.full_name, d.connection_type,
+                   SUM(d.connections) AS connections,
+                   SUM(d.fiber_meters) AS fiber_meters,
+                   SUM(d.twisted_pair_meters) AS twisted_pair_meters,
+                   0 AS routers_used
+            FROM employee_daily_connections d
+            JOIN employees e ON e.id = d.employee_id
+            {day_filter}
+            GROUP BY d.employee_id, d.connection_type
+            UNION ALL
+            SELECT d.employee_id, e.full_name, NULL, 0, 0, 0, CAST(SUM(d.routers_used) AS INTEGER)
+            FROM employee_daily_materials d
+            JOIN employees e ON e.id = d.employee_id
+            WHERE {router_filter}
+            GROUP BY d.employee_id
+            UNION ALL
+            SELECT NULL, NULL, d.connection_type, SUM(d.connections), SUM(d.fiber_meters), SUM(d.twisted_pair_meters), 0
+            FROM team_daily_connections d
+            {day_filter}
+            GROUP BY d.connection_type
+        """, tuple(params * 3), fetch_all=True, read_only=True) or []
+    
+    def get_report_watermark(self) -> Tuple[int, int]:
+        """
+        Получить отметку актуальности данных отчетов
+        
+        Подключения и журнал движений только дополняются, поэтому
+        пара (последний ID подключения, последний ID движения)
+        меняется при любом изменении данных, попадающих в отчеты.
+        MAX(id) по первичному ключу берется из B-дерева без сканирования.
+        """
+        try:
+            result = self.execute_query("""
+                SELECT
+                    (SELECT COALESCE(MAX(id), 0) FROM connections) AS connection_id,
+                    (SELECT COALESCE(MAX(id), 0) FROM material_movement_log) AS movement_id
+            """, fetch_one=True, read_only=True)
+            return (result['connection_id'], result['movement_id']) if result else (0, 0)
         except Exception as e:
-            logger.error(f"Ошибка при получении отчета: {e}")
-            return [], {}
+            logger.error(f"Ошибка при получении отметки данных отчетов: {e}")
+            return (0, 0)
     
     def get_all_count(self) -> int:
-        """Получить общее количество подключений"""
+        """Получить общее количество подключений (по дневным сводкам бригады)"""
         try:
             result = self.execute_query(
-                "SELECT COUNT(*) as count FROM connections",
-                fetch_one=True
+                "SELECT COALESCE(SUM(connections), 0) as count FROM team_daily_connections",
+                fetch_one=True, read_only=True
             )
             return result['count'] if result else 0
         except Exception as e:
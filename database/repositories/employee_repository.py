@@ -1,11 +1,14 @@
 """
 Репозиторий для работы с сотрудниками
 """
+import json
 import sqlite3
 from typing import List, Dict, Optional, Tuple
 import logging
 
 from database.base_repository import BaseRepository
+from database.employee_directory import get_employee_directory
+from database.router_catalog import get_router_catalog
 
 logger = logging.getLogger(__name__)
 
@@ -14,57 +17,103 @@ class EmployeeRepository(BaseRepository):
     """Репозиторий для управления сотрудниками"""
     
     def create(self, full_name: str) -> Optional[int]:
-        """Добавить нового сотрудника"""
+        """Добавить нового сотрудника (удаленный сотрудник с тем же ФИО восстанавливается)"""
         try:
-            return self.execute_query(
-                "INSERT INTO employees (full_name) VALUES (?)",
-                (full_name,)
-            )
+            with self.transaction() as conn:
+                cursor = conn.execute(
+                    "UPDATE employees SET active = 1 WHERE full_name = ? AND active = 0",
+                    (full_name,)
+                )
+                if cursor.rowcount:
+                    employee_id = conn.execute(
+                        "SELECT id FROM employees WHERE full_name = ?", (full_name,)
+                    ).fetchone()[0]
+                    logger.info(f"Восстановлен удаленный сотрудник {full_name} (ID: {employee_id})")
+                else:
+                    employee_id = conn.execute(
+                        "INSERT INTO employees (full_name) VALUES (?)", (full_name,)
+                    ).lastrowid
+                get_employee_directory(self.db_path).invalidate()
+            return employee_id
         except sqlite3.IntegrityError:
             logger.warning(f"Сотрудник {full_name} уже существует")
             return None
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении сотрудника: {e}")
+            return None
     
     def get_all(self) -> List[Dict]:
-        """Получить список всех сотрудников"""
+        """Получить список всех сотрудников (без удаленных)"""
         return self.execute_query("""
             SELECT id, full_name, fiber_balance, twisted_pair_balance, created_at 
             FROM employees 
+            WHERE active = 1
             ORDER BY full_name
         """, fetch_all=True) or []
     
+    def get_inventory(self) -> List[Dict]:
+        """
+        Получить сводку остатков всех сотрудников одним запросом
+        
+        Таблица employee_inventory поддерживается триггерами на employees
+        и employee_routers, поэтому списки сотрудников с материалами и
+        роутерами не требуют отдельного запроса на каждого сотрудника.
+        
+        Returns:
+            Список словарей (по ФИО): id, full_name, fiber_balance,
+            twisted_pair_balance, router_total и routers - модели роутеров
+            [{'router_name', 'quantity'}] в порядке названий
+        """
+        try:
+            rows = self.execute_query("""
+                SELECT employee_id AS id, full_name, fiber_balance, twisted_pair_balance,
+                       router_total, routers
+                FROM employee_inventory
+                ORDER BY full_name
+            """, fetch_all=True, read_only=True) or []
+        except Exception as e:
+            logger.error(f"Ошибка при получении сводки остатков: {e}")
+            return []
+        
+        for row in rows:
+            row['routers'] = json.loads(row['routers'])
+        return rows
+    
     def get_by_id(self, employee_id: int) -> Optional[Dict]:
-        """Получить сотрудника по ID"""
+        """Получить сотрудника по ID (без удаленных)"""
         return self.execute_query("""
             SELECT id, full_name, fiber_balance, twisted_pair_balance, created_at 
             FROM employees 
-            WHERE id = ?
+            WHERE id = ? AND active = 1
         """, (employee_id,), fetch_one=True)
     
     def delete(self, employee_id: int) -> bool:
-        """Удалить сотрудника и все связанные данные"""
+        """
+        Удалить сотрудника
+        
+        Удаление мягкое: сотрудник скрывается из списков (active = 0),
+        а его подключения и журнал движений материалов остаются для
+        истории - отчеты по напарникам не меняются.
+        """
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Сначала удаляем роутеры сотрудника (если CASCADE не настроен)
-            cursor.execute("DELETE FROM employee_routers WHERE employee_id = ?", (employee_id,))
-            deleted_routers = cursor.rowcount
-            
-            # Обнуляем балансы материалов (или можно оставить для истории)
-            cursor.execute("""
-                UPDATE employees 
-                SET fiber_balance = 0, twisted_pair_balance = 0 
-                WHERE id = ?
-            """, (employee_id,))
-            
-            # Удаляем сотрудника
-            cursor.execute("DELETE FROM employees WHERE id = ?", (employee_id,))
-            deleted_emp = cursor.rowcount > 0
-            
-            conn.commit()
-            conn.close()
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Удаляем роутеры сотрудника
+                cursor.execute("DELETE FROM employee_routers WHERE employee_id = ?", (employee_id,))
+                deleted_routers = cursor.rowcount
+                
+                # Обнуляем балансы материалов и скрываем сотрудника
+                cursor.execute("""
+                    UPDATE employees
+                    SET fiber_balance = 0, twisted_pair_balance = 0, active = 0
+                    WHERE id = ? AND active = 1
+                """, (employee_id,))
+                deleted_emp = cursor.rowcount > 0
             
             if deleted_emp:
+                get_employee_directory(self.db_path).invalidate()
+                get_router_catalog(self.db_path).invalidate()
                 logger.info(f"Удален сотрудник ID: {employee_id} и {deleted_routers} записей роутеров")
                 return True
             return False
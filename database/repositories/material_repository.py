@@ -1,11 +1,14 @@
 """
 Репозиторий для работы с материалами сотрудников
 """
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Tuple
 from datetime import datetime
 import logging
 
-from database.base_repository import BaseRepository
+from database.base_repository import BaseRepository, db_timestamp
+from database.daily_stats import day_conditions, day_range
+from database.ledger import MovementLedger
+from database.employee_directory import get_employee_directory
 
 logger = logging.getLogger(__name__)
 
@@ -18,47 +21,50 @@ class MaterialRepository(BaseRepository):
         employee_id: int, 
         fiber_meters: float = 0, 
         twisted_pair_meters: float = 0,
-        created_by: Optional[int] = None
+        created_by: Optional[int] = None,
+        ledger: Optional[MovementLedger] = None
     ) -> bool:
         """Добавить материалы на баланс сотрудника"""
+        own_ledger = ledger is None
+        if own_ledger:
+            ledger = MovementLedger()
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                UPDATE employees 
-                SET fiber_balance = fiber_balance + ?,
-                    twisted_pair_balance = twisted_pair_balance + ?
-                WHERE id = ?
-            """, (fiber_meters, twisted_pair_meters, employee_id))
-            
-            updated = cursor.rowcount > 0
-            
-            if updated:
-                # Получаем новый баланс
-                cursor.execute("""
-                    SELECT fiber_balance, twisted_pair_balance 
-                    FROM employees WHERE id = ?
-                """, (employee_id,))
-                row = cursor.fetchone()
-                new_fiber = row[0] if row else 0
-                new_twisted = row[1] if row else 0
+            with self.transaction() as conn:
+                cursor = conn.cursor()
                 
-                conn.commit()
-                conn.close()
+                cursor.execute("""
+                    UPDATE employees 
+                    SET fiber_balance = fiber_balance + ?,
+                        twisted_pair_balance = twisted_pair_balance + ?
+                    WHERE id = ?
+                """, (fiber_meters, twisted_pair_meters, employee_id))
                 
-                # Логируем операции
-                if fiber_meters > 0:
-                    self.log_movement(employee_id, 'add', 'fiber', 'ВОЛС', 
-                                    fiber_meters, new_fiber, None, created_by)
-                if twisted_pair_meters > 0:
-                    self.log_movement(employee_id, 'add', 'twisted_pair', 'Витая пара',
-                                    twisted_pair_meters, new_twisted, None, created_by)
+                updated = cursor.rowcount > 0
                 
+                if updated:
+                    # Получаем новый баланс
+                    cursor.execute("""
+                        SELECT fiber_balance, twisted_pair_balance 
+                        FROM employees WHERE id = ?
+                    """, (employee_id,))
+                    row = cursor.fetchone()
+                    new_fiber = row[0] if row else 0
+                    new_twisted = row[1] if row else 0
+                    
+                    # Логируем операции
+                    if fiber_meters > 0:
+                        ledger.record(employee_id, 'add', 'fiber', 'ВОЛС',
+                                      fiber_meters, new_fiber, None, created_by)
+                    if twisted_pair_meters > 0:
+                        ledger.record(employee_id, 'add', 'twisted_pair', 'Витая пара',
+                                      twisted_pair_meters, new_twisted, None, created_by)
+                    if own_ledger:
+                        ledger.flush(conn)
+            
+            if updated:
+                get_employee_directory(self.db_path).invalidate()
                 logger.info(f"Добавлено материалов сотруднику ID {employee_id}: "
                           f"ВОЛС +{fiber_meters}м, Витая пара +{twisted_pair_meters}м")
-            else:
-                conn.close()
             
             return updated
         except Exception as e:
@@ -71,69 +77,69 @@ class MaterialRepository(BaseRepository):
         fiber_meters: float = 0,
         twisted_pair_meters: float = 0,
         connection_id: Optional[int] = None,
-        created_by: Optional[int] = None
+        created_by: Optional[int] = None,
+        ledger: Optional[MovementLedger] = None
     ) -> bool:
         """Списать материалы с баланса сотрудника"""
+        own_ledger = ledger is None
+        if own_ledger:
+            ledger = MovementLedger()
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Проверяем текущий баланс
-            cursor.execute("""
-                SELECT fiber_balance, twisted_pair_balance 
-                FROM employees 
-                WHERE id = ?
-            """, (employee_id,))
-            row = cursor.fetchone()
-            
-            if not row:
-                logger.warning(f"Сотрудник ID {employee_id} не найден")
-                conn.close()
-                return False
-            
-            current_fiber = row[0] or 0
-            current_twisted = row[1] or 0
-            
-            # Проверяем достаточность средств
-            if current_fiber < fiber_meters:
-                logger.warning(f"Недостаточно ВОЛС у сотрудника ID {employee_id}")
-                conn.close()
-                return False
-            
-            if current_twisted < twisted_pair_meters:
-                logger.warning(f"Недостаточно витой пары у сотрудника ID {employee_id}")
-                conn.close()
-                return False
-            
-            # Списываем материалы
-            cursor.execute("""
-                UPDATE employees 
-                SET fiber_balance = fiber_balance - ?,
-                    twisted_pair_balance = twisted_pair_balance - ?
-                WHERE id = ?
-            """, (fiber_meters, twisted_pair_meters, employee_id))
-            
-            updated = cursor.rowcount > 0
-            
-            if updated:
-                new_fiber = current_fiber - fiber_meters
-                new_twisted = current_twisted - twisted_pair_meters
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Проверяем текущий баланс
+                cursor.execute("""
+                    SELECT fiber_balance, twisted_pair_balance 
+                    FROM employees 
+                    WHERE id = ?
+                """, (employee_id,))
+                row = cursor.fetchone()
+                
+                if not row:
+                    logger.warning(f"Сотрудник ID {employee_id} не найден")
+                    return False
+                
+                current_fiber = row[0] or 0
+                current_twisted = row[1] or 0
                 
-                conn.commit()
-                conn.close()
+                # Проверяем достаточность средств
+                if current_fiber < fiber_meters:
+                    logger.warning(f"Недостаточно ВОЛС у сотрудника ID {employee_id}")
+                    return False
+                
+                if current_twisted < twisted_pair_meters:
+                    logger.warning(f"Недостаточно витой пары у сотрудника ID {employee_id}")
+                    return False
+                
+                # Списываем материалы
+                cursor.execute("""
+                    UPDATE employees 
+                    SET fiber_balance = fiber_balance - ?,
+                        twisted_pair_balance = twisted_pair_balance - ?
+                    WHERE id = ?
+                """, (fiber_meters, twisted_pair_meters, employee_id))
                 
-                # Логируем операции
-                if fiber_meters > 0:
-                    self.log_movement(employee_id, 'deduct', 'fiber', 'ВОЛС',
-                                    fiber_meters, new_fiber, connection_id, created_by)
-                if twisted_pair_meters > 0:
-                    self.log_movement(employee_id, 'deduct', 'twisted_pair', 'Витая пара',
-                                    twisted_pair_meters, new_twisted, connection_id, created_by)
+                updated = cursor.rowcount > 0
                 
+                if updated:
+                    new_fiber = current_fiber - fiber_meters
+                    new_twisted = current_twisted - twisted_pair_meters
+                    
+                    # Логируем операции
+                    if fiber_meters > 0:
+                        ledger.record(employee_id, 'deduct', 'fiber', 'ВОЛС',
+                                      fiber_meters, new_fiber, connection_id, created_by)
+                    if twisted_pair_meters > 0:
+                        ledger.record(employee_id, 'deduct', 'twisted_pair', 'Витая пара',
+                                      twisted_pair_meters, new_twisted, connection_id, created_by)
+                    if own_ledger:
+                        ledger.flush(conn)
+            
+            if updated:
+                get_employee_directory(self.db_path).invalidate()
                 logger.info(f"Списано материалов у сотрудника ID {employee_id}: "
                           f"ВОЛС -{fiber_meters}м, Витая пара -{twisted_pair_meters}м")
-            else:
-                conn.close()
             
             return updated
         except Exception as e:
@@ -151,46 +157,111 @@ class MaterialRepository(BaseRepository):
         connection_id: Optional[int] = None,
         created_by: Optional[int] = None
     ) -> bool:
-        """Записать движение материала в лог"""
+        """Записать одно движение материала в лог (несколько движений - через MovementLedger)"""
         try:
-            self.execute_query("""
-                INSERT INTO material_movement_log 
-                (employee_id, operation_type, item_type, item_name, quantity, 
-                 balance_after, connection_id, created_by)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (employee_id, operation_type, item_type, item_name, quantity,
-                  balance_after, connection_id, created_by))
-            
-            logger.info(f"Logged movement: {operation_type} {quantity} {item_type} for employee {employee_id}")
+            ledger = MovementLedger()
+            ledger.record(employee_id, operation_type, item_type, item_name, quantity,
+                          balance_after, connection_id, created_by)
+            with self.transaction() as conn:
+                ledger.flush(conn)
             return True
         except Exception as e:
             logger.error(f"Ошибка при логировании движения: {e}")
             return False
     
+    _MOVEMENTS_COLUMNS = """
+            operation_type,
+            item_type,
+            item_name,
+            quantity,
+            balance_after,
+            connection_id,
+            created_at
+    """
+    
+    @staticmethod
+    def _movements_filter(
+        employee_id: int,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime]
+    ) -> Tuple[str, List]:
+        """Условие выборки движений сотрудника за полуоткрытый период [start_date, end_date)"""
+        conditions = ["employee_id = ?"]
+        params: List = [employee_id]
+        if start_date is not None:
+            conditions.append("created_at >= ?")
+            params.append(db_timestamp(start_date))
+        if end_date is not None:
+            conditions.append("created_at < ?")
+            params.append(db_timestamp(end_date))
+        return " AND ".join(conditions), params
+    
+    def _movements_query(
+        self,
+        employee_id: int,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime]
+    ) -> Tuple[str, List]:
+        """Запрос движений сотрудника за период (по индексу employee_id, created_at)"""
+        where, params = self._movements_filter(employee_id, start_date, end_date)
+        query = f"""
+            SELECT {self._MOVEMENTS_COLUMNS}
+            FROM material_movement_log
+            WHERE {where}
+            ORDER BY created_at
+        """
+        return query, params
+    
     def get_movements(
         self,
         employee_id: int,
-        start_date: datetime,
-        end_date: datetime
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
     ) -> List[Dict]:
         """Получить все движения материалов сотрудника за период"""
         try:
-            return self.execute_query("""
-                SELECT 
-                    operation_type,
-                    item_type,
-                    item_name,
-                    quantity,
-                    balance_after,
-                    connection_id,
-                    created_at
-                FROM material_movement_log
-                WHERE employee_id = ? 
-                  AND created_at >= ? 
-                  AND created_at <= ?
-                ORDER BY created_at
-            """, (employee_id, start_date, end_date), fetch_all=True) or []
+            query, params = self._movements_query(employee_id, start_date, end_date)
+            return self.execute_query(query, tuple(params), fetch_all=True, read_only=True) or []
         except Exception as e:
             logger.error(f"Ошибка при получении движений: {e}")
             return []
+    
+    def iter_movements(
+        self,
+        employee_id: int,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Iterator[Dict]:
+        """Потоково получить движения материалов сотрудника за период (из курсора)"""
+        query, params = self._movements_query(employee_id, start_date, end_date)
+        with self.read_connection() as conn:
+            cursor = conn.execute(query, params)
+            try:
+                for row in cursor:
+                    yield dict(row)
+            finally:
+                cursor.close()
+    
+    def count_movements(
+        self,
+        employee_id: int,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> int:
+        """Получить количество движений сотрудника за период (за целые дни - по дневным сводкам)"""
+        try:
+            days = day_range(start_date, end_date)
+            if days:
+                conditions, params = day_conditions(*days)
+                where = " AND ".join(["employee_id = ?", *conditions])
+                params = [employee_id, *params]
+                query = f"SELECT COALESCE(SUM(movements), 0) as count FROM employee_daily_materials WHERE {where}"
+            else:
+                where, params = self._movements_filter(employee_id, start_date, end_date)
+                query = f"SELECT COUNT(*) as count FROM material_movement_log WHERE {where}"
+            result = self.execute_query(query, tuple(params), fetch_one=True, read_only=True)
+            return result['count'] if result else 0
+        except Exception as e:
+            logger.error(f"Ошибка при подсчете движений: {e}")
+            return 0
 
@@ -0,0 +1,99 @@
+"""
+Репозиторий очереди исходящих сообщений Telegram
+"""
+import json
+from typing import Dict, List, Optional, Union
+import logging
+
+from database.base_repository import BaseRepository
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRepository(BaseRepository):
+    """
+    Очередь исходящих сообщений (outbox)
+    
+    Сообщение - вызов метода Bot API (send_media_group, send_message,
+    copy_messages) с параметрами в JSON. Сообщения одного чата
+    отправляются строго по порядку: к отправке готово только первое
+    неотправленное сообщение чата ("голова" его очереди).
+    """
+    
+    def enqueue(
+        self,
+        chat_id: Union[int, str],
+        method: str,
+        payload: Dict,
+        cost: int,
+        title: Optional[str],
+        now: float
+    ) -> Optional[int]:
+        """Поставить сообщение в очередь, вернуть его ID"""
+        return self.execute_query("""
+            INSERT INTO outbox (chat_id, method, payload, cost, title, created_at, next_attempt_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (str(chat_id), method, json.dumps(payload, ensure_ascii=False), cost, title, now, now))
+    
+    def get_heads(self, limit: int) -> List[Dict]:
+        """Получить первые неотправленные сообщения каждого чата (по времени следующей попытки)"""
+        rows = self.execute_query("""
+            SELECT id, chat_id, method, payload, cost, title, attempts, created_at, next_attempt_at
+            FROM outbox
+            WHERE id IN (SELECT MIN(id) FROM outbox WHERE status = 'pending' GROUP BY chat_id)
+            ORDER BY next_attempt_at, id
+            LIMIT ?
+        """, (limit,), read_only=True) or []
+        for row in rows:
+            row['payload'] = json.loads(row['payload'])
+        return rows
+    
+    def get_backlog(self) -> Dict:
+        """Получить количество неотправленных сообщений и время создания самого старого"""
+        return self.execute_query("""
+            SELECT COUNT(*) as pending, MIN(created_at) as oldest_created_at
+            FROM outbox
+            WHERE status = 'pending'
+        """, fetch_one=True, read_only=True) or {'pending': 0, 'oldest_created_at': None}
+    
+    def _update(self, message_id: int, assignments: str, params: tuple) -> bool:
+        """Обновить неотправленное сообщение"""
+        try:
+            with self.transaction() as conn:
+                cursor = conn.execute(
+                    f"UPDATE outbox SET {assignments} WHERE id = ? AND status = 'pending'",
+                    (*params, message_id)
+                )
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении сообщения очереди {message_id}: {e}")
+            return False
+    
+    def mark_sent(self, message_id: int, now: float) -> bool:
+        """Отметить сообщение отправленным"""
+        return self._update(message_id, "status = 'sent', sent_at = ?, attempts = attempts + 1", (now,))
+    
+    def reschedule(self, message_id: int, next_attempt_at: float, error: str, attempts: int) -> bool:
+        """Отложить сообщение до следующей попытки"""
+        return self._update(message_id, "next_attempt_at = ?, last_error = ?, attempts = ?",
+                            (next_attempt_at, error, attempts))
+    
+    def replace_request(self, message_id: int, method: str, payload: Dict, cost: int, now: float) -> bool:
+        """Заменить вызов Bot API сообщения (например, копирование - отправкой заново)"""
+        return self._update(message_id, "method = ?, payload = ?, cost = ?, next_attempt_at = ?",
+                            (method, json.dumps(payload, ensure_ascii=False), cost, now))
+    
+    def mark_failed(self, message_id: int, error: str, attempts: int) -> bool:
+        """Отметить сообщение неотправляемым (ошибка, которую не исправит повтор)"""
+        return self._update(message_id, "status = 'failed', last_error = ?, attempts = ?", (error, attempts))
+    
+    def prune(self, sent_before: float) -> int:
+        """Удалить отправленные сообщения старше sent_before, вернуть их количество"""
+        try:
+            with self.transaction() as conn:
+                return conn.execute(
+                    "DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?", (sent_before,)
+                ).rowcount
+        except Exception as e:
+            logger.error(f"Ошибка при очистке очереди сообщений: {e}")
+            return 0
@@ -5,6 +5,8 @@ from typing import List, Dict, Optional
 import logging
 
 from database.base_repository import BaseRepository
+from database.ledger import MovementLedger
+from database.router_catalog import get_router_catalog
 
 logger = logging.getLogger(__name__)
 
@@ -17,46 +19,48 @@ class RouterRepository(BaseRepository):
         employee_id: int,
         router_name: str,
         quantity: int,
-        created_by: Optional[int] = None
+        created_by: Optional[int] = None,
+        ledger: Optional[MovementLedger] = None
     ) -> bool:
         """Добавить роутеры сотруднику"""
+        own_ledger = ledger is None
+        if own_ledger:
+            ledger = MovementLedger()
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Проверяем, есть ли уже такой роутер у сотрудника
-            cursor.execute("""
-                SELECT id, quantity FROM employee_routers 
-                WHERE employee_id = ? AND router_name = ?
-            """, (employee_id, router_name))
-            existing = cursor.fetchone()
-            
-            if existing:
-                # Обновляем количество
-                new_quantity = existing[1] + quantity
-                cursor.execute("""
-                    UPDATE employee_routers 
-                    SET quantity = ? 
-                    WHERE id = ?
-                """, (new_quantity, existing[0]))
-                logger.info(f"Обновлено количество роутеров '{router_name}' у сотрудника ID {employee_id}: +{quantity} (всего: {new_quantity})")
-            else:
-                # Добавляем новую запись
-                new_quantity = quantity
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Проверяем, есть ли уже такой роутер у сотрудника
                 cursor.execute("""
-                    INSERT INTO employee_routers (employee_id, router_name, quantity)
-                    VALUES (?, ?, ?)
-                """, (employee_id, router_name, quantity))
-                logger.info(f"Добавлены роутеры '{router_name}' сотруднику ID {employee_id}: {quantity} шт.")
-            
-            conn.commit()
-            conn.close()
-            
-            # Логируем операцию через MaterialRepository
-            from database.repositories.material_repository import MaterialRepository
-            material_repo = MaterialRepository(self.db_path)
-            material_repo.log_movement(employee_id, 'add', 'router', router_name,
-                                      quantity, new_quantity, None, created_by)
+                    SELECT id, quantity FROM employee_routers 
+                    WHERE employee_id = ? AND router_name = ?
+                """, (employee_id, router_name))
+                existing = cursor.fetchone()
+                
+                if existing:
+                    # Обновляем количество
+                    new_quantity = existing[1] + quantity
+                    cursor.execute("""
+                        UPDATE employee_routers 
+                        SET quantity = ? 
+                        WHERE id = ?
+                    """, (new_quantity, existing[0]))
+                    logger.info(f"Обновлено количество роутеров '{router_name}' у сотрудника ID {employee_id}: +{quantity} (всего: {new_quantity})")
+                else:
+                    # Добавляем новую запись
+                    new_quantity = quantity
+                    cursor.execute("""
+                        INSERT INTO employee_routers (employee_id, router_name, quantity)
+                        VALUES (?, ?, ?)
+                    """, (employee_id, router_name, quantity))
+                    logger.info(f"Добавлены роутеры '{router_name}' сотруднику ID {employee_id}: {quantity} шт.")
+                
+                # Логируем операцию
+                ledger.record(employee_id, 'add', 'router', router_name,
+                              quantity, new_quantity, None, created_by)
+                if own_ledger:
+                    ledger.flush(conn)
+                get_router_catalog(self.db_path).invalidate()
             
             return True
         except Exception as e:
@@ -69,54 +73,54 @@ class RouterRepository(BaseRepository):
         router_name: str,
         quantity: int = 1,
         connection_id: Optional[int] = None,
-        created_by: Optional[int] = None
+        created_by: Optional[int] = None,
+        ledger: Optional[MovementLedger] = None
     ) -> bool:
         """Списать роутер у сотрудника"""
+        own_ledger = ledger is None
+        if own_ledger:
+            ledger = MovementLedger()
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Проверяем текущее количество
-            cursor.execute("""
-                SELECT id, quantity FROM employee_routers 
-                WHERE employee_id = ? AND router_name = ?
-            """, (employee_id, router_name))
-            existing = cursor.fetchone()
-            
-            if not existing:
-                logger.warning(f"Роутер '{router_name}' не найден у сотрудника ID {employee_id}")
-                conn.close()
-                return False
-            
-            current_quantity = existing[1]
-            if current_quantity < quantity:
-                logger.warning(f"Недостаточно роутеров '{router_name}' у сотрудника ID {employee_id}")
-                conn.close()
-                return False
-            
-            new_quantity = current_quantity - quantity
-            
-            if new_quantity == 0:
-                # Удаляем запись
-                cursor.execute("DELETE FROM employee_routers WHERE id = ?", (existing[0],))
-                logger.info(f"Списаны все роутеры '{router_name}' у сотрудника ID {employee_id}")
-            else:
-                # Обновляем количество
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Проверяем текущее количество
                 cursor.execute("""
-                    UPDATE employee_routers 
-                    SET quantity = ? 
-                    WHERE id = ?
-                """, (new_quantity, existing[0]))
-                logger.info(f"Списан роутер '{router_name}' у сотрудника ID {employee_id}: -{quantity} (осталось: {new_quantity})")
-            
-            conn.commit()
-            conn.close()
-            
-            # Логируем операцию
-            from database.repositories.material_repository import MaterialRepository
-            material_repo = MaterialRepository(self.db_path)
-            material_repo.log_movement(employee_id, 'deduct', 'router', router_name,
-                                      quantity, new_quantity, connection_id, created_by)
+                    SELECT id, quantity FROM employee_routers 
+                    WHERE employee_id = ? AND router_name = ?
+                """, (employee_id, router_name))
+                existing = cursor.fetchone()
+                
+                if not existing:
+                    logger.warning(f"Роутер '{router_name}' не найден у сотрудника ID {employee_id}")
+                    return False
+                
+                current_quantity = existing[1]
+                if current_quantity < quantity:
+                    logger.warning(f"Недостаточно роутеров '{router_name}' у сотрудника ID {employee_id}")
+                    return False
+                
+                new_quantity = current_quantity - quantity
+                
+                if new_quantity == 0:
+                    # Удаляем запись
+                    cursor.execute("DELETE FROM employee_routers WHERE id = ?", (existing[0],))
+                    logger.info(f"Списаны все роутеры '{router_name}' у сотрудника ID {employee_id}")
+                else:
+                    # Обновляем количество
+                    cursor.execute("""
+                        UPDATE employee_routers 
+                        SET quantity = ? 
+                        WHERE id = ?
+                    """, (new_quantity, existing[0]))
+                    logger.info(f"Списан роутер '{router_name}' у сотрудника ID {employee_id}: -{quantity} (осталось: {new_quantity})")
+                
+                # Логируем операцию
+                ledger.record(employee_id, 'deduct', 'router', router_name,
+                              quantity, new_quantity, connection_id, created_by)
+                if own_ledger:
+                    ledger.flush(conn)
+                get_router_catalog(self.db_path).invalidate()
             
             return True
         except Exception as e:
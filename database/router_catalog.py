@@ -0,0 +1,75 @@
+"""
+Кэш каталога роутеров
+Модели в наличии и роутеры сотрудников читаются из БД один раз и сбрасываются после фиксации изменений
+"""
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from database.connection_pool import get_pool
+from database.versioned_cache import VersionedCache
+
+
+class RouterCatalog(VersionedCache):
+    """
+    Каталог роутеров в памяти процесса
+    
+    Хранит список моделей, которые есть в наличии хотя бы у одного
+    сотрудника (шаг выбора роутера в мастере подключения), и роутеры
+    каждого сотрудника. Сбрасывается из RouterRepository.add_router,
+    deduct_router и при удалении сотрудника.
+    
+    Возвращаются копии записей, изменять их можно без вреда для кэша.
+    """
+    
+    title = "каталога роутеров"
+    
+    def _load(self, conn: sqlite3.Connection) -> Tuple[List[str], Dict[int, List[Dict]]]:
+        """Прочитать все роутеры сотрудников: модели в наличии и роутеры по сотрудникам"""
+        rows = conn.execute("""
+            SELECT id, employee_id, router_name, quantity, created_at
+            FROM employee_routers
+            ORDER BY employee_id, router_name
+        """).fetchall()
+        
+        by_employee: Dict[int, List[Dict]] = {}
+        names = set()
+        for row in rows:
+            router = dict(row)
+            employee_id = router.pop('employee_id')
+            by_employee.setdefault(employee_id, []).append(router)
+            if router['quantity'] > 0:
+                names.add(router['router_name'])
+        return sorted(names), by_employee
+    
+    def _sizes(self, snapshot: Optional[Tuple[List[str], Dict[int, List[Dict]]]]) -> Dict:
+        if snapshot is None:
+            return {'size': 0, 'models': 0}
+        names, by_employee = snapshot
+        return {'size': len(by_employee), 'models': len(names)}
+    
+    def get_names(self) -> List[str]:
+        """Получить модели роутеров, которые есть в наличии"""
+        snapshot = self._current()
+        return list(snapshot[0]) if snapshot is not None else []
+    
+    def get_routers(self, employee_id: int) -> List[Dict]:
+        """Получить роутеры сотрудника (по названию)"""
+        snapshot = self._current()
+        if snapshot is None:
+            return []
+        return [dict(router) for router in snapshot[1].get(employee_id, [])]
+    
+    def get_quantity(self, employee_id: int, router_name: str) -> int:
+        """Получить количество конкретного роутера у сотрудника"""
+        snapshot = self._current()
+        if snapshot is None:
+            return 0
+        for router in snapshot[1].get(employee_id, []):
+            if router['router_name'] == router_name:
+                return router['quantity']
+        return 0
+
+
+def get_router_catalog(db_path: str) -> RouterCatalog:
+    """Получить общий для процесса каталог роутеров БД"""
+    return get_pool(db_path).get_cache('router_catalog', lambda: RouterCatalog(db_path))
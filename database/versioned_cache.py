@@ -0,0 +1,110 @@
+"""
+Базовый кэш данных БД в памяти процесса
+Снимок читается из БД один раз и сбрасывается после фиксации изменений
+"""
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+import logging
+
+from database.connection_pool import get_pool, get_read_pool
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedCache:
+    """
+    Кэш снимка данных БД с версией
+    
+    Подкласс читает снимок в _load() и строит по нему свои представления;
+    хранение снимка, сброс и статистика общие. Репозитории вызывают
+    invalidate() при изменении данных; сброс происходит после фиксации
+    транзакции, поэтому другие потоки не могут закэшировать
+    незафиксированные или уже устаревшие данные. Снимок, прочитанный
+    во время сброса (версия изменилась), не кэшируется, а поток внутри
+    транзакции на запись читает данные мимо кэша.
+    """
+    
+    # Название для сообщений об ошибках ("справочника сотрудников")
+    title = "кэша"
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.pool = get_pool(db_path)
+        self.read_pool = get_read_pool(db_path)
+        
+        self._lock = threading.Lock()
+        self._cached: Optional[Any] = None
+        self.version = 0
+        
+        # Счетчики
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    def _load(self, conn: sqlite3.Connection) -> Any:
+        """Прочитать снимок из БД (реализуется подклассом)"""
+        raise NotImplementedError
+    
+    def _sizes(self, snapshot: Optional[Any]) -> Dict:
+        """Размеры снимка для статистики (None - снимок не загружен)"""
+        return {'size': len(snapshot) if snapshot is not None else 0}
+    
+    def _read(self) -> Any:
+        """Прочитать снимок из БД"""
+        # Внутри транзакции на запись читаем через нее, чтобы видеть свои изменения
+        pool = self.pool if self.pool.in_use() else self.read_pool
+        with pool.connection() as conn:
+            return self._load(conn)
+    
+    def _snapshot(self) -> Any:
+        """Получить актуальный снимок (из кэша или БД)"""
+        if self.pool.in_use():
+            # Незафиксированные изменения текущего потока в кэш не попадают
+            return self._read()
+        
+        with self._lock:
+            if self._cached is not None:
+                self.hits += 1
+                return self._cached
+            self.misses += 1
+            version = self.version
+        
+        snapshot = self._read()
+        
+        with self._lock:
+            # Пока читали, данные могли измениться - тогда не кэшируем
+            if self.version == version:
+                self._cached = snapshot
+        return snapshot
+    
+    def _current(self) -> Optional[Any]:
+        """Получить снимок или None, если его не удалось загрузить"""
+        try:
+            return self._snapshot()
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке {self.title}: {e}")
+            return None
+    
+    def invalidate(self) -> None:
+        """Сбросить кэш после фиксации текущей транзакции"""
+        self.pool.call_after_commit(self._reset)
+    
+    def _reset(self) -> None:
+        with self._lock:
+            self._cached = None
+            self.version += 1
+            self.invalidations += 1
+    
+    def stats(self) -> Dict:
+        """Получить статистику кэша"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                **self._sizes(self._cached),
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations,
+            }
@@ -5,10 +5,9 @@ from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 
-from config import CONFIRM, CONNECTION_TYPES, logger
+from config import CONFIRM, CONNECTION_TYPES
 from utils.keyboards import get_main_keyboard
-from utils.helpers import send_connection_report
-from database import Database
+from utils.helpers import send_connection_report, get_db, get_outbox
 
 
 async def show_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
@@ -20,7 +19,7 @@ async def show_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE,
     selected_employees = context.user_data.get('selected_employees', [])
     
     # Получаем имена выбранных сотрудников
-    employees = db.get_all_employees()
+    employees = await db.aget_all_employees()
     employee_names = [emp['full_name'] for emp in employees if emp['id'] in selected_employees]
     
     # Получаем читаемое название типа подключения
@@ -38,12 +37,12 @@ async def show_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE,
     
     payer_info = ""
     if material_payer_id:
-        payer = db.get_employee_by_id(material_payer_id)
+        payer = await db.aget_employee_by_id(material_payer_id)
         if payer:
             payer_info += f"\n\n💰 <b>Материалы списываются с:</b> {payer['full_name']}"
     
     if router_payer_id:
-        router_payer = db.get_employee_by_id(router_payer_id)
+        router_payer = await db.aget_employee_by_id(router_payer_id)
         if router_payer:
             router_quantity = data.get('router_quantity', 1)
             quantity_text = f" ({router_quantity} шт.)" if router_quantity > 1 else ""
@@ -137,7 +136,7 @@ async def confirm_connection(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return ConversationHandler.END
     
     # Сохраняем в БД
-    db = Database()
+    db = get_db(context)
     data = context.user_data['connection_data']
     photos = context.user_data.get('photos', [])
     selected_employees = context.user_data.get('selected_employees', [])
@@ -150,7 +149,7 @@ async def confirm_connection(update: Update, context: ContextTypes.DEFAULT_TYPE)
     router_access = data.get('router_access', False)
     telegram_bot_connected = data.get('telegram_bot_connected', False)
     
-    connection_id = db.create_connection(
+    connection_id = await db.acreate_connection(
         connection_type=data.get('connection_type', 'mkd'),
         address=data['address'],
         router_model=data['router_model'],
@@ -164,25 +163,11 @@ async def confirm_connection(update: Update, context: ContextTypes.DEFAULT_TYPE)
         router_quantity=router_quantity,
         contract_signed=contract_signed,
         router_access=router_access,
-        telegram_bot_connected=telegram_bot_connected
+        telegram_bot_connected=telegram_bot_connected,
+        router_payer_id=router_payer_id
     )
     
     if connection_id:
-        # Списываем роутер, если указан плательщик и роутер не пропущен
-        router_model = data.get('router_model', '-')
-        if router_payer_id and router_model != '-' and router_model:
-            success = db.deduct_router_from_employee(
-                router_payer_id, 
-                router_model, 
-                router_quantity,
-                connection_id=connection_id,
-                created_by=user_id
-            )
-            if success:
-                logger.info(f"Роутер '{router_model}' x{router_quantity} списан с сотрудника ID {router_payer_id}")
-            else:
-                logger.warning(f"Не удалось списать роутер '{router_model}' x{router_quantity} с сотрудника ID {router_payer_id}")
-        
         # Отправляем подтверждение
         await query.edit_message_text(
             f"✅ <b>Отчет успешно создан!</b>\n\n"
@@ -192,7 +177,8 @@ async def confirm_connection(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         
         # Отправляем отчет с фотографиями
-        await send_connection_report(query.message, connection_id, data, photos, selected_employees, db)
+        await send_connection_report(query.message, connection_id, data, photos, selected_employees, db,
+                                     get_outbox(context))
         
         await query.message.reply_text(
             "Выберите следующее действие:",
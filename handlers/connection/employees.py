@@ -1,11 +1,12 @@
 """
 Обработчики выбора исполнителей для подключения
 """
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import ContextTypes
 
 from config import SELECT_EMPLOYEES, logger
-from database import Database
+from utils.helpers import get_db
+from utils.keyboards import get_employee_checkbox_keyboard
 
 
 async def select_employee_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -21,7 +22,7 @@ async def select_employee_toggle(update: Update, context: ContextTypes.DEFAULT_T
             return SELECT_EMPLOYEES
         
         # Проверяем балансы и определяем, кто будет платить за материалы
-        db = Database()
+        db = get_db(context)
         from handlers.connection.validation import check_materials_and_proceed
         return await check_materials_and_proceed(update, context, db)
     
@@ -37,21 +38,10 @@ async def select_employee_toggle(update: Update, context: ContextTypes.DEFAULT_T
     context.user_data['selected_employees'] = selected
     
     # Обновляем клавиатуру
-    db = Database()
-    employees = db.get_all_employees()
-    keyboard = []
-    
-    for emp in employees:
-        is_selected = emp['id'] in selected
-        checkbox = "☑" if is_selected else "☐"
-        keyboard.append([InlineKeyboardButton(
-            f"{checkbox} {emp['full_name']}", 
-            callback_data=f"emp_{emp['id']}"
-        )])
-    
-    keyboard.append([InlineKeyboardButton("✅ Готово", callback_data='employees_done')])
-    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data='cancel_connection')])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    db = get_db(context)
+    version = db.get_data_version()
+    employees = await db.aget_all_employees()
+    reply_markup = get_employee_checkbox_keyboard(employees, selected, version)
     
     try:
         await query.edit_message_reply_markup(reply_markup=reply_markup)
@@ -9,10 +9,10 @@ from config import (
     ENTER_ROUTER_QUANTITY_CONNECTION, ROUTER_ACCESS, ENTER_PORT, ENTER_FIBER, 
     ENTER_TWISTED, CONTRACT_SIGNED, TELEGRAM_BOT_CONFIRM, SELECT_EMPLOYEES, CONNECTION_TYPES
 )
-from utils.keyboards import get_main_keyboard
+from utils.keyboards import get_main_keyboard, get_router_model_keyboard
 from handlers.connection.constants import MAX_PHOTOS, PHOTO_REQUIREMENTS
 from handlers.connection.cancellation import cancel_connection
-from database import Database
+from utils.helpers import get_db
 
 
 async def new_connection_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -196,23 +196,12 @@ async def enter_address(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     context.user_data['connection_data']['address'] = address
     
     # Получаем список роутеров из БД
-    db = Database()
-    router_names = db.get_all_router_names()
+    db = get_db(context)
+    version = db.get_data_version()
+    router_names = await db.aget_all_router_names()
     
-    # Создаём клавиатуру с роутерами
-    keyboard = []
-    
-    if router_names:
-        for router_name in router_names:
-            keyboard.append([InlineKeyboardButton(
-                f"📡 {router_name}",
-                callback_data=f"select_router_{router_name}"
-            )])
-    
-    # Добавляем кнопку "Пропустить"
-    keyboard.append([InlineKeyboardButton("⏭️ Пропустить", callback_data='router_skip')])
-    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data='cancel_connection')])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Клавиатура с роутерами и кнопкой "Пропустить"
+    reply_markup = get_router_model_keyboard(router_names, version)
     
     # Убираем клавиатуру отмены и показываем inline-клавиатуру
     if router_names:
@@ -595,8 +584,9 @@ async def telegram_bot_confirm(update: Update, context: ContextTypes.DEFAULT_TYP
         status_text = "⏭️ Пропущено"
     
     # Получаем список сотрудников
-    db = Database()
-    employees = db.get_all_employees()
+    db = get_db(context)
+    version = db.get_data_version()
+    employees = await db.aget_all_employees()
     
     if not employees:
         await query.edit_message_text(
@@ -612,17 +602,7 @@ async def telegram_bot_confirm(update: Update, context: ContextTypes.DEFAULT_TYP
     
     # Создаем клавиатуру для выбора сотрудников
     context.user_data['selected_employees'] = []
-    keyboard = []
-    
-    for emp in employees:
-        keyboard.append([InlineKeyboardButton(
-            f"☐ {emp['full_name']}", 
-            callback_data=f"emp_{emp['id']}"
-        )])
-    
-    keyboard.append([InlineKeyboardButton("✅ Готово", callback_data='employees_done')])
-    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data='cancel_connection')])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = get_employee_checkbox_keyboard(employees, [], version)
     
     await query.edit_message_text(
         f"{status_text}\n\n"
@@ -6,7 +6,7 @@ from telegram.ext import ContextTypes, ConversationHandler
 
 from config import SELECT_MATERIAL_PAYER, SELECT_ROUTER_PAYER
 from utils.keyboards import get_main_keyboard
-from database import Database
+from utils.helpers import get_db
 
 
 async def check_materials_and_proceed(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
@@ -21,7 +21,7 @@ async def check_materials_and_proceed(update: Update, context: ContextTypes.DEFA
     # Получаем балансы всех выбранных сотрудников
     employees_with_balance = []
     for emp_id in selected_employees:
-        emp = db.get_employee_by_id(emp_id)
+        emp = await db.aget_employee_by_id(emp_id)
         if emp:
             fiber_balance = emp.get('fiber_balance', 0) or 0
             twisted_balance = emp.get('twisted_pair_balance', 0) or 0
@@ -101,7 +101,7 @@ async def select_material_payer(update: Update, context: ContextTypes.DEFAULT_TY
     payer_id = int(query.data.split('_')[1])
     context.user_data['material_payer_id'] = payer_id
     
-    db = Database()
+    db = get_db(context)
     # Переходим к проверке роутеров
     return await check_routers_and_proceed(update, context, db)
 
@@ -123,9 +123,9 @@ async def check_routers_and_proceed(update: Update, context: ContextTypes.DEFAUL
     # Получаем информацию о роутерах у сотрудников
     employees_with_router = []
     for emp_id in selected_employees:
-        emp = db.get_employee_by_id(emp_id)
+        emp = await db.aget_employee_by_id(emp_id)
         if emp:
-            router_quantity = db.get_router_quantity(emp_id, router_model)
+            router_quantity = await db.aget_router_quantity(emp_id, router_model)
             has_enough = router_quantity >= required_quantity
             employees_with_router.append({
                 'id': emp_id,
@@ -199,7 +199,7 @@ async def select_router_payer(update: Update, context: ContextTypes.DEFAULT_TYPE
     payer_id = int(query.data.split('_')[-1])
     context.user_data['router_payer_id'] = payer_id
     
-    db = Database()
+    db = get_db(context)
     from handlers.connection.confirmation import show_confirmation
     return await show_confirmation(update, context, db)
 
@@ -11,7 +11,13 @@ from config import (
     SELECT_EMPLOYEE_FOR_ROUTER, SELECT_ROUTER_ACTION,
     ENTER_ROUTER_NAME, ENTER_ROUTER_QUANTITY
 )
-from utils.keyboards import get_main_keyboard
+from utils.keyboards import (
+    get_main_keyboard,
+    get_delete_employee_keyboard,
+    get_material_employee_keyboard,
+    get_router_employee_keyboard
+)
+from utils.helpers import get_db
 
 
 async def manage_employees_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -48,8 +54,9 @@ async def manage_employees_start(update: Update, context: ContextTypes.DEFAULT_T
     return MANAGE_ACTION
 
 
-async def manage_action(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
+async def manage_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обработка выбора действия"""
+    db = get_db(context)
     query = update.callback_query
     await query.answer()
     
@@ -85,22 +92,15 @@ async def manage_action(update: Update, context: ContextTypes.DEFAULT_TYPE, db)
         return ADD_EMPLOYEE_NAME
     
     if query.data == 'manage_delete':
-        employees = db.get_all_employees()
+        version = db.get_data_version()
+        employees = await db.aget_all_employees()
         
         if not employees:
             await query.edit_message_text("⚠️ В системе нет сотрудников для удаления.")
             await query.message.reply_text("Выберите действие:", reply_markup=get_main_keyboard())
             return ConversationHandler.END
         
-        keyboard = []
-        for emp in employees:
-            keyboard.append([InlineKeyboardButton(
-                f"🗑 {emp['full_name']}", 
-                callback_data=f"del_emp_{emp['id']}"
-            )])
-        
-        keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data='delete_cancel')])
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = get_delete_employee_keyboard(employees, version)
         
         await query.edit_message_text(
             "➖ <b>Удаление сотрудника</b>\n\n"
@@ -111,24 +111,15 @@ async def manage_action(update: Update, context: ContextTypes.DEFAULT_TYPE, db)
         return DELETE_EMPLOYEE_SELECT
     
     if query.data == 'manage_materials':
-        employees = db.get_all_employees()
+        version = db.get_data_version()
+        employees = await db.aget_all_employees()
         
         if not employees:
             await query.edit_message_text("⚠️ В системе нет сотрудников.")
             await query.message.reply_text("Выберите действие:", reply_markup=get_main_keyboard())
             return ConversationHandler.END
         
-        keyboard = []
-        for emp in employees:
-            fiber = emp.get('fiber_balance', 0) or 0
-            twisted = emp.get('twisted_pair_balance', 0) or 0
-            keyboard.append([InlineKeyboardButton(
-                f"📦 {emp['full_name']} (ВОЛС: {fiber}м, ВП: {twisted}м)",
-                callback_data=f"mat_emp_{emp['id']}"
-            )])
-        
-        keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data='back_to_manage')])
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = get_material_employee_keyboard(employees, version)
         
         await query.edit_message_text(
             "📦 <b>Управление материалами</b>\n\n"
@@ -139,25 +130,15 @@ async def manage_action(update: Update, context: ContextTypes.DEFAULT_TYPE, db)
         return SELECT_EMPLOYEE_FOR_MATERIAL
     
     if query.data == 'manage_routers':
-        employees = db.get_all_employees()
+        version = db.get_data_version()
+        employees = await db.aget_employee_inventory()
         
         if not employees:
             await query.edit_message_text("⚠️ В системе нет сотрудников.")
             await query.message.reply_text("Выберите действие:", reply_markup=get_main_keyboard())
             return ConversationHandler.END
         
-        keyboard = []
-        for emp in employees:
-            routers = db.get_employee_routers(emp['id'])
-            router_count = sum(r['quantity'] for r in routers)
-            router_text = f"{router_count} шт." if router_count > 0 else "нет"
-            keyboard.append([InlineKeyboardButton(
-                f"📡 {emp['full_name']} ({router_text})",
-                callback_data=f"rtr_emp_{emp['id']}"
-            )])
-        
-        keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data='back_to_manage')])
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = get_router_employee_keyboard(employees, version)
         
         await query.edit_message_text(
             "📡 <b>Управление роутерами</b>\n\n"
@@ -168,7 +149,7 @@ async def manage_action(update: Update, context: ContextTypes.DEFAULT_TYPE, db)
         return SELECT_EMPLOYEE_FOR_ROUTER
     
     if query.data == 'manage_list':
-        employees = db.get_all_employees()
+        employees = await db.aget_all_employees()
         
         if not employees:
             text = "📋 <b>Список сотрудников</b>\n\nСписок пуст."
@@ -191,15 +172,16 @@ async def manage_action(update: Update, context: ContextTypes.DEFAULT_TYPE, db)
         return MANAGE_ACTION
 
 
-async def add_employee_name(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
+async def add_employee_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Добавление нового сотрудника"""
+    db = get_db(context)
     full_name = update.message.text.strip()
     
     if len(full_name) < 3:
         await update.message.reply_text("⚠️ ФИО должно содержать минимум 3 символа. Попробуйте еще раз:")
         return ADD_EMPLOYEE_NAME
     
-    employee_id = db.add_employee(full_name)
+    employee_id = await db.aadd_employee(full_name)
     
     if employee_id:
         await update.message.reply_text(
@@ -217,8 +199,9 @@ async def add_employee_name(update: Update, context: ContextTypes.DEFAULT_TYPE,
     return ConversationHandler.END
 
 
-async def delete_employee_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
+async def delete_employee_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Удаление сотрудника"""
+    db = get_db(context)
     query = update.callback_query
     await query.answer()
     
@@ -228,9 +211,9 @@ async def delete_employee_confirm(update: Update, context: ContextTypes.DEFAULT_
         return ConversationHandler.END
     
     emp_id = int(query.data.split('_')[2])
-    employee = db.get_employee_by_id(emp_id)
+    employee = await db.aget_employee_by_id(emp_id)
     
-    if db.delete_employee(emp_id):
+    if await db.adelete_employee(emp_id):
         await query.edit_message_text(
             f"✅ Сотрудник <b>{employee['full_name']}</b> удален!",
             parse_mode='HTML'
@@ -242,16 +225,17 @@ async def delete_employee_confirm(update: Update, context: ContextTypes.DEFAULT_
     return ConversationHandler.END
 
 
-async def select_employee_for_material(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
+async def select_employee_for_material(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Выбор сотрудника для управления материалами"""
+    db = get_db(context)
     query = update.callback_query
     await query.answer()
     
     if query.data == 'back_to_manage':
-        return await manage_action(update, context, db)
+        return await manage_action(update, context)
     
     emp_id = int(query.data.split('_')[2])
-    employee = db.get_employee_by_id(emp_id)
+    employee = await db.aget_employee_by_id(emp_id)
     
     if not employee:
         await query.edit_message_text("❌ Сотрудник не найден.")
@@ -287,25 +271,17 @@ async def select_employee_for_material(update: Update, context: ContextTypes.DEF
     return SELECT_MATERIAL_ACTION
 
 
-async def select_material_action(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
+async def select_material_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Выбор действия с материалами"""
+    db = get_db(context)
     query = update.callback_query
     await query.answer()
     
     if query.data == 'mat_back_to_list':
         # Возврат к списку сотрудников
-        employees = db.get_all_employees()
-        keyboard = []
-        for emp in employees:
-            fiber = emp.get('fiber_balance', 0) or 0
-            twisted = emp.get('twisted_pair_balance', 0) or 0
-            keyboard.append([InlineKeyboardButton(
-                f"📦 {emp['full_name']} (ВОЛС: {fiber}м, ВП: {twisted}м)",
-                callback_data=f"mat_emp_{emp['id']}"
-            )])
-        
-        keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data='back_to_manage')])
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        version = db.get_data_version()
+        employees = await db.aget_all_employees()
+        reply_markup = get_material_employee_keyboard(employees, version)
         
         await query.edit_message_text(
             "📦 <b>Управление материалами</b>\n\n"
@@ -316,7 +292,7 @@ async def select_material_action(update: Update, context: ContextTypes.DEFAULT_T
         return SELECT_EMPLOYEE_FOR_MATERIAL
     
     emp_id = context.user_data.get('selected_employee_id')
-    employee = db.get_employee_by_id(emp_id)
+    employee = await db.aget_employee_by_id(emp_id)
     
     if query.data == 'mat_action_add':
         context.user_data['material_action'] = 'add'
@@ -343,8 +319,9 @@ async def select_material_action(update: Update, context: ContextTypes.DEFAULT_T
     return SELECT_MATERIAL_ACTION
 
 
-async def enter_fiber_amount(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
+async def enter_fiber_amount(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Ввод количества ВОЛС"""
+    db = get_db(context)
     try:
         fiber_amount = float(update.message.text.strip().replace(',', '.'))
         if fiber_amount < 0:
@@ -353,7 +330,7 @@ async def enter_fiber_amount(update: Update, context: ContextTypes.DEFAULT_TYPE,
         context.user_data['fiber_amount'] = fiber_amount
         
         emp_id = context.user_data.get('selected_employee_id')
-        employee = db.get_employee_by_id(emp_id)
+        employee = await db.aget_employee_by_id(emp_id)
         action = context.user_data.get('material_action')
         action_text = "добавления" if action == 'add' else "списания"
         
@@ -371,8 +348,9 @@ async def enter_fiber_amount(update: Update, context: ContextTypes.DEFAULT_TYPE,
         return ENTER_FIBER_AMOUNT
 
 
-async def enter_twisted_amount(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
+async def enter_twisted_amount(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Ввод количества витой пары и выполнение операции"""
+    db = get_db(context)
     try:
         twisted_amount = float(update.message.text.strip().replace(',', '.'))
         if twisted_amount < 0:
@@ -382,12 +360,12 @@ async def enter_twisted_amount(update: Update, context: ContextTypes.DEFAULT_TYP
         fiber_amount = context.user_data.get('fiber_amount', 0)
         action = context.user_data.get('material_action')
         
-        employee = db.get_employee_by_id(emp_id)
+        employee = await db.aget_employee_by_id(emp_id)
         
         if action == 'add':
-            success = db.add_material_to_employee(emp_id, fiber_amount, twisted_amount)
+            success = await db.aadd_material_to_employee(emp_id, fiber_amount, twisted_amount)
             if success:
-                updated_emp = db.get_employee_by_id(emp_id)
+                updated_emp = await db.aget_employee_by_id(emp_id)
                 new_fiber = updated_emp.get('fiber_balance', 0) or 0
                 new_twisted = updated_emp.get('twisted_pair_balance', 0) or 0
                 
@@ -409,9 +387,9 @@ async def enter_twisted_amount(update: Update, context: ContextTypes.DEFAULT_TYP
                     reply_markup=get_main_keyboard()
                 )
         else:  # deduct
-            success = db.deduct_material_from_employee(emp_id, fiber_amount, twisted_amount)
+            success = await db.adeduct_material_from_employee(emp_id, fiber_amount, twisted_amount)
             if success:
-                updated_emp = db.get_employee_by_id(emp_id)
+                updated_emp = await db.aget_employee_by_id(emp_id)
                 new_fiber = updated_emp.get('fiber_balance', 0) or 0
                 new_twisted = updated_emp.get('twisted_pair_balance', 0) or 0
                 
@@ -454,8 +432,9 @@ async def enter_twisted_amount(update: Update, context: ContextTypes.DEFAULT_TYP
 
 # ==================== УПРАВЛЕНИЕ РОУТЕРАМИ ====================
 
-async def select_employee_for_router(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
+async def select_employee_for_router(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Выбор сотрудника для управления роутерами"""
+    db = get_db(context)
     query = update.callback_query
     await query.answer()
     
@@ -466,8 +445,8 @@ async def select_employee_for_router(update: Update, context: ContextTypes.DEFAU
     emp_id = int(query.data.split('_')[-1])
     context.user_data['selected_employee_id'] = emp_id
     
-    employee = db.get_employee_by_id(emp_id)
-    routers = db.get_employee_routers(emp_id)
+    employee = await db.aget_employee_by_id(emp_id)
+    routers = await db.aget_employee_routers(emp_id)
     
     # Формируем текст с роутерами
     router_text = ""
@@ -496,26 +475,17 @@ async def select_employee_for_router(update: Update, context: ContextTypes.DEFAU
     return SELECT_ROUTER_ACTION
 
 
-async def select_router_action(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
+async def select_router_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Выбор действия с роутерами"""
+    db = get_db(context)
     query = update.callback_query
     await query.answer()
     
     if query.data == 'rtr_back_to_list':
         # Возврат к списку сотрудников
-        employees = db.get_all_employees()
-        keyboard = []
-        for emp in employees:
-            routers = db.get_employee_routers(emp['id'])
-            router_count = sum(r['quantity'] for r in routers)
-            router_text = f"{router_count} шт." if router_count > 0 else "нет"
-            keyboard.append([InlineKeyboardButton(
-                f"📡 {emp['full_name']} ({router_text})",
-                callback_data=f"rtr_emp_{emp['id']}"
-            )])
-        
-        keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data='back_to_manage')])
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        version = db.get_data_version()
+        employees = await db.aget_employee_inventory()
+        reply_markup = get_router_employee_keyboard(employees, version)
         
         await query.edit_message_text(
             "📡 <b>Управление роутерами</b>\n\n"
@@ -547,7 +517,7 @@ async def select_router_action(update: Update, context: ContextTypes.DEFAULT_TYP
         )
     else:  # deduct
         emp_id = context.user_data.get('selected_employee_id')
-        routers = db.get_employee_routers(emp_id)
+        routers = await db.aget_employee_routers(emp_id)
         
         if not routers:
             await query.edit_message_text("⚠️ У сотрудника нет роутеров для списания.")
@@ -576,8 +546,9 @@ async def select_router_action(update: Update, context: ContextTypes.DEFAULT_TYP
     return ENTER_ROUTER_NAME
 
 
-async def enter_router_name(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
+async def enter_router_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Ввод названия роутера"""
+    db = get_db(context)
     # Проверяем, это callback или текстовое сообщение
     if update.callback_query:
         query = update.callback_query
@@ -612,7 +583,7 @@ async def enter_router_name(update: Update, context: ContextTypes.DEFAULT_TYPE,
         emp_id = context.user_data.get('selected_employee_id')
         
         # Получаем информацию о роутере
-        routers = db.get_employee_routers(emp_id)
+        routers = await db.aget_employee_routers(emp_id)
         selected_router = next((r for r in routers if r['id'] == router_id), None)
         
         if not selected_router:
@@ -648,8 +619,9 @@ async def enter_router_name(update: Update, context: ContextTypes.DEFAULT_TYPE,
     return ENTER_ROUTER_QUANTITY
 
 
-async def enter_router_quantity(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
+async def enter_router_quantity(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Ввод количества роутеров"""
+    db = get_db(context)
     try:
         quantity = int(update.message.text.strip())
         if quantity <= 0:
@@ -659,12 +631,12 @@ async def enter_router_quantity(update: Update, context: ContextTypes.DEFAULT_TY
         router_name = context.user_data.get('router_name')
         action = context.user_data.get('router_action')
         
-        employee = db.get_employee_by_id(emp_id)
+        employee = await db.aget_employee_by_id(emp_id)
         
         if action == 'add':
-            success = db.add_router_to_employee(emp_id, router_name, quantity, created_by=update.effective_user.id)
+            success = await db.aadd_router_to_employee(emp_id, router_name, quantity, created_by=update.effective_user.id)
             if success:
-                new_quantity = db.get_router_quantity(emp_id, router_name)
+                new_quantity = await db.aget_router_quantity(emp_id, router_name)
                 await update.message.reply_text(
                     f"✅ <b>Роутеры добавлены!</b>\n\n"
                     f"👤 Сотрудник: {employee['full_name']}\n"
@@ -680,9 +652,9 @@ async def enter_router_quantity(update: Update, context: ContextTypes.DEFAULT_TY
                     reply_markup=get_main_keyboard()
                 )
         else:  # deduct
-            success = db.deduct_router_from_employee(emp_id, router_name, quantity, created_by=update.effective_user.id)
+            success = await db.adeduct_router_from_employee(emp_id, router_name, quantity, created_by=update.effective_user.id)
             if success:
-                new_quantity = db.get_router_quantity(emp_id, router_name)
+                new_quantity = await db.aget_router_quantity(emp_id, router_name)
                 await update.message.reply_text(
                     f"✅ <b>Роутеры списаны!</b>\n\n"
                     f"👤 Сотрудник: {employee['full_name']}\n"
@@ -709,9 +681,10 @@ async def enter_router_quantity(update: Update, context: ContextTypes.DEFAULT_TY
 
 # ==================== СПИСОК СОТРУДНИКОВ ====================
 
-async def show_employees_list(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> None:
+async def show_employees_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показать список всех сотрудников с их материалами"""
-    employees = db.get_all_employees()
+    db = get_db(context)
+    employees = await db.aget_employee_inventory()
     
     if not employees:
         await update.message.reply_text(
@@ -731,9 +704,9 @@ async def show_employees_list(update: Update, context: ContextTypes.DEFAULT_TYPE
         fiber_balance = emp.get('fiber_balance', 0) or 0
         twisted_balance = emp.get('twisted_pair_balance', 0) or 0
         
-        # Получаем роутеры сотрудника
-        routers = db.get_employee_routers(emp['id'])
-        router_count = sum(r['quantity'] for r in routers)
+        # Роутеры сотрудника уже в сводке
+        routers = emp['routers']
+        router_count = emp['router_total']
         
         message += f"{idx}. <b>{emp_name}</b>\n"
         message += f"   📦 Материалы:\n"
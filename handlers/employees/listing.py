@@ -11,7 +11,7 @@ from utils.keyboards import get_main_keyboard
 
 async def show_employees_list(flow: "EmployeeFlow", update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Выводит список сотрудников с материалами и роутерами"""
-    employees = flow.db.get_all_employees()
+    employees = flow.db.get_employee_inventory()
 
     if not employees:
         await update.message.reply_text(
@@ -28,8 +28,8 @@ async def show_employees_list(flow: "EmployeeFlow", update: Update, context: Con
     for idx, emp in enumerate(employees, 1):
         fiber_balance = emp.get("fiber_balance", 0) or 0
         twisted_balance = emp.get("twisted_pair_balance", 0) or 0
-        routers = flow.db.get_employee_routers(emp["id"])
-        router_count = sum(r["quantity"] for r in routers)
+        routers = emp["routers"]
+        router_count = emp["router_total"]
 
         message_lines.append(f"{idx}. <b>{emp['full_name']}</b>")
         message_lines.append("   📦 Материалы:")
@@ -63,11 +63,10 @@ async def select_router_action(flow: "EmployeeFlow", update: Update, context: Co
     await query.answer()
 
     if query.data == "rtr_back_to_list":
-        employees = flow.db.get_all_employees()
+        employees = flow.db.get_employee_inventory()
         keyboard = []
         for emp in employees:
-            routers = flow.db.get_employee_routers(emp["id"])
-            router_count = sum(r["quantity"] for r in routers)
+            router_count = emp["router_total"]
             router_text = f"{router_count} шт." if router_count > 0 else "нет"
             keyboard.append(
                 [
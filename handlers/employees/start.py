@@ -124,7 +124,7 @@ async def manage_action(flow: "EmployeeFlow", update: Update, context: ContextTy
         return SELECT_EMPLOYEE_FOR_MATERIAL
 
     if data == "manage_routers":
-        employees = flow.db.get_all_employees()
+        employees = flow.db.get_employee_inventory()
         if not employees:
             await query.edit_message_text("⚠️ В системе нет сотрудников.")
             await query.message.reply_text("Выберите действие:", reply_markup=get_main_keyboard())
@@ -132,8 +132,7 @@ async def manage_action(flow: "EmployeeFlow", update: Update, context: ContextTy
 
         keyboard = []
         for emp in employees:
-            routers = flow.db.get_employee_routers(emp["id"])
-            router_count = sum(r["quantity"] for r in routers)
+            router_count = emp["router_total"]
             router_text = f"{router_count} шт." if router_count > 0 else "нет"
             keyboard.append(
                 [
@@ -1,22 +1,31 @@
 """
 Обработчики для формирования отчетов
 """
-import os
 import logging
+from typing import Callable, Dict, Hashable
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Message, Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes, ConversationHandler
 
-from config import SELECT_REPORT_EMPLOYEE, SELECT_REPORT_PERIOD
-from utils.keyboards import get_main_keyboard
-from report_generator import ReportGenerator
+from config import SELECT_REPORT_EMPLOYEE, SELECT_REPORT_PERIOD, ENTER_REPORT_PERIOD
+from database.async_db import AsyncDatabase
+from utils.keyboards import get_main_keyboard, get_report_employee_keyboard
+from utils.helpers import get_db, get_report_jobs
+from utils.periods import PERIODS, ReportPeriod, parse_period, resolve_period
+from utils.report_cache import ReportCache, get_report_cache, make_report_key
+from utils.report_jobs import (
+    ReportJob, ReportJobCancelled, ReportJobRunner, build_employee_report, build_team_report
+)
 
 logger = logging.getLogger(__name__)
 
 
-async def report_start(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
+async def report_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Начало формирования отчета"""
-    employees = db.get_all_employees()
+    db = get_db(context)
+    version = db.get_data_version()
+    employees = await db.aget_all_employees()
     
     if not employees:
         text = "⚠️ В системе нет ни одного сотрудника!"
@@ -27,12 +36,7 @@ async def report_start(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -
             await update.message.reply_text(text, reply_markup=get_main_keyboard())
         return ConversationHandler.END
     
-    keyboard = []
-    for emp in employees:
-        keyboard.append([InlineKeyboardButton(emp['full_name'], callback_data=f"rep_emp_{emp['id']}")])
-    
-    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data='report_cancel')])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = get_report_employee_keyboard(employees, version)
     
     text = "📊 <b>Сводный отчет</b>\n\nВыберите сотрудника:"
     
@@ -45,8 +49,9 @@ async def report_start(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -
     return SELECT_REPORT_EMPLOYEE
 
 
-async def report_select_period(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
+async def report_select_period(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Выбор периода для отчета"""
+    db = get_db(context)
     query = update.callback_query
     await query.answer()
     
@@ -55,22 +60,26 @@ async def report_select_period(update: Update, context: ContextTypes.DEFAULT_TYP
         await query.message.reply_text("Выберите действие:", reply_markup=get_main_keyboard())
         return ConversationHandler.END
     
-    # Сохраняем выбранного сотрудника
-    emp_id = int(query.data.split('_')[2])
+    # Сохраняем выбранного сотрудника (None - сводный отчет по всем)
+    if query.data == 'rep_emp_all':
+        emp_id = None
+        selected = "все сотрудники"
+    else:
+        emp_id = int(query.data.split('_')[2])
+        employee = await db.aget_employee_by_id(emp_id)
+        selected = employee['full_name']
     context.user_data['report_employee_id'] = emp_id
     
-    employee = db.get_employee_by_id(emp_id)
-    
-    keyboard = [
-        [InlineKeyboardButton("📅 Последняя неделя", callback_data='period_7')],
-        [InlineKeyboardButton("📅 Последний месяц", callback_data='period_30')],
-        [InlineKeyboardButton("📅 Все время", callback_data='period_all')],
-        [InlineKeyboardButton("❌ Отмена", callback_data='period_cancel')]
-    ]
+    buttons = [InlineKeyboardButton(label, callback_data=code) for code, label in PERIODS.items()]
+    keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    keyboard.append([
+        InlineKeyboardButton("🗓 Свой период", callback_data='period_custom'),
+        InlineKeyboardButton("❌ Отмена", callback_data='period_cancel')
+    ])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text(
-        f"Выбран сотрудник: <b>{employee['full_name']}</b>\n\n"
+        f"Выбран сотрудник: <b>{selected}</b>\n\n"
         f"Выберите период для отчета:",
         reply_markup=reply_markup,
         parse_mode='HTML'
@@ -79,8 +88,8 @@ async def report_select_period(update: Update, context: ContextTypes.DEFAULT_TYP
     return SELECT_REPORT_PERIOD
 
 
-async def report_generate(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
-    """Генерация и отправка отчета"""
+async def report_generate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Генерация и отправка отчета за период, выбранный кнопкой"""
     query = update.callback_query
     await query.answer()
     
@@ -90,75 +99,278 @@ async def report_generate(update: Update, context: ContextTypes.DEFAULT_TYPE, db
         context.user_data.clear()
         return ConversationHandler.END
     
-    # Определяем период
-    period_map = {
-        'period_7': (7, 'Последняя неделя'),
-        'period_30': (30, 'Последний месяц'),
-        'period_all': (None, 'Все время')
-    }
-    
-    days, period_name = period_map[query.data]
-    emp_id = context.user_data['report_employee_id']
-    employee = db.get_employee_by_id(emp_id)
+    if query.data == 'period_custom':
+        await query.edit_message_text(
+            "🗓 Введите период в формате <b>ДД.ММ.ГГГГ - ДД.ММ.ГГГГ</b>\n"
+            "(например: 01.03.2025 - 15.03.2025) или одну дату:",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("❌ Отмена", callback_data='period_cancel')]]),
+            parse_mode='HTML'
+        )
+        return ENTER_REPORT_PERIOD
     
     await query.edit_message_text("⏳ Формирую отчет, подождите...")
+    return await _generate(update, context, query.message, resolve_period(query.data))
+
+
+async def report_custom_period(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Генерация отчета за период, введенный пользователем"""
+    is_valid, period, error_msg = parse_period(update.message.text)
+    if not is_valid:
+        await update.message.reply_text(error_msg)
+        return ENTER_REPORT_PERIOD
     
-    # Получаем данные из БД
-    connections, stats = db.get_employee_report(emp_id, days)
+    status = await update.message.reply_text("⏳ Формирую отчет, подождите...")
+    return await _generate(update, context, status, period)
+
+
+async def _generate(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    status: Message,
+    period: ReportPeriod
+) -> int:
+    """
+    Сформировать отчет за период: из кэша или заданием в пуле процессов
     
-    # Получаем движения материалов за период
-    from datetime import datetime, timedelta
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=days) if days else datetime(2020, 1, 1)
-    movements = db.get_employee_movements(emp_id, start_date, end_date)
+    Args:
+        status: Сообщение бота, в котором показывается ход формирования
+        period: Период отчета
+    """
+    db = get_db(context)
+    emp_id = context.user_data['report_employee_id']
     
-    if not connections and not movements:
-        await query.message.reply_text(
-            f"ℹ️ У сотрудника <b>{employee['full_name']}</b> нет данных за выбранный период.",
+    # Тот же отчет по неизменившимся данным отправляем из кэша
+    cache = get_report_cache()
+    watermark = await db.aget_report_watermark()
+    key = make_report_key(emp_id, period.cache_key, watermark, relative=period.relative)
+    report = cache.get(key)
+    if report:
+        try:
+            await _send_report(status, cache, key, report)
+        except TelegramError as e:
+            logger.warning(f"Не удалось отправить отчет из кэша, формируем заново: {e}")
+            cache.discard(key)
+        else:
+            logger.info(f"Отчет {'по всем сотрудникам' if emp_id is None else f'по сотруднику ID {emp_id}'} "
+                        f"({period.name}) отправлен из кэша")
+            await status.reply_text(
+                "✅ Отчет сформирован!",
+                reply_markup=get_main_keyboard()
+            )
+            context.user_data.clear()
+            return ConversationHandler.END
+    
+    if emp_id is None:
+        plan = await _plan_team_report(db, period)
+    else:
+        plan = await _plan_employee_report(db, emp_id, period)
+    
+    if not plan['total']:
+        await status.reply_text(
+            plan['empty_text'],
             parse_mode='HTML',
             reply_markup=get_main_keyboard()
         )
         context.user_data.clear()
         return ConversationHandler.END
     
-    # Генерируем Excel-отчет
-    try:
-        filename = ReportGenerator.generate_employee_report(
-            employee_name=employee['full_name'],
-            connections=connections,
-            stats=stats,
-            period_name=period_name,
-            movements=movements
+    jobs = get_report_jobs(context)
+    user_id = update.effective_user.id
+    if jobs.get_user_job(user_id):
+        await status.reply_text(
+            "⏳ У вас уже формируется отчет. Дождитесь его или отмените.",
+            reply_markup=get_main_keyboard()
         )
+        context.user_data.clear()
+        return ConversationHandler.END
+    
+    job = jobs.submit(user_id, title=plan['title'], total=plan['total'])
+    if job is None:
+        await status.reply_text(
+            "⚠️ Сейчас формируется слишком много отчетов. Попробуйте через несколько минут.",
+            reply_markup=get_main_keyboard()
+        )
+        context.user_data.clear()
+        return ConversationHandler.END
+    
+    # Отчет формируется в пуле процессов, обработчик сразу освобождается
+    await status.edit_text(
+        _progress_text(job, jobs),
+        reply_markup=_cancel_keyboard(job),
+        parse_mode='HTML'
+    )
+    jobs.start(job, _deliver_report(
+        jobs, job, status, cache, key, plan['caption'],
+        plan['build'], db.db_path, *plan['args'], jobs.spill_dir
+    ))
+    
+    context.user_data.clear()
+    return ConversationHandler.END
+
+
+async def _plan_employee_report(db: AsyncDatabase, emp_id: int, period: ReportPeriod) -> Dict:
+    """
+    Подготовить отчет по сотруднику: итоги и количество движений - агрегирующими
+    запросами, сами строки читаются воркером при записи файла
+    """
+    employee = await db.aget_employee_by_id(emp_id)
+    stats = await db.aget_employee_report_totals(emp_id, start=period.start, end=period.end)
+    movement_count = await db.acount_employee_movements(emp_id, period.start, period.end)
+    
+    return {
+        'title': f"<b>{employee['full_name']}</b>, {period.name}",
+        'total': stats['total_connections'] + movement_count,
+        'empty_text': f"ℹ️ У сотрудника <b>{employee['full_name']}</b> нет данных за выбранный период.",
+        'caption': (
+            f"📊 Отчет по сотруднику: <b>{employee['full_name']}</b>\n"
+            f"Период: {period.name}\n"
+            f"Подключений: {stats['total_connections']}\n"
+            f"ВОЛС: {stats['total_fiber_meters']} м\n"
+            f"Витая пара: {stats['total_twisted_pair_meters']} м"
+        ),
+        'build': build_employee_report,
+        'args': (emp_id, period.start, period.end, employee['full_name'], stats, period.name),
+    }
+
+
+async def _plan_team_report(db: AsyncDatabase, period: ReportPeriod) -> Dict:
+    """Подготовить сводный отчет по всем сотрудникам: сводка - одним группирующим запросом"""
+    summary = await db.aget_team_summary(start=period.start, end=period.end)
+    total = summary['total']
+    
+    return {
+        'title': f"<b>Все сотрудники</b>, {period.name}",
+        # Строк в листах сотрудников - по одной на пару сотрудник-подключение
+        'total': sum(emp['total_connections'] for emp in summary['employees']),
+        'empty_text': "ℹ️ За выбранный период нет подключений.",
+        'caption': (
+            f"📊 Сводный отчет по всем сотрудникам\n"
+            f"Период: {period.name}\n"
+            f"Сотрудников: {len(summary['employees'])}\n"
+            f"Подключений: {total['total_connections']}\n"
+            f"ВОЛС: {total['total_fiber_meters']} м\n"
+            f"Витая пара: {total['total_twisted_pair_meters']} м\n"
+            f"Роутеров: {total['routers_used']}"
+        ),
+        'build': build_team_report,
+        'args': (period.start, period.end, summary, period.name),
+    }
+
+
+async def report_job_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Отмена формирования отчета по кнопке под сообщением о прогрессе"""
+    query = update.callback_query
+    job_id = int(query.data.rsplit('_', 1)[1])
+    
+    if get_report_jobs(context).cancel(job_id, query.from_user.id):
+        await query.answer("Отменяю формирование отчета...")
+    else:
+        await query.answer("Отчет уже сформирован или отменен")
+
+
+def _cancel_keyboard(job: ReportJob) -> InlineKeyboardMarkup:
+    """Кнопка отмены задания"""
+    return InlineKeyboardMarkup([[InlineKeyboardButton("❌ Отменить", callback_data=f"rjob_cancel_{job.id}")]])
+
+
+def _progress_text(job: ReportJob, jobs: ReportJobRunner) -> str:
+    """Текст сообщения о ходе формирования отчета"""
+    if job.cancel_requested:
+        return f"⏳ Отменяю формирование отчета...\n{job.title}"
+    if job.status == 'queued':
+        return (
+            f"⏳ Отчет в очереди\n{job.title}\n\n"
+            f"Заданий перед вами: {jobs.queue_position(job)}"
+        )
+    return (
+        f"⏳ Формирую отчет, подождите...\n{job.title}\n\n"
+        f"Обработано строк: {job.progress} из {job.total} ({job.percent}%)"
+    )
+
+
+async def _deliver_report(
+    jobs: ReportJobRunner,
+    job: ReportJob,
+    message: Message,
+    cache: ReportCache,
+    key: Hashable,
+    caption: str,
+    build: Callable,
+    *args
+) -> None:
+    """Дождаться формирования отчета функцией build в пуле процессов и отправить его пользователю"""
+    shown = {'text': _progress_text(job, jobs)}
+    
+    async def show_progress(job: ReportJob) -> None:
+        text = _progress_text(job, jobs)
+        if text == shown['text']:
+            return
+        shown['text'] = text
+        try:
+            await message.edit_text(text, reply_markup=_cancel_keyboard(job), parse_mode='HTML')
+        except TelegramError as e:
+            logger.debug(f"Не удалось обновить прогресс задания {job.id}: {e}")
+    
+    try:
+        document = await jobs.run(job, build, *args, on_progress=show_progress)
+        await message.edit_text(f"📊 Отчет сформирован\n{job.title}", parse_mode='HTML')
         
-        # Отправляем файл
-        with open(filename, 'rb') as file:
-            await query.message.reply_document(
-                document=file,
-                filename=filename,
-                caption=f"📊 Отчет по сотруднику: <b>{employee['full_name']}</b>\n"
-                        f"Период: {period_name}\n"
-                        f"Подключений: {stats['total_connections']}\n"
-                        f"ВОЛС: {stats['total_fiber_meters']} м\n"
-                        f"Витая пара: {stats['total_twisted_pair_meters']} м",
-                parse_mode='HTML'
-            )
-        
-        # Удаляем временный файл
-        os.remove(filename)
+        # Отправляем файл: обычно прямо из памяти, большой отчет - из временного файла
+        try:
+            with document.open() as content:
+                report = {
+                    'content': document.content if document.content is not None else content,
+                    'filename': document.filename,
+                    'caption': caption,
+                    'file_id': None
+                }
+                if document.content is not None:
+                    cache.put(key, **report)
+                await _send_report(message, cache, key, report)
+        finally:
+            document.discard()
         
-        await query.message.reply_text(
+        await message.reply_text(
             "✅ Отчет сформирован!",
             reply_markup=get_main_keyboard()
         )
-        
+    
+    except ReportJobCancelled:
+        logger.info(f"Формирование отчета отменено (задание {job.id})")
+        await message.edit_text("❌ Формирование отчета отменено.")
+        await message.reply_text("Выберите действие:", reply_markup=get_main_keyboard())
+    
     except Exception as e:
+        job.status = 'failed'
         logger.error(f"Ошибка при генерации отчета: {e}")
-        await query.message.reply_text(
+        await message.reply_text(
             "❌ Ошибка при формировании отчета. Попробуйте позже.",
             reply_markup=get_main_keyboard()
         )
-    
-    context.user_data.clear()
-    return ConversationHandler.END
 
+
+async def _send_report(message: Message, cache: ReportCache, key: Hashable, report: Dict) -> None:
+    """
+    Отправить отчет: по file_id, если документ уже загружался, иначе файлом
+    
+    После первой загрузки file_id документа сохраняется в кэше.
+    """
+    if report.get('file_id'):
+        try:
+            await message.reply_document(
+                document=report['file_id'],
+                caption=report['caption'],
+                parse_mode='HTML'
+            )
+            return
+        except TelegramError as e:
+            logger.warning(f"Не удалось отправить отчет по file_id, загружаем заново: {e}")
+    
+    sent = await message.reply_document(
+        document=report['content'],
+        filename=report['filename'],
+        caption=report['caption'],
+        parse_mode='HTML'
+    )
+    if sent and sent.document:
+        cache.set_file_id(key, sent.document.file_id)
@@ -1,346 +1,437 @@
 """
 Модуль для генерации отчетов в Excel
+
+Отчеты пишутся в режиме write-only openpyxl: строки уходят в файл по мере
+чтения из итераторов (курсоров БД) и не накапливаются в памяти, а
+оформление задается именованными стилями, общими для всех ячеек.
 """
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+from openpyxl.utils import get_column_letter
+from copy import copy
 from datetime import datetime
-from typing import List, Dict
+from io import BytesIO
+from itertools import chain, groupby
+from operator import itemgetter
+from weakref import WeakKeyDictionary
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Set, Tuple
 import logging
 
 from config import CONNECTION_TYPES
 
 logger = logging.getLogger(__name__)
 
+# Столбцы листа подключений: (заголовок, ширина)
+REPORT_COLUMNS = [
+    ('Столбец', 12),
+    ('Тип', 15),
+    ('Исполнители', 25),
+    ('Адрес подключения', 30),
+    ('Модель роутера', 15),
+    ('Порт', 10),
+    ('Кол-во ВОЛС м', 12),
+    ('Кол-во Вит.пар м', 12),
+    ('Дата', 18),
+]
+
+# Столбцы сводного листа отчета по всем сотрудникам: (заголовок, ширина)
+TEAM_SUMMARY_COLUMNS = (
+    [('№', 6), ('Сотрудник', 30), ('Подключений', 14)]
+    + [(type_name, 11) for type_name in CONNECTION_TYPES.values()]
+    + [('ВОЛС м', 12), ('Вит.пара м', 12), ('Роутеров', 11)]
+)
+
+# Название сводного листа
+TEAM_SUMMARY_TITLE = "Сводка"
+
+# Символы, недопустимые в названии листа Excel, и его максимальная длина
+_SHEET_TITLE_FORBIDDEN = str.maketrans({char: ' ' for char in '[]:*?/\\'})
+_SHEET_TITLE_MAX = 31
+
+# Столбцы листа движений: (заголовок, ширина)
+MOVEMENT_COLUMNS = [
+    ('Дата', 18),
+    ('Операция', 12),
+    ('Тип', 15),
+    ('Название', 20),
+    ('Количество', 12),
+    ('Остаток', 12),
+    ('Связь с подключением', 20),
+]
+
+MOVEMENT_TYPES = {
+    'fiber': 'ВОЛС',
+    'twisted_pair': 'Витая пара',
+    'router': 'Роутер'
+}
+
+_BORDER = Border(
+    left=Side(style='thin'),
+    right=Side(style='thin'),
+    top=Side(style='thin'),
+    bottom=Side(style='thin')
+)
+_TEXT_ALIGNMENT = Alignment(horizontal='left', vertical='center', wrap_text=True)
+_NUMBER_ALIGNMENT = Alignment(horizontal='right', vertical='center')
+_HEADER_FILL = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+_TOTAL_FILL = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")
+_EMPLOYEE_TOTAL_FILL = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
+_ADD_FILL = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")
+_DEDUCT_FILL = PatternFill(start_color="FCE4D6", end_color="FCE4D6", fill_type="solid")
+_EMPLOYEE_TOTAL_FONT = Font(name='Arial', size=12, bold=True, color="FFFFFF")
+
+# Именованные стили отчетов: имя -> параметры NamedStyle
+REPORT_STYLES: Dict[str, Dict[str, Any]] = {
+    'report_title': dict(font=Font(name='Arial', size=14, bold=True),
+                         alignment=Alignment(horizontal='center', vertical='center')),
+    'report_info_bold': dict(font=Font(name='Arial', size=11, bold=True), alignment=_TEXT_ALIGNMENT),
+    'report_info': dict(font=Font(name='Arial', size=11), alignment=_TEXT_ALIGNMENT),
+    'report_date': dict(font=Font(name='Arial', size=10), alignment=_TEXT_ALIGNMENT),
+    'report_header': dict(font=Font(name='Arial', size=12, bold=True, color="FFFFFF"), fill=_HEADER_FILL,
+                          alignment=Alignment(horizontal='center', vertical='center', wrap_text=True),
+                          border=_BORDER),
+    'report_text': dict(alignment=_TEXT_ALIGNMENT, border=_BORDER),
+    'report_number': dict(alignment=_NUMBER_ALIGNMENT, border=_BORDER, number_format='0.00'),
+    'report_count': dict(alignment=_NUMBER_ALIGNMENT, border=_BORDER, number_format='0'),
+    'report_total_label': dict(font=Font(name='Arial', size=11, bold=True), fill=_TOTAL_FILL,
+                               alignment=Alignment(horizontal='right', vertical='center'), border=_BORDER),
+    'report_total_number': dict(font=Font(name='Arial', size=11, bold=True), fill=_TOTAL_FILL,
+                                alignment=_NUMBER_ALIGNMENT, border=_BORDER, number_format='0.00'),
+    'report_total_count': dict(font=Font(name='Arial', size=11, bold=True), fill=_TOTAL_FILL,
+                               alignment=_NUMBER_ALIGNMENT, border=_BORDER, number_format='0'),
+    'report_total_blank': dict(fill=_TOTAL_FILL, border=_BORDER),
+    'report_employee_label': dict(font=_EMPLOYEE_TOTAL_FONT, fill=_EMPLOYEE_TOTAL_FILL,
+                                  alignment=Alignment(horizontal='right', vertical='center'), border=_BORDER),
+    'report_employee_number': dict(font=_EMPLOYEE_TOTAL_FONT, fill=_EMPLOYEE_TOTAL_FILL,
+                                   alignment=_NUMBER_ALIGNMENT, border=_BORDER, number_format='0.00'),
+    'report_employee_blank': dict(fill=_EMPLOYEE_TOTAL_FILL, border=_BORDER),
+    'movement_add_text': dict(fill=_ADD_FILL, alignment=_TEXT_ALIGNMENT, border=_BORDER),
+    'movement_add_number': dict(fill=_ADD_FILL, alignment=_NUMBER_ALIGNMENT, border=_BORDER),
+    'movement_deduct_text': dict(fill=_DEDUCT_FILL, alignment=_TEXT_ALIGNMENT, border=_BORDER),
+    'movement_deduct_number': dict(fill=_DEDUCT_FILL, alignment=_NUMBER_ALIGNMENT, border=_BORDER),
+}
+
+
+# Наборы индексов именованных стилей по книгам: {книга: {имя стиля: StyleArray}}
+_style_arrays: "WeakKeyDictionary[Workbook, Dict[str, Any]]" = WeakKeyDictionary()
+
+
+def _sheet_title(name: str, used: Set[str]) -> str:
+    """Уникальное допустимое название листа для ФИО"""
+    base = ' '.join(name.translate(_SHEET_TITLE_FORBIDDEN).split())[:_SHEET_TITLE_MAX] or "Сотрудник"
+    title, number = base, 1
+    while title.lower() in used:
+        number += 1
+        suffix = f" ({number})"
+        title = base[:_SHEET_TITLE_MAX - len(suffix)] + suffix
+    used.add(title.lower())
+    return title
+
+
+def _format_date(value: Any) -> Any:
+    """Дата из БД в формате ДД.ММ.ГГГГ ЧЧ:ММ (нераспознанное значение - как есть)"""
+    try:
+        return datetime.fromisoformat(value).strftime('%d.%m.%Y %H:%M')
+    except (TypeError, ValueError):
+        return value
+
 
 class ReportGenerator:
     """Класс для генерации Excel-отчетов"""
     
     @staticmethod
-    def generate_employee_report(
+    def create_workbook() -> Workbook:
+        """Создать потоковую книгу (write-only) с зарегистрированными стилями отчетов"""
+        wb = Workbook(write_only=True)
+        for name, params in REPORT_STYLES.items():
+            wb.add_named_style(NamedStyle(name=name, **params))
+        return wb
+    
+    @staticmethod
+    def _cell(ws: Any, value: Any, style: str) -> WriteOnlyCell:
+        """Ячейка со стилем отчета (набор индексов стиля берется из кэша книги)"""
+        cell = WriteOnlyCell(ws, value=value)
+        style_arrays = _style_arrays.setdefault(ws.parent, {})
+        array = style_arrays.get(style)
+        if array is None:
+            # Поиск именованного стиля по имени дорогой - делаем его один раз на книгу
+            cell.style = style
+            style_arrays[style] = copy(cell._style)
+        else:
+            cell._style = copy(array)
+        return cell
+    
+    @staticmethod
+    def _write_heading(ws: Any, columns: List, lines: List, header_row: int) -> None:
+        """
+        Записать шапку листа: ширины столбцов, строки заголовка и названия столбцов
+        
+        Args:
+            ws: Лист в режиме write-only (еще без строк)
+            columns: Столбцы [(заголовок, ширина)]
+            lines: Строки над таблицей [(текст, стиль)], каждая объединяется на всю ширину
+            header_row: Номер строки с названиями столбцов
+        """
+        cell = ReportGenerator._cell
+        last_column = get_column_letter(len(columns))
+        
+        for index, (_, width) in enumerate(columns, 1):
+            ws.column_dimensions[get_column_letter(index)].width = width
+        
+        for row, (text, style) in enumerate(lines, 1):
+            ws.merged_cells.add(f'A{row}:{last_column}{row}')
+            ws.append([cell(ws, text, style)])
+        for _ in range(len(lines) + 1, header_row):
+            ws.append([])
+        
+        ws.row_dimensions[header_row].height = 30
+        ws.append([cell(ws, title, 'report_header') for title, _ in columns])
+    
+    @staticmethod
+    def write_employee_sheets(
+        wb: Workbook,
         employee_name: str,
-        connections: List[Dict],
+        connections: Iterable[Dict],
         stats: Dict,
         period_name: str,
-        movements: List[Dict] = None
-    ) -> str:
+        movements: Optional[Iterable[Dict]] = None,
+        title: str = "Отчет"
+    ) -> int:
         """
-        Генерирует Excel-отчет по сотруднику
+        Записать в книгу лист подключений сотрудника и, если есть движения, лист движений
         
         Args:
+            wb: Книга из create_workbook()
             employee_name: ФИО сотрудника
-            connections: Список подключений
-            stats: Итоговая статистика
+            connections: Подключения (список или итератор по курсору БД)
+            stats: Итоговая статистика (агрегирующий запрос)
             period_name: Название периода
-            movements: Список движений материалов и роутеров (опционально)
+            movements: Движения материалов и роутеров (опционально, список или итератор)
+            title: Название листа подключений
         
         Returns:
-            Путь к созданному файлу
+            Количество записанных строк данных
         """
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Отчет"
-        
-        # Стили
-        header_font = Font(name='Arial', size=12, bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        
-        title_font = Font(name='Arial', size=14, bold=True)
-        title_alignment = Alignment(horizontal='center', vertical='center')
-        
-        cell_alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
-        number_alignment = Alignment(horizontal='right', vertical='center')
-        
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        total_fill = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")
-        total_font = Font(name='Arial', size=11, bold=True)
-        
-        # Заголовок отчета
-        ws.merge_cells('A1:H1')
-        ws['A1'] = f"Сводный отчет по монтажнику"
-        ws['A1'].font = title_font
-        ws['A1'].alignment = title_alignment
-        
-        # Информация о сотруднике и периоде
-        ws.merge_cells('A2:H2')
-        ws['A2'] = f"Исполнитель: {employee_name}"
-        ws['A2'].font = Font(name='Arial', size=11, bold=True)
-        ws['A2'].alignment = cell_alignment
-        
-        ws.merge_cells('A3:H3')
-        ws['A3'] = f"Период: {period_name}"
-        ws['A3'].font = Font(name='Arial', size=11)
-        ws['A3'].alignment = cell_alignment
-        
-        ws.merge_cells('A4:H4')
-        ws['A4'] = f"Дата формирования: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
-        ws['A4'].font = Font(name='Arial', size=10)
-        ws['A4'].alignment = cell_alignment
+        cell = ReportGenerator._cell
+        ws = wb.create_sheet(title=title)
         
-        # Заголовки столбцов (строка 6)
-        headers = [
-            'Столбец',
-            'Тип',
-            'Исполнители',
-            'Адрес подключения',
-            'Модель роутера',
-            'Порт',
-            'Кол-во ВОЛС м',
-            'Кол-во Вит.пар м',
-            'Дата'
-        ]
-        
-        ws.row_dimensions[6].height = 30
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=6, column=col_num)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = border
-        
-        # Ширина столбцов
-        ws.column_dimensions['A'].width = 12  # Столбец
-        ws.column_dimensions['B'].width = 15  # Тип
-        ws.column_dimensions['C'].width = 25  # Исполнители
-        ws.column_dimensions['D'].width = 30  # Адрес
-        ws.column_dimensions['E'].width = 15  # Модель роутера
-        ws.column_dimensions['F'].width = 10  # Порт
-        ws.column_dimensions['G'].width = 12  # ВОЛС
-        ws.column_dimensions['H'].width = 12  # Витая пара
-        ws.column_dimensions['I'].width = 18  # Дата
+        ReportGenerator._write_heading(ws, REPORT_COLUMNS, [
+            ("Сводный отчет по монтажнику", 'report_title'),
+            (f"Исполнитель: {employee_name}", 'report_info_bold'),
+            (f"Период: {period_name}", 'report_info'),
+            (f"Дата формирования: {datetime.now().strftime('%d.%m.%Y %H:%M')}", 'report_date'),
+        ], header_row=6)
         
         # Данные подключений
-        current_row = 7
+        rows = 0
         for idx, conn in enumerate(connections, 1):
-            # Форматируем дату
-            try:
-                created_at = datetime.fromisoformat(conn['created_at'])
-                date_str = created_at.strftime('%d.%m.%Y %H:%M')
-            except:
-                date_str = conn['created_at']
-            
-            # Список исполнителей через запятую
-            executors = ', '.join(conn['all_employees'])
-            
-            # Получаем читаемое название типа подключения
             conn_type = conn.get('connection_type', 'mkd')
-            type_name = CONNECTION_TYPES.get(conn_type, conn_type)
-            
-            row_data = [
-                idx,  # Номер по порядку
-                type_name,  # Тип подключения
-                executors,
-                conn['address'],
-                conn['router_model'],
-                str(conn['port']),
-                conn['employee_fiber_meters'],
-                conn['employee_twisted_pair_meters'],
-                date_str
-            ]
-            
-            for col_num, value in enumerate(row_data, 1):
-                cell = ws.cell(row=current_row, column=col_num)
-                cell.value = value
-                cell.border = border
-                
-                if col_num in [7, 8]:  # Числовые столбцы (сдвинулись на 1)
-                    cell.alignment = number_alignment
-                    cell.number_format = '0.00'
-                else:
-                    cell.alignment = cell_alignment
-            
-            current_row += 1
-        
-        # Итоги
-        current_row += 1
-        
-        # Итого общее
-        ws.merge_cells(f'A{current_row}:E{current_row}')
-        cell = ws.cell(row=current_row, column=1)
-        cell.value = "Итого общее:"
-        cell.font = total_font
-        cell.fill = total_fill
-        cell.alignment = Alignment(horizontal='right', vertical='center')
-        cell.border = border
-        
-        # Итого ВОЛС
-        cell = ws.cell(row=current_row, column=6)
-        cell.value = stats['total_fiber_meters']
-        cell.font = total_font
-        cell.fill = total_fill
-        cell.alignment = number_alignment
-        cell.number_format = '0.00'
-        cell.border = border
-        
-        # Итого витая пара
-        cell = ws.cell(row=current_row, column=7)
-        cell.value = stats['total_twisted_pair_meters']
-        cell.font = total_font
-        cell.fill = total_fill
-        cell.alignment = number_alignment
-        cell.number_format = '0.00'
-        cell.border = border
-        
-        # Пустая ячейка для выравнивания
-        cell = ws.cell(row=current_row, column=8)
-        cell.fill = total_fill
-        cell.border = border
-        
-        # Итого для сотрудника (с учетом деления)
-        current_row += 1
-        ws.merge_cells(f'A{current_row}:E{current_row}')
-        cell = ws.cell(row=current_row, column=1)
-        cell.value = f"Итого {employee_name}:"
-        cell.font = Font(name='Arial', size=12, bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        cell.alignment = Alignment(horizontal='right', vertical='center')
-        cell.border = border
-        
-        # Итого ВОЛС для сотрудника
-        cell = ws.cell(row=current_row, column=6)
-        cell.value = stats['total_fiber_meters']
-        cell.font = Font(name='Arial', size=12, bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        cell.alignment = number_alignment
-        cell.number_format = '0.00'
-        cell.border = border
-        
-        # Итого витая пара для сотрудника
-        cell = ws.cell(row=current_row, column=7)
-        cell.value = stats['total_twisted_pair_meters']
-        cell.font = Font(name='Arial', size=12, bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        cell.alignment = number_alignment
-        cell.number_format = '0.00'
-        cell.border = border
-        
-        # Пустая ячейка для выравнивания
-        cell = ws.cell(row=current_row, column=8)
-        cell.fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        cell.border = border
-        
-        # Создаём второй лист с движениями материалов, если они есть
-        if movements and len(movements) > 0:
-            ReportGenerator._add_movements_sheet(wb, employee_name, period_name, movements)
-        
-        # Сохранение файла
+            ws.append([
+                cell(ws, idx, 'report_text'),  # Номер по порядку
+                cell(ws, CONNECTION_TYPES.get(conn_type, conn_type), 'report_text'),
+                cell(ws, ', '.join(conn['all_employees']), 'report_text'),
+                cell(ws, conn['address'], 'report_text'),
+                cell(ws, conn['router_model'], 'report_text'),
+                cell(ws, str(conn['port']), 'report_text'),
+                cell(ws, conn['employee_fiber_meters'], 'report_number'),
+                cell(ws, conn['employee_twisted_pair_meters'], 'report_number'),
+                cell(ws, _format_date(conn['created_at']), 'report_text'),
+            ])
+            rows = idx
+        
+        # Итоги под столбцами метража: подпись объединяется на столбцы A-F
+        label_row = 6 + rows + 2
+        ws.append([])
+        for label, prefix in (("Итого общее:", 'report_total'), (f"Итого {employee_name}:", 'report_employee')):
+            ws.merged_cells.add(f'A{label_row}:F{label_row}')
+            ws.append(
+                [cell(ws, label, f'{prefix}_label')]
+                + [cell(ws, None, f'{prefix}_label') for _ in range(5)]
+                + [cell(ws, stats['total_fiber_meters'], f'{prefix}_number'),
+                   cell(ws, stats['total_twisted_pair_meters'], f'{prefix}_number'),
+                   cell(ws, None, f'{prefix}_blank')]
+            )
+            label_row += 1
+        
+        # Второй лист с движениями материалов, если они есть
+        if movements is not None:
+            movements = iter(movements)
+            first = next(movements, None)
+            if first is not None:
+                rows += ReportGenerator._add_movements_sheet(wb, employee_name, period_name, chain([first], movements))
+        
+        return rows
+    
+    @staticmethod
+    def report_filename(employee_name: str) -> str:
+        """Имя файла отчета для отправки пользователю"""
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"report_{employee_name.replace(' ', '_')}_{timestamp}.xlsx"
-        wb.save(filename)
-        
-        logger.info(f"Отчет создан: {filename}")
-        return filename
+        return f"report_{employee_name.replace(' ', '_')}_{timestamp}.xlsx"
     
     @staticmethod
-    def _add_movements_sheet(wb: Workbook, employee_name: str, period_name: str, movements: List[Dict]):
+    def generate_employee_report(
+        employee_name: str,
+        connections: Iterable[Dict],
+        stats: Dict,
+        period_name: str,
+        movements: Optional[Iterable[Dict]] = None,
+        output: Optional[BinaryIO] = None
+    ) -> BinaryIO:
         """
-        Добавляет лист с движениями материалов и роутеров
+        Генерирует Excel-отчет по сотруднику
         
         Args:
-            wb: Workbook объект
             employee_name: ФИО сотрудника
+            connections: Подключения (список или итератор по курсору БД)
+            stats: Итоговая статистика
             period_name: Название периода
-            movements: Список движений
-        """
-        # Создаём новый лист
-        ws = wb.create_sheet(title="Движение материалов")
-        
-        # Стили
-        header_font = Font(name='Arial', size=12, bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+            movements: Движения материалов и роутеров (опционально)
+            output: Куда записать книгу (BytesIO, SpooledTemporaryFile, открытый файл);
+                по умолчанию - новый BytesIO
         
-        title_font = Font(name='Arial', size=14, bold=True)
-        title_alignment = Alignment(horizontal='center', vertical='center')
+        Returns:
+            Буфер с книгой, установленный на начало
+        """
+        wb = ReportGenerator.create_workbook()
+        rows = ReportGenerator.write_employee_sheets(wb, employee_name, connections, stats, period_name, movements)
         
-        cell_alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
-        number_alignment = Alignment(horizontal='right', vertical='center')
+        output, size = ReportGenerator._save(wb, output)
+        logger.info(f"Отчет по сотруднику {employee_name} создан: {size} байт ({rows} строк)")
+        return output
+    
+    @staticmethod
+    def write_team_summary(wb: Workbook, summary: Dict, period_name: str) -> None:
+        """
+        Записать сводный лист по всем сотрудникам
         
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
+        Args:
+            wb: Книга из create_workbook()
+            summary: Сводка из Database.get_team_summary()
+            period_name: Название периода
+        """
+        cell = ReportGenerator._cell
+        ws = wb.create_sheet(title=TEAM_SUMMARY_TITLE)
+        employees = summary['employees']
+        
+        ReportGenerator._write_heading(ws, TEAM_SUMMARY_COLUMNS, [
+            ("Сводный отчет по всем сотрудникам", 'report_title'),
+            (f"Период: {period_name}", 'report_info_bold'),
+            (f"Сотрудников: {len(employees)}", 'report_info'),
+            (f"Дата формирования: {datetime.now().strftime('%d.%m.%Y %H:%M')}", 'report_date'),
+            ("Совместное подключение входит в строку каждого исполнителя, в итог - один раз", 'report_date'),
+        ], header_row=7)
+        
+        def values(summary_row: Dict) -> List:
+            return (
+                [summary_row['total_connections']]
+                + [summary_row['by_type'].get(conn_type, 0) for conn_type in CONNECTION_TYPES]
+                + [summary_row['total_fiber_meters'], summary_row['total_twisted_pair_meters'],
+                   summary_row['routers_used']]
+            )
+        
+        # Строка на сотрудника: количества - целыми, метраж - с двумя знаками
+        meter_columns = {len(CONNECTION_TYPES) + 1, len(CONNECTION_TYPES) + 2}
+        for idx, emp in enumerate(employees, 1):
+            ws.append(
+                [cell(ws, idx, 'report_text'), cell(ws, emp['full_name'], 'report_text')]
+                + [cell(ws, value, 'report_number' if col in meter_columns else 'report_count')
+                   for col, value in enumerate(values(emp))]
+            )
+        
+        # Итог по бригаде: подпись объединяется на столбцы A-B
+        label_row = 7 + len(employees) + 2
+        ws.append([])
+        ws.merged_cells.add(f'A{label_row}:B{label_row}')
+        ws.append(
+            [cell(ws, "Итого по бригаде:", 'report_total_label'), cell(ws, None, 'report_total_label')]
+            + [cell(ws, value, 'report_total_number' if col in meter_columns else 'report_total_count')
+               for col, value in enumerate(values(summary['total']))]
         )
+    
+    @staticmethod
+    def generate_team_report(
+        summary: Dict,
+        connections: Iterable[Dict],
+        period_name: str,
+        output: Optional[BinaryIO] = None
+    ) -> BinaryIO:
+        """
+        Генерирует сводный Excel-отчет по всем сотрудникам
         
-        # Зелёный для добавления
-        add_fill = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")
-        # Красный для списания
-        deduct_fill = PatternFill(start_color="FCE4D6", end_color="FCE4D6", fill_type="solid")
-        
-        # Заголовок
-        ws.merge_cells('A1:G1')
-        ws['A1'] = f"Движение материалов и роутеров"
-        ws['A1'].font = title_font
-        ws['A1'].alignment = title_alignment
+        Первый лист - сводка, затем по листу подключений на сотрудника.
+        Подключения читаются одним потоком, сгруппированным по сотрудникам
+        (Database.iter_team_report()), и пишутся в листы по мере чтения.
         
-        # Информация
-        ws.merge_cells('A2:G2')
-        ws['A2'] = f"Исполнитель: {employee_name}"
-        ws['A2'].font = Font(name='Arial', size=11, bold=True)
-        ws['A2'].alignment = cell_alignment
+        Args:
+            summary: Сводка из Database.get_team_summary()
+            connections: Подключения всех сотрудников (итератор по курсору БД)
+            period_name: Название периода
+            output: Куда записать книгу; по умолчанию - новый BytesIO
         
-        ws.merge_cells('A3:G3')
-        ws['A3'] = f"Период: {period_name}"
-        ws['A3'].font = Font(name='Arial', size=11)
-        ws['A3'].alignment = cell_alignment
+        Returns:
+            Буфер с книгой, установленный на начало
+        """
+        wb = ReportGenerator.create_workbook()
+        ReportGenerator.write_team_summary(wb, summary, period_name)
+        
+        employees = {emp['employee_id']: emp for emp in summary['employees']}
+        used_titles = {TEAM_SUMMARY_TITLE.lower()}
+        rows = 0
+        for employee_id, employee_rows in groupby(connections, key=itemgetter('employee_id')):
+            emp = employees.get(employee_id)
+            if emp is None:
+                # Сотрудник появился после расчета сводки - его строки пропускаются
+                continue
+            rows += ReportGenerator.write_employee_sheets(
+                wb, emp['full_name'], employee_rows, emp, period_name,
+                title=_sheet_title(emp['full_name'], used_titles)
+            )
+        
+        output, size = ReportGenerator._save(wb, output)
+        logger.info(f"Сводный отчет по {len(employees)} сотрудникам создан: {size} байт ({rows} строк)")
+        return output
+    
+    @staticmethod
+    def _save(wb: Workbook, output: Optional[BinaryIO]) -> Tuple[BinaryIO, int]:
+        """Сохранить книгу в буфер (по умолчанию BytesIO) и вернуть его, установленным на начало, и размер"""
+        if output is None:
+            output = BytesIO()
+        wb.save(output)
+        size = output.tell()
+        output.seek(0)
+        return output, size
+    
+    @staticmethod
+    def _add_movements_sheet(wb: Workbook, employee_name: str, period_name: str, movements: Iterable[Dict]) -> int:
+        """
+        Добавляет лист с движениями материалов и роутеров
         
-        # Заголовки столбцов
-        headers = [
-            'Дата',
-            'Операция',
-            'Тип',
-            'Название',
-            'Количество',
-            'Остаток',
-            'Связь с подключением'
-        ]
+        Args:
+            wb: Workbook объект (write-only)
+            employee_name: ФИО сотрудника
+            period_name: Название периода
+            movements: Движения (список или итератор)
         
-        ws.row_dimensions[5].height = 30
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=5, column=col_num)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = border
+        Returns:
+            Количество записанных движений
+        """
+        cell = ReportGenerator._cell
+        ws = wb.create_sheet(title="Движение материалов")
         
-        # Ширина столбцов
-        ws.column_dimensions['A'].width = 18  # Дата
-        ws.column_dimensions['B'].width = 12  # Операция
-        ws.column_dimensions['C'].width = 15  # Тип
-        ws.column_dimensions['D'].width = 20  # Название
-        ws.column_dimensions['E'].width = 12  # Количество
-        ws.column_dimensions['F'].width = 12  # Остаток
-        ws.column_dimensions['G'].width = 20  # Связь
+        ReportGenerator._write_heading(ws, MOVEMENT_COLUMNS, [
+            ("Движение материалов и роутеров", 'report_title'),
+            (f"Исполнитель: {employee_name}", 'report_info_bold'),
+            (f"Период: {period_name}", 'report_info'),
+        ], header_row=5)
         
-        # Данные движений
-        current_row = 6
+        count = 0
         for mov in movements:
-            # Форматируем дату
-            try:
-                created_at = datetime.fromisoformat(mov['created_at'])
-                date_str = created_at.strftime('%d.%m.%Y %H:%M')
-            except:
-                date_str = mov['created_at']
-            
-            # Операция
-            operation = "Добавление" if mov['operation_type'] == 'add' else "Списание"
-            
-            # Тип
-            type_map = {
-                'fiber': 'ВОЛС',
-                'twisted_pair': 'Витая пара',
-                'router': 'Роутер'
-            }
-            item_type = type_map.get(mov['item_type'], mov['item_type'])
+            # Операция и цвет строки
+            if mov['operation_type'] == 'add':
+                operation, text_style, number_style = "Добавление", 'movement_add_text', 'movement_add_number'
+            else:
+                operation, text_style, number_style = "Списание", 'movement_deduct_text', 'movement_deduct_number'
             
             # Количество
             if mov['item_type'] == 'router':
@@ -353,30 +444,16 @@ class ReportGenerator:
             # Связь с подключением
             conn_link = f"Подключение #{mov['connection_id']}" if mov['connection_id'] else "-"
             
-            row_data = [
-                date_str,
-                operation,
-                item_type,
-                mov['item_name'],
-                quantity_str,
-                balance_str,
-                conn_link
-            ]
-            
-            # Определяем цвет фона
-            row_fill = add_fill if mov['operation_type'] == 'add' else deduct_fill
-            
-            for col_num, value in enumerate(row_data, 1):
-                cell = ws.cell(row=current_row, column=col_num)
-                cell.value = value
-                cell.border = border
-                cell.fill = row_fill
-                
-                if col_num in [5, 6]:  # Количество и остаток
-                    cell.alignment = number_alignment
-                else:
-                    cell.alignment = cell_alignment
-            
-            current_row += 1
-        
-        logger.info(f"Добавлен лист 'Движение материалов' с {len(movements)} записями")
+            ws.append([
+                cell(ws, _format_date(mov['created_at']), text_style),
+                cell(ws, operation, text_style),
+                cell(ws, MOVEMENT_TYPES.get(mov['item_type'], mov['item_type']), text_style),
+                cell(ws, mov['item_name'], text_style),
+                cell(ws, quantity_str, number_style),
+                cell(ws, balance_str, number_style),
+                cell(ws, conn_link, text_style),
+            ])
+            count += 1
+        
+        logger.info(f"Добавлен лист 'Движение материалов' с {count} записями")
+        return count
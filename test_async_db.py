@@ -0,0 +1,115 @@
+"""
+Тесты для асинхронного фасада БД
+"""
+import asyncio
+import os
+import threading
+import time
+import unittest
+
+from database import Database
+from database.async_db import AsyncDatabase
+from database.connection_pool import close_pool
+
+
+class TestAsyncDatabase(unittest.IsolatedAsyncioTestCase):
+    """Тесты для класса AsyncDatabase"""
+    
+    def setUp(self):
+        """Подготовка к тестам - создание тестовой БД"""
+        self.test_db_path = "test_async_isp_bot.db"
+        self.db = AsyncDatabase(Database(self.test_db_path), read_workers=2, max_pending=4)
+    
+    async def asyncTearDown(self):
+        await self.db.shutdown()
+    
+    def tearDown(self):
+        """Очистка после тестов - удаление тестовой БД"""
+        close_pool(self.test_db_path)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db_path + suffix):
+                os.remove(self.test_db_path + suffix)
+    
+    async def test_async_methods(self):
+        """Тест вызова методов Database через префикс a"""
+        emp_id = await self.db.aadd_employee("Асинхронный Сотрудник")
+        employee = await self.db.aget_employee_by_id(emp_id)
+        
+        self.assertEqual(employee['full_name'], "Асинхронный Сотрудник")
+        self.assertEqual(self.db.db_path, self.test_db_path)
+    
+    async def test_runs_outside_event_loop_thread(self):
+        """Тест выполнения запросов вне потока цикла событий"""
+        loop_thread = threading.get_ident()
+        
+        def current_thread():
+            return threading.get_ident(), threading.current_thread().name
+        
+        read_ident, read_name = await self.db.run_read(current_thread)
+        write_ident, write_name = await self.db.run_write(current_thread)
+        
+        self.assertNotEqual(read_ident, loop_thread)
+        self.assertNotEqual(write_ident, loop_thread)
+        self.assertTrue(read_name.startswith("db-read"))
+        self.assertTrue(write_name.startswith("db-write"))
+    
+    async def test_bounded_queue_and_stats(self):
+        """Тест ограничения очереди и статистики"""
+        await asyncio.gather(*[
+            self.db.aadd_employee(f"Сотрудник {i}") for i in range(10)
+        ])
+        employees = await self.db.aget_all_employees()
+        
+        self.assertEqual(len(employees), 10)
+        stats = self.db.stats()
+        self.assertEqual(stats['write']['completed'], 10)
+        self.assertLessEqual(stats['write']['max_pending'], 4)
+        self.assertEqual(stats['read']['completed'], 1)
+        self.assertEqual(stats['write']['errors'], 0)
+    
+    
+    async def test_sync_methods_rejected(self):
+        """Тест: синхронные запросы через фасад запрещены, кроме SYNC_METHODS"""
+        with self.assertRaises(AttributeError):
+            self.db.get_all_employees()
+        with self.assertRaises(AttributeError):
+            self.db.add_employee("Синхронный Сотрудник")
+        
+        self.assertEqual(self.db.get_data_version(), self.db.db.get_data_version())
+        self.assertIn('write', self.db.get_pool_stats())
+        self.assertIs(self.db.pool, self.db.db.pool)
+    
+    async def test_queue_time_includes_full_queue_wait(self):
+        """Тест: время ожидания места в заполненной очереди входит в queue_time"""
+        db = AsyncDatabase(self.db.db, read_workers=1, max_pending=1)
+        try:
+            await asyncio.gather(db.run_write(time.sleep, 0.1), db.run_write(time.sleep, 0.1))
+            stats = db.stats()['write']
+        finally:
+            await db.shutdown()
+        
+        self.assertEqual(stats['queue_full_waits'], 1)
+        self.assertGreaterEqual(stats['queue_time_max'], 0.09)
+    
+    async def test_shutdown_does_not_block_loop(self):
+        """Тест: ожидание незавершенных запросов при остановке не блокирует цикл событий"""
+        write = asyncio.create_task(self.db.run_write(time.sleep, 0.3))
+        await asyncio.sleep(0.05)
+        
+        ticks = 0
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+        
+        ticking = asyncio.create_task(ticker())
+        await self.db.shutdown()
+        ticking.cancel()
+        await write
+        
+        self.assertGreater(ticks, 5)
+        self.assertEqual(self.db.stats()['write']['completed'], 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
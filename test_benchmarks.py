@@ -0,0 +1,149 @@
+"""
+Тесты генератора синтетических данных и бенчмарка репозиториев
+"""
+import copy
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from benchmarks import repositories, webhook_latency
+from benchmarks.dataset import DEFAULT_NOW, generate
+from database import Database
+from database.base_repository import db_timestamp
+from database.connection_pool import close_pool
+
+# Начало, которое раньше всей истории и не совпадает с началом суток (итоги - по исходным таблицам)
+RAW_START = datetime(2000, 1, 1, 0, 0, 1)
+
+
+class TestDataset(unittest.TestCase):
+    """Тесты для benchmarks.dataset.generate"""
+    
+    def setUp(self):
+        """Подготовка к тестам - временный каталог для БД"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.now = datetime(2025, 3, 10, 12, 0)
+    
+    def tearDown(self):
+        """Очистка после тестов - закрытие пулов и удаление БД"""
+        for name in os.listdir(self.tmp.name):
+            if name.endswith('.db'):
+                close_pool(os.path.join(self.tmp.name, name))
+        self.tmp.cleanup()
+    
+    def _generate(self, name: str, connections: int, seed: int = 42) -> tuple:
+        db_path = os.path.join(self.tmp.name, name)
+        return db_path, generate(db_path, connections, seed=seed, now=self.now)
+    
+    @staticmethod
+    def _dump(db_path: str) -> dict:
+        conn = sqlite3.connect(db_path)
+        try:
+            return {
+                table: conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2").fetchall()
+                for table in ('connections', 'connection_employees', 'material_movement_log', 'employee_routers')
+            }
+        finally:
+            conn.close()
+    
+    def test_generate_is_deterministic(self):
+        """Одинаковый seed дает одинаковые данные, другой - другие"""
+        first_path, first = self._generate("first.db", 300)
+        second_path, second = self._generate("second.db", 300)
+        other_path, _ = self._generate("other.db", 300, seed=7)
+        
+        self.assertEqual(first['connections'], 300)
+        self.assertGreater(first['connection_employees'], 300)
+        self.assertEqual(
+            {key: value for key, value in first.items() if key != 'seconds'},
+            {key: value for key, value in second.items() if key != 'seconds'}
+        )
+        self.assertEqual(self._dump(first_path), self._dump(second_path))
+        self.assertNotEqual(self._dump(first_path)['connections'], self._dump(other_path)['connections'])
+    
+    def test_default_end_is_fixed(self):
+        """Без now история заканчивается фиксированной датой, а не днем запуска"""
+        db_path = os.path.join(self.tmp.name, "default.db")
+        generate(db_path, 100)
+        conn = sqlite3.connect(db_path)
+        try:
+            first, last = conn.execute("SELECT MIN(created_at), MAX(created_at) FROM connections").fetchone()
+        finally:
+            conn.close()
+        self.assertEqual(first, db_timestamp(DEFAULT_NOW - timedelta(days=365)))
+        self.assertLess(last, db_timestamp(DEFAULT_NOW))
+    
+    def test_generated_history_is_consistent(self):
+        """Остатки совпадают с журналом, дневные сводки - с исходными таблицами"""
+        db_path, result = self._generate("history.db", 500)
+        db = Database(db_path)
+        
+        for employee_id in result['employee_ids']:
+            fiber, twisted_pair = db.get_employee_balance(employee_id)
+            self.assertGreaterEqual(fiber, 0)
+            self.assertGreaterEqual(twisted_pair, 0)
+            
+            # Итоги из сводок и из строк отчета
+            _, stats = db.get_employee_report(employee_id)
+            self.assertEqual(db.get_employee_report_totals(employee_id), stats)
+            self.assertEqual(db.count_employee_movements(employee_id),
+                             db.count_employee_movements(employee_id, RAW_START))
+        
+        self.assertEqual(db.get_team_summary(), db.get_team_summary(start=RAW_START))
+
+
+class TestRepositoryBenchmark(unittest.TestCase):
+    """Тесты для benchmarks.repositories"""
+    
+    def test_run_and_compare(self):
+        """Прогон на маленькой истории и поиск регрессий относительно базовых результатов"""
+        results = repositories.run([200], time_budget=0, max_iterations=1)
+        cases = results['sizes']['200']['cases']
+        
+        self.assertEqual(set(cases), {case.name for case in repositories.CASES})
+        for name, result in cases.items():
+            self.assertEqual(result['iterations'], 5, name)
+            self.assertGreater(result['ops_per_sec'], 0, name)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'], name)
+            self.assertGreater(result['queries'], 0, name)
+        
+        # Итоги и счетчики - один запрос к сводкам, отчет - не зависит от размера истории
+        self.assertEqual(cases['connections.employee_totals_all']['queries'], 1)
+        self.assertEqual(cases['connections.team_summary_30d']['queries'], 1)
+        self.assertEqual(cases['report.employee_30d']['queries'], 3)
+        
+        self.assertEqual(repositories.compare(results, results, tolerance=0.5), [])
+        
+        slower = copy.deepcopy(results)
+        case = slower['sizes']['200']['cases']['connections.get_by_id']
+        case['queries'] += 1
+        case['p50_ms'] += 10
+        regressions = repositories.compare(slower, results, tolerance=0.5)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(regression.startswith("200 / connections.get_by_id") for regression in regressions))
+
+
+
+class TestWebhookLatency(unittest.TestCase):
+    """Тесты для benchmarks.webhook_latency"""
+    
+    def test_polling_and_webhook(self):
+        """Каждое записанное обновление получает ответ в обоих режимах"""
+        results = webhook_latency.run(['polling', 'webhook'], rounds=1)
+        polling, webhook = results['modes']['polling'], results['modes']['webhook']
+        
+        for result in (polling, webhook):
+            self.assertEqual(result['updates'], 4)
+            self.assertEqual(result['api_calls']['sendMessage'], 4)
+            self.assertLessEqual(result['p50_ms'], result['max_ms'])
+        
+        self.assertGreaterEqual(polling['api_calls']['getUpdates'], 4)
+        self.assertEqual(webhook['api_calls']['setWebhook'], 1)
+        self.assertNotIn('getUpdates', webhook['api_calls'])
+        self.assertEqual(webhook['rejected_without_secret'], 403)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -3,7 +3,13 @@
 """
 import unittest
 import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
 from database import Database
+from database.base_repository import db_timestamp
+from database.connection_pool import close_pool
+from database.migrations import LATEST_VERSION, apply_migrations, get_schema_version
 
 
 class TestDatabase(unittest.TestCase):
@@ -16,8 +22,15 @@ class TestDatabase(unittest.TestCase):
     
     def tearDown(self):
         """Очистка после тестов - удаление тестовой БД"""
-        if os.path.exists(self.test_db_path):
-            os.remove(self.test_db_path)
+        close_pool(self.test_db_path)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db_path + suffix):
+                os.remove(self.test_db_path + suffix)
+    
+    def _stock(self, *employee_ids):
+        """Выдать исполнителям материалы для подключений без плательщика (списание поровну)"""
+        for employee_id in employee_ids:
+            self.db.add_material_to_employee(employee_id, 1000.0, 1000.0)
     
     # ==================== ТЕСТЫ СОТРУДНИКОВ ====================
     
@@ -77,6 +90,46 @@ class TestDatabase(unittest.TestCase):
         result = self.db.delete_employee(99999)
         self.assertFalse(result)
     
+    def test_delete_employee_keeps_history(self):
+        """Тест: после удаления сотрудника его подключения и журнал движений сохраняются"""
+        emp1 = self.db.add_employee("Уволенный")
+        emp2 = self.db.add_employee("Напарник")
+        self.db.add_material_to_employee(emp1, 100.0, 10.0)
+        conn_id = self.db.create_connection(
+            connection_type="mkd",
+            address="ул. Тестовая, д. 2",
+            router_model="Test Router",
+            port="1",
+            fiber_meters=10.0,
+            twisted_pair_meters=4.0,
+            employee_ids=[emp1, emp2],
+            photo_file_ids=["photo1"],
+            created_by=123456789,
+            material_payer_id=emp1
+        )
+        movements = self.db.count_employee_movements(emp1)
+        
+        self.assertTrue(self.db.delete_employee(emp1))
+        self.assertFalse(self.db.delete_employee(emp1))
+        
+        # Из списков сотрудник исчезает
+        self.assertEqual([emp['id'] for emp in self.db.get_all_employees()], [emp2])
+        self.assertEqual([emp['id'] for emp in self.db.get_employee_inventory()], [emp2])
+        
+        # История остается
+        self.assertEqual(self.db.count_employee_movements(emp1), movements)
+        self.assertEqual(len(self.db.get_connection_by_id(conn_id)['employees']), 2)
+        self.assertEqual(self.db.get_employee_names([emp1, emp2]), ["Напарник", "Уволенный"])
+        rows, stats = self.db.get_employee_report(emp2)
+        self.assertEqual(rows[0]['employee_count'], 2)
+        self.assertEqual(stats['total_fiber_meters'], 5.0)
+        
+        # Повторное добавление восстанавливает того же сотрудника
+        self.assertEqual(self.db.add_employee("Уволенный"), emp1)
+        self.assertEqual(self.db.get_employee_by_id(emp1)['fiber_balance'], 0)
+        self.assertEqual(len(self.db.get_all_employees()), 2)
+        self.assertIsNone(self.db.add_employee("Напарник"))
+    
     # ==================== ТЕСТЫ ПОДКЛЮЧЕНИЙ ====================
     
     def test_create_connection(self):
@@ -84,9 +137,11 @@ class TestDatabase(unittest.TestCase):
         # Добавляем сотрудников
         emp1 = self.db.add_employee("Монтажник 1")
         emp2 = self.db.add_employee("Монтажник 2")
+        self._stock(emp1, emp2)
         
         # Создаем подключение
         conn_id = self.db.create_connection(
+            connection_type="mkd",
             address="ул. Тестовая, д. 1",
             router_model="Test Router",
             port="8",
@@ -105,8 +160,10 @@ class TestDatabase(unittest.TestCase):
         # Подготовка данных
         emp1 = self.db.add_employee("Монтажник А")
         emp2 = self.db.add_employee("Монтажник Б")
+        self._stock(emp1, emp2)
         
         conn_id = self.db.create_connection(
+            connection_type="mkd",
             address="ул. Ленина, д. 10",
             router_model="Keenetic",
             port="5",
@@ -127,6 +184,87 @@ class TestDatabase(unittest.TestCase):
         self.assertEqual(len(connection['employees']), 2)
         self.assertEqual(len(connection['photos']), 3)
     
+    def test_create_connection_atomic(self):
+        """Тест создания подключения со списанием материалов и роутера одной транзакцией"""
+        payer = self.db.add_employee("Плательщик")
+        helper = self.db.add_employee("Помощник")
+        self.db.add_material_to_employee(payer, 500.0, 100.0)
+        self.db.add_router_to_employee(payer, "Keenetic", 2)
+        
+        with self.db.pool.trace_statements() as statements:
+            conn_id = self.db.create_connection(
+                connection_type="mkd",
+                address="ул. Атомарная, д. 1",
+                router_model="Keenetic",
+                port="2",
+                fiber_meters=120.0,
+                twisted_pair_meters=30.0,
+                employee_ids=[payer, helper],
+                photo_file_ids=["photo1", "photo2"],
+                created_by=123456789,
+                material_payer_id=payer,
+                router_payer_id=payer
+            )
+        
+        self.assertIsNotNone(conn_id)
+        self.assertEqual(sum(1 for sql in statements if sql == "COMMIT"), 1)
+        self.assertEqual(self.db.get_employee_balance(payer), (380.0, 70.0))
+        self.assertEqual(self.db.get_router_quantity(payer, "Keenetic"), 1)
+        self.assertEqual(len(self.db.get_connection_by_id(conn_id)['photos']), 2)
+        
+        with self.db.pool.connection() as conn:
+            logged = conn.execute(
+                "SELECT COUNT(*) FROM material_movement_log WHERE connection_id = ?", (conn_id,)
+            ).fetchone()[0]
+        self.assertEqual(logged, 3)  # ВОЛС, витая пара, роутер
+    
+    def test_create_connection_rollback(self):
+        """Тест отката подключения, если у плательщика не хватает материалов"""
+        payer = self.db.add_employee("Бедный Плательщик")
+        self.db.add_material_to_employee(payer, 50.0, 100.0)
+        self.db.add_router_to_employee(payer, "Keenetic", 1)
+        
+        conn_id = self.db.create_connection(
+            connection_type="mkd",
+            address="ул. Откатная, д. 2",
+            router_model="Keenetic",
+            port="3",
+            fiber_meters=120.0,
+            twisted_pair_meters=30.0,
+            employee_ids=[payer],
+            photo_file_ids=["photo1"],
+            created_by=123456789,
+            material_payer_id=payer,
+            router_payer_id=payer
+        )
+        
+        self.assertIsNone(conn_id)
+        self.assertEqual(self.db.get_all_connections_count(), 0)
+        self.assertEqual(self.db.get_employee_balance(payer), (50.0, 100.0))
+        self.assertEqual(self.db.get_router_quantity(payer, "Keenetic"), 1)
+        
+        with self.db.pool.connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM connection_photos").fetchone()[0], 0)
+            self.assertEqual(conn.execute(
+                "SELECT COUNT(*) FROM material_movement_log WHERE operation_type = 'deduct'"
+            ).fetchone()[0], 0)
+    
+    def test_material_movements_single_commit(self):
+        """Тест записи движений в той же транзакции, что и изменение остатков"""
+        emp_id = self.db.add_employee("Кладовщик")
+        
+        with self.db.pool.trace_statements() as statements:
+            self.assertTrue(self.db.add_material_to_employee(emp_id, 100.0, 50.0))
+            self.assertTrue(self.db.add_router_to_employee(emp_id, "Keenetic", 3))
+        
+        self.assertEqual(sum(1 for sql in statements if sql == "COMMIT"), 2)
+        
+        movements = self.db.get_employee_movements(emp_id, datetime(2020, 1, 1), datetime.now() + timedelta(days=1))
+        self.assertEqual(
+            [(m['item_type'], m['quantity'], m['balance_after']) for m in movements],
+            [('fiber', 100.0, 100.0), ('twisted_pair', 50.0, 50.0), ('router', 3, 3)]
+        )
+    
     # ==================== ТЕСТЫ ОТЧЕТОВ ====================
     
     def test_get_employee_report_empty(self):
@@ -139,11 +277,41 @@ class TestDatabase(unittest.TestCase):
         self.assertEqual(stats['total_fiber_meters'], 0)
         self.assertEqual(stats['total_twisted_pair_meters'], 0)
     
+    def test_create_connection_rollback_on_any_deduction(self):
+        """Тест отката подключения, если не списалась доля исполнителя или роутер"""
+        stocked = self.db.add_employee("С материалами")
+        empty = self.db.add_employee("Без материалов")
+        self._stock(stocked)
+        self.db.add_router_to_employee(empty, "Keenetic", 1)
+        
+        def create(**kwargs):
+            options = dict(connection_type="mkd", address="ул. Откатная, д. 3", router_model="-", port="1",
+                           fiber_meters=10.0, twisted_pair_meters=2.0, employee_ids=[stocked, empty],
+                           photo_file_ids=["photo1"], created_by=1)
+            options.update(kwargs)
+            return self.db.create_connection(**options)
+        
+        # Поровну: у второго исполнителя нет материалов - доля первого тоже не списывается
+        self.assertIsNone(create())
+        
+        # Материалы у плательщика есть, а роутера нет
+        self.assertIsNone(create(router_model="TP-Link", material_payer_id=stocked, router_payer_id=stocked))
+        
+        self.assertEqual(self.db.get_all_connections_count(), 0)
+        self.assertEqual(self.db.get_employee_balance(stocked), (1000.0, 1000.0))
+        with self.db.pool.connection() as conn:
+            self.assertEqual(conn.execute(
+                "SELECT COUNT(*) FROM material_movement_log WHERE connection_id IS NOT NULL"
+            ).fetchone()[0], 0)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM connection_photos").fetchone()[0], 0)
+    
     def test_get_employee_report_single(self):
         """Тест отчета с одним подключением (один исполнитель)"""
         emp_id = self.db.add_employee("Единственный Исполнитель")
+        self._stock(emp_id)
         
         conn_id = self.db.create_connection(
+            connection_type="mkd",
             address="ул. Мира, д. 5",
             router_model="TP-Link",
             port="3",
@@ -165,9 +333,11 @@ class TestDatabase(unittest.TestCase):
         """Тест отчета с разделенным подключением (два исполнителя)"""
         emp1 = self.db.add_employee("Исполнитель 1")
         emp2 = self.db.add_employee("Исполнитель 2")
+        self._stock(emp1, emp2)
         
         # Создаем подключение с двумя исполнителями
         self.db.create_connection(
+            connection_type="mkd",
             address="ул. Пушкина, д. 3",
             router_model="Mikrotik",
             port="12",
@@ -189,9 +359,11 @@ class TestDatabase(unittest.TestCase):
         """Тест отчета с несколькими подключениями"""
         emp1 = self.db.add_employee("Многозадачный 1")
         emp2 = self.db.add_employee("Многозадачный 2")
+        self._stock(emp1, emp2)
         
         # Первое подключение (один исполнитель)
         self.db.create_connection(
+            connection_type="mkd",
             address="Адрес 1",
             router_model="Router 1",
             port="1",
@@ -204,6 +376,7 @@ class TestDatabase(unittest.TestCase):
         
         # Второе подключение (два исполнителя)
         self.db.create_connection(
+            connection_type="mkd",
             address="Адрес 2",
             router_model="Router 2",
             port="2",
@@ -221,9 +394,170 @@ class TestDatabase(unittest.TestCase):
         self.assertEqual(stats['total_fiber_meters'], 200.0)  # 100 + 100 (200/2)
         self.assertEqual(stats['total_twisted_pair_meters'], 20.0)  # 10 + 10 (20/2)
     
+    def test_get_employee_report_executors(self):
+        """Тест списка исполнителей в отчете (в алфавитном порядке)"""
+        emp1 = self.db.add_employee("Яковлев")
+        emp2 = self.db.add_employee("Андреев")
+        emp3 = self.db.add_employee("Борисов")
+        self._stock(emp1, emp2, emp3)
+        
+        self.db.create_connection(
+            connection_type="mkd",
+            address="ул. Садовая, д. 7",
+            router_model="TP-Link",
+            port="4",
+            fiber_meters=90.0,
+            twisted_pair_meters=30.0,
+            employee_ids=[emp1, emp2, emp3],
+            photo_file_ids=[],
+            created_by=123456789
+        )
+        
+        connections, stats = self.db.get_employee_report(emp1)
+        
+        self.assertEqual(connections[0]['all_employees'], ["Андреев", "Борисов", "Яковлев"])
+        self.assertEqual(connections[0]['employee_count'], 3)
+        self.assertEqual(stats['total_fiber_meters'], 30.0)
+    
+    def test_get_employee_report_query_count(self):
+        """Тест: количество запросов отчета не зависит от числа подключений"""
+        emp1 = self.db.add_employee("Ветеран 1")
+        emp2 = self.db.add_employee("Ветеран 2")
+        self._stock(emp1, emp2)
+        
+        counts = []
+        for batch in range(2):
+            for i in range(1 + batch * 20):
+                self.db.create_connection(
+                    connection_type="mkd",
+                    address=f"Адрес {batch}-{i}",
+                    router_model="Router",
+                    port=str(i),
+                    fiber_meters=10.0,
+                    twisted_pair_meters=2.0,
+                    employee_ids=[emp1, emp2],
+                    photo_file_ids=[],
+                    created_by=123456789
+                )
+            with self.db.read_pool.trace_statements() as statements:
+                connections, _ = self.db.get_employee_report(emp1)
+            counts.append(len(statements))
+        
+        self.assertEqual(len(connections), 22)
+        self.assertEqual(counts, [1, 1])
+    
+    def test_employee_report_stream_and_totals(self):
+        """Тест потокового отчета и итогов агрегирующим запросом"""
+        emp1 = self.db.add_employee("Монтажник 1")
+        emp2 = self.db.add_employee("Монтажник 2")
+        self.db.add_material_to_employee(emp1, 1000.0, 1000.0)
+        for i, executors in enumerate([[emp1], [emp1, emp2], [emp1, emp2]]):
+            self.db.create_connection(
+                connection_type="mkd", address=f"Адрес {i}", router_model="-", port=str(i),
+                fiber_meters=100.0, twisted_pair_meters=10.0, employee_ids=executors,
+                photo_file_ids=[], created_by=1, material_payer_id=emp1
+            )
+        
+        connections, stats = self.db.get_employee_report(emp1)
+        self.assertEqual(list(self.db.iter_employee_report(emp1)), connections)
+        self.assertEqual(self.db.get_employee_report_totals(emp1), stats)
+        self.assertEqual(stats['total_fiber_meters'], 200.0)
+        self.assertEqual(self.db.get_employee_report_totals(emp2)['total_connections'], 2)
+        
+        start, end = datetime(2020, 1, 1), datetime.now() + timedelta(days=1)
+        movements = self.db.get_employee_movements(emp1, start, end)
+        self.assertEqual(list(self.db.iter_employee_movements(emp1, start, end)), movements)
+        self.assertEqual(self.db.count_employee_movements(emp1, start, end), len(movements))
+    
+    def test_team_summary_and_stream(self):
+        """Тест сводки по всем сотрудникам и общего потока подключений"""
+        emp1 = self.db.add_employee("Монтажник 1")
+        emp2 = self.db.add_employee("Монтажник 2")
+        self.db.add_material_to_employee(emp1, 1000.0, 1000.0)
+        self.db.add_router_to_employee(emp2, "Keenetic", 5)
+        for i, (conn_type, executors) in enumerate([('mkd', [emp1]), ('chs', [emp1, emp2]), ('mkd', [emp1, emp2])]):
+            self.db.create_connection(
+                connection_type=conn_type, address=f"Адрес {i}", router_model="Keenetic", port=str(i),
+                fiber_meters=100.0, twisted_pair_meters=10.0, employee_ids=executors,
+                photo_file_ids=[], created_by=1, material_payer_id=emp1, router_payer_id=emp2
+            )
+        
+        with self.db.pool.trace_statements() as statements:
+            summary = self.db.get_team_summary()
+        self.assertEqual(len(statements), 1)
+        
+        first, second = summary['employees']
+        self.assertEqual(first['employee_id'], emp1)
+        self.assertEqual(first['by_type'], {'mkd': 2, 'chs': 1})
+        self.assertEqual(first['routers_used'], 0)
+        self.assertEqual(second['by_type'], {'mkd': 1, 'chs': 1})
+        self.assertEqual(second['routers_used'], 3)
+        
+        # Доли сотрудника совпадают с его отчетом, в итоге подключение учитывается один раз
+        for emp in summary['employees']:
+            totals = self.db.get_employee_report_totals(emp['employee_id'])
+            self.assertEqual(emp['total_connections'], totals['total_connections'])
+            self.assertEqual(emp['total_fiber_meters'], totals['total_fiber_meters'])
+        self.assertEqual(summary['total']['total_connections'], 3)
+        self.assertEqual(summary['total']['by_type'], {'mkd': 2, 'chs': 1})
+        self.assertEqual(summary['total']['total_fiber_meters'], 300.0)
+        self.assertEqual(summary['total']['routers_used'], 3)
+        
+        rows = list(self.db.iter_team_report())
+        self.assertEqual([row['employee_id'] for row in rows], [emp1] * 3 + [emp2] * 2)
+        self.assertEqual(rows[:3], list(self.db.iter_employee_report(emp1)))
+        
+        self.assertEqual(self.db.get_team_summary(days=7)['total']['total_connections'], 3)
+    
+    def test_report_date_range(self):
+        """Тест отчетов за произвольный период: границы [start, end) в локальном времени"""
+        emp1 = self.db.add_employee("Монтажник 1")
+        emp2 = self.db.add_employee("Монтажник 2")
+        self.db.add_material_to_employee(emp1, 1000.0, 1000.0)
+        self.db.add_router_to_employee(emp1, "Keenetic", 5)
+        days = [datetime(2025, 2, 28, 23, 30), datetime(2025, 3, 1), datetime(2025, 3, 31, 23, 59), datetime(2025, 4, 1)]
+        for i, day in enumerate(days):
+            conn_id = self.db.create_connection(
+                connection_type="mkd", address=f"Адрес {i}", router_model="Keenetic", port=str(i),
+                fiber_meters=10.0, twisted_pair_meters=5.0, employee_ids=[emp1, emp2],
+                photo_file_ids=[], created_by=1, material_payer_id=emp1, router_payer_id=emp1
+            )
+            # created_at хранится в UTC; дата исполнителей обновляется триггером
+            with self.db.pool.transaction() as conn:
+                conn.execute("UPDATE connections SET created_at = ? WHERE id = ?", (db_timestamp(day), conn_id))
+                conn.execute("UPDATE material_movement_log SET created_at = ? WHERE connection_id = ?",
+                             (db_timestamp(day), conn_id))
+        # Даты изменены в обход репозиториев - сводки пересчитываются
+        self.db.rebuild_daily_stats()
+        
+        start, end = datetime(2025, 3, 1), datetime(2025, 4, 1)
+        connections, stats = self.db.get_employee_report(emp2, start=start, end=end)
+        self.assertEqual([conn['address'] for conn in connections], ["Адрес 2", "Адрес 1"])
+        self.assertEqual(stats['total_connections'], 2)
+        self.assertEqual(self.db.get_employee_report_totals(emp1, start=start, end=end)['total_connections'], 2)
+        self.assertEqual(len(list(self.db.iter_team_report(start=start, end=end))), 4)
+        
+        summary = self.db.get_team_summary(start=start, end=end)
+        self.assertEqual(summary['total']['total_connections'], 2)
+        self.assertEqual(summary['total']['routers_used'], 2)
+        
+        # Списания за период: по ВОЛС, витой паре и роутеру на подключение
+        movements = self.db.get_employee_movements(emp1, start, end)
+        self.assertEqual(len(movements), 6)
+        self.assertEqual(self.db.count_employee_movements(emp1, start, end), 6)
+        # Без конца периода - по текущий момент (включая сегодняшние начисления)
+        self.assertEqual(self.db.count_employee_movements(emp1, start_date=start),
+                         self.db.count_employee_movements(emp1) - 3)
+        self.assertEqual(self.db.get_employee_report_totals(emp1, end=start)['total_connections'], 1)
+        
+        # Границы внутри дня считаются по исходным таблицам
+        self.assertEqual(self.db.get_employee_report_totals(emp1, start=datetime(2025, 2, 28, 23))['total_connections'], 4)
+        self.assertEqual(self.db.get_team_summary(start=start, end=datetime(2025, 3, 31, 23))['total']['total_connections'], 1)
+    
     def test_get_connections_count(self):
         """Тест подсчета общего количества подключений"""
         emp_id = self.db.add_employee("Тестовый")
+        self._stock(emp_id)
         
         # Изначально 0
         count = self.db.get_all_connections_count()
@@ -232,6 +566,7 @@ class TestDatabase(unittest.TestCase):
         # Добавляем 3 подключения
         for i in range(3):
             self.db.create_connection(
+                connection_type="mkd",
                 address=f"Адрес {i}",
                 router_model="Router",
                 port=str(i),
@@ -244,6 +579,339 @@ class TestDatabase(unittest.TestCase):
         
         count = self.db.get_all_connections_count()
         self.assertEqual(count, 3)
+    
+    def test_daily_stats(self):
+        """Тест дневных сводок: обновляются в транзакции операции и совпадают с пересчетом"""
+        emp1 = self.db.add_employee("Монтажник 1")
+        emp2 = self.db.add_employee("Монтажник 2")
+        self.db.add_material_to_employee(emp1, 100.0, 50.0)
+        self.db.add_router_to_employee(emp1, "Keenetic", 3)
+        for conn_type in ('mkd', 'chs'):
+            self.db.create_connection(
+                connection_type=conn_type, address="Адрес", router_model="Keenetic", port="1",
+                fiber_meters=10.0, twisted_pair_meters=5.0, employee_ids=[emp1, emp2],
+                photo_file_ids=[], created_by=1, material_payer_id=emp1, router_payer_id=emp1
+            )
+        
+        # Откат подключения (не хватает материалов) не меняет сводки
+        self.assertIsNone(self.db.create_connection(
+            connection_type="mkd", address="Адрес", router_model="-", port="1",
+            fiber_meters=1000.0, twisted_pair_meters=0, employee_ids=[emp2],
+            photo_file_ids=[], created_by=1, material_payer_id=emp2
+        ))
+        
+        def snapshot():
+            with self.db.pool.connection() as conn:
+                return {
+                    table: [tuple(row) for row in conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2, 3")]
+                    for table in ('employee_daily_connections', 'team_daily_connections', 'employee_daily_materials')
+                }
+        
+        tables = snapshot()
+        today = datetime.now().strftime("%Y-%m-%d")
+        self.assertEqual(tables['employee_daily_connections'], [
+            (emp1, today, 'chs', 1, 5.0, 2.5), (emp1, today, 'mkd', 1, 5.0, 2.5),
+            (emp2, today, 'chs', 1, 5.0, 2.5), (emp2, today, 'mkd', 1, 5.0, 2.5),
+        ])
+        self.assertEqual(tables['team_daily_connections'], [(today, 'chs', 1, 10.0, 5.0), (today, 'mkd', 1, 10.0, 5.0)])
+        # ВОЛС и витая пара: начислено, списано; роутеры: выдано, списано, под подключения; движений
+        self.assertEqual(tables['employee_daily_materials'], [(emp1, today, 100.0, 20.0, 50.0, 10.0, 3.0, 2.0, 2.0, 9)])
+        
+        self.assertEqual(self.db.get_all_connections_count(), 2)
+        midnight = datetime.combine(datetime.now().date(), datetime.min.time())
+        with self.db.pool.trace_statements() as statements:
+            totals = self.db.get_employee_report_totals(emp2, start=midnight)
+        self.assertIn("employee_daily_connections", statements[0])
+        self.assertEqual(totals, {'total_connections': 2, 'total_fiber_meters': 10.0, 'total_twisted_pair_meters': 5.0})
+        self.assertEqual(self.db.count_employee_movements(emp1, midnight), 9)
+        
+        # Сводка по дневным итогам совпадает со сводкой по исходным таблицам
+        self.assertEqual(self.db.get_team_summary(), self.db.get_team_summary(days=1))
+        
+        self.assertEqual(self.db.rebuild_daily_stats(), (4, 1))
+        self.assertEqual(snapshot(), tables)
+        self.db.rebuild_daily_stats(since=midnight.date())
+        self.assertEqual(snapshot(), tables)
+    
+    def test_daily_stats_after_executor_removed(self):
+        """Тест дневных сводок: после удаления напарника итоги по сводкам и по строкам совпадают"""
+        emp_a = self.db.add_employee("Монтажник А")
+        emp_b = self.db.add_employee("Монтажник Б")
+        self._stock(emp_a, emp_b)
+        self.db.create_connection(
+            connection_type="mkd", address="Адрес", router_model="-", port="1",
+            fiber_meters=10.0, twisted_pair_meters=4.0, employee_ids=[emp_a, emp_b],
+            photo_file_ids=[], created_by=1
+        )
+        midnight = datetime.combine(datetime.now().date(), datetime.min.time())
+        
+        def totals(employee_id):
+            """Итоги по сводкам (период из целых дней) и по строкам отчета"""
+            rollup = self.db.get_employee_report_totals(employee_id, start=midnight)
+            rows = self.db.get_employee_report_totals(employee_id, days=1)
+            _, report = self.db.get_employee_report(employee_id, start=midnight)
+            self.assertEqual(rollup, rows)
+            self.assertEqual(rollup, report)
+            return rollup
+        
+        # Удаленный сотрудник остается исполнителем: доля напарника не меняется
+        self.assertTrue(self.db.delete_employee(emp_a))
+        self.assertEqual(totals(emp_b)['total_fiber_meters'], 5.0)
+        
+        # Связь, удаленная в обход бота, учитывается после пересчета сводок
+        with self.db.pool.transaction() as conn:
+            conn.execute("DELETE FROM connection_employees WHERE employee_id = ?", (emp_a,))
+        self.db.rebuild_daily_stats(since=midnight.date())
+        self.assertEqual(totals(emp_b), {'total_connections': 1, 'total_fiber_meters': 10.0,
+                                         'total_twisted_pair_meters': 4.0})
+        self.assertEqual(totals(emp_a)['total_connections'], 0)
+    
+    # ==================== ТЕСТЫ ПУЛА ПОДКЛЮЧЕНИЙ ====================
+    
+    def test_connection_pool_reuse(self):
+        """Тест переиспользования подключений из пула"""
+        for i in range(10):
+            emp_id = self.db.add_employee(f"Сотрудник пула {i}")
+            self.db.get_employee_balance(emp_id)
+        
+        stats = self.db.get_pool_stats()['write']
+        self.assertGreaterEqual(stats['acquisitions'], 20)
+        self.assertEqual(stats['connections'], 1)
+        
+        # Подключение настроено один раз при создании
+        with self.db.pool.connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+            self.assertEqual(conn.execute("PRAGMA foreign_keys").fetchone()[0], 1)
+    
+    def test_nested_transaction_rollback(self):
+        """Тест отката вложенной транзакции вместе с внешней"""
+        with self.assertRaises(RuntimeError):
+            with self.db.pool.transaction():
+                self.db.add_employee("Откатываемый Сотрудник")
+                raise RuntimeError("сбой")
+        
+        self.assertEqual(self.db.get_all_employees(), [])
+    
+    def test_reports_use_read_only_pool(self):
+        """Тест выполнения отчетов на подключениях только для чтения"""
+        emp_id = self.db.add_employee("Читатель")
+        self.db.add_material_to_employee(emp_id, 10.0, 5.0)
+        
+        self.db.get_employee_report(emp_id)
+        movements = self.db.get_employee_movements(emp_id, datetime(2020, 1, 1), datetime.now() + timedelta(days=1))
+        
+        self.assertEqual(len(movements), 2)
+        stats = self.db.get_pool_stats()
+        self.assertEqual(stats['read']['acquisitions'], 2)
+        self.assertTrue(stats['read']['read_only'])
+        self.assertGreater(stats['write']['transactions'], 0)
+        
+        # Запись через подключение только для чтения невозможна
+        with self.db.read_pool.connection() as conn:
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute("DELETE FROM employees")
+    
+    def test_read_only_pool_does_not_block_writer(self):
+        """Тест: открытая транзакция чтения не мешает записи"""
+        self.db.add_employee("Сотрудник до чтения")
+        
+        with self.db.read_pool.connection() as reader:
+            reader.execute("BEGIN")
+            before = reader.execute("SELECT COUNT(*) FROM employees").fetchone()[0]
+            
+            # Запись в другом потоке, пока читатель держит снимок
+            result = []
+            writer = threading.Thread(target=lambda: result.append(self.db.add_employee("Сотрудник во время чтения")))
+            writer.start()
+            writer.join(timeout=5)
+            
+            self.assertIsNotNone(result[0])
+            self.assertEqual(reader.execute("SELECT COUNT(*) FROM employees").fetchone()[0], before)
+            reader.execute("COMMIT")
+        
+        self.assertEqual(len(self.db.get_all_employees()), 2)
+    
+    # ==================== ТЕСТЫ СПРАВОЧНИКА СОТРУДНИКОВ ====================
+    
+    def test_employee_directory_cache(self):
+        """Тест повторного чтения сотрудников из кэша"""
+        emp_id = self.db.add_employee("Кэшируемый")
+        
+        with self.db.read_pool.trace_statements() as statements:
+            for _ in range(5):
+                self.db.get_all_employees()
+                self.db.get_employee_by_id(emp_id)
+        
+        self.assertEqual(len(statements), 1)
+        stats = self.db.get_cache_stats()['employees']
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 9)
+        
+        # Копии записей не портят кэш
+        self.db.get_employee_by_id(emp_id)['full_name'] = "Испорчено"
+        self.assertEqual(self.db.get_employee_by_id(emp_id)['full_name'], "Кэшируемый")
+    
+    def test_employee_directory_invalidation(self):
+        """Тест сброса кэша при изменениях сотрудников и остатков"""
+        emp_id = self.db.add_employee("Первый")
+        self.assertEqual(len(self.db.get_all_employees()), 1)
+        
+        self.db.add_employee("Второй")
+        self.assertEqual(len(self.db.get_all_employees()), 2)
+        
+        self.db.add_material_to_employee(emp_id, 15.0, 5.0)
+        self.assertEqual(self.db.get_employee_by_id(emp_id)['fiber_balance'], 15.0)
+        
+        self.db.deduct_material_from_employee(emp_id, 5.0, 0)
+        self.assertEqual(self.db.get_employee_by_id(emp_id)['fiber_balance'], 10.0)
+        
+        self.db.delete_employee(emp_id)
+        self.assertIsNone(self.db.get_employee_by_id(emp_id))
+        self.assertEqual(len(self.db.get_all_employees()), 1)
+    
+    def test_employee_directory_rollback(self):
+        """Тест: откат транзакции не сбрасывает кэш"""
+        self.db.get_all_employees()
+        version = self.db.employee_directory.version
+        
+        with self.assertRaises(RuntimeError):
+            with self.db.pool.transaction():
+                self.db.add_employee("Откатываемый")
+                # Внутри транзакции виден свой незафиксированный сотрудник
+                self.assertEqual(len(self.db.get_all_employees()), 1)
+                raise RuntimeError("сбой")
+        
+        self.assertEqual(self.db.employee_directory.version, version)
+        self.assertEqual(self.db.get_all_employees(), [])
+    
+    # ==================== ТЕСТЫ КАТАЛОГА РОУТЕРОВ ====================
+    
+    def test_router_catalog_cache(self):
+        """Тест выбора модели роутера без запросов к БД"""
+        emp1 = self.db.add_employee("Монтажник 1")
+        emp2 = self.db.add_employee("Монтажник 2")
+        self.db.add_router_to_employee(emp1, "TP-Link", 2)
+        self.db.add_router_to_employee(emp2, "Keenetic", 1)
+        self.db.get_all_router_names()
+        
+        with self.db.read_pool.trace_statements() as statements:
+            for _ in range(5):
+                self.assertEqual(self.db.get_all_router_names(), ["Keenetic", "TP-Link"])
+                self.assertEqual(self.db.get_router_quantity(emp1, "TP-Link"), 2)
+                self.assertEqual(self.db.get_router_quantity(emp1, "Keenetic"), 0)
+        
+        self.assertEqual(statements, [])
+        self.assertEqual(self.db.get_cache_stats()['routers']['hits'], 15)
+    
+    def test_router_catalog_invalidation(self):
+        """Тест сброса каталога при добавлении и списании роутеров"""
+        emp_id = self.db.add_employee("Монтажник")
+        self.assertEqual(self.db.get_all_router_names(), [])
+        
+        self.db.add_router_to_employee(emp_id, "TP-Link", 1)
+        self.assertEqual(self.db.get_all_router_names(), ["TP-Link"])
+        self.assertEqual(self.db.get_employee_routers(emp_id)[0]['quantity'], 1)
+        
+        self.db.add_router_to_employee(emp_id, "TP-Link", 2)
+        self.assertEqual(self.db.get_router_quantity(emp_id, "TP-Link"), 3)
+        
+        # Неудачное списание ничего не меняет
+        self.assertFalse(self.db.deduct_router_from_employee(emp_id, "TP-Link", 5))
+        self.assertEqual(self.db.get_router_quantity(emp_id, "TP-Link"), 3)
+        
+        self.db.deduct_router_from_employee(emp_id, "TP-Link", 3)
+        self.assertEqual(self.db.get_all_router_names(), [])
+        self.assertEqual(self.db.get_employee_routers(emp_id), [])
+        
+        self.db.add_router_to_employee(emp_id, "Keenetic", 1)
+        self.db.delete_employee(emp_id)
+        self.assertEqual(self.db.get_all_router_names(), [])
+    
+    # ==================== ТЕСТЫ СВОДКИ ОСТАТКОВ ====================
+    
+    def _inventory(self) -> dict:
+        return {emp['id']: emp for emp in self.db.get_employee_inventory()}
+    
+    def test_employee_inventory_triggers(self):
+        """Тест поддержки сводки остатков триггерами"""
+        emp_id = self.db.add_employee("Монтажник")
+        self.assertEqual(self._inventory()[emp_id]['routers'], [])
+        self.assertEqual(self._inventory()[emp_id]['router_total'], 0)
+        
+        self.db.add_material_to_employee(emp_id, 100.0, 50.0)
+        self.db.add_router_to_employee(emp_id, "TP-Link", 2)
+        self.db.add_router_to_employee(emp_id, "Keenetic", 1)
+        self.db.add_router_to_employee(emp_id, "TP-Link", 1)
+        
+        inventory = self._inventory()[emp_id]
+        self.assertEqual(inventory['fiber_balance'], 100.0)
+        self.assertEqual(inventory['twisted_pair_balance'], 50.0)
+        self.assertEqual(inventory['router_total'], 4)
+        self.assertEqual(inventory['routers'], [
+            {'router_name': "Keenetic", 'quantity': 1},
+            {'router_name': "TP-Link", 'quantity': 3},
+        ])
+        
+        self.db.deduct_material_from_employee(emp_id, 30.0, 0)
+        self.db.deduct_router_from_employee(emp_id, "Keenetic", 1)
+        inventory = self._inventory()[emp_id]
+        self.assertEqual(inventory['fiber_balance'], 70.0)
+        self.assertEqual(inventory['router_total'], 3)
+        self.assertEqual(inventory['routers'], [{'router_name': "TP-Link", 'quantity': 3}])
+        
+        self.db.delete_employee(emp_id)
+        self.assertEqual(self.db.get_employee_inventory(), [])
+    
+    def test_employee_inventory_single_query(self):
+        """Тест: список сотрудников с роутерами - один запрос"""
+        for i in range(10):
+            emp_id = self.db.add_employee(f"Монтажник {i:02d}")
+            self.db.add_router_to_employee(emp_id, "TP-Link", i + 1)
+        
+        with self.db.read_pool.trace_statements() as statements:
+            inventory = self.db.get_employee_inventory()
+        
+        self.assertEqual(len(statements), 1)
+        self.assertEqual([emp['full_name'] for emp in inventory], [f"Монтажник {i:02d}" for i in range(10)])
+        self.assertEqual(sum(emp['router_total'] for emp in inventory), 55)
+    
+    # ==================== ТЕСТЫ МИГРАЦИЙ ====================
+    
+    def test_schema_version(self):
+        """Тест версии схемы после инициализации"""
+        self.assertEqual(get_schema_version(self.test_db_path), LATEST_VERSION)
+        self.assertEqual(self.db.pool.schema_version, LATEST_VERSION)
+    
+    def test_migrations_idempotent(self):
+        """Тест повторного применения миграций"""
+        emp_id = self.db.add_employee("Сотрудник до миграции")
+        
+        self.assertEqual(apply_migrations(self.test_db_path), LATEST_VERSION)
+        Database(self.test_db_path)
+        
+        self.assertIsNotNone(self.db.get_employee_by_id(emp_id))
+    
+    def test_report_dates_migration(self):
+        """Тест заполнения даты подключения у исполнителей при миграции"""
+        emp_id = self.db.add_employee("Монтажник")
+        conn_id = self.db.create_connection(
+            connection_type="mkd", address="Адрес", router_model="-", port="1",
+            fiber_meters=0, twisted_pair_meters=0, employee_ids=[emp_id],
+            photo_file_ids=[], created_by=1
+        )
+        with self.db.pool.transaction() as conn:
+            conn.execute("UPDATE connection_employees SET created_at = NULL")
+            conn.execute("PRAGMA user_version = 3")
+        
+        apply_migrations(self.test_db_path)
+        with self.db.pool.connection() as conn:
+            row = conn.execute("""
+                SELECT ce.created_at, c.created_at AS connection_created_at
+                FROM connection_employees ce JOIN connections c ON c.id = ce.connection_id
+                WHERE ce.connection_id = ?
+            """, (conn_id,)).fetchone()
+        self.assertIsNotNone(row['created_at'])
+        self.assertEqual(row['created_at'], row['connection_created_at'])
 
 
 if __name__ == '__main__':
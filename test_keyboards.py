@@ -0,0 +1,91 @@
+"""
+Тесты для кэша клавиатур
+"""
+import os
+import unittest
+
+from database import Database
+from database.connection_pool import close_pool
+from utils.keyboards import (
+    KeyboardCache,
+    get_main_keyboard,
+    get_employee_checkbox_keyboard,
+    get_material_employee_keyboard,
+    get_keyboard_cache
+)
+
+
+class TestKeyboards(unittest.TestCase):
+    """Тесты для фабрики клавиатур"""
+    
+    def setUp(self):
+        """Подготовка к тестам - создание тестовой БД"""
+        self.test_db_path = "test_keyboards_isp_bot.db"
+        self.db = Database(self.test_db_path)
+        get_keyboard_cache().clear()
+    
+    def tearDown(self):
+        """Очистка после тестов - удаление тестовой БД"""
+        close_pool(self.test_db_path)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db_path + suffix):
+                os.remove(self.test_db_path + suffix)
+    
+    def _buttons(self, markup) -> list:
+        return [row[0].text for row in markup.inline_keyboard]
+    
+    def test_main_keyboard_reused(self):
+        """Главная клавиатура создается один раз"""
+        self.assertIs(get_main_keyboard(), get_main_keyboard())
+    
+    def test_checkbox_keyboard_cached_by_selection(self):
+        """Одинаковый набор отметок - та же клавиатура"""
+        emp1 = self.db.add_employee("Иванов")
+        emp2 = self.db.add_employee("Петров")
+        version = self.db.get_data_version()
+        employees = self.db.get_all_employees()
+        
+        empty = get_employee_checkbox_keyboard(employees, [], version)
+        first = get_employee_checkbox_keyboard(employees, [emp1], version)
+        self.assertEqual(self._buttons(first)[:2], ["☑ Иванов", "☐ Петров"])
+        
+        # Порядок выбора не важен
+        both = get_employee_checkbox_keyboard(employees, [emp1, emp2], version)
+        self.assertIs(get_employee_checkbox_keyboard(employees, [emp2, emp1], version), both)
+        self.assertIs(get_employee_checkbox_keyboard(employees, [], version), empty)
+        
+        stats = get_keyboard_cache().stats()
+        self.assertEqual(stats['misses'], 3)
+        self.assertEqual(stats['hits'], 2)
+    
+    def test_keyboard_rebuilt_after_data_change(self):
+        """После изменения данных клавиатура строится заново"""
+        emp_id = self.db.add_employee("Иванов")
+        version = self.db.get_data_version()
+        before = get_material_employee_keyboard(self.db.get_all_employees(), version)
+        
+        self.db.add_material_to_employee(emp_id, 100.0, 0)
+        self.assertNotEqual(self.db.get_data_version(), version)
+        
+        after = get_material_employee_keyboard(self.db.get_all_employees(), self.db.get_data_version())
+        self.assertIsNot(after, before)
+        self.assertIn("ВОЛС: 100.0м", self._buttons(after)[0])
+        
+        self.db.add_router_to_employee(emp_id, "TP-Link", 1)
+        self.assertNotEqual(self.db.get_data_version()[1], version[1])
+    
+    def test_lru_eviction(self):
+        """Редко используемые клавиатуры вытесняются"""
+        cache = KeyboardCache(max_size=2)
+        cache.get_or_build('a', lambda: 1)
+        cache.get_or_build('b', lambda: 2)
+        cache.get_or_build('a', lambda: 0)
+        cache.get_or_build('c', lambda: 3)
+        
+        self.assertEqual(cache.get_or_build('a', lambda: 0), 1)
+        self.assertEqual(cache.get_or_build('b', lambda: 4), 4)
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
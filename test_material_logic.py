@@ -1,14 +1,36 @@
 #!/usr/bin/env python3
 """
 Тестовый скрипт для проверки логики списания материалов
+
+При запуске скриптом проверяет рабочую БД бота, под pytest - временную
+БД с двумя сотрудниками, чтобы не создавать и не менять isp_bot.db.
 """
+import os
+import tempfile
+from typing import Optional
 
 from database import Database
+from database.connection_pool import close_pool
+
 
-def test_material_logic():
+def test_material_logic(db: Optional[Database] = None):
     """Тестирование логики списания материалов"""
-    
-    db = Database()
+    if db is None:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "test_material_logic.db")
+            db = Database(db_path)
+            db.add_material_to_employee(db.add_employee("Иванов Иван"), 500.0, 100.0)
+            db.add_employee("Петров Петр")
+            try:
+                _check_material_logic(db)
+            finally:
+                close_pool(db_path)
+        return
+    _check_material_logic(db)
+
+
+def _check_material_logic(db: Database):
+    """Вывести балансы сотрудников и решение бота о плательщике"""
     
     print("=" * 70)
     print("  ТЕСТИРОВАНИЕ ЛОГИКИ СПИСАНИЯ МАТЕРИАЛОВ")
@@ -89,7 +111,7 @@ def test_material_logic():
         print("📊 В отчёте будет указано (для зарплаты):")
         print(f"  {emp1['full_name']}: ВОЛС {test_fiber/2}м, ВП {test_twisted/2}м")
         print(f"  {emp2['full_name']}: ВОЛС {test_fiber/2}м, ВП {test_twisted/2}м")
-        
+    
     else:
         print("⚠️  Для теста нужно минимум 2 сотрудника")
     
@@ -114,7 +136,7 @@ def test_material_logic():
 
 if __name__ == "__main__":
     try:
-        test_material_logic()
+        test_material_logic(Database())
     except Exception as e:
         print(f"❌ Ошибка: {e}")
         import traceback
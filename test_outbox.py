@@ -0,0 +1,223 @@
+"""
+Тесты очереди исходящих сообщений Telegram
+"""
+import asyncio
+import os
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from database import Database
+from database.async_db import AsyncDatabase
+from database.connection_pool import close_pool
+from utils.outbox import Outbox, TokenBucket
+from utils.report_delivery import MODE_COPY, DeliveryStats, Destination, build_payload, deliver
+
+
+class FakeClock:
+    """Часы, которые двигает тест"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeBot:
+    """Бот, который запоминает вызовы и выбрасывает заданные ошибки"""
+    
+    def __init__(self, errors=None):
+        # chat_id -> список ошибок для последовательных вызовов в этот чат
+        self.errors = {chat_id: list(chat_errors) for chat_id, chat_errors in (errors or {}).items()}
+        self.calls = []
+        self.next_id = 1
+    
+    async def _call(self, method: str, chat_id, payload, count: int = 1):
+        self.calls.append((method, chat_id, payload))
+        chat_errors = self.errors.get(chat_id)
+        if chat_errors:
+            raise chat_errors.pop(0)
+        messages = tuple(SimpleNamespace(message_id=self.next_id + i) for i in range(count))
+        self.next_id += count
+        return messages
+    
+    async def send_media_group(self, chat_id, media):
+        return await self._call('send_media_group', chat_id, [item.media for item in media], len(media))
+    
+    async def send_message(self, chat_id, text, parse_mode=None):
+        return (await self._call('send_message', chat_id, text))[0]
+    
+    async def copy_messages(self, chat_id, from_chat_id, message_ids):
+        return await self._call('copy_messages', chat_id, (from_chat_id, message_ids), len(message_ids))
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Тесты для TokenBucket"""
+    
+    def test_rate_and_capacity(self):
+        """Маркеры пополняются со скоростью rate и не копятся сверх capacity"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2.0, capacity=4.0, clock=clock)
+        
+        self.assertEqual(bucket.delay(4), 0.0)
+        bucket.consume(4)
+        self.assertAlmostEqual(bucket.delay(1), 0.5)
+        self.assertAlmostEqual(bucket.delay(3), 1.5)
+        
+        clock.now = 100.0
+        self.assertEqual(bucket.delay(4), 0.0)
+        self.assertEqual(bucket.tokens, 4.0)
+        
+        # Запрос дороже емкости ждет полной корзины, а не вечно
+        bucket.consume(4)
+        self.assertAlmostEqual(bucket.delay(10), 2.0)
+    
+    def test_block(self):
+        """RetryAfter приостанавливает расход маркеров"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1.0, capacity=1.0, clock=clock)
+        bucket.block(3.0)
+        self.assertAlmostEqual(bucket.delay(1), 3.0)
+        clock.now = 3.0
+        self.assertEqual(bucket.delay(1), 0.0)
+
+
+class TestOutbox(unittest.IsolatedAsyncioTestCase):
+    """Тесты для Outbox"""
+    
+    def setUp(self):
+        """Подготовка к тестам - создание тестовой БД"""
+        self.test_db_path = "test_outbox_isp_bot.db"
+        self.db = AsyncDatabase(Database(self.test_db_path))
+        self.outboxes = []
+    
+    async def asyncTearDown(self):
+        for outbox in self.outboxes:
+            await outbox.stop(timeout=1)
+        await self.db.shutdown()
+    
+    def tearDown(self):
+        """Очистка после тестов - удаление тестовой БД"""
+        close_pool(self.test_db_path)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db_path + suffix):
+                os.remove(self.test_db_path + suffix)
+    
+    def _outbox(self, bot: FakeBot, **kwargs) -> Outbox:
+        options = {'global_rate': 1000, 'group_rate_per_minute': 60000, 'backoff_base': 0.01}
+        options.update(kwargs)
+        outbox = Outbox(self.db, bot, **options)
+        self.outboxes.append(outbox)
+        return outbox
+    
+    async def _drain(self, outbox: Outbox, timeout: float = 5.0) -> None:
+        """Дождаться, пока в очереди не останется неотправленных сообщений"""
+        async def pending() -> int:
+            return (await self.db.aget_outbox_backlog())['pending']
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while await pending() and loop.time() < deadline:
+            await asyncio.sleep(0.01)
+        self.assertEqual(await pending(), 0)
+    
+    def _statuses(self) -> list:
+        return [(row['status'], row['attempts']) for row in self.db.db.outbox_repo.execute_query(
+            "SELECT status, attempts FROM outbox ORDER BY id", read_only=True
+        )]
+    
+    async def test_retry_after_keeps_chat_order(self):
+        """RetryAfter откладывает чат без расхода попытки, порядок сообщений сохраняется"""
+        bot = FakeBot(errors={-100: [RetryAfter(0.05)]})
+        outbox = self._outbox(bot)
+        for text in ("первое", "второе", "третье"):
+            await outbox.enqueue(-100, 'send_message', {'text': text, 'parse_mode': 'HTML'})
+        await outbox.enqueue(-200, 'send_message', {'text': "другой канал"})
+        
+        outbox.start()
+        await self._drain(outbox)
+        
+        delivered = [text for method, chat_id, text in bot.calls if chat_id == -100]
+        self.assertEqual(delivered, ["первое", "первое", "второе", "третье"])
+        self.assertEqual(self._statuses(), [('sent', 1)] * 4)
+        
+        stats = outbox.stats()
+        self.assertEqual(stats['sent'], 4)
+        self.assertEqual(stats['rate_limited'], 1)
+        self.assertEqual(stats['retries'], 0)
+        self.assertEqual(stats['api_calls'], 5)
+    
+    async def test_resume_after_restart(self):
+        """Сообщения, не отправленные до остановки, отправляются после перезапуска"""
+        first = self._outbox(FakeBot())
+        await first.enqueue(-100, 'send_media_group', {'media': [{'type': 'photo', 'media': "photo1"}]})
+        await first.enqueue(-100, 'send_message', {'text': "после альбома"})
+        await first.stop()
+        
+        bot = FakeBot()
+        second = self._outbox(bot)
+        second.start()
+        await self._drain(second)
+        
+        self.assertEqual(bot.calls, [('send_media_group', -100, ["photo1"]),
+                                     ('send_message', -100, "после альбома")])
+    
+    async def test_copy_falls_back_to_send(self):
+        """Если копирование отклонено, сообщение отправляется заново"""
+        bot = FakeBot(errors={-100: [BadRequest("Message to copy not found")]})
+        outbox = self._outbox(bot)
+        await outbox.enqueue(-100, 'copy_messages', {
+            'from_chat_id': 100, 'message_ids': [1, 2],
+            'fallback': {'method': 'send_message', 'params': {'text': "Отчет"}, 'cost': 1}
+        }, cost=2)
+        
+        outbox.start()
+        await self._drain(outbox)
+        
+        self.assertEqual([(method, chat_id) for method, chat_id, _ in bot.calls],
+                         [('copy_messages', -100), ('send_message', -100)])
+        self.assertEqual(outbox.stats()['fallbacks'], 1)
+        self.assertEqual(self._statuses(), [('sent', 1)])
+    
+    async def test_failed_after_max_attempts(self):
+        """Сообщение отмечается неотправляемым после max_attempts сбоев, BadRequest - сразу"""
+        bot = FakeBot(errors={-100: [NetworkError("timeout")] * 3, -200: [BadRequest("chat not found")]})
+        outbox = self._outbox(bot, max_attempts=3)
+        await outbox.enqueue(-100, 'send_message', {'text': "Отчет"})
+        await outbox.enqueue(-200, 'send_message', {'text': "Отчет"})
+        
+        outbox.start()
+        await self._drain(outbox)
+        
+        self.assertEqual(self._statuses(), [('failed', 3), ('failed', 1)])
+        stats = outbox.stats()
+        self.assertEqual(stats['failed'], 2)
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(stats['sent'], 0)
+    
+    async def test_deliver_through_outbox(self):
+        """Пользователь получает отчет сразу, каналы - копию через очередь"""
+        bot = FakeBot()
+        outbox = self._outbox(bot)
+        payload = build_payload("Отчет", ["photo1", "photo2"])
+        destinations = [Destination('user', 100), Destination('channel', -100)]
+        
+        stats = DeliveryStats()
+        with mock.patch('utils.report_delivery.get_delivery_stats', return_value=stats):
+            results = await deliver(bot, payload, destinations, mode=MODE_COPY, outbox=outbox)
+        self.assertTrue(results[1].queued)
+        self.assertTrue(results[1].copied)
+        self.assertEqual(results[1].api_calls, 0)
+        self.assertEqual(bot.calls, [('send_media_group', 100, ["photo1", "photo2"])])
+        
+        outbox.start()
+        await self._drain(outbox)
+        self.assertEqual(bot.calls[1], ('copy_messages', -100, (100, [1, 2])))
+        self.assertEqual(stats.stats()['api_calls'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
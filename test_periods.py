@@ -0,0 +1,60 @@
+"""
+Тесты для периодов отчетов
+"""
+import unittest
+from datetime import datetime
+
+from utils.periods import PERIODS, ReportPeriod, parse_period, resolve_period
+
+
+class TestReportPeriods(unittest.TestCase):
+    """Тесты для resolve_period и parse_period"""
+    
+    def test_calendar_periods(self):
+        """Календарные периоды - полуоткрытые интервалы с переходом через год"""
+        now = datetime(2025, 1, 15, 12, 30)
+        self.assertEqual(resolve_period('period_month', now),
+                         ReportPeriod("Январь 2025", datetime(2025, 1, 1), datetime(2025, 2, 1)))
+        self.assertEqual(resolve_period('period_prev_month', now),
+                         ReportPeriod("Декабрь 2024", datetime(2024, 12, 1), datetime(2025, 1, 1)))
+        self.assertEqual(resolve_period('period_quarter', now),
+                         ReportPeriod("1-й квартал 2025", datetime(2025, 1, 1), datetime(2025, 4, 1)))
+        self.assertEqual(resolve_period('period_prev_quarter', now),
+                         ReportPeriod("4-й квартал 2024", datetime(2024, 10, 1), datetime(2025, 1, 1)))
+    
+    def test_relative_periods(self):
+        """Относительные периоды - целые дни по сегодняшний, все время - без границ"""
+        now = datetime(2025, 3, 10, 9, 0)
+        week = resolve_period('period_7', now)
+        self.assertEqual((week.start, week.end, week.relative), (datetime(2025, 3, 4), None, True))
+        self.assertEqual(resolve_period('period_30', now).start, datetime(2025, 2, 9))
+        self.assertEqual(resolve_period('period_all', now), ReportPeriod("Все время", None, None))
+        
+        # Все кнопки клавиатуры разрешаются в период
+        for code in PERIODS:
+            self.assertIsInstance(resolve_period(code, now), ReportPeriod)
+        with self.assertRaises(KeyError):
+            resolve_period('period_unknown', now)
+    
+    def test_parse_period(self):
+        """Введенные даты включаются в период целиком"""
+        is_valid, period, _ = parse_period("01.03.2025 - 15.03.2025")
+        self.assertTrue(is_valid)
+        self.assertEqual(period, ReportPeriod("01.03.2025 - 15.03.2025", datetime(2025, 3, 1), datetime(2025, 3, 16)))
+        self.assertEqual(period.cache_key, (datetime(2025, 3, 1), datetime(2025, 3, 16)))
+        
+        is_valid, period, _ = parse_period("31.12.2024")
+        self.assertTrue(is_valid)
+        self.assertEqual((period.start, period.end), (datetime(2024, 12, 31), datetime(2025, 1, 1)))
+    
+    def test_parse_period_invalid(self):
+        """Некорректный ввод возвращает сообщение об ошибке"""
+        for text in ("вчера", "32.01.2025", "15.03.2025 - 01.03.2025"):
+            is_valid, period, error = parse_period(text)
+            self.assertFalse(is_valid)
+            self.assertIsNone(period)
+            self.assertTrue(error.startswith("⚠️"))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
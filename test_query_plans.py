@@ -0,0 +1,175 @@
+"""
+Тесты планов выполнения основных запросов (EXPLAIN QUERY PLAN)
+"""
+import os
+import sqlite3
+import unittest
+from datetime import datetime
+
+from database import Database
+from database.connection_pool import close_pool, get_pool
+from database.migrations import MIGRATIONS, apply_migrations
+
+
+def _full_scans(conn: sqlite3.Connection, sql: str) -> list:
+    """Получить строки плана с полным сканированием таблицы"""
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    return [detail for detail in plan if detail.startswith("SCAN ") and "INDEX" not in detail]
+
+
+class TestQueryPlans(unittest.TestCase):
+    """Основные запросы используют индексы, а не полный проход по таблице"""
+    
+    def setUp(self):
+        """Подготовка к тестам - создание тестовой БД с данными"""
+        self.test_db_path = "test_plans_isp_bot.db"
+        self.db = Database(self.test_db_path)
+        
+        self.emp1 = self.db.add_employee("Монтажник 1")
+        self.emp2 = self.db.add_employee("Монтажник 2")
+        self.db.add_material_to_employee(self.emp1, 1000.0, 1000.0)
+        self.db.add_router_to_employee(self.emp1, "Keenetic", 5)
+        for i in range(5):
+            self.connection_id = self.db.create_connection(
+                connection_type="mkd",
+                address=f"Адрес {i}",
+                router_model="Keenetic",
+                port=str(i),
+                fiber_meters=10.0,
+                twisted_pair_meters=5.0,
+                employee_ids=[self.emp1, self.emp2],
+                photo_file_ids=["photo1", "photo2"],
+                created_by=123456789,
+                material_payer_id=self.emp1
+            )
+    
+    def tearDown(self):
+        """Очистка после тестов - удаление тестовой БД"""
+        close_pool(self.test_db_path)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db_path + suffix):
+                os.remove(self.test_db_path + suffix)
+    
+    def _traced_selects(self, calls) -> list:
+        """Выполнить вызовы и собрать выполненные ими SELECT-запросы"""
+        with self.db.pool.trace_statements() as statements:
+            calls()
+        return [sql for sql in statements if sql.lstrip().upper().startswith(("SELECT", "WITH"))]
+    
+    def _assert_no_full_scans(self, calls):
+        selects = self._traced_selects(calls)
+        self.assertTrue(selects)
+        with self.db.pool.connection() as conn:
+            for sql in selects:
+                self.assertEqual(_full_scans(conn, sql), [], msg=" ".join(sql.split()))
+    
+    def test_employee_report_plan(self):
+        """Отчет по сотруднику"""
+        self._assert_no_full_scans(lambda: (
+            self.db.get_employee_report(self.emp1, 7),
+            self.db.get_employee_report(self.emp2)
+        ))
+    
+    def test_movements_plan(self):
+        """Движения материалов за период"""
+        self._assert_no_full_scans(lambda: (
+            self.db.get_employee_movements(self.emp1, datetime(2025, 1, 1), datetime.now()),
+            self.db.get_employee_movements(self.emp1)
+        ))
+    
+    def test_date_range_plans(self):
+        """Отчеты за период читают диапазон индекса по дате, а не всю историю"""
+        start, end = datetime(2025, 3, 1, 8, 0), datetime(2025, 4, 1, 8, 0)
+        selects = self._traced_selects(lambda: (
+            self.db.get_employee_report(self.emp1, start=start, end=end),
+            self.db.get_team_summary(start=start, end=end)
+        ))
+        with self.db.pool.connection() as conn:
+            plans = [" | ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")) for sql in selects]
+        self.assertIn("idx_connection_employees_employee_created (employee_id=? AND created_at>? AND created_at<?)",
+                      plans[0])
+        self.assertIn("idx_connections_created (created_at>? AND created_at<?)", plans[1])
+        self.assertIn("idx_movement_log_router_deduct (created_at>? AND created_at<?)", plans[1])
+    
+    def test_daily_stats_plan(self):
+        """Итоги за целые дни читаются из дневных сводок по индексам"""
+        start, end = datetime(2025, 3, 1), datetime(2025, 4, 1)
+        selects = self._traced_selects(lambda: (
+            self.db.get_employee_report_totals(self.emp1, start=start, end=end),
+            self.db.get_team_summary(start=start, end=end),
+            self.db.count_employee_movements(self.emp1, start, end)
+        ))
+        self.assertTrue(all("_daily_" in sql for sql in selects))
+        self._assert_no_full_scans(lambda: (
+            self.db.get_employee_report_totals(self.emp1, start=start, end=end),
+            self.db.get_team_summary(start=start, end=end),
+            self.db.count_employee_movements(self.emp1, start, end)
+        ))
+    
+    def test_router_lookups_plan(self):
+        """Поиск роутеров сотрудника и списка моделей"""
+        self._assert_no_full_scans(lambda: (
+            self.db.get_employee_routers(self.emp1),
+            self.db.get_router_quantity(self.emp1, "Keenetic"),
+            self.db.get_all_router_names()
+        ))
+    
+    def test_employee_inventory_plan(self):
+        """Список сотрудников со сводкой остатков"""
+        self._assert_no_full_scans(self.db.get_employee_inventory)
+    
+    def test_connection_details_plan(self):
+        """Карточка подключения с исполнителями и фото"""
+        self._assert_no_full_scans(lambda: self.db.get_connection_by_id(self.connection_id))
+    
+    def test_unique_employee_router(self):
+        """Одна запись на модель роутера у сотрудника"""
+        with self.assertRaises(sqlite3.IntegrityError):
+            with self.db.pool.transaction() as conn:
+                conn.execute(
+                    "INSERT INTO employee_routers (employee_id, router_name, quantity) VALUES (?, ?, ?)",
+                    (self.emp1, "Keenetic", 1)
+                )
+
+
+class TestIndexMigration(unittest.TestCase):
+    """Миграция индексов на БД, созданной старой версией"""
+    
+    def setUp(self):
+        self.test_db_path = "test_legacy_isp_bot.db"
+    
+    def tearDown(self):
+        close_pool(self.test_db_path)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db_path + suffix):
+                os.remove(self.test_db_path + suffix)
+    
+    def test_duplicate_routers_merged(self):
+        """Дубли роутеров сливаются перед созданием уникального индекса"""
+        _, _, initial_schema = MIGRATIONS[0]
+        with get_pool(self.test_db_path).transaction() as conn:
+            initial_schema(conn)
+            conn.execute("PRAGMA user_version = 1")
+            conn.execute("INSERT INTO employees (full_name) VALUES ('Старый Монтажник')")
+            conn.executemany(
+                "INSERT INTO employee_routers (employee_id, router_name, quantity) VALUES (1, ?, ?)",
+                [("TP-Link", 2), ("TP-Link", 3), ("Keenetic", 1)]
+            )
+        
+        apply_migrations(self.test_db_path)
+        db = Database(self.test_db_path)
+        
+        routers = {r['router_name']: r['quantity'] for r in db.get_employee_routers(1)}
+        self.assertEqual(routers, {"TP-Link": 5, "Keenetic": 1})
+        
+        # Сводка остатков заполнена для существующих сотрудников
+        inventory = db.get_employee_inventory()
+        self.assertEqual(inventory[0]['router_total'], 6)
+        self.assertEqual(inventory[0]['routers'], [
+            {'router_name': "Keenetic", 'quantity': 1},
+            {'router_name': "TP-Link", 'quantity': 5},
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
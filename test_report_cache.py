@@ -0,0 +1,141 @@
+"""
+Тесты для кэша отчетов
+"""
+import os
+import unittest
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from database import Database
+from database.async_db import AsyncDatabase
+from database.connection_pool import close_pool
+from handlers.reports import report_generate
+from report_generator import ReportGenerator
+from utils.helpers import DB_KEY, REPORT_JOBS_KEY
+from utils.report_cache import ReportCache, get_report_cache, make_report_key
+from utils.report_jobs import ReportJobRunner
+
+
+class TestReportCache(unittest.TestCase):
+    """Тесты для класса ReportCache"""
+    
+    def test_lru_eviction(self):
+        """Вытеснение по количеству и по суммарному размеру"""
+        cache = ReportCache(max_entries=2, max_bytes=10)
+        cache.put('a', b'1234', 'a.xlsx', "a")
+        cache.put('b', b'1234', 'b.xlsx', "b")
+        self.assertIsNotNone(cache.get('a'))
+        
+        cache.put('c', b'12', 'c.xlsx', "c")
+        self.assertIsNone(cache.get('b'))
+        
+        cache.put('d', b'123456', 'd.xlsx', "d")
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+        
+        # Слишком большой отчет не кэшируется
+        cache.put('e', b'x' * 11, 'e.xlsx', "e")
+        self.assertIsNone(cache.get('e'))
+        
+        stats = cache.stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['bytes'], 8)
+        self.assertEqual(stats['evictions'], 2)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 3)
+    
+    def test_file_id(self):
+        """file_id запоминается после отправки"""
+        cache = ReportCache()
+        cache.put('a', b'1', 'a.xlsx', "a")
+        cache.set_file_id('a', "FILE_ID")
+        self.assertEqual(cache.get('a')['file_id'], "FILE_ID")
+    
+    def test_relative_period_key(self):
+        """Отчет за скользящий период действует только в день формирования"""
+        watermark = (1, 2, 3)
+        day1, day2 = date(2024, 1, 1), date(2024, 1, 2)
+        self.assertNotEqual(
+            make_report_key(1, 'period_7', watermark, relative=True, today=day1),
+            make_report_key(1, 'period_7', watermark, relative=True, today=day2)
+        )
+        self.assertEqual(
+            make_report_key(1, 'period_all', watermark, today=day1),
+            make_report_key(1, 'period_all', watermark, today=day2)
+        )
+
+
+class TestReportCaching(unittest.IsolatedAsyncioTestCase):
+    """Повторный запрос отчета отправляется по file_id без генерации"""
+    
+    def setUp(self):
+        """Подготовка к тестам - создание тестовой БД с данными"""
+        self.test_db_path = "test_report_cache_isp_bot.db"
+        self.sync_db = Database(self.test_db_path)
+        self.db = AsyncDatabase(self.sync_db)
+        self.jobs = ReportJobRunner(use_processes=False, progress_interval=0.05)
+        get_report_cache().clear()
+        
+        self.emp_id = self.sync_db.add_employee("Монтажник")
+        self.sync_db.add_material_to_employee(self.emp_id, 100.0, 100.0)
+        self._create_connection()
+    
+    async def asyncTearDown(self):
+        await self.jobs.shutdown()
+        await self.db.shutdown()
+    
+    def tearDown(self):
+        """Очистка после тестов - удаление тестовой БД"""
+        close_pool(self.test_db_path)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db_path + suffix):
+                os.remove(self.test_db_path + suffix)
+    
+    def _create_connection(self):
+        self.sync_db.create_connection(
+            connection_type="mkd", address="ул. Тестовая, д. 1", router_model="-", port="1",
+            fiber_meters=10.0, twisted_pair_meters=5.0, employee_ids=[self.emp_id],
+            photo_file_ids=[], created_by=1, material_payer_id=self.emp_id
+        )
+    
+    async def _request_report(self):
+        """Выполнить запрос отчета за все время, вернуть сообщение-мок"""
+        message = MagicMock()
+        message.reply_document = AsyncMock(return_value=MagicMock(document=MagicMock(file_id="FILE_ID")))
+        message.reply_text = AsyncMock()
+        message.edit_text = AsyncMock()
+        query = MagicMock(data='period_all', message=message)
+        query.answer = AsyncMock()
+        query.edit_message_text = AsyncMock()
+        update = MagicMock(callback_query=query)
+        context = MagicMock(
+            bot_data={DB_KEY: self.db, REPORT_JOBS_KEY: self.jobs},
+            user_data={'report_employee_id': self.emp_id}
+        )
+        
+        await report_generate(update, context)
+        await self.jobs.join()
+        return message
+    
+    async def test_repeat_request_sent_by_file_id(self):
+        """Повтор - по file_id, новые данные - новый отчет"""
+        with patch('utils.report_jobs.ReportGenerator.generate_employee_report',
+                   wraps=ReportGenerator.generate_employee_report) as generate:
+            first = await self._request_report()
+            second = await self._request_report()
+            
+            self.assertEqual(generate.call_count, 1)
+            self.assertIsInstance(first.reply_document.call_args.kwargs['document'], bytes)
+            self.assertEqual(second.reply_document.call_args.kwargs['document'], "FILE_ID")
+            
+            # Новое подключение меняет отметку данных - отчет формируется заново
+            self._create_connection()
+            third = await self._request_report()
+            self.assertEqual(generate.call_count, 2)
+            self.assertIsInstance(third.reply_document.call_args.kwargs['document'], bytes)
+        
+        self.assertEqual(get_report_cache().stats()['hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,208 @@
+"""
+Тесты доставки отчетов о подключениях
+"""
+import asyncio
+import os
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from database import Database
+from database.async_db import AsyncDatabase
+from database.connection_pool import close_pool
+from utils import helpers
+from utils.report_delivery import MODE_COPY, DeliveryStats, Destination, build_payload, deliver, send_request_size
+
+# Задержка ответа Bot API в фейковом боте
+SEND_DELAY = 0.2
+
+
+class FakeBot:
+    """Бот, который отвечает с задержкой и запоминает запросы"""
+    
+    def __init__(self, failing_chats=(), failing_copies=()):
+        self.failing_chats = set(failing_chats)
+        self.failing_copies = set(failing_copies)
+        self.sent = []
+        self.next_id = 1
+    
+    async def _send(self, method: str, chat_id, payload, count: int = 1):
+        await asyncio.sleep(SEND_DELAY)
+        if chat_id in self.failing_chats:
+            raise RuntimeError(f"chat {chat_id} is unavailable")
+        self.sent.append((method, chat_id, payload))
+        messages = tuple(SimpleNamespace(message_id=self.next_id + i) for i in range(count))
+        self.next_id += count
+        return messages
+    
+    async def send_media_group(self, chat_id, media):
+        return await self._send('send_media_group', chat_id, media, len(media))
+    
+    async def send_message(self, chat_id, text, parse_mode=None):
+        return (await self._send('send_message', chat_id, text))[0]
+    
+    async def copy_messages(self, chat_id, from_chat_id, message_ids):
+        if chat_id in self.failing_copies:
+            raise RuntimeError("message can't be copied")
+        return await self._send('copy_messages', chat_id, (from_chat_id, message_ids), len(message_ids))
+
+
+class FakeMessage:
+    """Сообщение пользователя, на которое бот отвечает отчетом"""
+    
+    def __init__(self, bot: FakeBot, chat_id: int = 100):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.replies = []
+    
+    def get_bot(self) -> FakeBot:
+        return self.bot
+    
+    async def reply_text(self, text, parse_mode=None):
+        self.replies.append(text)
+
+
+class TestReportDelivery(unittest.IsolatedAsyncioTestCase):
+    """Тесты для build_payload и deliver"""
+    
+    def setUp(self):
+        self.stats = DeliveryStats()
+        patcher = mock.patch('utils.report_delivery.get_delivery_stats', return_value=self.stats)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_build_payload(self):
+        """Подпись - только у первого фото, без фото - текстовое сообщение"""
+        payload = build_payload("<b>Отчет</b>", ["photo1", "photo2", "photo3"])
+        self.assertEqual([item.media for item in payload.media], ["photo1", "photo2", "photo3"])
+        self.assertEqual(payload.media[0].caption, "<b>Отчет</b>")
+        self.assertEqual(payload.media[0].parse_mode, 'HTML')
+        self.assertIsNone(payload.media[1].caption)
+        self.assertEqual(build_payload("Отчет", []).media, ())
+    
+    async def test_deliver_concurrently(self):
+        """Адресаты получают одну и ту же медиа-группу одновременно"""
+        bot = FakeBot()
+        payload = build_payload("Отчет", [f"photo{i}" for i in range(10)])
+        destinations = [Destination('user', 100), Destination('channel', -100)]
+        
+        started = time.perf_counter()
+        results = await deliver(bot, payload, destinations)
+        elapsed = time.perf_counter() - started
+        
+        self.assertLess(elapsed, SEND_DELAY * 1.9)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual([chat_id for _, chat_id, _ in bot.sent], [100, -100])
+        self.assertIs(bot.sent[0][2], bot.sent[1][2])
+        
+        stats = self.stats.stats()
+        self.assertEqual(stats['reports'], 1)
+        self.assertEqual(stats['destinations']['channel']['sent'], 1)
+        self.assertGreaterEqual(stats['destinations']['user']['time_avg'], SEND_DELAY)
+    
+    async def test_deliver_isolates_errors(self):
+        """Ошибка канала не мешает доставке пользователю"""
+        bot = FakeBot(failing_chats={-100})
+        results = await deliver(bot, build_payload("Отчет", []),
+                                [Destination('user', 100), Destination('channel', -100)])
+        
+        self.assertTrue(results[0].ok)
+        self.assertIsInstance(results[1].error, RuntimeError)
+        self.assertEqual(bot.sent, [('send_message', 100, "Отчет")])
+        self.assertEqual(self.stats.stats()['destinations']['channel']['errors'], 1)
+    
+    async def test_deliver_copies_to_channels(self):
+        """В режиме copy медиа-группа отправляется один раз, каналы получают копию альбома"""
+        bot = FakeBot(failing_copies={-300})
+        payload = build_payload("Отчет", [f"photo{i}" for i in range(10)])
+        destinations = [Destination('user', 100), Destination('channel', -100), Destination('channel:mkd', -300)]
+        
+        results = await deliver(bot, payload, destinations, mode=MODE_COPY)
+        
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual([(method, chat_id) for method, chat_id, _ in bot.sent], [
+            ('send_media_group', 100), ('copy_messages', -100), ('send_media_group', -300)
+        ])
+        self.assertEqual(bot.sent[1][2], (100, list(range(1, 11))))
+        self.assertTrue(results[1].copied)
+        self.assertEqual(results[1].message_ids, tuple(range(11, 21)))
+        
+        # Канал, куда копирование не удалось, получил сообщение заново
+        self.assertFalse(results[2].copied)
+        self.assertEqual(results[2].api_calls, 2)
+        
+        stats = self.stats.stats()
+        self.assertEqual(stats['api_calls'], 4)
+        self.assertEqual(stats['copies'], 1)
+        self.assertEqual(stats['bytes_saved'], send_request_size(destinations[1], payload) - results[1].request_bytes)
+        self.assertGreater(stats['bytes_saved'], 0)
+    
+    async def test_copy_mode_without_source(self):
+        """Если сообщение пользователю не отправлено, каналы получают его напрямую"""
+        bot = FakeBot(failing_chats={100})
+        results = await deliver(bot, build_payload("Отчет", ["photo1"]),
+                                [Destination('user', 100), Destination('channel', -100)], mode=MODE_COPY)
+        
+        self.assertFalse(results[0].ok)
+        self.assertTrue(results[1].ok)
+        self.assertEqual([(method, chat_id) for method, chat_id, _ in bot.sent], [('send_media_group', -100)])
+
+
+class TestSendConnectionReport(unittest.IsolatedAsyncioTestCase):
+    """Тесты для send_connection_report"""
+    
+    def setUp(self):
+        """Подготовка к тестам - создание тестовой БД"""
+        self.test_db_path = "test_delivery_isp_bot.db"
+        self.db = AsyncDatabase(Database(self.test_db_path))
+        self.data = {'address': "ул. Тестовая, 1", 'fiber_meters': 100.0, 'twisted_pair_meters': 20.0}
+    
+    async def asyncTearDown(self):
+        await self.db.shutdown()
+    
+    def tearDown(self):
+        """Очистка после тестов - удаление тестовой БД"""
+        close_pool(self.test_db_path)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db_path + suffix):
+                os.remove(self.test_db_path + suffix)
+    
+    async def test_report_to_user_and_channel(self):
+        """Отчет с именами исполнителей уходит пользователю и в канал"""
+        emp1 = await self.db.aadd_employee("Иванов Иван")
+        await self.db.aadd_employee("Петров Петр")
+        emp3 = await self.db.aadd_employee("Сидоров Сидор")
+        bot = FakeBot()
+        message = FakeMessage(bot)
+        
+        with mock.patch.object(helpers, 'REPORTS_CHANNEL_ID', -100), \
+                mock.patch.object(helpers, 'REPORTS_CHANNELS_BY_TYPE', {'mkd': [-100, -300], 'chs': [-400]}), \
+                mock.patch.object(helpers, 'REPORT_DELIVERY_MODE', MODE_COPY):
+            await helpers.send_connection_report(message, 7, self.data, ["photo1", "photo2"], [emp3, emp1], self.db)
+        
+        # Общий канал и каналы типа подключения, без повторов
+        self.assertEqual([(method, chat_id) for method, chat_id, _ in bot.sent], [
+            ('send_media_group', 100), ('copy_messages', -100), ('copy_messages', -300)
+        ])
+        caption = bot.sent[0][2][0].caption
+        self.assertIn("ОТЧЕТ О ПОДКЛЮЧЕНИИ #7", caption)
+        self.assertIn("Иванов Иван", caption)
+        self.assertIn("Сидоров Сидор", caption)
+        self.assertNotIn("Петров Петр", caption)
+        self.assertEqual(message.replies, [])
+    
+    async def test_user_warned_when_own_copy_fails(self):
+        """Пользователь получает предупреждение, если его копия не доставлена"""
+        emp1 = await self.db.aadd_employee("Иванов Иван")
+        message = FakeMessage(FakeBot(failing_chats={100}))
+        
+        with mock.patch.object(helpers, 'REPORTS_CHANNEL_ID', None):
+            await helpers.send_connection_report(message, 8, self.data, [], [emp1], self.db)
+        
+        self.assertEqual(len(message.replies), 1)
+        self.assertTrue(message.replies[0].startswith("⚠️"))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
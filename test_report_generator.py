@@ -0,0 +1,102 @@
+"""
+Тесты для потоковой генерации Excel-отчетов
+"""
+import unittest
+from datetime import datetime
+
+from openpyxl import load_workbook
+
+from report_generator import ReportGenerator
+
+
+def _connections(count: int):
+    """Итератор подключений в формате ConnectionRepository.iter_employee_report"""
+    for i in range(count):
+        yield {
+            'connection_type': 'mkd',
+            'address': f"ул. Тестовая, д. {i}",
+            'router_model': "TP-Link",
+            'port': i,
+            'employee_fiber_meters': 50.0,
+            'employee_twisted_pair_meters': 10.5,
+            'all_employees': ["Иванов", "Петров"],
+            'created_at': "2024-01-15 10:30:00",
+        }
+
+
+class TestReportGenerator(unittest.TestCase):
+    """Тесты для класса ReportGenerator"""
+    
+    def test_streaming_report(self):
+        """Отчет из итераторов: строки, итоги под столбцами метража, лист движений"""
+        movements = iter([{
+            'operation_type': 'deduct', 'item_type': 'router', 'item_name': "TP-Link",
+            'quantity': 1, 'balance_after': 2, 'connection_id': 7, 'created_at': "bad date",
+        }])
+        stats = {'total_connections': 3, 'total_fiber_meters': 150.0, 'total_twisted_pair_meters': 31.5}
+        
+        buffer = ReportGenerator.generate_employee_report(
+            "Иванов", _connections(3), stats, "Все время", movements
+        )
+        self.assertEqual(buffer.tell(), 0)
+        wb = load_workbook(buffer)
+        
+        ws = wb["Отчет"]
+        self.assertEqual(ws['A6'].value, "Столбец")
+        self.assertEqual(ws['A6'].style, 'report_header')
+        self.assertEqual([ws.cell(row=r, column=1).value for r in range(7, 10)], [1, 2, 3])
+        self.assertEqual(ws['I7'].value, "15.01.2024 10:30")
+        self.assertEqual(ws['G7'].number_format, '0.00')
+        
+        # Итоги: пустая строка после данных, затем общие и по сотруднику
+        self.assertEqual(ws['A11'].value, "Итого общее:")
+        self.assertEqual((ws['G11'].value, ws['H11'].value), (150.0, 31.5))
+        self.assertEqual(ws['A12'].value, "Итого Иванов:")
+        self.assertIn('A12:F12', {str(r) for r in ws.merged_cells.ranges})
+        
+        ws = wb["Движение материалов"]
+        self.assertEqual(ws['A6'].value, "bad date")
+        self.assertEqual(ws['E6'].value, "1 шт.")
+        self.assertEqual(ws['G6'].value, "Подключение #7")
+    
+    def test_no_movements_sheet(self):
+        """Без движений второй лист не создается"""
+        stats = {'total_connections': 1, 'total_fiber_meters': 50.0, 'total_twisted_pair_meters': 10.5}
+        buffer = ReportGenerator.generate_employee_report(
+            "Иванов", _connections(1), stats, "Все время", iter([])
+        )
+        self.assertEqual(load_workbook(buffer, read_only=True).sheetnames, ["Отчет"])
+    
+    def test_team_report(self):
+        """Сводный отчет: лист сводки и по листу на сотрудника"""
+        def employee(employee_id, name, connections):
+            return {'employee_id': employee_id, 'full_name': name, 'total_connections': connections,
+                    'by_type': {'mkd': connections}, 'total_fiber_meters': 50.0 * connections,
+                    'total_twisted_pair_meters': 10.5 * connections, 'routers_used': 1}
+        
+        summary = {
+            'employees': [employee(2, "Иванов", 2), employee(1, "Петров/Сидоров", 1), employee(3, "Иванов", 1)],
+            'total': {'total_connections': 3, 'by_type': {'mkd': 3}, 'total_fiber_meters': 150.0,
+                      'total_twisted_pair_meters': 31.5, 'routers_used': 3},
+        }
+        rows = [dict(row, employee_id=2) for row in _connections(2)]
+        rows += [dict(row, employee_id=1) for row in _connections(1)]
+        rows += [dict(row, employee_id=3) for row in _connections(1)]
+        
+        wb = load_workbook(ReportGenerator.generate_team_report(summary, iter(rows), "Все время"))
+        self.assertEqual(wb.sheetnames, ["Сводка", "Иванов", "Петров Сидоров", "Иванов (2)"])
+        
+        ws = wb["Сводка"]
+        self.assertEqual(ws['B8'].value, "Иванов")
+        self.assertEqual((ws['C8'].value, ws['D8'].value, ws['E8'].value), (2, 2, 0))
+        self.assertEqual(ws['G8'].value, 100.0)
+        self.assertEqual(ws['A12'].value, "Итого по бригаде:")
+        self.assertEqual((ws['C12'].value, ws['G12'].value, ws['I12'].value), (3, 150.0, 3))
+        
+        ws = wb["Иванов"]
+        self.assertEqual([ws.cell(row=r, column=1).value for r in range(7, 9)], [1, 2])
+        self.assertEqual(ws['G10'].value, 100.0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
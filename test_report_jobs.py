@@ -0,0 +1,185 @@
+"""
+Тесты для фонового формирования отчетов
+"""
+import asyncio
+import os
+import time
+import unittest
+
+from database import Database
+from database.connection_pool import close_pool
+from utils.report_jobs import JobProgress, ReportJobCancelled, ReportJobRunner, build_employee_report, spool_report
+
+
+def _count_rows(progress: JobProgress, rows: int, delay: float = 0.0) -> int:
+    """Тестовое задание: пройти по строкам с публикацией прогресса"""
+    progress.every = 10
+    for _ in progress.track(range(rows)):
+        time.sleep(delay)
+    return progress.rows
+
+
+class TestReportJobRunner(unittest.IsolatedAsyncioTestCase):
+    """Тесты для класса ReportJobRunner"""
+    
+    async def asyncSetUp(self):
+        self.jobs = ReportJobRunner(max_workers=1, max_queued=1, use_processes=False, progress_interval=0.01)
+    
+    async def asyncTearDown(self):
+        await self.jobs.shutdown()
+    
+    async def test_progress_and_result(self):
+        """Прогресс приходит во время выполнения, результат - из воркера"""
+        job = self.jobs.submit(1, "отчет", total=100)
+        seen = []
+        
+        async def on_progress(job):
+            seen.append((job.status, job.progress))
+        
+        async def deliver():
+            return await self.jobs.run(job, _count_rows, 100, 0.002, on_progress=on_progress)
+        
+        result = await self.jobs.start(job, deliver())
+        self.assertEqual(result, 100)
+        self.assertEqual(job.percent, 100)
+        self.assertTrue(any(status == 'running' and 0 < rows < 100 for status, rows in seen))
+        
+        stats = self.jobs.stats()
+        self.assertEqual(stats['completed'], 1)
+        self.assertEqual(stats['active'], 0)
+    
+    async def test_cancel_running_job(self):
+        """Выполняющееся задание прерывается воркером"""
+        job = self.jobs.submit(1, "отчет", total=10000)
+        
+        async def deliver():
+            return await self.jobs.run(job, _count_rows, 10000, 0.001)
+        
+        task = self.jobs.start(job, deliver())
+        while job.status != 'running':
+            await asyncio.sleep(0.01)
+        
+        self.assertFalse(self.jobs.cancel(job.id, user_id=2))
+        self.assertTrue(self.jobs.cancel(job.id, user_id=1))
+        with self.assertRaises(ReportJobCancelled):
+            await task
+        self.assertLess(job.progress, 10000)
+        self.assertEqual(self.jobs.stats()['cancelled'], 1)
+    
+    async def test_queue_limits(self):
+        """Очередь ограничена, ожидающее задание отменяется без запуска"""
+        running = self.jobs.submit(1, "первый", total=1000)
+        queued = self.jobs.submit(2, "второй", total=10)
+        self.assertIsNone(self.jobs.submit(3, "третий", total=10))
+        self.assertIs(self.jobs.get_user_job(2), queued)
+        
+        first = self.jobs.start(running, self.jobs.run(running, _count_rows, 1000, 0.001))
+        second = self.jobs.start(queued, self.jobs.run(queued, _count_rows, 10))
+        await asyncio.sleep(0.05)
+        self.assertEqual(queued.status, 'queued')
+        self.assertEqual(self.jobs.queue_position(queued), 0)
+        
+        self.jobs.cancel(queued.id, 2)
+        with self.assertRaises(ReportJobCancelled):
+            await second
+        self.assertIsNone(queued.started_at)
+        self.assertEqual(await first, 1000)
+        self.assertEqual(self.jobs.stats()['rejected'], 1)
+    
+    async def test_cancel_wakes_queued_job(self):
+        """Отмена ожидающего задания срабатывает сразу, не дожидаясь интервала прогресса"""
+        jobs = ReportJobRunner(max_workers=1, max_queued=1, use_processes=False, progress_interval=30)
+        running = jobs.submit(1, "первый", total=5000)
+        queued = jobs.submit(2, "второй", total=10)
+        first = jobs.start(running, jobs.run(running, _count_rows, 5000, 0.001))
+        second = jobs.start(queued, jobs.run(queued, _count_rows, 10))
+        await asyncio.sleep(0.05)
+        
+        jobs.cancel(queued.id, 2)
+        with self.assertRaises(ReportJobCancelled):
+            await asyncio.wait_for(second, timeout=1)
+        self.assertEqual(running.status, 'running')
+        
+        jobs.cancel(running.id, 1)
+        with self.assertRaises(ReportJobCancelled):
+            await first
+        await jobs.shutdown()
+    
+    async def test_cancel_job_waiting_for_worker(self):
+        """Задание, снятое до запуска в пуле, завершается ReportJobCancelled"""
+        self.jobs._start_executor()
+        busy = self.jobs._executor.submit(time.sleep, 0.2)
+        job = self.jobs.submit(1, "отчет", total=10)
+        task = self.jobs.start(job, self.jobs.run(job, _count_rows, 10))
+        while job.future is None:
+            await asyncio.sleep(0.01)
+        
+        self.assertTrue(self.jobs.cancel(job.id, 1))
+        self.assertTrue(job.future.cancelled())
+        with self.assertRaises(ReportJobCancelled):
+            await task
+        self.assertEqual(self.jobs.stats()['cancelled'], 1)
+        await asyncio.wrap_future(busy)
+    
+    async def test_spool_report(self):
+        """Небольшой отчет передается в памяти, большой - файлом в закрытом каталоге"""
+        small = spool_report(lambda buffer: buffer.write(b'x' * 10), "small.xlsx", self.jobs.spill_dir, max_size=100)
+        self.assertEqual(small.content, b'x' * 10)
+        self.assertIsNone(small.path)
+        self.assertEqual(os.listdir(self.jobs.spill_dir), [])
+        
+        large = spool_report(lambda buffer: buffer.write(b'x' * 1000), "large.xlsx", self.jobs.spill_dir, max_size=100)
+        self.assertIsNone(large.content)
+        self.assertEqual(os.path.dirname(large.path), self.jobs.spill_dir)
+        with large.open() as file:
+            self.assertEqual(file.read(), b'x' * 1000)
+        large.discard()
+        self.assertEqual(os.listdir(self.jobs.spill_dir), [])
+        
+        spill_dir = self.jobs.spill_dir
+        await self.jobs.shutdown()
+        self.assertFalse(os.path.exists(spill_dir))
+
+
+class TestReportJobProcess(unittest.IsolatedAsyncioTestCase):
+    """Формирование отчета в отдельном процессе"""
+    
+    def setUp(self):
+        """Подготовка к тестам - создание тестовой БД с данными"""
+        self.test_db_path = os.path.abspath("test_report_jobs_isp_bot.db")
+        self.db = Database(self.test_db_path)
+        self.emp_id = self.db.add_employee("Монтажник")
+        self.db.add_material_to_employee(self.emp_id, 100.0, 100.0)
+        self.db.create_connection(
+            connection_type="mkd", address="ул. Тестовая, д. 1", router_model="-", port="1",
+            fiber_meters=10.0, twisted_pair_meters=5.0, employee_ids=[self.emp_id],
+            photo_file_ids=[], created_by=1, material_payer_id=self.emp_id
+        )
+    
+    def tearDown(self):
+        """Очистка после тестов - удаление тестовой БД"""
+        close_pool(self.test_db_path)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db_path + suffix):
+                os.remove(self.test_db_path + suffix)
+    
+    async def test_build_report_in_process(self):
+        """Отчет строится в spawn-процессе по пути к БД"""
+        jobs = ReportJobRunner(max_workers=1, progress_interval=0.05)
+        try:
+            stats = self.db.get_employee_report_totals(self.emp_id)
+            total = stats['total_connections'] + self.db.count_employee_movements(self.emp_id)
+            job = jobs.submit(1, "отчет", total=total)
+            document = await jobs.start(job, jobs.run(
+                job, build_employee_report, self.test_db_path, self.emp_id, None, None, "Монтажник",
+                stats, "Все время", jobs.spill_dir
+            ))
+            self.assertTrue(document.filename.startswith("report_Монтажник_"))
+            self.assertEqual(document.content[:2], b'PK')
+            self.assertEqual(job.progress, total)
+        finally:
+            await jobs.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
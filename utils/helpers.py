@@ -1,26 +1,45 @@
 """
 Вспомогательные функции
 """
-from typing import Dict, List
+from typing import Dict, List, Optional
 from datetime import datetime
 import logging
 
-from telegram import InputMediaPhoto
+from telegram.ext import ContextTypes
 
-from config import REPORTS_CHANNEL_ID, CONNECTION_TYPES
+from config import REPORTS_CHANNEL_ID, REPORTS_CHANNELS_BY_TYPE, REPORT_DELIVERY_MODE, CONNECTION_TYPES
+from database.async_db import AsyncDatabase
+from utils.outbox import Outbox
+from utils.report_delivery import Destination, build_payload, deliver
+from utils.report_jobs import ReportJobRunner
 
 logger = logging.getLogger(__name__)
 
+# Ключ общего экземпляра Database в application.bot_data
+DB_KEY = 'db'
 
-def _create_media_group(photos: List[str], caption: str) -> List[InputMediaPhoto]:
-    """Создать медиа-группу из фотографий с подписью"""
-    media_group = []
-    for idx, photo_id in enumerate(photos):
-        if idx == 0:
-            media_group.append(InputMediaPhoto(media=photo_id, caption=caption, parse_mode='HTML'))
-        else:
-            media_group.append(InputMediaPhoto(media=photo_id))
-    return media_group
+
+def get_db(context: ContextTypes.DEFAULT_TYPE) -> AsyncDatabase:
+    """Получить общий для приложения доступ к БД (создается в post_init)"""
+    return context.bot_data[DB_KEY]
+
+
+# Ключ планировщика заданий отчетов в application.bot_data
+REPORT_JOBS_KEY = 'report_jobs'
+
+
+def get_report_jobs(context: ContextTypes.DEFAULT_TYPE) -> ReportJobRunner:
+    """Получить планировщик фонового формирования отчетов (создается в post_init)"""
+    return context.bot_data[REPORT_JOBS_KEY]
+
+
+# Ключ очереди исходящих сообщений в application.bot_data
+OUTBOX_KEY = 'outbox'
+
+
+def get_outbox(context: ContextTypes.DEFAULT_TYPE) -> Optional[Outbox]:
+    """Получить очередь исходящих сообщений (создается в post_init)"""
+    return context.bot_data.get(OUTBOX_KEY)
 
 
 def _format_report_text(connection_id: int, data: Dict, employee_names: List[str]) -> str:
@@ -86,44 +105,40 @@ def _format_report_text(connection_id: int, data: Dict, employee_names: List[str
 """
 
 
-async def send_connection_report(message, connection_id: int, data: Dict, photos: List[str], 
-                                 employee_ids: List[int], db) -> None:
-    """Отправить красиво отформатированный отчет о подключении с фотографиями"""
+def _report_destinations(chat_id: int, connection_type: str) -> List[Destination]:
+    """Адресаты отчета: пользователь, общий канал и каналы типа подключения (без повторов)"""
+    destinations = [Destination('user', chat_id)]
+    channels = [('channel', REPORTS_CHANNEL_ID)] if REPORTS_CHANNEL_ID else []
+    channels += [(f"channel:{connection_type}", channel_id)
+                 for channel_id in REPORTS_CHANNELS_BY_TYPE.get(connection_type, [])]
+    seen = {chat_id}
+    for name, channel_id in channels:
+        if channel_id not in seen:
+            seen.add(channel_id)
+            destinations.append(Destination(name, channel_id))
+    return destinations
+
+
+async def send_connection_report(message, connection_id: int, data: Dict, photos: List[str],
+                                 employee_ids: List[int], db, outbox: Optional[Outbox] = None) -> None:
+    """Отправить отчет о подключении с фотографиями пользователю и в каналы отчетов (через outbox, если задана)"""
     try:
-        # Получаем имена сотрудников
-        employees = db.get_all_employees()
-        employee_names = [emp['full_name'] for emp in employees if emp['id'] in employee_ids]
-        
-        # Формируем текст отчета
-        report_text = _format_report_text(connection_id, data, employee_names)
-        
-        # Отправляем отчет пользователю
-        if photos:
-            media_group = _create_media_group(photos, report_text)
-            await message.reply_media_group(media=media_group)
-            logger.info(f"Отправлен отчет #{connection_id} пользователю с {len(photos)} фото")
-        else:
-            await message.reply_text(report_text, parse_mode='HTML')
-            logger.info(f"Отправлен отчет #{connection_id} пользователю без фото")
-        
-        # Отправляем отчет в канал, если он настроен
-        if REPORTS_CHANNEL_ID:
-            try:
-                bot = message.get_bot()
-                if photos:
-                    media_group = _create_media_group(photos, report_text)
-                    await bot.send_media_group(chat_id=REPORTS_CHANNEL_ID, media=media_group)
-                    logger.info(f"Отчет #{connection_id} отправлен в канал с {len(photos)} фото")
-                else:
-                    await bot.send_message(chat_id=REPORTS_CHANNEL_ID, text=report_text, parse_mode='HTML')
-                    logger.info(f"Отчет #{connection_id} отправлен в канал без фото")
-            except Exception as channel_error:
-                logger.error(f"Ошибка при отправке отчета в канал: {channel_error}")
-            
+        employee_names = await db.aget_employee_names(employee_ids)
+        payload = build_payload(_format_report_text(connection_id, data, employee_names), photos)
     except Exception as e:
-        logger.error(f"Ошибка при отправке отчета о подключении: {e}")
-        await message.reply_text(
-            "⚠️ Отчет создан, но возникла ошибка при отправке фотографий.",
-            parse_mode='HTML'
+        logger.error(f"Ошибка при подготовке отчета о подключении #{connection_id}: {e}")
+        payload = None
+    
+    destinations = _report_destinations(message.chat_id, data.get('connection_type', 'mkd'))
+    
+    if payload is not None:
+        user_result, *_ = await deliver(
+            message.get_bot(), payload, destinations, f"Отчет #{connection_id}", REPORT_DELIVERY_MODE, outbox
         )
-
+        if user_result.ok:
+            return
+    
+    await message.reply_text(
+        "⚠️ Отчет создан, но возникла ошибка при отправке фотографий.",
+        parse_mode='HTML'
+    )
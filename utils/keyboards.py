@@ -1,9 +1,83 @@
 """
 Модуль для создания клавиатур
+
+Разметки в python-telegram-bot неизменяемы, поэтому готовые клавиатуры
+кэшируются и переиспользуются. Клавиатуры со списками сотрудников и
+роутеров привязаны к версии данных (Database.get_data_version()):
+после изменения справочников ключ меняется и клавиатура строится заново.
 """
-from telegram import ReplyKeyboardMarkup, KeyboardButton
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict, Hashable, Iterable, List, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
+
+# Сколько готовых inline-клавиатур держать в памяти
+KEYBOARD_CACHE_SIZE = 256
+
+
+class KeyboardCache:
+    """LRU-кэш готовых inline-клавиатур"""
+    
+    def __init__(self, max_size: int = KEYBOARD_CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._markups: "OrderedDict[Hashable, InlineKeyboardMarkup]" = OrderedDict()
+        
+        # Счетчики
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get_or_build(self, key: Hashable, build: Callable[[], InlineKeyboardMarkup]) -> InlineKeyboardMarkup:
+        """Получить клавиатуру из кэша или построить и запомнить"""
+        with self._lock:
+            markup = self._markups.get(key)
+            if markup is not None:
+                self._markups.move_to_end(key)
+                self.hits += 1
+                return markup
+            self.misses += 1
+        
+        markup = build()
+        
+        with self._lock:
+            self._markups[key] = markup
+            self._markups.move_to_end(key)
+            while len(self._markups) > self.max_size:
+                self._markups.popitem(last=False)
+                self.evictions += 1
+        return markup
+    
+    def clear(self) -> None:
+        """Очистить кэш"""
+        with self._lock:
+            self._markups.clear()
+    
+    def stats(self) -> Dict:
+        """Получить статистику кэша"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._markups),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+            }
+
+
+_cache = KeyboardCache()
 
 
+def get_keyboard_cache() -> KeyboardCache:
+    """Получить общий кэш inline-клавиатур"""
+    return _cache
+
+
+@lru_cache(maxsize=1)
 def get_main_keyboard() -> ReplyKeyboardMarkup:
     """Создать главную клавиатуру"""
     keyboard = [
@@ -14,3 +88,102 @@ def get_main_keyboard() -> ReplyKeyboardMarkup:
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
+
+def _employee_list(
+    employees: List[Dict],
+    label: Callable[[Dict], str],
+    prefix: str,
+    *footers: Tuple[str, str]
+) -> InlineKeyboardMarkup:
+    """Построить клавиатуру: по кнопке на сотрудника и кнопки внизу"""
+    keyboard = [
+        [InlineKeyboardButton(label(emp), callback_data=f"{prefix}{emp['id']}")]
+        for emp in employees
+    ]
+    for text, callback_data in footers:
+        keyboard.append([InlineKeyboardButton(text, callback_data=callback_data)])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def _material_label(emp: Dict) -> str:
+    fiber = emp.get('fiber_balance', 0) or 0
+    twisted = emp.get('twisted_pair_balance', 0) or 0
+    return f"📦 {emp['full_name']} (ВОЛС: {fiber}м, ВП: {twisted}м)"
+
+
+def _router_label(emp: Dict) -> str:
+    router_count = emp['router_total']
+    router_text = f"{router_count} шт." if router_count > 0 else "нет"
+    return f"📡 {emp['full_name']} ({router_text})"
+
+
+def get_delete_employee_keyboard(employees: List[Dict], version: Hashable) -> InlineKeyboardMarkup:
+    """Клавиатура выбора сотрудника для удаления"""
+    return _cache.get_or_build(('delete', version), lambda: _employee_list(
+        employees, lambda emp: f"🗑 {emp['full_name']}", 'del_emp_', ("❌ Отмена", 'delete_cancel')
+    ))
+
+
+def get_material_employee_keyboard(employees: List[Dict], version: Hashable) -> InlineKeyboardMarkup:
+    """Клавиатура выбора сотрудника для управления материалами (с балансами)"""
+    return _cache.get_or_build(('materials', version), lambda: _employee_list(
+        employees, _material_label, 'mat_emp_', ("◀️ Назад", 'back_to_manage')
+    ))
+
+
+def get_router_employee_keyboard(inventory: List[Dict], version: Hashable) -> InlineKeyboardMarkup:
+    """Клавиатура выбора сотрудника для управления роутерами (по сводке остатков)"""
+    return _cache.get_or_build(('routers', version), lambda: _employee_list(
+        inventory, _router_label, 'rtr_emp_', ("◀️ Назад", 'back_to_manage')
+    ))
+
+
+def get_report_employee_keyboard(employees: List[Dict], version: Hashable) -> InlineKeyboardMarkup:
+    """Клавиатура выбора сотрудника для отчета (и сводного отчета по всем)"""
+    return _cache.get_or_build(('report', version), lambda: _employee_list(
+        employees, lambda emp: emp['full_name'], 'rep_emp_',
+        ("👥 Все сотрудники", 'rep_emp_all'), ("❌ Отмена", 'report_cancel')
+    ))
+
+
+def get_employee_checkbox_keyboard(
+    employees: List[Dict],
+    selected: Iterable[int],
+    version: Hashable
+) -> InlineKeyboardMarkup:
+    """
+    Клавиатура выбора исполнителей подключения с отметками
+    
+    Ключ кэша - версия данных и набор выбранных сотрудников, поэтому
+    при быстром переключении отметок уже встречавшиеся состояния
+    берутся из кэша.
+    """
+    selection = frozenset(selected)
+    
+    def build() -> InlineKeyboardMarkup:
+        keyboard = [
+            [InlineKeyboardButton(
+                f"{'☑' if emp['id'] in selection else '☐'} {emp['full_name']}",
+                callback_data=f"emp_{emp['id']}"
+            )]
+            for emp in employees
+        ]
+        keyboard.append([InlineKeyboardButton("✅ Готово", callback_data='employees_done')])
+        keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data='cancel_connection')])
+        return InlineKeyboardMarkup(keyboard)
+    
+    return _cache.get_or_build(('checkbox', version, selection), build)
+
+
+def get_router_model_keyboard(router_names: List[str], version: Hashable) -> InlineKeyboardMarkup:
+    """Клавиатура выбора модели роутера в мастере подключения"""
+    def build() -> InlineKeyboardMarkup:
+        keyboard = [
+            [InlineKeyboardButton(f"📡 {router_name}", callback_data=f"select_router_{router_name}")]
+            for router_name in router_names
+        ]
+        keyboard.append([InlineKeyboardButton("⏭️ Пропустить", callback_data='router_skip')])
+        keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data='cancel_connection')])
+        return InlineKeyboardMarkup(keyboard)
+    
+    return _cache.get_or_build(('router_models', version), build)
@@ -0,0 +1,327 @@
+"""
+Очередь исходящих сообщений Telegram (outbox)
+
+Отправки в каналы отчетов сохраняются в таблицу outbox и выполняются
+фоновой задачей. Поэтому RetryAfter, сбой сети или перезапуск бота не
+теряют сообщение: после перезапуска задача продолжает с неотправленных.
+
+Ограничения Bot API соблюдаются маркерными корзинами (token bucket):
+общая на бота (по умолчанию 25 сообщений в секунду при лимите ~30) и по чату (1 в секунду в
+личном чате, 20 в минуту в группе или канале). Медиа-группа из N фото
+расходует N маркеров. Сообщения одного чата отправляются по порядку;
+RetryAfter приостанавливает только этот чат.
+
+Повторная отправка - с экспоненциальной задержкой до max_attempts
+попыток; ошибки, которые повтор не исправит (BadRequest, Forbidden),
+сразу отмечают сообщение неотправляемым. Если сбой произошел после
+того, как Telegram принял сообщение, оно может быть отправлено повторно
+(доставка "хотя бы один раз").
+"""
+import asyncio
+import random
+import time
+from typing import Dict, Optional, Set, Union
+import logging
+
+from telegram import Bot, InputMediaPhoto
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from database.async_db import AsyncDatabase
+
+logger = logging.getLogger(__name__)
+
+# Значения по умолчанию (переопределяются в config.py)
+DEFAULT_GLOBAL_RATE = 25.0
+DEFAULT_GROUP_RATE_PER_MINUTE = 20
+PRIVATE_CHAT_RATE = 1.0
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_CONCURRENCY = 4
+
+# Задержка повтора: BASE * 2^(попытка-1), не больше MAX, со случайным разбросом
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 300.0
+
+# Сколько голов очередей чатов читать за проход и как долго спать без работы
+BATCH_SIZE = 50
+IDLE_WAIT = 30.0
+
+# Отправленные сообщения хранятся неделю (для разбора инцидентов)
+KEEP_SENT_SECONDS = 7 * 24 * 3600
+
+
+class TokenBucket:
+    """Маркерная корзина: rate маркеров в секунду, не больше capacity"""
+    
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self.blocked_until = 0.0
+    
+    def _refill(self) -> float:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+    
+    def delay(self, cost: float) -> float:
+        """Сколько секунд ждать, пока можно будет израсходовать cost маркеров"""
+        now = self._refill()
+        cost = min(cost, self.capacity)
+        return max(self.blocked_until - now, (cost - self.tokens) / self.rate, 0.0)
+    
+    def consume(self, cost: float) -> None:
+        """Израсходовать маркеры (после delay() == 0)"""
+        self._refill()
+        self.tokens -= min(cost, self.capacity)
+    
+    def block(self, seconds: float) -> None:
+        """Приостановить расход маркеров (RetryAfter от Telegram)"""
+        self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+
+def _chat_id(value: str) -> Union[int, str]:
+    """ID чата из колонки outbox.chat_id (число или @username)"""
+    return int(value) if value.lstrip('-').isdigit() else value
+
+
+async def call_api(bot: Bot, chat_id: Union[int, str], method: str, params: Dict):
+    """Выполнить вызов Bot API, сохраненный в очереди"""
+    if method == 'send_media_group':
+        media = [InputMediaPhoto(**{key: value for key, value in item.items() if key != 'type'})
+                 for item in params['media']]
+        return await bot.send_media_group(chat_id=chat_id, media=media)
+    if method == 'send_message':
+        return await bot.send_message(chat_id=chat_id, text=params['text'], parse_mode=params.get('parse_mode'))
+    if method == 'copy_messages':
+        return await bot.copy_messages(
+            chat_id=chat_id, from_chat_id=params['from_chat_id'], message_ids=params['message_ids']
+        )
+    raise ValueError(f"Неизвестный метод очереди сообщений: {method}")
+
+
+class Outbox:
+    """
+    Очередь исходящих сообщений с фоновой отправкой
+    
+    enqueue() сохраняет вызов Bot API в БД и будит фоновую задачу;
+    start()/stop() вызываются в post_init/post_shutdown приложения.
+    """
+    
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        bot: Bot,
+        global_rate: float = DEFAULT_GLOBAL_RATE,
+        group_rate_per_minute: float = DEFAULT_GROUP_RATE_PER_MINUTE,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        backoff_base: float = BACKOFF_BASE
+    ):
+        self.db = db
+        self.bot = bot
+        self.max_attempts = max_attempts
+        self.concurrency = concurrency
+        self.backoff_base = backoff_base
+        self.group_rate_per_minute = group_rate_per_minute
+        self._global = TokenBucket(global_rate, max(global_rate, 1.0))
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._busy_chats: Set[str] = set()
+        self._sending: Set[asyncio.Task] = set()
+        
+        # Счетчики
+        self.enqueued = 0
+        self.sent = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.fallbacks = 0
+        self.failed = 0
+        self.api_calls = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.depth = 0
+        self.oldest_created_at: Optional[float] = None
+    
+    # ==================== ПОСТАНОВКА В ОЧЕРЕДЬ ====================
+    
+    async def enqueue(
+        self,
+        chat_id: Union[int, str],
+        method: str,
+        params: Dict,
+        cost: int = 1,
+        title: Optional[str] = None
+    ) -> Optional[int]:
+        """Сохранить вызов Bot API в очереди и разбудить отправку"""
+        message_id = await self.db.aenqueue_outbox(chat_id, method, params, cost, title)
+        if message_id:
+            self.enqueued += 1
+            self._notify()
+        return message_id
+    
+    def _notify(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+    
+    # ==================== ФОНОВАЯ ОТПРАВКА ====================
+    
+    def start(self) -> None:
+        """Запустить фоновую отправку (в работающем цикле событий)"""
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="outbox")
+    
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Остановить фоновую отправку, дождавшись начатых вызовов (не дольше timeout)"""
+        self._stopping = True
+        self._notify()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        if self._sending:
+            # Не дождавшиеся маркеров отправки отменяются и останутся в очереди до перезапуска
+            _, pending = await asyncio.wait(self._sending, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        logger.info(f"Статистика очереди сообщений: {self.stats()}")
+    
+    async def _run(self) -> None:
+        """Цикл отправки: головы очередей чатов, готовые к отправке"""
+        pruned = await self.db.aprune_outbox(time.time() - KEEP_SENT_SECONDS)
+        if pruned:
+            logger.info(f"Из очереди сообщений удалено отправленных: {pruned}")
+        
+        while not self._stopping:
+            timeout = IDLE_WAIT
+            try:
+                backlog = await self.db.aget_outbox_backlog()
+                self.depth, self.oldest_created_at = backlog['pending'], backlog['oldest_created_at']
+                
+                now = time.time()
+                for row in await self.db.aget_outbox_heads(BATCH_SIZE):
+                    if row['chat_id'] in self._busy_chats:
+                        continue
+                    if row['next_attempt_at'] > now:
+                        timeout = min(timeout, row['next_attempt_at'] - now)
+                        continue
+                    if len(self._sending) >= self.concurrency:
+                        break
+                    self._busy_chats.add(row['chat_id'])
+                    task = asyncio.create_task(self._process(row))
+                    self._sending.add(task)
+                    task.add_done_callback(self._sent_callback)
+            except Exception as e:
+                logger.error(f"Ошибка цикла очереди сообщений: {e}")
+            
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+    
+    def _sent_callback(self, task: asyncio.Task) -> None:
+        self._sending.discard(task)
+        self._notify()
+    
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        """Корзина чата: личный чат - 1 сообщение в секунду, группа или канал - 20 в минуту"""
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            private = isinstance(chat_id, int) and chat_id > 0
+            if private:
+                bucket = TokenBucket(PRIVATE_CHAT_RATE, 1.0)
+            else:
+                bucket = TokenBucket(self.group_rate_per_minute / 60, self.group_rate_per_minute)
+            self._chats[chat_id] = bucket
+        return bucket
+    
+    async def _acquire(self, chat_id: Union[int, str], cost: int) -> None:
+        """Дождаться маркеров в общей корзине и корзине чата"""
+        chat = self._chat_bucket(chat_id)
+        while True:
+            delay = max(self._global.delay(cost), chat.delay(cost))
+            if delay <= 0:
+                self._global.consume(cost)
+                chat.consume(cost)
+                return
+            await asyncio.sleep(delay)
+    
+    def _backoff(self, attempts: int) -> float:
+        delay = min(BACKOFF_MAX, self.backoff_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+    
+    async def _process(self, row: Dict) -> None:
+        """Отправить одно сообщение очереди и записать результат"""
+        chat_id = _chat_id(row['chat_id'])
+        title = row['title'] or f"Сообщение {row['id']}"
+        attempts = row['attempts'] + 1
+        try:
+            await self._acquire(chat_id, row['cost'])
+            self.api_calls += 1
+            await call_api(self.bot, chat_id, row['method'], row['payload'])
+        except RetryAfter as e:
+            # Ограничение Telegram - не ошибка сообщения, попытка не расходуется
+            retry_after = float(e.retry_after)
+            self.rate_limited += 1
+            self._chat_bucket(chat_id).block(retry_after)
+            logger.warning(f"{title} ({chat_id}): Telegram просит подождать {retry_after} с")
+            await self.db.areschedule_outbox(row['id'], time.time() + retry_after, str(e), row['attempts'])
+        except (BadRequest, Forbidden) as e:
+            fallback = row['payload'].get('fallback')
+            if fallback:
+                # Копирование не удалось (например, исходное сообщение удалено) - отправляем заново
+                self.fallbacks += 1
+                logger.warning(f"{title} ({chat_id}): {e}, отправляем сообщение заново")
+                await self.db.areplace_outbox_request(row['id'], fallback['method'], fallback['params'],
+                                                      fallback['cost'])
+            else:
+                self.failed += 1
+                logger.error(f"{title} ({chat_id}) не будет отправлен: {e}")
+                await self.db.afail_outbox(row['id'], str(e), attempts)
+        except Exception as e:
+            # Сбой сети, таймаут или ошибка сервера - повторяем с растущей задержкой
+            if attempts >= self.max_attempts:
+                self.failed += 1
+                logger.error(f"{title} ({chat_id}) не отправлен после {attempts} попыток: {e}")
+                await self.db.afail_outbox(row['id'], str(e), attempts)
+            else:
+                self.retries += 1
+                delay = self._backoff(attempts)
+                log = logger.warning if isinstance(e, NetworkError) else logger.error
+                log(f"{title} ({chat_id}): {e}, повтор через {delay:.1f} с (попытка {attempts})")
+                await self.db.areschedule_outbox(row['id'], time.time() + delay, str(e), attempts)
+        else:
+            now = time.time()
+            await self.db.amark_outbox_sent(row['id'], now)
+            lag = now - row['created_at']
+            self.sent += 1
+            self.lag_total += lag
+            self.lag_max = max(self.lag_max, lag)
+            logger.info(f"{title} отправлен из очереди ({chat_id}) через {lag:.2f} с после постановки")
+        finally:
+            self._busy_chats.discard(row['chat_id'])
+    
+    # ==================== МЕТРИКИ ====================
+    
+    def stats(self) -> Dict:
+        """Получить статистику очереди: глубина, задержка доставки и исходы отправок"""
+        return {
+            'depth': self.depth,
+            'lag': round(time.time() - self.oldest_created_at, 3) if self.oldest_created_at else 0.0,
+            'enqueued': self.enqueued,
+            'sent': self.sent,
+            'retries': self.retries,
+            'rate_limited': self.rate_limited,
+            'fallbacks': self.fallbacks,
+            'failed': self.failed,
+            'api_calls': self.api_calls,
+            'delivery_lag_avg': round(self.lag_total / self.sent, 3) if self.sent else 0.0,
+            'delivery_lag_max': round(self.lag_max, 3),
+        }
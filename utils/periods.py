@@ -0,0 +1,137 @@
+"""
+Периоды отчетов
+
+Период - полуоткрытый интервал [start, end) в локальном времени.
+Относительные периоды ("последняя неделя") отсчитываются от текущего
+дня, календарные (месяц, квартал, произвольные даты) - фиксированы.
+Границы всех периодов - начало суток, поэтому итоги за любой период
+собираются из дневных сводок.
+"""
+import re
+from datetime import date, datetime, timedelta
+from typing import Hashable, NamedTuple, Optional, Tuple
+
+MONTH_NAMES = (
+    "Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
+    "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"
+)
+
+# Кнопки выбора периода: callback_data -> подпись
+PERIODS = {
+    'period_7': "📅 Последняя неделя",
+    'period_30': "📅 Последние 30 дней",
+    'period_month': "📅 Текущий месяц",
+    'period_prev_month': "📅 Прошлый месяц",
+    'period_quarter': "📅 Текущий квартал",
+    'period_prev_quarter': "📅 Прошлый квартал",
+    'period_all': "📅 Все время",
+}
+
+DATE_FORMAT = "%d.%m.%Y"
+_RANGE_SEPARATOR = re.compile(r"\s*(?:-|–|—|\.\.)\s*")
+
+
+class ReportPeriod(NamedTuple):
+    """Период отчета: название и границы [start, end), None - без ограничения"""
+    name: str
+    start: Optional[datetime]
+    end: Optional[datetime]
+    relative: bool = False
+    
+    @property
+    def cache_key(self) -> Hashable:
+        """Идентификатор периода для ключа кэша отчетов"""
+        return (self.name,) if self.relative else (self.start, self.end)
+
+
+def _month_start(year: int, month: int) -> datetime:
+    """Начало месяца (month может выходить за 1..12)"""
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return datetime(year, month, 1)
+
+
+def _month_period(year: int, month: int) -> ReportPeriod:
+    """Календарный месяц"""
+    start = _month_start(year, month)
+    return ReportPeriod(f"{MONTH_NAMES[start.month - 1]} {start.year}", start, _month_start(year, month + 1))
+
+
+def _quarter_period(year: int, quarter: int) -> ReportPeriod:
+    """Календарный квартал (quarter может выходить за 1..4)"""
+    start = _month_start(year, (quarter - 1) * 3 + 1)
+    return ReportPeriod(
+        f"{(start.month - 1) // 3 + 1}-й квартал {start.year}",
+        start,
+        _month_start(start.year, start.month + 3)
+    )
+
+
+def resolve_period(code: str, now: Optional[datetime] = None) -> ReportPeriod:
+    """
+    Получить период по коду кнопки
+    
+    Args:
+        code: callback_data кнопки (ключ PERIODS)
+        now: Текущий момент (для тестов)
+    
+    Returns:
+        ReportPeriod: Период отчета
+    
+    Raises:
+        KeyError: Неизвестный код периода
+    """
+    now = now or datetime.now()
+    today = datetime.combine(now.date(), datetime.min.time())
+    quarter = (now.month - 1) // 3 + 1
+    
+    # Последние N дней - сегодня и N-1 предыдущих
+    if code == 'period_7':
+        return ReportPeriod("Последняя неделя", today - timedelta(days=6), None, relative=True)
+    if code == 'period_30':
+        return ReportPeriod("Последние 30 дней", today - timedelta(days=29), None, relative=True)
+    if code == 'period_month':
+        return _month_period(now.year, now.month)
+    if code == 'period_prev_month':
+        return _month_period(now.year, now.month - 1)
+    if code == 'period_quarter':
+        return _quarter_period(now.year, quarter)
+    if code == 'period_prev_quarter':
+        return _quarter_period(now.year, quarter - 1)
+    if code == 'period_all':
+        return ReportPeriod("Все время", None, None)
+    raise KeyError(code)
+
+
+def _parse_date(text: str) -> date:
+    """Дата в формате ДД.ММ.ГГГГ"""
+    return datetime.strptime(text.strip(), DATE_FORMAT).date()
+
+
+def parse_period(text: str) -> Tuple[bool, Optional[ReportPeriod], str]:
+    """
+    Разобрать период, введенный пользователем
+    
+    Принимается одна дата ("05.03.2025") или диапазон
+    ("01.03.2025 - 15.03.2025"), обе даты включительно.
+    
+    Returns:
+        Tuple[bool, Optional[ReportPeriod], str]: (валидно, период, сообщение об ошибке)
+    """
+    parts = _RANGE_SEPARATOR.split(text.strip(), maxsplit=1)
+    try:
+        first = _parse_date(parts[0])
+        last = _parse_date(parts[1]) if len(parts) > 1 else first
+    except ValueError:
+        return False, None, (
+            "⚠️ Введите даты в формате ДД.ММ.ГГГГ - ДД.ММ.ГГГГ "
+            "(например: 01.03.2025 - 15.03.2025) или одну дату"
+        )
+    
+    if last < first:
+        return False, None, "⚠️ Дата окончания не может быть раньше даты начала"
+    
+    name = first.strftime(DATE_FORMAT)
+    if last != first:
+        name = f"{name} - {last.strftime(DATE_FORMAT)}"
+    start = datetime.combine(first, datetime.min.time())
+    return True, ReportPeriod(name, start, datetime.combine(last, datetime.min.time()) + timedelta(days=1)), ""
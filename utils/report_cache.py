@@ -0,0 +1,146 @@
+"""
+Кэш сформированных отчетов
+
+Повторный запрос того же отчета по неизменившимся данным отправляется
+по file_id уже загруженного в Telegram документа - без генерации Excel
+и без повторной загрузки файла.
+"""
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Hashable, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Ограничения кэша: количество отчетов и суммарный размер файлов
+REPORT_CACHE_MAX_ENTRIES = 64
+REPORT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+
+def make_report_key(
+    employee_id: int,
+    period: Hashable,
+    watermark: Tuple,
+    relative: bool = False,
+    today: Optional[date] = None
+) -> Tuple:
+    """
+    Ключ отчета в кэше
+    
+    Args:
+        employee_id: ID сотрудника
+        period: Идентификатор периода (ReportPeriod.cache_key)
+        watermark: Отметка данных из Database.get_report_watermark()
+        relative: Период отсчитывается от текущего момента ("последняя неделя") -
+            такой отчет действует только в день формирования
+        today: Текущая дата (для тестов)
+    """
+    day = (today or date.today()) if relative else None
+    return (employee_id, period, tuple(watermark), day)
+
+
+class ReportCache:
+    """
+    LRU-кэш отчетов
+    
+    Значение - словарь с содержимым файла ('content'), именем файла
+    ('filename'), подписью к документу ('caption') и file_id документа
+    в Telegram ('file_id'), если файл уже был отправлен. Вытесняются
+    давно не запрашивавшиеся отчеты, пока не выполнены ограничения
+    по количеству и суммарному размеру.
+    """
+    
+    def __init__(self, max_entries: int = REPORT_CACHE_MAX_ENTRIES, max_bytes: int = REPORT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._reports: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self._bytes = 0
+        
+        # Счетчики
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+    
+    def get(self, key: Hashable) -> Optional[Dict]:
+        """Получить отчет из кэша (копию записи) или None"""
+        with self._lock:
+            report = self._reports.get(key)
+            if report is None:
+                self.misses += 1
+                return None
+            self._reports.move_to_end(key)
+            self.hits += 1
+            self.bytes_saved += len(report['content'])
+            return dict(report)
+    
+    def put(
+        self,
+        key: Hashable,
+        content: bytes,
+        filename: str,
+        caption: str,
+        file_id: Optional[str] = None
+    ) -> None:
+        """Сохранить сформированный отчет"""
+        if len(content) > self.max_bytes:
+            logger.info(f"Отчет {filename} ({len(content)} байт) больше лимита кэша, не кэшируется")
+            return
+        
+        with self._lock:
+            previous = self._reports.pop(key, None)
+            if previous:
+                self._bytes -= len(previous['content'])
+            self._reports[key] = {'content': content, 'filename': filename, 'caption': caption, 'file_id': file_id}
+            self._bytes += len(content)
+            
+            while len(self._reports) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._reports.popitem(last=False)
+                self._bytes -= len(evicted['content'])
+                self.evictions += 1
+    
+    def set_file_id(self, key: Hashable, file_id: str) -> None:
+        """Запомнить file_id отправленного документа"""
+        with self._lock:
+            report = self._reports.get(key)
+            if report is not None:
+                report['file_id'] = file_id
+    
+    def discard(self, key: Hashable) -> None:
+        """Удалить отчет из кэша"""
+        with self._lock:
+            report = self._reports.pop(key, None)
+            if report:
+                self._bytes -= len(report['content'])
+    
+    def clear(self) -> None:
+        """Очистить кэш"""
+        with self._lock:
+            self._reports.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict:
+        """Получить статистику кэша"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._reports),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'bytes_saved': self.bytes_saved,
+            }
+
+
+_cache = ReportCache()
+
+
+def get_report_cache() -> ReportCache:
+    """Получить общий кэш отчетов"""
+    return _cache
@@ -0,0 +1,274 @@
+"""
+Доставка отчетов о подключениях
+
+Сообщение отчета (текст и медиа-группа с фотографиями) собирается один
+раз. Первым адресатом всегда идет пользователь, создавший подключение,
+за ним - каналы отчетов. Два режима доставки:
+
+- 'send': сообщение отправляется всем адресатам одновременно;
+- 'copy': сообщение отправляется только пользователю, каналы получают
+  его копию (copy_messages). Запрос копирования содержит только ID
+  сообщений, а не медиа-группу с подписью, и альбом сохраняется.
+
+Ошибка одного адресата не мешает доставке остальным; если копирование
+в канал не удалось, сообщение отправляется в него заново. С очередью
+сообщений (utils/outbox.py) каналы получают отчет через нее: с
+повторами, ограничением частоты и без потерь при перезапуске.
+"""
+import asyncio
+import json
+import time
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+import logging
+
+from telegram import Bot, InputMediaPhoto
+
+if TYPE_CHECKING:
+    from utils.outbox import Outbox
+
+logger = logging.getLogger(__name__)
+
+# Режимы доставки
+MODE_SEND = 'send'
+MODE_COPY = 'copy'
+
+
+class ReportPayload(NamedTuple):
+    """Сообщение отчета: текст (подпись к первому фото) и медиа-группа"""
+    text: str
+    media: Tuple[InputMediaPhoto, ...] = ()
+
+
+class Destination(NamedTuple):
+    """Адресат отчета: имя для журнала и статистики ('user', 'channel') и чат"""
+    name: str
+    chat_id: Union[int, str]
+
+
+class DeliveryResult(NamedTuple):
+    """Результат доставки одному адресату"""
+    destination: Destination
+    elapsed: float
+    error: Optional[Exception] = None
+    message_ids: Tuple[int, ...] = ()
+    api_calls: int = 1
+    request_bytes: int = 0
+    copied: bool = False
+    queued: bool = False
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def build_payload(text: str, photos: Sequence[str]) -> ReportPayload:
+    """Собрать сообщение отчета (медиа-группа с подписью у первого фото)"""
+    media = tuple(
+        InputMediaPhoto(media=photo_id, caption=text, parse_mode='HTML') if idx == 0
+        else InputMediaPhoto(media=photo_id)
+        for idx, photo_id in enumerate(photos)
+    )
+    return ReportPayload(text, media)
+
+
+def _request_size(params: Dict) -> int:
+    """Размер параметров запроса к Bot API в байтах (JSON)"""
+    return len(json.dumps(params, ensure_ascii=False).encode())
+
+
+def send_request(payload: ReportPayload) -> Tuple[str, Dict, int]:
+    """Вызов Bot API, отправляющий сообщение отчета: (метод, параметры без chat_id, число сообщений)"""
+    if payload.media:
+        return 'send_media_group', {'media': [item.to_dict() for item in payload.media]}, len(payload.media)
+    return 'send_message', {'text': payload.text, 'parse_mode': 'HTML'}, 1
+
+
+def send_request_size(destination: Destination, payload: ReportPayload) -> int:
+    """Размер запроса, отправляющего сообщение отчета заново"""
+    _, params, _ = send_request(payload)
+    return _request_size({'chat_id': destination.chat_id, **params})
+
+
+async def _send(bot: Bot, destination: Destination, payload: ReportPayload) -> DeliveryResult:
+    """Отправить отчет одному адресату; ошибка возвращается в результате"""
+    started = time.perf_counter()
+    size = send_request_size(destination, payload)
+    try:
+        if payload.media:
+            messages = await bot.send_media_group(chat_id=destination.chat_id, media=payload.media)
+        else:
+            messages = (await bot.send_message(chat_id=destination.chat_id, text=payload.text, parse_mode='HTML'),)
+        message_ids = tuple(message.message_id for message in messages)
+    except Exception as e:
+        return DeliveryResult(destination, time.perf_counter() - started, e, request_bytes=size)
+    return DeliveryResult(destination, time.perf_counter() - started, message_ids=message_ids, request_bytes=size)
+
+
+async def _copy(bot: Bot, destination: Destination, source: DeliveryResult, payload: ReportPayload) -> DeliveryResult:
+    """Скопировать отчет из чата source адресату; при ошибке - отправить заново"""
+    started = time.perf_counter()
+    params = {'chat_id': destination.chat_id, 'from_chat_id': source.destination.chat_id,
+              'message_ids': sorted(source.message_ids)}
+    size = _request_size(params)
+    try:
+        message_ids = tuple(copy.message_id for copy in await bot.copy_messages(**params))
+    except Exception as e:
+        logger.warning(f"Не удалось скопировать отчет ({destination.name}): {e}, отправляем заново")
+        result = await _send(bot, destination, payload)
+        return result._replace(elapsed=time.perf_counter() - started, api_calls=2,
+                               request_bytes=size + result.request_bytes)
+    return DeliveryResult(destination, time.perf_counter() - started,
+                          message_ids=message_ids, request_bytes=size, copied=True)
+
+
+async def _enqueue(
+    outbox: 'Outbox',
+    destination: Destination,
+    payload: ReportPayload,
+    source: Optional[DeliveryResult],
+    title: str
+) -> DeliveryResult:
+    """Поставить отчет адресату в очередь сообщений (копию из source, если он есть)"""
+    started = time.perf_counter()
+    method, params, cost = send_request(payload)
+    if source is not None:
+        copy_params = {'from_chat_id': source.destination.chat_id, 'message_ids': sorted(source.message_ids)}
+        size = _request_size({'chat_id': destination.chat_id, **copy_params})
+        # Если копирование не удастся, очередь отправит сообщение заново
+        method, params = 'copy_messages', {**copy_params, 'fallback': {'method': method, 'params': params,
+                                                                        'cost': cost}}
+    else:
+        size = _request_size({'chat_id': destination.chat_id, **params})
+    
+    if not await outbox.enqueue(destination.chat_id, method, params, cost, title):
+        logger.error(f"{title}: не удалось поставить в очередь ({destination.name}), отправляем сразу")
+        return await _send(outbox.bot, destination, payload)
+    return DeliveryResult(destination, time.perf_counter() - started, api_calls=0, request_bytes=size,
+                          copied=source is not None, queued=True)
+
+
+async def deliver(
+    bot: Bot,
+    payload: ReportPayload,
+    destinations: Sequence[Destination],
+    title: str = "Отчет",
+    mode: str = MODE_SEND,
+    outbox: Optional['Outbox'] = None
+) -> List[DeliveryResult]:
+    """
+    Доставить отчет всем адресатам
+    
+    Args:
+        bot: Бот, через который выполняются отправки
+        payload: Сообщение отчета
+        destinations: Адресаты; в режиме 'copy' первый - источник копий
+        title: Название отчета для журнала ("Отчет #15")
+        mode: Режим доставки ('send' или 'copy')
+        outbox: Очередь сообщений: если задана, первый адресат получает
+            отчет сразу, остальные - через очередь (с повторами и
+            ограничением частоты)
+    
+    Returns:
+        List[DeliveryResult]: Результаты в порядке адресатов
+    """
+    started = time.perf_counter()
+    first, others = destinations[0], destinations[1:]
+    if outbox is not None and others and mode == MODE_COPY:
+        source = await _send(bot, first, payload)
+        copy_source = source if source.ok else None
+        results = [source, *await asyncio.gather(
+            *(_enqueue(outbox, destination, payload, copy_source, title) for destination in others)
+        )]
+    elif outbox is not None and others:
+        results = await asyncio.gather(
+            _send(bot, first, payload),
+            *(_enqueue(outbox, destination, payload, None, title) for destination in others)
+        )
+    elif mode == MODE_COPY and others:
+        source = await _send(bot, first, payload)
+        if source.ok:
+            copies = [_copy(bot, destination, source, payload) for destination in others]
+        else:
+            copies = [_send(bot, destination, payload) for destination in others]
+        results = [source, *await asyncio.gather(*copies)]
+    else:
+        results = await asyncio.gather(*(_send(bot, destination, payload) for destination in destinations))
+    elapsed = time.perf_counter() - started
+    get_delivery_stats().record(payload, results, elapsed)
+    
+    for result in results:
+        if not result.ok:
+            logger.error(f"{title} не отправлен ({result.destination.name}): {result.error}")
+            continue
+        action = "поставлен в очередь" if result.queued else "скопирован" if result.copied else "отправлен"
+        logger.info(f"{title} {action} ({result.destination.name}, {len(payload.media)} фото) "
+                    f"за {result.elapsed:.2f} с")
+    logger.info(f"{title}: доставка {len(results)} адресатам заняла {elapsed:.2f} с, "
+                f"запросов к API: {sum(result.api_calls for result in results)}")
+    return results
+
+
+class DeliveryStats:
+    """Счетчики доставки отчетов: время, запросы к API и трафик (обновляются в цикле событий)"""
+    
+    def __init__(self):
+        self.reports = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.api_calls = 0
+        self.request_bytes = 0
+        self.copies = 0
+        self.bytes_saved = 0
+        self._destinations: Dict[str, Dict] = {}
+    
+    def record(self, payload: ReportPayload, results: Sequence[DeliveryResult], elapsed: float) -> None:
+        """Учесть доставку одного отчета"""
+        self.reports += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        for result in results:
+            self.api_calls += result.api_calls
+            self.request_bytes += result.request_bytes
+            if result.copied:
+                # Экономия - относительно отправки сообщения этому адресату заново
+                self.copies += 1
+                self.bytes_saved += send_request_size(result.destination, payload) - result.request_bytes
+            
+            counters = self._destinations.setdefault(
+                result.destination.name, {'sent': 0, 'errors': 0, 'time': 0.0, 'max_time': 0.0}
+            )
+            counters['sent' if result.ok else 'errors'] += 1
+            counters['time'] += result.elapsed
+            counters['max_time'] = max(counters['max_time'], result.elapsed)
+    
+    def stats(self) -> Dict:
+        """Получить статистику доставки"""
+        destinations = {}
+        for name, counters in self._destinations.items():
+            attempts = counters['sent'] + counters['errors']
+            destinations[name] = {
+                'sent': counters['sent'],
+                'errors': counters['errors'],
+                'time_avg': round(counters['time'] / attempts, 6) if attempts else 0.0,
+                'time_max': round(counters['max_time'], 6),
+            }
+        return {
+            'reports': self.reports,
+            'time_avg': round(self.total_time / self.reports, 6) if self.reports else 0.0,
+            'time_max': round(self.max_time, 6),
+            'api_calls': self.api_calls,
+            'api_calls_per_report': round(self.api_calls / self.reports, 2) if self.reports else 0.0,
+            'request_bytes': self.request_bytes,
+            'copies': self.copies,
+            'bytes_saved': self.bytes_saved,
+            'bytes_saved_per_report': round(self.bytes_saved / self.reports) if self.reports else 0,
+            'destinations': destinations,
+        }
+
+
+_stats = DeliveryStats()
+
+
+def get_delivery_stats() -> DeliveryStats:
+    """Получить общую статистику доставки отчетов"""
+    return _stats
@@ -0,0 +1,534 @@
+"""
+Фоновое формирование отчетов
+
+Excel-отчет строится в отдельном процессе (ProcessPoolExecutor, spawn),
+поэтому чтение истории из БД и запись книги не блокируют цикл событий
+бота: монтажники, заполняющие мастер подключения, не ждут, пока
+руководитель выгружает отчет за все время.
+
+Одновременно выполняется не больше max_workers заданий (семафор),
+еще max_queued ждут в очереди; у пользователя может быть только одно
+активное задание. Воркер сообщает количество записанных строк через
+общий словарь состояния и проверяет в нем флаг отмены.
+
+Готовый отчет возвращается из воркера содержимым в памяти; во временный
+файл (в закрытом каталоге планировщика) сбрасываются только отчеты
+больше REPORT_SPOOL_MAX_SIZE.
+"""
+import asyncio
+import io
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime
+from typing import Any, Awaitable, BinaryIO, Callable, Coroutine, Dict, Iterable, Iterator, MutableMapping, Optional
+import logging
+
+from database.repositories.connection_repository import ConnectionRepository
+from database.repositories.material_repository import MaterialRepository
+from report_generator import ReportGenerator
+
+logger = logging.getLogger(__name__)
+
+# Количество процессов формирования отчетов
+DEFAULT_REPORT_WORKERS = 2
+
+# Сколько заданий может ждать свободного процесса
+DEFAULT_REPORT_MAX_QUEUED = 8
+
+# Как часто обновлять сообщение о ходе формирования, секунд
+PROGRESS_INTERVAL = 2.0
+
+# Через сколько строк воркер публикует прогресс и проверяет отмену
+PROGRESS_EVERY = 500
+
+# Отчеты до этого размера передаются из воркера в памяти, большие - через временный файл
+REPORT_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+class ReportJobCancelled(Exception):
+    """Задание отменено пользователем"""
+
+
+class JobProgress:
+    """
+    Прогресс задания на стороне воркера
+    
+    Передается в функцию задания первым аргументом. Ключ job_id в общем
+    словаре - количество обработанных строк, ('cancel', job_id) - флаг отмены.
+    """
+    
+    def __init__(self, job_id: int, state: MutableMapping, every: int = PROGRESS_EVERY):
+        self.job_id = job_id
+        self.state = state
+        self.every = every
+        self.rows = 0
+    
+    def publish(self) -> None:
+        """Опубликовать прогресс и прервать задание, если запрошена отмена"""
+        self.state[self.job_id] = self.rows
+        if self.state.get(('cancel', self.job_id)):
+            raise ReportJobCancelled(f"Задание {self.job_id} отменено")
+    
+    def track(self, rows: Iterable) -> Iterator:
+        """Пропустить строки через счетчик прогресса"""
+        for row in rows:
+            yield row
+            self.rows += 1
+            if self.rows % self.every == 0:
+                self.publish()
+
+
+class ReportJob:
+    """Задание на формирование отчета"""
+    
+    def __init__(self, job_id: int, user_id: int, title: str, total: int):
+        self.id = job_id
+        self.user_id = user_id
+        self.title = title
+        self.total = total
+        self.status = 'queued'
+        self.progress = 0
+        self.created_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_requested = False
+        # Будит ожидание свободного воркера при отмене
+        self.cancel_event = asyncio.Event()
+        self.future = None
+        self.task: Optional[asyncio.Task] = None
+    
+    @property
+    def percent(self) -> int:
+        """Процент выполнения"""
+        if not self.total:
+            return 0
+        return min(100, int(self.progress * 100 / self.total))
+
+
+class ReportDocument:
+    """
+    Сформированный отчет, переданный из воркера
+    
+    Содержимое либо в памяти (content), либо во временном файле (path),
+    который удаляется вызовом discard() после отправки.
+    """
+    
+    def __init__(self, filename: str, content: Optional[bytes] = None, path: Optional[str] = None):
+        self.filename = filename
+        self.content = content
+        self.path = path
+    
+    @property
+    def size(self) -> int:
+        """Размер файла, байт"""
+        return len(self.content) if self.content is not None else os.path.getsize(self.path)
+    
+    def open(self) -> BinaryIO:
+        """Открыть содержимое для чтения"""
+        if self.content is not None:
+            return io.BytesIO(self.content)
+        return open(self.path, 'rb')
+    
+    def discard(self) -> None:
+        """Удалить временный файл"""
+        if self.path:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+
+def spool_report(
+    write: Callable[[BinaryIO], Any],
+    filename: str,
+    spill_dir: Optional[str] = None,
+    max_size: int = REPORT_SPOOL_MAX_SIZE
+) -> ReportDocument:
+    """
+    Записать отчет в буфер и упаковать для передачи из воркера
+    
+    Пока книга не больше max_size, она остается в памяти и возвращается
+    содержимым. Больший отчет SpooledTemporaryFile уже сбросил на диск
+    (в spill_dir), его содержимое переносится в именованный файл там же.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=max_size, dir=spill_dir) as buffer:
+        write(buffer)
+        size = buffer.seek(0, io.SEEK_END)
+        buffer.seek(0)
+        if size <= max_size:
+            return ReportDocument(filename, content=buffer.read())
+        
+        with tempfile.NamedTemporaryFile(dir=spill_dir, prefix='report_', suffix='.xlsx', delete=False) as file:
+            shutil.copyfileobj(buffer, file)
+        logger.info(f"Отчет {filename} ({size} байт) передается через временный файл")
+        return ReportDocument(filename, path=file.name)
+
+
+def _call_job(func: Callable, job_id: int, state: MutableMapping, args: tuple) -> Any:
+    """Выполнить функцию задания в воркере"""
+    progress = JobProgress(job_id, state)
+    try:
+        return func(progress, *args)
+    finally:
+        state[job_id] = progress.rows
+
+
+class ReportJobRunner:
+    """
+    Планировщик заданий формирования отчетов
+    
+    submit() регистрирует задание, start() запускает корутину, которая
+    доставляет результат пользователю, а внутри нее run() выполняет
+    функцию задания в пуле процессов и вызывает on_progress с заданным
+    интервалом. use_processes=False выполняет задания в потоках
+    (для тестов и окружений без spawn).
+    """
+    
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_REPORT_WORKERS,
+        max_queued: int = DEFAULT_REPORT_MAX_QUEUED,
+        use_processes: bool = True,
+        progress_interval: float = PROGRESS_INTERVAL
+    ):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.use_processes = use_processes
+        self.progress_interval = progress_interval
+        
+        self._executor: Optional[Executor] = None
+        self._manager = None
+        self._state: Optional[MutableMapping] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._jobs: Dict[int, ReportJob] = {}
+        self._ids = itertools.count(1)
+        self._spill_dir: Optional[str] = None
+        
+        # Счетчики
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.queue_time = 0.0
+        self.max_queue_time = 0.0
+        self.run_time = 0.0
+        self.max_run_time = 0.0
+    
+    def _start_executor(self) -> None:
+        """Создать пул воркеров и общий словарь состояния при первом задании"""
+        if self._executor is not None:
+            return
+        if self.use_processes:
+            ctx = multiprocessing.get_context('spawn')
+            self._manager = ctx.Manager()
+            self._state = self._manager.dict()
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+        else:
+            self._state = {}
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="report-job")
+        logger.info(f"Пул формирования отчетов запущен: {self.max_workers} "
+                    f"{'процесс(ов)' if self.use_processes else 'поток(ов)'}")
+    
+    @property
+    def spill_dir(self) -> str:
+        """Закрытый каталог для больших отчетов (создается при первом обращении)"""
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix='isp_bot_reports_')
+        return self._spill_dir
+    
+    def _get_slots(self) -> asyncio.Semaphore:
+        """Семафор ограничения одновременных заданий (создается в работающем цикле событий)"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        return self._slots
+    
+    def get_user_job(self, user_id: int) -> Optional[ReportJob]:
+        """Активное задание пользователя"""
+        for job in self._jobs.values():
+            if job.user_id == user_id:
+                return job
+        return None
+    
+    def get_job(self, job_id: int) -> Optional[ReportJob]:
+        """Активное задание по ID"""
+        return self._jobs.get(job_id)
+    
+    def queue_position(self, job: ReportJob) -> int:
+        """Сколько заданий ожидают запуска перед данным"""
+        return sum(1 for other in self._jobs.values()
+                   if other.status == 'queued' and other.id < job.id)
+    
+    def submit(self, user_id: int, title: str, total: int) -> Optional[ReportJob]:
+        """
+        Зарегистрировать задание
+        
+        Returns:
+            Задание или None, если очередь заполнена
+        """
+        if len(self._jobs) >= self.max_workers + self.max_queued:
+            self.rejected += 1
+            logger.warning(f"Очередь отчетов заполнена ({len(self._jobs)}), задание пользователя {user_id} отклонено")
+            return None
+        
+        job = ReportJob(next(self._ids), user_id, title, total)
+        self._jobs[job.id] = job
+        self.submitted += 1
+        return job
+    
+    def start(self, job: ReportJob, coro: Coroutine) -> asyncio.Task:
+        """Запустить корутину доставки задания в фоне"""
+        job.task = asyncio.create_task(coro, name=f"report-job-{job.id}")
+        job.task.add_done_callback(lambda _: self._finish(job))
+        return job.task
+    
+    async def run(
+        self,
+        job: ReportJob,
+        func: Callable,
+        *args,
+        on_progress: Optional[Callable[[ReportJob], Awaitable]] = None
+    ) -> Any:
+        """
+        Выполнить функцию задания в пуле воркеров
+        
+        Функция вызывается как func(progress: JobProgress, *args) и должна
+        быть доступна для импорта в дочернем процессе.
+        
+        Raises:
+            ReportJobCancelled: задание отменено
+        """
+        self._start_executor()
+        slots = self._get_slots()
+        
+        # Ждем свободного воркера или отмены, периодически сообщая позицию в очереди
+        acquire = asyncio.ensure_future(slots.acquire())
+        cancelled = asyncio.ensure_future(job.cancel_event.wait())
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    {acquire, cancelled}, timeout=self.progress_interval, return_when=asyncio.FIRST_COMPLETED
+                )
+                if acquire in done:
+                    break
+                if job.cancel_requested:
+                    raise ReportJobCancelled(f"Задание {job.id} отменено")
+                if on_progress:
+                    await on_progress(job)
+        except BaseException:
+            if acquire.done() and not acquire.cancelled():
+                slots.release()
+            else:
+                acquire.cancel()
+            raise
+        finally:
+            cancelled.cancel()
+        
+        try:
+            if job.cancel_requested:
+                raise ReportJobCancelled(f"Задание {job.id} отменено")
+            
+            job.status = 'running'
+            job.started_at = time.monotonic()
+            waited = job.started_at - job.created_at
+            self.queue_time += waited
+            self.max_queue_time = max(self.max_queue_time, waited)
+            
+            self._state[job.id] = 0
+            job.future = self._executor.submit(_call_job, func, job.id, self._state, args)
+            waiter = asyncio.wrap_future(job.future)
+            
+            while True:
+                done, _ = await asyncio.wait({waiter}, timeout=self.progress_interval)
+                job.progress = self._state.get(job.id, job.progress)
+                if done:
+                    break
+                if on_progress:
+                    await on_progress(job)
+            
+            try:
+                return waiter.result()
+            except asyncio.CancelledError:
+                # Задание снято до запуска в пуле (cancel() отменил future)
+                raise ReportJobCancelled(f"Задание {job.id} отменено") from None
+        finally:
+            slots.release()
+    
+    def cancel(self, job_id: int, user_id: int) -> bool:
+        """
+        Запросить отмену задания
+        
+        Ожидающее задание снимается сразу (ожидание воркера прерывается),
+        выполняющееся прерывается воркером при следующей публикации прогресса.
+        
+        Returns:
+            True, если задание найдено и принадлежит пользователю
+        """
+        job = self._jobs.get(job_id)
+        if not job or job.user_id != user_id:
+            return False
+        
+        job.cancel_requested = True
+        job.cancel_event.set()
+        if job.future is not None and not job.future.cancel() and self._state is not None:
+            self._state[('cancel', job.id)] = True
+        logger.info(f"Запрошена отмена задания {job.id} ({job.title})")
+        return True
+    
+    def _finish(self, job: ReportJob) -> None:
+        """Снять задание с учета после завершения корутины доставки"""
+        job.finished_at = time.monotonic()
+        if job.started_at is not None:
+            elapsed = job.finished_at - job.started_at
+            self.run_time += elapsed
+            self.max_run_time = max(self.max_run_time, elapsed)
+        
+        if job.cancel_requested:
+            job.status = 'cancelled'
+            self.cancelled += 1
+        elif job.task.cancelled() or job.task.exception() is not None or job.status == 'failed':
+            job.status = 'failed'
+            self.failed += 1
+        else:
+            job.status = 'done'
+            self.completed += 1
+        
+        self._jobs.pop(job.id, None)
+        if self._state is not None:
+            try:
+                self._state.pop(job.id, None)
+                self._state.pop(('cancel', job.id), None)
+            except Exception as e:
+                # Менеджер состояния мог уже остановиться при завершении бота
+                logger.debug(f"Не удалось очистить состояние задания {job.id}: {e}")
+    
+    async def join(self) -> None:
+        """Дождаться завершения всех заданий"""
+        tasks = [job.task for job in list(self._jobs.values()) if job.task]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def shutdown(self, timeout: float = 30.0) -> None:
+        """Отменить ожидающие задания, дождаться выполняющихся и остановить пул"""
+        for job in list(self._jobs.values()):
+            if job.status == 'queued':
+                self.cancel(job.id, job.user_id)
+        try:
+            await asyncio.wait_for(self.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Задания отчетов не завершились за {timeout} с")
+        
+        # Остановка пула и менеджера блокирует - выполняем ее вне цикла событий
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+        if self._manager is not None:
+            manager, self._manager = self._manager, None
+            await asyncio.to_thread(manager.shutdown)
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+        logger.info(f"Статистика заданий отчетов: {self.stats()}")
+    
+    def stats(self) -> Dict:
+        """Получить статистику заданий"""
+        finished = self.completed + self.failed + self.cancelled
+        started = self.submitted - len([job for job in self._jobs.values() if job.status == 'queued'])
+        return {
+            'workers': self.max_workers,
+            'active': len(self._jobs),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'cancelled': self.cancelled,
+            'rejected': self.rejected,
+            'queue_time_avg': round(self.queue_time / started, 6) if started else 0.0,
+            'queue_time_max': round(self.max_queue_time, 6),
+            'run_time_avg': round(self.run_time / finished, 6) if finished else 0.0,
+            'run_time_max': round(self.max_run_time, 6),
+        }
+
+
+class _ReportSource:
+    """
+    Чтение строк отчета в воркере
+    
+    Только репозитории поверх пула чтения: схему уже проверил бот при
+    запуске, а справочники и кэши Database воркеру не нужны.
+    """
+    
+    def __init__(self, db_path: str):
+        self.connections = ConnectionRepository(db_path)
+        self.materials = MaterialRepository(db_path)
+
+
+# Источники строк отчета в процессе-воркере (по одному на файл БД)
+_sources: Dict[str, _ReportSource] = {}
+
+
+def _get_source(db_path: str) -> _ReportSource:
+    """Получить источник строк отчета воркера"""
+    source = _sources.get(db_path)
+    if source is None:
+        source = _sources[db_path] = _ReportSource(db_path)
+    return source
+
+
+def build_employee_report(
+    progress: JobProgress,
+    db_path: str,
+    employee_id: int,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    employee_name: str,
+    stats: Dict,
+    period_name: str,
+    spill_dir: Optional[str] = None
+) -> ReportDocument:
+    """Сформировать отчет по сотруднику (выполняется в воркере)"""
+    source = _get_source(db_path)
+    
+    def write(output: BinaryIO) -> None:
+        with closing(source.connections.iter_employee_report(employee_id, start=start, end=end)) as connections, \
+                closing(source.materials.iter_movements(employee_id, start, end)) as movements:
+            ReportGenerator.generate_employee_report(
+                employee_name=employee_name,
+                connections=progress.track(connections),
+                stats=stats,
+                period_name=period_name,
+                movements=progress.track(movements),
+                output=output
+            )
+    
+    return spool_report(write, ReportGenerator.report_filename(employee_name), spill_dir)
+
+
+def build_team_report(
+    progress: JobProgress,
+    db_path: str,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    summary: Dict,
+    period_name: str,
+    spill_dir: Optional[str] = None
+) -> ReportDocument:
+    """Сформировать сводный отчет по всем сотрудникам (выполняется в воркере)"""
+    source = _get_source(db_path)
+    
+    def write(output: BinaryIO) -> None:
+        with closing(source.connections.iter_team_report(start=start, end=end)) as connections:
+            ReportGenerator.generate_team_report(
+                summary=summary,
+                connections=progress.track(connections),
+                period_name=period_name,
+                output=output
+            )
+    
+    return spool_report(write, ReportGenerator.report_filename("Все_сотрудники"), spill_dir)